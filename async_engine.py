@@ -0,0 +1,595 @@
+#!/usr/bin/env python3
+"""
+Asyncio I/O engine for the Modbus TCP Master GUI.
+
+All traffic to the device goes through one pymodbus AsyncModbusTcpClient
+owned by an event loop running in a single background thread. Other threads
+hand work to the loop with submit() (or the blocking call()), which queue it
+on the loop thread-safely, and operations take an asyncio lock so requests
+from the read button, the write button and the poller never interleave on the
+socket. Any number of requests can be waiting; they run in arrival order.
+
+Completed operations are not delivered from the loop thread. Their callbacks
+are put on a queue that the owning thread empties with pump(), which the GUI
+calls from its single after()-driven refresh loop.
+
+Each request is recorded in a metrics.Metrics collection, and so is the time
+every operation spent queued between submit() and getting the connection.
+
+Reads follow a modbus_core.RetryPolicy: response timeouts are derived from
+the measured round-trip time, and blocks lost to a timeout or a dropped
+connection are read again on their own after a jittered backoff. When the
+connection drops the engine reconnects in the background with the same
+backoff (state is RECONNECTING meanwhile, and operations fail fast), so
+pollers simply resume once the device is back. Losing and regaining the
+connection is published on an events.EventBus (ConnectionLost, Reconnected).
+
+The engine talks to the device over a transports.Transport, Modbus TCP by
+default. The RTU transports have no transaction IDs to pipeline with: their
+transports.RtuClient runs one request at a time on a private I/O thread,
+in chunks sized for the line.
+"""
+
+import asyncio
+import concurrent.futures
+import contextvars
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from modbus_core import (
+    DEFAULT_POLICY, AdaptivePacer, ModbusError, ModbusIOError, PackedBits, is_transient, iter_chunks, join_values,
+    response_error, FC_READ_COILS, FC_READ_DISCRETE_INPUTS, FC_READ_HOLDING_REGISTERS, FC_READ_INPUT_REGISTERS,
+    FC_MASK_WRITE_REGISTER, FC_READ_WRITE_MULTIPLE_REGISTERS, FC_WRITE_MULTIPLE_REGISTERS, HOLDING_REGISTERS,
+    MAX_WRITE_REGISTERS, RETRYABLE_EXCEPTIONS,
+)
+from events import EVENTS, ConnectionLost, Reconnected
+from metrics import METRICS
+from read_planner import max_gap_for_line
+from transports import TcpTransport
+
+# perf_counter() at which the running operation was submitted
+_submitted_at = contextvars.ContextVar('submitted_at', default=None)
+
+# Connection states
+DISCONNECTED = "disconnected"
+CONNECTED = "connected"
+RECONNECTING = "reconnecting"
+
+
+class ModbusEngine:
+    """Runs Modbus I/O for one device on a private asyncio event loop."""
+
+    max_busy_retries = 8
+
+    def __init__(self, host, port, timeout=3, metrics=None, policy=None, transport=None, events=None):
+        self.host = host
+        self.port = port
+        self.transport = transport or TcpTransport(host, port)
+        self.name = self.transport.name
+        self.timeout = timeout
+        self.metrics = metrics if metrics is not None else METRICS
+        self.events = events if events is not None else EVENTS
+        self.policy = policy or DEFAULT_POLICY
+        self.client = None
+        self.pacer = AdaptivePacer()
+        self.state = DISCONNECTED
+        self.reconnect_attempts = 0
+        self.reconnects = 0
+        self.loop = None
+        self._thread = None
+        self._io_lock = None
+        self._reconnect_task = None
+        self._rtu_executor = None
+        self._completed = queue.Queue()
+
+    # ------------------------------------------------------------------ #
+    # Thread-side API
+    # ------------------------------------------------------------------ #
+    def start(self):
+        """Start the event loop thread."""
+        if self._thread is not None:
+            return
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self._io_lock = asyncio.Lock()
+            self.loop.call_soon(ready.set)
+            self.loop.run_forever()
+            self.loop.close()
+
+        self._thread = threading.Thread(target=run, name="modbus-engine", daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def stop(self, timeout=5):
+        """Close the connection and stop the event loop thread."""
+        if self._thread is None:
+            return
+        try:
+            self.call(self.close, timeout=timeout)
+        except Exception:
+            pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        self._thread = None
+        if self._rtu_executor is not None:
+            self._rtu_executor.shutdown(wait=False)
+            self._rtu_executor = None
+
+    def submit(self, operation, *args, callback=None, **kwargs):
+        """
+        Schedule operation(*args, **kwargs) on the loop and return a concurrent Future.
+
+        If callback is given it is called as callback(result, error) from the
+        thread that calls pump(), never from the loop thread.
+        """
+        future = asyncio.run_coroutine_threadsafe(
+            self._queued(time.perf_counter(), operation, args, kwargs), self.loop
+        )
+        if callback is not None:
+            future.add_done_callback(lambda f: self._completed.put((callback, f)))
+        return future
+
+    def call(self, operation, *args, timeout=None, **kwargs):
+        """Run operation on the loop and block the calling thread until it finishes."""
+        return self.submit(operation, *args, **kwargs).result(timeout)
+
+    def pump(self):
+        """Run the callbacks of every completed operation; returns how many ran."""
+        handled = 0
+        while True:
+            try:
+                callback, future = self._completed.get_nowait()
+            except queue.Empty:
+                return handled
+            if future.cancelled():
+                error = ModbusIOError("Request cancelled")
+                result = None
+            else:
+                error = future.exception()
+                result = None if error is not None else future.result()
+            callback(result, error)
+            handled += 1
+
+    # ------------------------------------------------------------------ #
+    # Operations (run on the loop)
+    # ------------------------------------------------------------------ #
+    async def connect(self):
+        """Open the connection; returns True on success."""
+        self._cancel_reconnect()
+        async with self._io():
+            self.pacer = AdaptivePacer()
+            return await self._open()
+
+    async def close(self):
+        """Close the connection and stop reconnecting."""
+        self._cancel_reconnect()
+        async with self._io():
+            self.state = DISCONNECTED
+            if self.client is not None:
+                self.client.close()
+                self.client = None
+
+    async def read_registers(self, address, count, unit, table=HOLDING_REGISTERS):
+        """
+        Read count entries of a data table starting at address, in pipelined chunks.
+
+        Returns a list of ints for register tables and PackedBits for bit tables.
+        """
+        chunks = list(iter_chunks(address, count, self.chunk_size(table)))
+        async with self._io():
+            results = await self._read_blocks(chunks, unit, table)
+        return join_values(table, (results[chunk] for chunk in chunks))
+
+    async def read_blocks(self, blocks, unit, table=HOLDING_REGISTERS):
+        """
+        Read several (address, count) blocks of at most table.max_read entries each.
+
+        All blocks are pipelined as one batch. Returns the values of each
+        block, in the order given.
+        """
+        async with self._io():
+            results = await self._read_blocks(blocks, unit, table)
+        return [results[block] for block in blocks]
+
+    async def read_tables(self, requests, unit):
+        """
+        Read [(blocks, table), ...] back to back without letting other operations in between.
+
+        Returns the block values of each request, in the order given.
+        """
+        results = []
+        async with self._io():
+            for blocks, table in requests:
+                values = await self._read_blocks(blocks, unit, table)
+                results.append([values[block] for block in blocks])
+        return results
+
+    async def write_registers(self, address, values, unit):
+        """Write up to 123 values to consecutive holding registers starting at address, as one request."""
+        from pymodbus.register_write_message import WriteMultipleRegistersRequest
+
+        async with self._io():
+            await self._pipeline(
+                [(address,)], lambda item: WriteMultipleRegistersRequest(address, list(values), slave=unit),
+                FC_WRITE_MULTIPLE_REGISTERS, unit
+            )
+
+    async def write_blocks(self, blocks, unit):
+        """
+        Write several (address, values) blocks of any length.
+
+        Blocks are split into requests of at most 123 registers (fewer on a
+        slow RTU line) and pipelined as one batch. Returns the number of
+        requests sent.
+        """
+        from pymodbus.register_write_message import WriteMultipleRegistersRequest
+
+        size = self.chunk_size(HOLDING_REGISTERS, write=True)
+        chunks = []
+        for address, values in blocks:
+            for offset in range(0, len(values), size):
+                chunks.append((address + offset, tuple(values[offset:offset + size])))
+        async with self._io():
+            await self._pipeline(
+                chunks, lambda chunk: WriteMultipleRegistersRequest(chunk[0], list(chunk[1]), slave=unit),
+                FC_WRITE_MULTIPLE_REGISTERS, unit
+            )
+        return len(chunks)
+
+    async def read_write_registers(self, address, values, unit, read_address=None, read_count=None):
+        """
+        Write values and read registers in one read/write multiple registers (FC23) request.
+
+        Reads back the written range unless read_address/read_count are
+        given; returns the values read.
+        """
+        from pymodbus.register_read_message import ReadWriteMultipleRegistersRequest
+
+        read_address = address if read_address is None else read_address
+        read_count = len(values) if read_count is None else read_count
+        async with self._io():
+            responses = await self._pipeline(
+                [(address,)], lambda item: ReadWriteMultipleRegistersRequest(
+                    read_address=read_address, read_count=read_count, write_address=address,
+                    write_registers=list(values), slave=unit
+                ), FC_READ_WRITE_MULTIPLE_REGISTERS, unit
+            )
+        registers = responses[(address,)].registers
+        if len(registers) < read_count:
+            raise ModbusIOError(f"Short response: expected {read_count} registers, got {len(registers)}")
+        return list(registers[:read_count])
+
+    async def mask_write_register(self, address, and_mask, or_mask, unit):
+        """Change bits of one holding register with a mask write (FC22); see modbus_core.bit_masks()."""
+        from pymodbus.register_write_message import MaskWriteRegisterRequest
+
+        async with self._io():
+            await self._pipeline(
+                [(address,)], lambda item: MaskWriteRegisterRequest(address, and_mask, or_mask, slave=unit),
+                FC_MASK_WRITE_REGISTER, unit
+            )
+
+    async def run_sequence(self, steps, unit, keep_going=False):
+        """
+        Run write_sequence steps back-to-back, one request at a time, holding the connection throughout.
+
+        No other operation gets in between the steps. Returns a
+        write_sequence.StepResult per step run; stops after the first failure
+        unless keep_going is set.
+        """
+        results = []
+        async with self._io():
+            for step in steps:
+                started = time.perf_counter()
+                try:
+                    if step.kind == 'delay':
+                        await asyncio.sleep(step.delay)
+                        values = None
+                    else:
+                        responses = await self._pipeline(
+                            [(step.address,)], lambda item: step.request(unit), step.function_code, unit
+                        )
+                        values = getattr(responses[(step.address,)], 'registers', None)
+                        if step.read_count is not None:
+                            if values is None or len(values) < step.read_count:
+                                raise ModbusIOError(f"Short response: expected {step.read_count} registers")
+                            values = list(values[:step.read_count])
+                        else:
+                            values = None
+                    result = step.result(time.perf_counter() - started, values)
+                except (ModbusError, OSError) as e:
+                    result = step.result(time.perf_counter() - started, error=str(e) or type(e).__name__)
+                results.append(result)
+                if not result.ok and not keep_going:
+                    break
+        return results
+
+    async def execute(self, request, unit):
+        """
+        Send one pymodbus request of any function code as it is and return the response.
+
+        Used by modbus_proxy to pass requests through; an exception response
+        raises ModbusResponseError like every other operation.
+        """
+        request.slave_id = unit
+        address = getattr(request, 'address', getattr(request, 'write_address', 0))
+        async with self._io():
+            responses = await self._pipeline([(address,)], lambda item: request, request.function_code, unit)
+        return responses[(address,)]
+
+    def chunk_size(self, table, write=False):
+        """Entries per request of table on this engine's transport."""
+        return min(MAX_WRITE_REGISTERS if write else table.max_read,
+                   self.transport.chunk_size(table, self.timeout, write))
+
+    def max_gap(self):
+        """Registers worth bridging in a read plan on this link, from its line rate and measured round trip."""
+        return max_gap_for_line(self.transport.line, self.pacer.srtt)
+
+    # ------------------------------------------------------------------ #
+    # Internals
+    # ------------------------------------------------------------------ #
+    async def _queued(self, submitted, operation, args, kwargs):
+        """Run an operation, remembering when it was submitted for the queue wait metric."""
+        _submitted_at.set(submitted)
+        return await operation(*args, **kwargs)
+
+    @asynccontextmanager
+    async def _io(self):
+        """Hold the I/O lock, recording how long the operation waited for it since submit()."""
+        started = _submitted_at.get() or time.perf_counter()
+        async with self._io_lock:
+            self.metrics.queued(self.name, time.perf_counter() - started)
+            yield
+
+    async def _open(self):
+        """(Re)open the connection with the I/O lock held; returns True on success."""
+        from pymodbus.client import AsyncModbusTcpClient
+
+        if self.client is not None:
+            self.client.close()
+        if self.transport.pipelining:
+            # pymodbus' own reconnect is disabled; _reconnect_loop follows the RetryPolicy instead
+            self.client = AsyncModbusTcpClient(
+                host=self.host, port=self.port, timeout=self.timeout, retries=0, reconnect_delay=0
+            )
+            connected = await self.client.connect()
+        else:
+            if self._rtu_executor is None:
+                self._rtu_executor = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="modbus-rtu")
+            self.client = self.transport.client(self.timeout)
+            connected = await self.loop.run_in_executor(self._rtu_executor, self.client.connect)
+        if connected:
+            self.state = CONNECTED
+            self.reconnect_attempts = 0
+        return connected
+
+    def _connected_client(self):
+        """Return the client, raising ModbusIOError if it is not connected."""
+        if self.client is None or self.state == DISCONNECTED:
+            raise ModbusIOError("Not connected to server")
+        if not self.client.connected:
+            if self.policy.reconnect:
+                self._start_reconnect()
+                raise ModbusIOError(f"Connection to {self.name} lost, reconnecting")
+            raise ModbusIOError("Connection lost")
+        return self.client
+
+    def _start_reconnect(self):
+        """Start reconnecting in the background unless that is already happening."""
+        if self._reconnect_task is None or self._reconnect_task.done():
+            lost = self.state == CONNECTED
+            self.state = RECONNECTING
+            self._reconnect_task = self.loop.create_task(self._reconnect_loop())
+            if lost:
+                self.events.publish(ConnectionLost(self.name))
+
+    def _cancel_reconnect(self):
+        if self._reconnect_task is not None:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+
+    async def _reconnect_loop(self):
+        """Try to reconnect with jittered exponential backoff until it works or close() is called."""
+        while self.state == RECONNECTING:
+            self.reconnect_attempts += 1
+            await asyncio.sleep(self.policy.backoff(self.reconnect_attempts, self.policy.reconnect_max))
+            async with self._io_lock:
+                if self.state != RECONNECTING:
+                    return
+                attempts = self.reconnect_attempts
+                if await self._open_quietly():
+                    self.reconnects += 1
+                    self.events.publish(Reconnected(self.name, attempts))
+                    return
+
+    async def _open_quietly(self):
+        """_open() for reconnect attempts: failures are expected and only logged at debug level."""
+        try:
+            return await self._open()
+        except Exception as e:
+            logging.getLogger(__name__).debug("Reconnect to %s failed: %s", self.name, e)
+            return False
+
+    async def _recover(self, attempt):
+        """
+        Wait before retry number attempt of a read, reopening the connection if it was lost (lock held).
+
+        Raises ModbusIOError instead when the background reconnect has
+        already failed, so reads fail fast while the device is away.
+        """
+        await asyncio.sleep(self.policy.backoff(attempt))
+        if self.state == DISCONNECTED:
+            raise ModbusIOError("Not connected to server")
+        if self.client is not None and self.client.connected:
+            return
+        if self.reconnect_attempts > 0 or not await self._open_quietly():
+            if self.policy.reconnect:
+                self._start_reconnect()
+            raise ModbusIOError(f"Connection to {self.name} lost, reconnecting")
+        self._cancel_reconnect()
+        self.reconnects += 1
+        self.events.publish(Reconnected(self.name, attempt))
+
+    def _pipelining_supported(self):
+        """True if responses carry transaction IDs (MBAP framing)."""
+        return self.transport.pipelining and type(self.client.framer).__name__ == 'ModbusSocketFramer'
+
+    def _send(self, request, timeout):
+        """
+        Send request without waiting; return (transaction id, response future, bytes sent).
+
+        On the RTU transports the whole exchange runs on the I/O thread and
+        the future fails with TimeoutError once timeout (plus the line's
+        transmission times) has passed without an answer; the transaction ID
+        is None.
+        """
+        client = self.client
+        if not self.transport.pipelining:
+            future = self.loop.run_in_executor(self._rtu_executor, client.execute, request, timeout)
+            return None, future, self.transport.overhead + 1 + len(request.encode())
+        request.transaction_id = client.transaction.getNextTID()
+        future = client.build_response(request.transaction_id)
+        packet = client.framer.buildPacket(request)
+        client.send(packet)
+        return request.transaction_id, future, len(packet)
+
+    async def _read_blocks(self, blocks, unit, table):
+        """
+        Read (address, count) blocks; returns a dict mapping each block to its values.
+
+        Blocks longer than chunk_size(table) are read in several requests.
+        """
+        from pymodbus.bit_read_message import ReadCoilsRequest, ReadDiscreteInputsRequest
+        from pymodbus.register_read_message import ReadHoldingRegistersRequest, ReadInputRegistersRequest
+
+        request_class = {
+            FC_READ_COILS: ReadCoilsRequest,
+            FC_READ_DISCRETE_INPUTS: ReadDiscreteInputsRequest,
+            FC_READ_HOLDING_REGISTERS: ReadHoldingRegistersRequest,
+            FC_READ_INPUT_REGISTERS: ReadInputRegistersRequest,
+        }[table.function_code]
+        size = self.chunk_size(table)
+        chunks = [chunk for block in blocks for chunk in iter_chunks(*block, size)]
+        responses = {}
+        attempt = 0
+        while True:
+            try:
+                await self._pipeline(
+                    [chunk for chunk in chunks if chunk not in responses],
+                    lambda block: request_class(block[0], block[1], slave=unit), table.function_code, unit,
+                    responses, self.policy.request_timeout(self.pacer, self.timeout, attempt)
+                )
+                break
+            except Exception as e:
+                if not is_transient(e) or attempt >= self.policy.retries:
+                    raise
+            attempt += 1
+            await self._recover(attempt)
+        values = {}
+        for chunk_address, chunk_count in chunks:
+            response = responses[(chunk_address, chunk_count)]
+            chunk_values = response.bits if table.bits else response.registers
+            if len(chunk_values) < chunk_count:
+                raise ModbusIOError(
+                    f"Short response at address {chunk_address}: "
+                    f"expected {chunk_count} values, got {len(chunk_values)}"
+                )
+            if table.bits:
+                # The packed payload (after its byte count), not one Python bool per bit
+                values[(chunk_address, chunk_count)] = PackedBits(response.encode()[1:], chunk_count)
+            else:
+                values[(chunk_address, chunk_count)] = chunk_values[:chunk_count]
+        return {
+            block: values[block] if block in values else join_values(
+                table, (values[chunk] for chunk in iter_chunks(*block, size))
+            )
+            for block in blocks
+        }
+
+    async def _pipeline(self, items, build_request, function_code, unit, results=None, timeout=None):
+        """
+        Keep up to pacer.window requests in flight, matched by transaction ID.
+
+        items are tuples whose first element is the start address;
+        build_request(item) returns the pymodbus request for an item. Returns a
+        dict mapping each item to its response; responses are stored in
+        results as they arrive, so they survive a later failure. timeout
+        defaults to the full configured timeout.
+        """
+        client = self._connected_client()
+        pacer = self.pacer
+        timeout = timeout or self.timeout
+        metrics = self.metrics
+        device = self.transport.device(unit)
+        if not self._pipelining_supported():
+            pacer.max_in_flight = 1
+            pacer.window = 1
+
+        pending = deque((item, 0) for item in items)
+        in_flight = {}
+        results = {} if results is None else results
+        try:
+            while pending or in_flight:
+                while pending and len(in_flight) < pacer.window:
+                    if in_flight and pacer.delay > 0:
+                        break
+                    item, busy_retries = pending.popleft()
+                    request = build_request(item)
+                    tid, future, size = self._send(request, timeout)
+                    metrics.sent(device, function_code, size)
+                    # Framing bytes (MBAP header or address and CRC) are the same both ways
+                    overhead = size - 1 - len(request.encode())
+                    in_flight[future] = (tid, item, busy_retries, time.perf_counter(), overhead)
+
+                # RTU exchanges time out on their own, after the line's transmission times
+                done, _ = await asyncio.wait(
+                    in_flight, timeout=timeout if self.transport.pipelining else None, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    metrics.timed_out(device, function_code, len(in_flight))
+                    raise ModbusIOError(f"No response received within {timeout:.3g} s")
+
+                for future in done:
+                    _tid, item, busy_retries, sent_at, overhead = in_flight.pop(future)
+                    try:
+                        response = future.result()
+                    except TimeoutError:
+                        metrics.timed_out(device, function_code, 1 + len(in_flight))
+                        raise
+                    except Exception:
+                        metrics.failed(device, function_code, 1 + len(in_flight))
+                        raise
+                    rtt = time.perf_counter() - sent_at
+                    size = overhead + 1 + len(response.encode())
+
+                    if response.isError():
+                        code = getattr(response, 'exception_code', None)
+                        retry = code in RETRYABLE_EXCEPTIONS and busy_retries < self.max_busy_retries
+                        metrics.received(device, function_code, rtt, size, exception_code=code, retried=retry)
+                        if retry:
+                            pacer.on_busy()
+                            pending.appendleft((item, busy_retries + 1))
+                            continue
+                        raise response_error(response, function_code, item[0])
+
+                    metrics.received(device, function_code, rtt, size)
+                    results[item] = response
+                    pacer.on_success(rtt)
+
+                if not in_flight and pacer.delay > 0:
+                    await asyncio.sleep(pacer.delay)
+        finally:
+            # Forget requests we stopped waiting for; late answers are then ignored
+            for tid, *_ in in_flight.values():
+                if tid is not None:
+                    client.transaction.delTransaction(tid)
+
+        return results
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Latency and throughput benchmark for the Modbus TCP Master.
+
+Starts test_server.py on a free loopback port (or uses --host/--port to
+measure a real device), runs a fixed set of scenarios through the same code
+paths as the GUI and the command-line interface, and prints the results as
+JSON:
+
+    python benchmark.py
+    python benchmark.py --engine both --iterations 500 -o results.json
+    python benchmark.py --baseline results.json   # exit code 1 on regression
+
+Each scenario reports the latency of one operation (p50/p95/p99, mean, min,
+max in milliseconds), operations per second and Modbus requests per second.
+The "sync" engine is the pipelined ChunkedReader/ChunkedWriter on a pymodbus
+ModbusTcpClient (used by the command-line interface and the scanner); the
+"async" engine is the ModbusEngine used by the GUI.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from modbus_core import (
+    AdaptivePacer, ChunkedReader, ChunkedWriter, ModbusError, compare_registers,
+    MAX_READ_REGISTERS, MAX_WRITE_REGISTERS,
+)
+
+SERVER_REGISTERS = 1200
+CHUNKED_READ_COUNT = 1000
+WRITE_COUNT = 10
+WRITE_ADDRESS = 1000
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(name, latencies, requests_per_operation, elapsed, clients=1):
+    """Turn raw latencies (seconds) into a result record."""
+    ordered = sorted(latencies)
+    operations = len(ordered)
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 3)
+
+    return {
+        "scenario": name,
+        "clients": clients,
+        "operations": operations,
+        "requests": operations * requests_per_operation,
+        "elapsed_s": round(elapsed, 4),
+        "p50_ms": ms(percentile(ordered, 0.50)),
+        "p95_ms": ms(percentile(ordered, 0.95)),
+        "p99_ms": ms(percentile(ordered, 0.99)),
+        "mean_ms": ms(sum(ordered) / operations if operations else None),
+        "min_ms": ms(ordered[0] if ordered else None),
+        "max_ms": ms(ordered[-1] if ordered else None),
+        "operations_per_s": round(operations / elapsed, 1) if elapsed > 0 else None,
+        "requests_per_s": round(operations * requests_per_operation / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+class SyncBackend:
+    """Pipelined ChunkedReader/ChunkedWriter on a synchronous pymodbus client."""
+
+    name = "sync"
+
+    def __init__(self, host, port, unit, timeout, in_flight):
+        from pymodbus.client import ModbusTcpClient
+
+        self.client = ModbusTcpClient(host=host, port=port, timeout=timeout)
+        if not self.client.connect():
+            raise ModbusError(f"Could not connect to {host}:{port}")
+        pacer = AdaptivePacer(max_in_flight=in_flight)
+        self.reader = ChunkedReader(self.client, unit, pacer=pacer)
+        self.writer = ChunkedWriter(self.client, unit, pacer=pacer)
+
+    def read(self, address, count):
+        return self.reader.read(address, count)
+
+    def write(self, address, values):
+        self.writer.write_blocks([(address, values)])
+
+    def close(self):
+        self.client.close()
+
+
+class AsyncBackend:
+    """The GUI's asyncio ModbusEngine, driven with blocking call()s."""
+
+    name = "async"
+
+    def __init__(self, host, port, unit, timeout, in_flight):
+        from async_engine import ModbusEngine
+
+        self.unit = unit
+        self.engine = ModbusEngine(host, port, timeout)
+        self.engine.start()
+        if not self.engine.call(self.engine.connect):
+            self.engine.stop()
+            raise ModbusError(f"Could not connect to {host}:{port}")
+        self.engine.pacer.max_in_flight = max(1, in_flight)
+
+    def read(self, address, count):
+        return self.engine.call(self.engine.read_registers, address, count, self.unit)
+
+    def write(self, address, values):
+        self.engine.call(self.engine.write_registers, address, values, self.unit)
+
+    def close(self):
+        self.engine.stop()
+
+
+BACKENDS = {backend.name: backend for backend in (SyncBackend, AsyncBackend)}
+
+
+def _write_verify(backend):
+    values = [int(time.perf_counter_ns() + i) & 0xFFFF for i in range(WRITE_COUNT)]
+    backend.write(WRITE_ADDRESS, values)
+    if compare_registers(WRITE_ADDRESS, values, backend.read(WRITE_ADDRESS, WRITE_COUNT)):
+        raise ModbusError("Write verification failed")
+
+
+# name: (operation, Modbus requests per operation)
+SCENARIOS = {
+    "single_read": (lambda backend: backend.read(0, 1), 1),
+    "block_read": (lambda backend: backend.read(0, MAX_READ_REGISTERS), 1),
+    "chunked_read": (
+        lambda backend: backend.read(0, CHUNKED_READ_COUNT), math.ceil(CHUNKED_READ_COUNT / MAX_READ_REGISTERS)
+    ),
+    "block_write": (lambda backend: backend.write(WRITE_ADDRESS, [1] * MAX_WRITE_REGISTERS), 1),
+    "write_verify": (_write_verify, 2),
+}
+
+
+def run_scenario(backend, name, iterations, warmup):
+    """Run one scenario on one connection and return its result record."""
+    operation, requests = SCENARIOS[name]
+    for _ in range(warmup):
+        operation(backend)
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        op_started = time.perf_counter()
+        operation(backend)
+        latencies.append(time.perf_counter() - op_started)
+    return summarize(name, latencies, requests, time.perf_counter() - started)
+
+
+def run_concurrent(factory, clients, iterations, warmup):
+    """Single-register reads from several clients at once, each on its own connection and thread."""
+    backends = [factory() for _ in range(clients)]
+    latencies = [[] for _ in range(clients)]
+    errors = []
+    barrier = threading.Barrier(clients + 1)
+
+    def worker(index):
+        backend = backends[index]
+        try:
+            for _ in range(warmup):
+                backend.read(0, 1)
+            barrier.wait()
+            for _ in range(iterations):
+                op_started = time.perf_counter()
+                backend.read(0, 1)
+                latencies[index].append(time.perf_counter() - op_started)
+        except Exception as e:
+            errors.append(e)
+            barrier.abort()
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(clients)]
+    try:
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    except threading.BrokenBarrierError:
+        for thread in threads:
+            thread.join()
+        elapsed = 0
+    finally:
+        for backend in backends:
+            backend.close()
+    if errors:
+        raise errors[0]
+    return summarize("concurrent_read", [l for per_client in latencies for l in per_client], 1, elapsed, clients)
+
+
+def free_port():
+    """Return a TCP port on the loopback interface that is currently free."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_test_server(port, timeout=10):
+    """Run test_server.py in a child process and wait until it accepts connections."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    process = subprocess.Popen(
+        [sys.executable, "-c",
+         f"import test_server; test_server.run_test_server('127.0.0.1', {port}, size={SERVER_REGISTERS})"],
+        cwd=here, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("test_server.py exited during startup")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError(f"test_server.py did not start listening on port {port}")
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """Return a description of every scenario whose p50 got slower than the baseline allows."""
+    previous = {(r["engine"], r["scenario"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        before = previous.get((result["engine"], result["scenario"]))
+        if before is None or not before.get("p50_ms") or result["p50_ms"] is None:
+            continue
+        if result["p50_ms"] > before["p50_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{result['engine']}/{result['scenario']}: p50 {before['p50_ms']} ms -> {result['p50_ms']} ms"
+            )
+    return regressions
+
+
+def build_parser():
+    """Return the argument parser for the benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark Modbus read/write paths against test_server.py.")
+    parser.add_argument("--host", help="benchmark this device instead of starting test_server.py")
+    parser.add_argument("--port", type=int, default=502, help="device port when --host is given (default: 502)")
+    parser.add_argument("--unit", type=int, default=1, help="unit/slave ID (default: 1)")
+    parser.add_argument("--timeout", type=float, default=3, help="response timeout in seconds (default: 3)")
+    parser.add_argument("--engine", choices=("sync", "async", "both"), default="both",
+                        help="I/O engine to measure (default: both)")
+    parser.add_argument("--scenario", action="append", choices=(*SCENARIOS, "concurrent_read"),
+                        help="run only this scenario (repeatable; default: all)")
+    parser.add_argument("--iterations", type=int, default=200, help="operations per scenario (default: 200)")
+    parser.add_argument("--warmup", type=int, default=10, help="untimed operations first (default: 10)")
+    parser.add_argument("--clients", type=int, default=8, help="connections for concurrent_read (default: 8)")
+    parser.add_argument("--in-flight", type=int, default=4, help="maximum pipelined requests (default: 4)")
+    parser.add_argument("--output", "-o", help="write the JSON report to this file instead of stdout")
+    parser.add_argument("--baseline", help="earlier JSON report; exit code 1 if any p50 regressed")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed p50 slowdown against --baseline as a fraction (default: 0.25)")
+    return parser
+
+
+def main(argv=None):
+    """Run the benchmark and return the process exit code."""
+    args = build_parser().parse_args(argv)
+    scenarios = args.scenario or [*SCENARIOS, "concurrent_read"]
+    engines = ("sync", "async") if args.engine == "both" else (args.engine,)
+
+    server = None
+    host, port = args.host, args.port
+    if host is None:
+        host, port = "127.0.0.1", free_port()
+        server = start_test_server(port)
+
+    import pymodbus
+
+    results = []
+    try:
+        for engine in engines:
+            backend_class = BACKENDS[engine]
+
+            def factory():
+                return backend_class(host, port, args.unit, args.timeout, args.in_flight)
+
+            backend = factory()
+            try:
+                for name in scenarios:
+                    if name == "concurrent_read":
+                        continue
+                    result = run_scenario(backend, name, args.iterations, args.warmup)
+                    results.append({"engine": engine, **result})
+                    print(f"{engine}/{name}: p50 {result['p50_ms']} ms, {result['requests_per_s']} req/s",
+                          file=sys.stderr)
+            finally:
+                backend.close()
+            if "concurrent_read" in scenarios:
+                result = run_concurrent(factory, args.clients, args.iterations, args.warmup)
+                results.append({"engine": engine, **result})
+                print(f"{engine}/concurrent_read: p50 {result['p50_ms']} ms, {result['requests_per_s']} req/s",
+                      file=sys.stderr)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(5)
+
+    report = {
+        "target": "test_server.py" if server is not None else f"{host}:{port}",
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "pymodbus": getattr(pymodbus, "__version__", "unknown"),
+        "platform": platform.platform(),
+        "iterations": args.iterations,
+        "in_flight": args.in_flight,
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_with_baseline(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
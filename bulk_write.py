@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Bulk writes of register images.
+
+A register image is a set of address/value pairs loaded from a file:
+
+    CSV      "address,value" rows, as written by "--cli read/dump --format csv"
+    JSON     JSON lines of {"address": a, "value": v} (the "--cli dump" output),
+             {"address": a, "values": [...]} objects (or a list of them), or
+             a {"address": value} mapping
+    binary   raw big-endian uint16 words, the register layout on the wire,
+             starting at a given base address
+
+The image is split into contiguous segments which are written in pipelined
+requests of up to 123 registers. Verification happens once, after every
+write has been acknowledged: all written addresses are read back as a
+coalesced, pipelined batch and differences are reported per address range.
+"""
+
+import csv
+import io
+import json
+import time
+from pathlib import Path
+
+from modbus_core import AdaptivePacer, ChunkedReader, ChunkedWriter
+from read_planner import DEFAULT_MAX_GAP, plan_reads
+
+IMAGE_FORMATS = ('csv', 'json', 'bin')
+
+
+def _check_pair(address, value, where):
+    """Raise ValueError unless address and value are valid uint16 numbers."""
+    if not 0 <= address <= 65535:
+        raise ValueError(f"{where}: address {address} is outside 0-65535")
+    if not 0 <= value <= 65535:
+        raise ValueError(f"{where}: value {value} is outside 0-65535 (uint16)")
+
+
+def parse_image_csv(text):
+    """Parse "address,value" rows into a {address: value} dict; a header row is allowed."""
+    image = {}
+    for line_number, row in enumerate(csv.reader(io.StringIO(text)), 1):
+        if not row or not row[0].strip() or row[0].lstrip().startswith("#"):
+            continue
+        try:
+            address, value = int(row[0], 0), int(row[1], 0)
+        except (ValueError, IndexError):
+            if line_number == 1:
+                continue  # Header
+            raise ValueError(f"Line {line_number}: expected 'address,value'") from None
+        _check_pair(address, value, f"Line {line_number}")
+        image[address] = value
+    return image
+
+
+def parse_image_json(text):
+    """Parse a JSON or JSON lines register image into a {address: value} dict."""
+    try:
+        documents = [json.loads(text)]
+    except json.JSONDecodeError:
+        try:
+            documents = [json.loads(line) for line in text.splitlines() if line.strip()]
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON: {e}") from None
+
+    image = {}
+
+    def add(item, where):
+        if isinstance(item, list):
+            for index, entry in enumerate(item):
+                add(entry, f"{where}[{index}]")
+        elif isinstance(item, dict) and "address" in item:
+            values = item["values"] if "values" in item else [item.get("value")]
+            for offset, value in enumerate(values):
+                if not isinstance(value, int) or not isinstance(item["address"], int):
+                    raise ValueError(f"{where}: addresses and values must be integers")
+                _check_pair(item["address"] + offset, value, where)
+                image[item["address"] + offset] = value
+        elif isinstance(item, dict):
+            for key, value in item.items():
+                try:
+                    address = int(key, 0)
+                except ValueError:
+                    raise ValueError(f"{where}: '{key}' is not an address") from None
+                if not isinstance(value, int):
+                    raise ValueError(f"{where}: value of {key} must be an integer")
+                _check_pair(address, value, where)
+                image[address] = value
+        else:
+            raise ValueError(f"{where}: unsupported entry")
+
+    for index, document in enumerate(documents):
+        add(document, f"Entry {index + 1}")
+    return image
+
+
+def parse_image_binary(data, base_address=0):
+    """Parse big-endian uint16 words into a {address: value} dict."""
+    if len(data) % 2:
+        raise ValueError("Binary image has an odd number of bytes")
+    count = len(data) // 2
+    if base_address < 0 or base_address + count > 65536:
+        raise ValueError(f"Binary image of {count} registers does not fit at address {base_address}")
+    values = memoryview(data).cast('B')
+    return {
+        base_address + i: (values[2 * i] << 8) | values[2 * i + 1] for i in range(count)
+    }
+
+
+def load_register_image(path, image_format=None, base_address=0):
+    """
+    Load a register image file and return it as a list of (address, values) segments.
+
+    The format is taken from the file extension unless image_format is given.
+    """
+    path = Path(path)
+    if image_format is None:
+        suffix = path.suffix.lower()
+        image_format = 'csv' if suffix == '.csv' else 'json' if suffix in ('.json', '.jsonl') else 'bin'
+    if image_format == 'csv':
+        image = parse_image_csv(path.read_text())
+    elif image_format == 'json':
+        image = parse_image_json(path.read_text())
+    elif image_format == 'bin':
+        image = parse_image_binary(path.read_bytes(), base_address)
+    else:
+        raise ValueError(f"Unknown image format '{image_format}'")
+    if not image:
+        raise ValueError(f"{path.name} contains no registers")
+    return image_segments(image)
+
+
+def image_segments(image):
+    """Turn a {address: value} dict into sorted (address, values) runs of consecutive addresses."""
+    segments = []
+    for address in sorted(image):
+        if segments and segments[-1][0] + len(segments[-1][1]) == address:
+            segments[-1][1].append(image[address])
+        else:
+            segments.append((address, [image[address]]))
+    return segments
+
+
+def verify_plan(segments, max_gap=DEFAULT_MAX_GAP):
+    """Return the ReadPlan used to read a written image back in as few requests as possible."""
+    addresses = [address + i for address, values in segments for i in range(len(values))]
+    return plan_reads(addresses, max_gap=max_gap)
+
+
+def compare_image(segments, plan, block_values):
+    """Compare read-back blocks with the image; returns (address, expected, observed) mismatches."""
+    expected = {address + i: value for address, values in segments for i, value in enumerate(values)}
+    return [
+        (address, expected[address], observed)
+        for address, observed in zip(plan.addresses, plan.extract(block_values))
+        if observed != expected[address]
+    ]
+
+
+def diff_ranges(mismatches):
+    """Group mismatches by runs of consecutive addresses: [(first, last, [mismatch, ...]), ...]."""
+    ranges = []
+    for mismatch in mismatches:
+        if ranges and ranges[-1][1] + 1 == mismatch[0]:
+            first, _, items = ranges[-1]
+            items.append(mismatch)
+            ranges[-1] = (first, mismatch[0], items)
+        else:
+            ranges.append((mismatch[0], mismatch[0], [mismatch]))
+    return ranges
+
+
+class BulkWriteResult:
+    """Outcome of write_image."""
+
+    def __init__(self, registers, write_requests, mismatches=None, verify_requests=0, elapsed=0.0):
+        self.registers = registers
+        self.write_requests = write_requests
+        self.mismatches = mismatches
+        self.verify_requests = verify_requests
+        self.elapsed = elapsed
+
+    @property
+    def verified(self):
+        """True if verified without differences, False if differences, None if not verified."""
+        return None if self.mismatches is None else not self.mismatches
+
+    @property
+    def ranges(self):
+        """Mismatches grouped by address range (see diff_ranges)."""
+        return diff_ranges(self.mismatches or [])
+
+
+def write_image(client, segments, unit_id, verify=True, verify_delay=0.2, pacer=None,
+                max_gap=DEFAULT_MAX_GAP):
+    """Write an image with a synchronous client, then optionally verify it in one batch."""
+    started = time.perf_counter()
+    pacer = pacer or AdaptivePacer()
+    requests = ChunkedWriter(client, unit_id, pacer=pacer).write_blocks(segments)
+    registers = sum(len(values) for _, values in segments)
+    if not verify:
+        return BulkWriteResult(registers, requests, elapsed=time.perf_counter() - started)
+
+    if verify_delay > 0:
+        time.sleep(verify_delay)
+    plan = verify_plan(segments, max_gap)
+    block_values = ChunkedReader(client, unit_id, pacer=pacer).read_blocks(plan.blocks)
+    return BulkWriteResult(
+        registers, requests, compare_image(segments, plan, block_values), len(plan.blocks),
+        time.perf_counter() - started
+    )
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Change detection for polled values.
+
+RegisterSnapshot keeps the last value of every register (or bit) of a range
+in one array('H') and diffs each new read against it in bulk: the new values
+are packed into bytes once and compared with the snapshot in slices of
+BLOCK_SIZE registers, which is a memcmp in C; only the slices that differ are
+looked at register by register. A poll in which nothing moved costs one
+comparison, and one in which a handful of registers moved costs a few.
+
+DeadbandFilter does the same for decoded tag values: a tag is reported only
+when it has moved more than its deadband since it was last reported, so
+noisy analog values do not flood the display, the log or subscribers.
+"""
+
+from array import array
+from math import isnan
+
+BLOCK_SIZE = 32
+
+
+class RegisterSnapshot:
+    """Last known value of size consecutive positions (addresses or row numbers)."""
+
+    def __init__(self, size=65536):
+        self.size = size
+        self.values = array('H', bytes(2 * size))
+        self.known = bytearray(size)
+
+    def update(self, address, values):
+        """
+        Store values read from address on.
+
+        Returns the addresses whose value differs from the snapshot, in
+        ascending order; addresses stored for the first time count as changed.
+        """
+        new = values if isinstance(values, array) and values.typecode == 'H' else array('H', values)
+        count = len(new)
+        end = address + count
+        if address < 0 or end > self.size:
+            raise ValueError(f"Addresses {address}-{end - 1} are outside the snapshot (0-{self.size - 1})")
+
+        old_bytes = memoryview(self.values).cast('B')[2 * address:2 * end]
+        new_bytes = new.tobytes()
+        changed = []
+        if old_bytes != new_bytes:
+            old = self.values
+            for start in range(0, count, BLOCK_SIZE):
+                stop = min(count, start + BLOCK_SIZE)
+                if old_bytes[2 * start:2 * stop] != new_bytes[2 * start:2 * stop]:
+                    changed.extend(
+                        address + i for i in range(start, stop) if old[address + i] != new[i]
+                    )
+
+        known = self.known[address:end]
+        if known.count(0):
+            # Never seen before: report them too, even if they happen to read as 0
+            unknown = [address + i for i, seen in enumerate(known) if not seen]
+            changed = sorted(set(changed).union(unknown))
+            self.known[address:end] = b"\x01" * count
+
+        self.values[address:end] = new
+        return changed
+
+    def update_sparse(self, addresses, values):
+        """Store values for scattered addresses; returns the addresses that changed."""
+        changed = []
+        old = self.values
+        known = self.known
+        for address, value in zip(addresses, values):
+            if old[address] != value or not known[address]:
+                old[address] = value
+                known[address] = 1
+                changed.append(address)
+        return changed
+
+    def get(self, address, count=1):
+        """Return the stored values of count addresses from address on."""
+        return self.values[address:address + count].tolist()
+
+    def clear(self):
+        """Forget every stored value."""
+        self.known = bytearray(self.size)
+
+
+class DeadbandFilter:
+    """Report decoded tag values only when they move more than the tag's deadband."""
+
+    def __init__(self, tags, default_deadband=0.0):
+        self.deadbands = [getattr(tag, 'deadband', 0.0) or default_deadband for tag in tags]
+        self.reported = [None] * len(self.deadbands)
+        self._last = None
+
+    def update(self, values):
+        """Return [(index, value), ...] for every tag that should be reported now."""
+        values = list(values)
+        if values == self._last:
+            return []
+        self._last = values
+        reported = self.reported
+        changes = []
+        for index, (value, band) in enumerate(zip(values, self.deadbands)):
+            last = reported[index]
+            if value == last:
+                continue
+            if last is not None:
+                if band and not isinstance(value, str) and abs(value - last) <= band:
+                    continue
+                if isinstance(value, float) and isinstance(last, float) and isnan(value) and isnan(last):
+                    continue
+            reported[index] = value
+            changes.append((index, value))
+        return changes
+
+    def reset(self):
+        """Report every tag again on the next update."""
+        self.reported = [None] * len(self.deadbands)
+        self._last = None
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Connection pool and parallel scan for many Modbus TCP devices.
+
+Targets are (host, port, unit) triples. Sockets are shared by every unit
+behind the same host and port, opened lazily on first use and re-opened after
+a failure. Only a host that refuses connections is put into exponential
+backoff; a unit that times out fails on its own. A per-host semaphore limits how many
+requests run against one host at the same time, so a gateway is never asked
+to serve more connections than it has been configured for. Time spent
+waiting for such a slot is recorded as queue wait in the pool's metrics.
+"""
+
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+
+from metrics import METRICS
+from modbus_core import AdaptivePacer, ChunkedReader, ModbusIOError, ModbusResponseError, HOLDING_REGISTERS
+from transports import TcpTransport
+
+DEFAULT_PORT = 502
+DEFAULT_UNIT = 1
+
+
+class Target(namedtuple('Target', 'host port unit')):
+    """One Modbus device: a host, a TCP port and a unit ID behind it."""
+
+    __slots__ = ()
+
+    def __str__(self):
+        return f"{self.host}:{self.port}/{self.unit}"
+
+
+def parse_units(text):
+    """Parse a unit list such as "1,2,5-8" into a list of unit IDs."""
+    units = []
+    for token in text.replace(",", " ").split():
+        if "-" in token:
+            first, last = token.split("-", 1)
+            units.extend(range(int(first), int(last) + 1))
+        else:
+            units.append(int(token))
+    for unit in units:
+        if unit < 0 or unit > 255:
+            raise ValueError(f"Unit ID {unit} is outside 0-255")
+    return units
+
+
+def parse_targets(text, default_port=DEFAULT_PORT, default_unit=DEFAULT_UNIT):
+    """
+    Parse one target specification per line.
+
+    Each line is "host[:port] [units]", for example "192.168.1.10:502 1-4".
+    Blank lines and lines starting with # are ignored.
+    """
+    targets = []
+    for line_number, line in enumerate(text.splitlines(), 1):
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        address, _, units_text = line.partition(" ")
+        host, _, port_text = address.partition(":")
+        try:
+            port = int(port_text) if port_text else default_port
+            units = parse_units(units_text) if units_text.strip() else [default_unit]
+        except ValueError as e:
+            raise ValueError(f"Line {line_number}: {e}") from None
+        if not host or port <= 0 or port > 65535:
+            raise ValueError(f"Line {line_number}: invalid address '{address}'")
+        targets.extend(Target(host, port, unit) for unit in units)
+    return targets
+
+
+class _Endpoint:
+    """Idle clients and reconnect backoff state for one host:port."""
+
+    def __init__(self):
+        self.idle = []
+        self.failures = 0
+        self.retry_at = 0.0
+        self.lock = threading.Lock()
+
+
+class ConnectionPool:
+    """Reusable Modbus TCP connections keyed by host and port."""
+
+    def __init__(self, timeout=3, max_per_host=1, backoff_initial=0.5, backoff_max=30.0, metrics=None):
+        self.timeout = timeout
+        self.metrics = metrics if metrics is not None else METRICS
+        self.max_per_host = max(1, max_per_host)
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self._endpoints = {}
+        self._host_slots = {}
+        self._pacers = {}
+        self._lock = threading.Lock()
+
+    def _endpoint(self, host, port):
+        """Return the endpoint and per-host semaphore for host:port, creating them if needed."""
+        with self._lock:
+            endpoint = self._endpoints.get((host, port))
+            if endpoint is None:
+                endpoint = self._endpoints[(host, port)] = _Endpoint()
+            slots = self._host_slots.get(host)
+            if slots is None:
+                slots = self._host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return endpoint, slots
+
+    def pacer(self, target):
+        """Return the AdaptivePacer that tracks target across reads."""
+        with self._lock:
+            pacer = self._pacers.get(target)
+            if pacer is None:
+                pacer = self._pacers[target] = AdaptivePacer()
+            return pacer
+
+    def _open(self, host, port, endpoint):
+        """Open a new client, honouring the reconnect backoff of the endpoint."""
+        with endpoint.lock:
+            wait = endpoint.retry_at - time.monotonic()
+        if wait > 0:
+            raise ModbusIOError(f"{host}:{port} unreachable, next attempt in {wait:.1f} s")
+
+        # Without pymodbus' own retries, so ChunkedReader's RetryPolicy only resends what is missing
+        client = TcpTransport(host, port).client(self.timeout)
+        if not client.connect():
+            client.close()
+            self._record_failure(endpoint)
+            raise ModbusIOError(f"Could not connect to {host}:{port}")
+        return client
+
+    def _record_failure(self, endpoint):
+        """Push the next reconnect attempt further out."""
+        with endpoint.lock:
+            delay = min(self.backoff_max, self.backoff_initial * (2 ** endpoint.failures))
+            endpoint.failures += 1
+            endpoint.retry_at = time.monotonic() + delay
+
+    @contextmanager
+    def connection(self, host, port):
+        """
+        Borrow a connected client for host:port.
+
+        The client goes back to the pool when the block exits normally or with
+        an exception response from the device. Any other error (a timeout, a
+        dropped socket) closes the client, since responses still in flight
+        could be mistaken for the next request's, and the next borrower opens
+        a new one. Such errors belong to one unit: other units behind the
+        same gateway are still tried, and only a failed connect() puts the
+        endpoint into backoff.
+        """
+        endpoint, slots = self._endpoint(host, port)
+        started = time.perf_counter()
+        with slots:
+            self.metrics.queued(f"{host}:{port}", time.perf_counter() - started)
+            with endpoint.lock:
+                client = endpoint.idle.pop() if endpoint.idle else None
+            if client is None or not client.is_socket_open():
+                client = self._open(host, port, endpoint)
+            try:
+                yield client
+            except ModbusResponseError:
+                # The device answered, so the connection itself is fine
+                self._release(endpoint, client)
+                raise
+            except Exception:
+                client.close()
+                raise
+            self._release(endpoint, client)
+
+    @staticmethod
+    def _release(endpoint, client):
+        """Return a healthy client to the idle list and clear the backoff."""
+        with endpoint.lock:
+            endpoint.failures = 0
+            endpoint.retry_at = 0.0
+            endpoint.idle.append(client)
+
+    def read(self, target, address, count, table=HOLDING_REGISTERS):
+        """Read count entries of a data table from target."""
+        with self.connection(target.host, target.port) as client:
+            reader = ChunkedReader(client, target.unit, pacer=self.pacer(target), table=table, metrics=self.metrics)
+            return reader.read(address, count)
+
+    def close_all(self):
+        """Close every idle connection."""
+        with self._lock:
+            endpoints = list(self._endpoints.values())
+        for endpoint in endpoints:
+            with endpoint.lock:
+                idle, endpoint.idle = endpoint.idle, []
+            for client in idle:
+                client.close()
+
+
+class ScanResult:
+    """Registers read from one target, or the error that prevented it."""
+
+    __slots__ = ('target', 'values', 'error', 'elapsed')
+
+    def __init__(self, target, values=None, error=None, elapsed=0.0):
+        self.target = target
+        self.values = values
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def scan(pool, targets, address, count, max_workers=16, on_result=None, cancel=None, table=HOLDING_REGISTERS):
+    """
+    Read the same range of a data table from every target in parallel.
+
+    on_result, if given, is called from a worker thread as each target
+    finishes. cancel is an optional threading.Event; targets not started when
+    it is set are skipped. Returns the results in the order of targets.
+    """
+    def scan_one(target):
+        if cancel is not None and cancel.is_set():
+            return ScanResult(target, error="Cancelled")
+        started = time.perf_counter()
+        try:
+            values = pool.read(target, address, count, table)
+            result = ScanResult(target, values=values, elapsed=time.perf_counter() - started)
+        except Exception as e:
+            result = ScanResult(target, error=str(e) or type(e).__name__, elapsed=time.perf_counter() - started)
+        if on_result is not None:
+            on_result(result)
+        return result
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {executor.submit(scan_one, target): index for index, target in enumerate(targets)}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+    return [results[index] for index in range(len(targets))]
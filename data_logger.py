@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Streaming recorder for polled register values.
+
+Samples are appended to compact binary files (".mblog") instead of being kept
+in memory or formatted as text:
+
+    header   "MBLG", version (u8), 3 pad bytes, metadata length (u32 LE),
+             metadata as UTF-8 JSON (address, count, device, start time)
+    frames   timestamp (f64 LE, Unix seconds) followed by count uint16 LE values
+
+Every frame has the same size, so a file can be memory-mapped and indexed
+directly, and a frame cut short by a crash is simply ignored when reading.
+A background thread does all disk I/O through a bounded queue, flushes and
+fsyncs periodically, and rotates to a new file when the current one reaches
+its size limit, so memory use is flat regardless of capture length.
+
+Recordings can be exported to CSV, or to Parquet when pyarrow is installed,
+either as raw registers or as the typed values of a TagDecoder.
+"""
+
+import csv
+import json
+import mmap
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+from array import array
+from pathlib import Path
+
+MAGIC = b"MBLG"
+VERSION = 1
+EXTENSION = ".mblog"
+FILE_HEADER = struct.Struct("<4sB3xI")
+FRAME_TIMESTAMP = struct.Struct("<d")
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_FSYNC_INTERVAL = 5.0
+DEFAULT_QUEUE_SIZE = 4096
+
+
+def _to_le_bytes(values):
+    """Pack uint16 values as little-endian bytes."""
+    data = array('H', values)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data.tobytes()
+
+
+def _from_le_bytes(data):
+    """Unpack little-endian bytes into an array of uint16 values."""
+    values = array('H')
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+class DataRecorder:
+    """Append timestamped register frames to rotating .mblog files."""
+
+    def __init__(self, path, address, count, metadata=None, max_bytes=DEFAULT_MAX_BYTES,
+                 fsync_interval=DEFAULT_FSYNC_INTERVAL, queue_size=DEFAULT_QUEUE_SIZE):
+        path = Path(path)
+        if path.suffix != EXTENSION:
+            path = path.with_name(path.name + EXTENSION)
+        self.path = path
+        self.address = address
+        self.count = count
+        self.metadata = dict(metadata or {}, address=address, count=count)
+        self.frame_size = FRAME_TIMESTAMP.size + 2 * count
+        self.max_bytes = max(max_bytes, self.frame_size * 16)
+        self.fsync_interval = fsync_interval
+        self.files = []
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.error = None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._file = None
+        self._file_size = 0
+
+    def start(self):
+        """Open the first file and start the writer thread."""
+        self._open_next()
+        self._thread = threading.Thread(target=self._run, name="modbus-recorder", daemon=True)
+        self._thread.start()
+
+    def submit(self, timestamp, values):
+        """Queue one frame without blocking; returns False if it had to be dropped."""
+        if len(values) != self.count:
+            raise ValueError(f"Expected {self.count} values, got {len(values)}")
+        if self.error is not None:
+            # The writer thread has stopped; nothing would ever take the frame off the queue
+            self.frames_dropped += 1
+            return False
+        try:
+            self._queue.put_nowait((timestamp, values))
+            return True
+        except queue.Full:
+            self.frames_dropped += 1
+            return False
+
+    def record(self, result):
+        """Poller on_result callback: queue successful poll results."""
+        if result.error is None and result.values is not None:
+            self.submit(result.timestamp, result.values)
+
+    def close(self, timeout=10):
+        """Write everything still queued, fsync and close the current file."""
+        if self._thread is not None:
+            if self._thread.is_alive():
+                try:
+                    self._queue.put(None, timeout=timeout)
+                except queue.Full:
+                    pass
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _open_next(self):
+        """Start a new file with its own header."""
+        if self._file is not None:
+            self._sync()
+            self._file.close()
+        index = len(self.files)
+        path = self.path if index == 0 else self.path.with_name(
+            f"{self.path.stem}.{index:04d}{EXTENSION}"
+        )
+        metadata = dict(self.metadata, created=time.time(), part=index)
+        encoded = json.dumps(metadata).encode("utf-8")
+        self._file = open(path, "wb")
+        self._file.write(FILE_HEADER.pack(MAGIC, VERSION, len(encoded)) + encoded)
+        self._file_size = FILE_HEADER.size + len(encoded)
+        self.files.append(path)
+
+    def _sync(self):
+        """Flush buffered frames to the disk."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _run(self):
+        """Writer thread: drain the queue, fsync periodically, rotate files."""
+        next_sync = time.monotonic() + self.fsync_interval
+        try:
+            while True:
+                try:
+                    item = self._queue.get(timeout=max(0.0, next_sync - time.monotonic()))
+                except queue.Empty:
+                    item = ()
+                if item is None:
+                    break
+                if item:
+                    timestamp, values = item
+                    if self._file_size + self.frame_size > self.max_bytes:
+                        self._open_next()
+                    self._file.write(FRAME_TIMESTAMP.pack(timestamp) + _to_le_bytes(values))
+                    self._file_size += self.frame_size
+                    self.frames_written += 1
+                if time.monotonic() >= next_sync:
+                    self._sync()
+                    next_sync = time.monotonic() + self.fsync_interval
+        except OSError as e:
+            self.error = e
+        finally:
+            if self._file is not None:
+                try:
+                    self._sync()
+                    self._file.close()
+                except OSError as e:
+                    self.error = self.error or e
+                self._file = None
+
+
+def read_header(path):
+    """Return (metadata, data offset) of a recording file."""
+    with open(path, "rb") as f:
+        header = f.read(FILE_HEADER.size)
+        if len(header) < FILE_HEADER.size:
+            raise ValueError(f"{path}: not a recording (file too short)")
+        magic, version, length = FILE_HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a recording (bad magic)")
+        if version != VERSION:
+            raise ValueError(f"{path}: unsupported recording version {version}")
+        metadata = json.loads(f.read(length).decode("utf-8"))
+    return metadata, FILE_HEADER.size + length
+
+
+def iter_frames(path):
+    """Yield (timestamp, values) for every complete frame in a recording file."""
+    metadata, offset = read_header(path)
+    count = metadata['count']
+    frame_size = FRAME_TIMESTAMP.size + 2 * count
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size - offset < frame_size:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for position in range(offset, size - frame_size + 1, frame_size):
+                (timestamp,) = FRAME_TIMESTAMP.unpack_from(mm, position)
+                start = position + FRAME_TIMESTAMP.size
+                yield timestamp, _from_le_bytes(mm[start:start + 2 * count])
+
+
+def sort_recordings(paths):
+    """Return recording files in capture order, using the start time and part number in each header."""
+    def key(path):
+        metadata, _ = read_header(path)
+        return metadata.get('created', 0), metadata.get('part', 0)
+    return sorted(paths, key=key)
+
+
+def _check_compatible(paths):
+    """Return the metadata of the first file after checking all files share its layout."""
+    metadata = None
+    for path in paths:
+        current, _ = read_header(path)
+        if metadata is None:
+            metadata = current
+        elif (current['address'], current['count']) != (metadata['address'], metadata['count']):
+            raise ValueError(f"{path}: register range differs from {paths[0]}")
+    if metadata is None:
+        raise ValueError("No recording files given")
+    return metadata
+
+
+def _check_decoder(metadata, decoder):
+    """Raise ValueError unless the recording contains every register the decoder needs."""
+    table = metadata.get('table', 'holding')
+    if table != decoder.table.key:
+        raise ValueError(f"Tags are in {decoder.table.name.lower()}, the recording has {table}")
+    if not decoder.covers(metadata['address'], metadata['count']):
+        raise ValueError(
+            f"Tags use registers {decoder.base}-{decoder.base + decoder.span - 1}, the recording has "
+            f"{metadata['address']}-{metadata['address'] + metadata['count'] - 1}"
+        )
+
+
+def export_csv(paths, stream, decoder=None):
+    """
+    Write the recordings as CSV: a timestamp column and one column per register,
+    or one column per tag if a TagDecoder is given.
+    """
+    metadata = _check_compatible(paths)
+    address = metadata['address']
+    writer = csv.writer(stream, lineterminator="\n")
+    if decoder is not None:
+        _check_decoder(metadata, decoder)
+        writer.writerow(["timestamp", *decoder.names])
+    else:
+        writer.writerow(["timestamp", *(str(address + i) for i in range(metadata['count']))])
+    rows = 0
+    for path in paths:
+        for timestamp, values in iter_frames(path):
+            if decoder is not None:
+                values = decoder.decode(values, address)
+            writer.writerow((f"{timestamp:.6f}", *values))
+            rows += 1
+    return rows
+
+
+def export_parquet(paths, output, batch_size=65536, decoder=None):
+    """Write the recordings as a Parquet file (requires pyarrow); returns the row count."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)") from None
+
+    metadata = _check_compatible(paths)
+    if decoder is not None:
+        _check_decoder(metadata, decoder)
+        return _export_tags_parquet(paths, output, batch_size, decoder, metadata['address'], pa, pq)
+    names = ["timestamp", *(f"r{metadata['address'] + i}" for i in range(metadata['count']))]
+    schema = pa.schema(
+        [pa.field("timestamp", pa.float64())] + [pa.field(name, pa.uint16()) for name in names[1:]]
+    )
+    rows = 0
+    with pq.ParquetWriter(output, schema) as writer:
+        timestamps = array('d')
+        columns = [array('H') for _ in range(metadata['count'])]
+
+        def flush():
+            writer.write_table(pa.table([pa.array(timestamps)] + [pa.array(c, pa.uint16()) for c in columns],
+                                        schema=schema))
+            del timestamps[:]
+            for column in columns:
+                del column[:]
+
+        for path in paths:
+            for timestamp, values in iter_frames(path):
+                timestamps.append(timestamp)
+                for column, value in zip(columns, values):
+                    column.append(value)
+                rows += 1
+                if len(timestamps) >= batch_size:
+                    flush()
+        if timestamps:
+            flush()
+    return rows
+
+
+def _export_tags_parquet(paths, output, batch_size, decoder, address, pa, pq):
+    """Write one typed column per tag: strings, floats for float or scaled tags, integers otherwise."""
+    def column_type(tag):
+        if tag.data_type == 'string':
+            return pa.string()
+        if tag.data_type.startswith('float') or tag.scaled:
+            return pa.float64()
+        return pa.uint64() if tag.data_type == 'uint64' else pa.int64()
+
+    schema = pa.schema(
+        [pa.field("timestamp", pa.float64())] + [pa.field(tag.name, column_type(tag)) for tag in decoder.tags]
+    )
+    rows = 0
+    with pq.ParquetWriter(output, schema) as writer:
+        timestamps = array('d')
+        decoded = []
+
+        def flush():
+            columns = list(zip(*decoded))
+            writer.write_table(pa.table(
+                [pa.array(timestamps)]
+                + [pa.array(column, field.type) for column, field in zip(columns, list(schema)[1:])],
+                schema=schema
+            ))
+            del timestamps[:]
+            del decoded[:]
+
+        for path in paths:
+            for timestamp, values in iter_frames(path):
+                timestamps.append(timestamp)
+                decoded.append(decoder.decode(values, address))
+                rows += 1
+                if len(timestamps) >= batch_size:
+                    flush()
+        if timestamps:
+            flush()
+    return rows
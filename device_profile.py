@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Device profiles: the named register map of a device.
+
+A profile lists the device's tags (see tag_decoder) and the poll groups they
+belong to, plus optional connection settings. It is a JSON object:
+
+    {
+      "name": "Pump skid",
+      "host": "192.168.1.10", "port": 502, "unit": 1,
+      "max_gap": 10, "unreadable": "200-209",
+      "groups": {"fast": {"period_ms": 100, "priority": 0}, "slow": {"period_ms": 5000}},
+      "tags": [
+        {"name": "flow", "address": 100, "type": "float32", "group": "fast"},
+        {"name": "serial", "address": 900, "type": "string", "length": 8, "group": "slow"}
+      ]
+    }
+
+or a CSV file with one tag per row, the tag columns of tag_decoder plus
+"group", "period_ms" and "priority" (given on any row of the group). Lower
+priorities are read first when several groups are due (default 0; among equal
+priorities faster groups go first).
+A plain tag file (a JSON list of tags, or CSV without a group column) is a
+profile with a single group.
+
+Loading a profile compiles it once: tags are validated, split into one poll
+group per (group, table), and each group gets its read plan and decode
+schedule. The compiled form is written next to the source as
+"<file>.plan" (JSON) and reused on the next load as long as the source
+file's size and modification time are unchanged, so large profiles are not
+re-parsed and re-planned on every launch.
+"""
+
+import csv
+import io
+import json
+import os
+from pathlib import Path
+
+from read_planner import DEFAULT_MAX_GAP, ReadPlan, parse_address_list
+from tag_decoder import Tag, TagDecoder, tag_from_dict
+
+CACHE_VERSION = 2
+CACHE_SUFFIX = ".plan"
+DEFAULT_GROUP = "default"
+DEFAULT_PERIOD = 1.0
+SETTINGS = ('host', 'port', 'unit', 'max_gap', 'unreadable')
+
+
+class PollGroup:
+    """Tags of one table that are polled together, with their read plan and decoder."""
+
+    def __init__(self, name, period, decoder, plan, priority=0):
+        self.name = name
+        self.period = period
+        self.decoder = decoder
+        self.plan = plan
+        self.priority = priority
+
+    @property
+    def table(self):
+        return self.decoder.table
+
+    @property
+    def tags(self):
+        return self.decoder.tags
+
+    def decode(self, block_values):
+        """Decode the values read for self.plan.blocks."""
+        return self.decoder.decode_blocks(self.plan.blocks, block_values)
+
+    def __repr__(self):
+        return f"PollGroup({self.name!r}, {self.period}, {len(self.tags)} tags, {len(self.plan.blocks)} requests)"
+
+
+class DeviceProfile:
+    """A compiled device profile."""
+
+    def __init__(self, name, settings, groups, source=None, from_cache=False):
+        self.name = name
+        self.settings = settings
+        self.groups = groups
+        self.source = source
+        self.from_cache = from_cache
+
+    @property
+    def tags(self):
+        """All tags, group by group."""
+        return [tag for group in self.groups for tag in group.tags]
+
+    def plan_for_link(self, max_gap):
+        """
+        Re-plan every group with the max_gap of the link, unless the profile sets its own.
+
+        Returns True if any group's read plan changed.
+        """
+        if 'max_gap' in self.settings:
+            return False
+        unreadable = parse_address_list(str(self.settings.get('unreadable', "")))
+        changed = False
+        for group in self.groups:
+            plan = group.decoder.read_plan(max_gap=max_gap, unreadable=unreadable)
+            if plan.blocks != group.plan.blocks:
+                group.plan = plan
+                changed = True
+        return changed
+
+    @property
+    def request_count(self):
+        """Requests needed to read every group once."""
+        return sum(len(group.plan.blocks) for group in self.groups)
+
+
+def parse_profile_json(text):
+    """Return (name, settings, {group: (period, priority)}, [(tag, group), ...]) from a JSON profile."""
+    try:
+        document = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON: {e}") from None
+    if isinstance(document, list):
+        document = {'tags': document}
+    if not isinstance(document, dict) or not isinstance(document.get('tags'), list):
+        raise ValueError("Expected a profile object with a \"tags\" list, or a list of tags")
+
+    periods = {}
+    groups = document.get('groups', {})
+    if isinstance(groups, list):
+        groups = {group.get('name'): group for group in groups if isinstance(group, dict)}
+    for group_name, group in groups.items():
+        if not isinstance(group, dict) or 'period_ms' not in group:
+            raise ValueError(f"Group '{group_name}': expected an object with period_ms")
+        where = f"Group '{group_name}'"
+        periods[str(group_name)] = (_period(group['period_ms'], where), _priority(group.get('priority', 0), where))
+
+    tags = []
+    for index, item in enumerate(document['tags']):
+        if not isinstance(item, dict):
+            raise ValueError(f"Tag {index + 1}: expected an object")
+        item = dict(item)
+        group = str(item.pop('group', None) or DEFAULT_GROUP)
+        period, priority = item.pop('period_ms', None), item.pop('priority', None)
+        if period is not None:
+            periods.setdefault(group, (_period(period, f"Tag {index + 1}"), _priority(priority, f"Tag {index + 1}")))
+        tags.append((tag_from_dict(item, f"Tag {index + 1}"), group))
+
+    settings = {key: document[key] for key in SETTINGS if key in document}
+    return document.get('name'), settings, periods, tags
+
+
+def parse_profile_csv(text):
+    """Return (name, settings, {group: (period, priority)}, [(tag, group), ...]) from a CSV profile."""
+    periods = {}
+    tags = []
+    for line_number, row in enumerate(csv.DictReader(io.StringIO(text)), 2):
+        row = {key.strip(): (value or "").strip() for key, value in row.items() if key}
+        if not any(row.values()) or row.get('name', '').startswith('#'):
+            continue
+        group = row.pop('group', '') or DEFAULT_GROUP
+        period, priority = row.pop('period_ms', ''), row.pop('priority', '')
+        if period:
+            where = f"Line {line_number}"
+            periods.setdefault(group, (_period(period, where), _priority(priority, where)))
+        tags.append((tag_from_dict(row, f"Line {line_number}"), group))
+    return None, {}, periods, tags
+
+
+def _period(value, where):
+    """Convert a period in ms to seconds, raising ValueError for bad values."""
+    try:
+        period = float(value) / 1000
+    except (TypeError, ValueError):
+        raise ValueError(f"{where}: period_ms must be a number") from None
+    if period <= 0:
+        raise ValueError(f"{where}: period_ms must be positive")
+    return period
+
+
+def _priority(value, where):
+    """Convert a priority to an int; empty means 0."""
+    if value in (None, ""):
+        return 0
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{where}: priority must be an integer") from None
+
+
+def compile_profile(name, settings, periods, tags):
+    """Split tags into poll groups by (group, table) and plan and schedule each one."""
+    if not tags:
+        raise ValueError("The profile contains no tags")
+    names = set()
+    for tag, _ in tags:
+        if tag.name in names:
+            raise ValueError(f"Duplicate tag name '{tag.name}'")
+        names.add(tag.name)
+
+    max_gap = int(settings.get('max_gap', DEFAULT_MAX_GAP))
+    unreadable = parse_address_list(str(settings.get('unreadable', "")))
+    members = {}
+    for tag, group in tags:
+        members.setdefault((group, tag.table.key), []).append(tag)
+
+    groups = []
+    for (group, _), group_tags in members.items():
+        decoder = TagDecoder(group_tags)
+        plan = decoder.read_plan(max_gap=max_gap, unreadable=unreadable)
+        if plan.skipped:
+            raise ValueError(f"Group '{group}': tags use unreadable address(es) "
+                             f"{', '.join(str(a) for a in plan.skipped)}")
+        period, priority = periods.get(group, (DEFAULT_PERIOD, 0))
+        groups.append(PollGroup(group, period, decoder, plan, priority))
+    groups.sort(key=lambda g: (g.priority, g.period, g.name))
+    return DeviceProfile(name, settings, groups)
+
+
+def cache_path(path):
+    """Return the path of the compiled form of a profile."""
+    path = Path(path)
+    return path.with_name(path.name + CACHE_SUFFIX)
+
+
+def _source_stamp(path):
+    """Identify the version of a source file without reading it."""
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _tag_row(tag):
+    """A tag as a list of TAG_FIELDS values."""
+    return [tag.name, tag.address, tag.data_type, tag.byte_order, tag.word_order, tag.scale, tag.offset,
+            tag.length, tag.table.key, tag.deadband]
+
+
+def save_compiled(profile, path, stamp):
+    """Write the compiled profile next to its source; returns False if that is not possible."""
+    document = {
+        'version': CACHE_VERSION,
+        'source': stamp,
+        'name': profile.name,
+        'settings': profile.settings,
+        'groups': [
+            {
+                'name': group.name,
+                'period': group.period,
+                'priority': group.priority,
+                'tags': [_tag_row(tag) for tag in group.tags],
+                'addresses': group.plan.addresses,
+                'blocks': group.plan.blocks,
+                'schedule': group.decoder.schedule,
+            }
+            for group in profile.groups
+        ],
+    }
+    target = cache_path(path)
+    temporary = target.with_name(target.name + ".tmp")
+    try:
+        with open(temporary, "w") as f:
+            json.dump(document, f, separators=(",", ":"))
+        os.replace(temporary, target)
+        return True
+    except OSError:
+        return False
+
+
+def load_compiled(path, stamp):
+    """Return the cached DeviceProfile for path, or None if there is no valid cache."""
+    try:
+        with open(cache_path(path)) as f:
+            document = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if document.get('version') != CACHE_VERSION or document.get('source') != stamp:
+        return None
+    try:
+        groups = []
+        for group in document['groups']:
+            tags = [Tag(*row) for row in group['tags']]
+            groups.append(PollGroup(
+                group['name'], group['period'],
+                TagDecoder(tags, schedule=group['schedule']),
+                ReadPlan(group['addresses'], [tuple(block) for block in group['blocks']]),
+                group['priority'],
+            ))
+    except (KeyError, TypeError, ValueError):
+        return None
+    return DeviceProfile(document.get('name'), document.get('settings', {}), groups, from_cache=True)
+
+
+def load_profile(path, use_cache=True):
+    """
+    Load and compile a profile file, using and refreshing its compiled cache.
+
+    Raises ValueError for invalid profiles and OSError if the file cannot be read.
+    """
+    path = Path(path)
+    stamp = _source_stamp(path)
+    if use_cache:
+        profile = load_compiled(path, stamp)
+        if profile is not None:
+            profile.source = path
+            return profile
+
+    text = path.read_text()
+    if path.suffix.lower() == '.csv':
+        name, settings, periods, tags = parse_profile_csv(text)
+    else:
+        name, settings, periods, tags = parse_profile_json(text)
+    profile = compile_profile(name or path.stem, settings, periods, tags)
+    profile.source = path
+    if use_cache:
+        save_compiled(profile, path, stamp)
+    return profile
+
+
+def read_groups(groups, read_tables):
+    """
+    Read several poll groups at once and return the decoded values of each.
+
+    Blocks of groups in the same table are merged into one request list
+    (duplicates read once), so read_tables([(blocks, table), ...]), which
+    returns the values of every block of every request, can pipeline them
+    as one batch.
+    """
+    tables = {}
+    for group in groups:
+        blocks = tables.setdefault(group.table, {})
+        for block in group.plan.blocks:
+            blocks.setdefault(block, None)
+    requests = [(list(blocks), table) for table, blocks in tables.items()]
+    values = {}
+    for (blocks, table), block_values in zip(requests, read_tables(requests)):
+        values.update(((table, block), value) for block, value in zip(blocks, block_values))
+    return [group.decode([values[(group.table, block)] for block in group.plan.blocks]) for group in groups]
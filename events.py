@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Event stream of the Modbus TCP Master.
+
+The I/O paths publish typed events on an EventBus: every request that is
+started, completed or failed (published by metrics.Metrics, which every
+request already goes through), connections lost and regained (published by
+async_engine.ModbusEngine), and operations that failed as a whole (published
+by the GUI). Subscribers pick the event types they care about; the GUI feeds
+failures into a non-modal status bar, the CLI prints aggregated error lines
+or, with --events, the raw stream as JSON lines.
+
+Handlers run synchronously in the publishing thread, often the engine's
+event loop, so they must be quick and thread-safe; the GUI only puts events
+on a queue that its UI loop drains. Publishing an event type nobody
+subscribed to costs one dictionary lookup.
+
+Under an error storm nobody wants one line or dialog per failed request.
+ErrorWindow counts failures by kind over a sliding window ("37 timeouts in
+last 10 s"), and RateLimitedReporter reports the first failure right away
+and then at most one such summary per interval.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+DEFAULT_WINDOW = 10.0  # seconds of failures summarised by ErrorWindow
+
+# Kinds of failure, with their singular and plural names
+TIMEOUT = 'timeout'
+CONNECTION = 'connection'
+EXCEPTION = 'exception'
+ERROR = 'error'
+KIND_NAMES = {
+    TIMEOUT: ("timeout", "timeouts"),
+    CONNECTION: ("connection error", "connection errors"),
+    EXCEPTION: ("exception response", "exception responses"),
+    ERROR: ("error", "errors"),
+}
+
+logger = logging.getLogger(__name__)
+
+
+class Event:
+    """Base class of all events; time is the wall-clock time it happened."""
+
+    __slots__ = ('time',)
+    fields = ()
+
+    def __init__(self):
+        self.time = time.time()
+
+    def as_dict(self):
+        """The event as a JSON-ready dict, with its type name."""
+        record = {"event": type(self).__name__, "time": round(self.time, 6)}
+        for name in self.fields:
+            value = getattr(self, name)
+            record[name] = value if value is None or isinstance(value, (int, float, str)) else str(value)
+        return record
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{name}={getattr(self, name)!r}' for name in self.fields)})"
+
+
+class RequestStarted(Event):
+    """A request of size bytes was put on the wire to device."""
+
+    __slots__ = fields = ('device', 'function_code', 'size')
+
+    def __init__(self, device, function_code, size):
+        super().__init__()
+        self.device = device
+        self.function_code = function_code
+        self.size = size
+
+
+class RequestCompleted(Event):
+    """A response arrived latency seconds after its request (exception_code is set for exception responses)."""
+
+    __slots__ = fields = ('device', 'function_code', 'latency', 'size', 'exception_code', 'retried')
+
+    def __init__(self, device, function_code, latency, size, exception_code=None, retried=False):
+        super().__init__()
+        self.device = device
+        self.function_code = function_code
+        self.latency = latency
+        self.size = size
+        self.exception_code = exception_code
+        self.retried = retried
+
+
+class RequestFailed(Event):
+    """count requests to device failed: kind is TIMEOUT, CONNECTION or EXCEPTION (with exception_code)."""
+
+    __slots__ = fields = ('device', 'function_code', 'kind', 'count', 'exception_code')
+
+    def __init__(self, device, function_code, kind, count=1, exception_code=None):
+        super().__init__()
+        self.device = device
+        self.function_code = function_code
+        self.kind = kind
+        self.count = count
+        self.exception_code = exception_code
+
+
+class ConnectionLost(Event):
+    """The connection to a device dropped; the engine is reconnecting in the background."""
+
+    __slots__ = fields = ('connection',)
+
+    def __init__(self, connection):
+        super().__init__()
+        self.connection = connection
+
+
+class Reconnected(Event):
+    """The connection came back after attempts reconnect attempts."""
+
+    __slots__ = fields = ('connection', 'attempts')
+
+    def __init__(self, connection, attempts):
+        super().__init__()
+        self.connection = connection
+        self.attempts = attempts
+
+
+class OperationFailed(Event):
+    """A user-level operation (a read, a write, a poll cycle...) failed; source says which."""
+
+    __slots__ = fields = ('source', 'kind', 'message')
+
+    def __init__(self, source, error):
+        super().__init__()
+        self.source = source
+        self.kind = error_kind(error)
+        self.message = str(error) or type(error).__name__
+
+
+def error_kind(error):
+    """Classify an exception as TIMEOUT, CONNECTION, EXCEPTION or ERROR."""
+    if getattr(error, 'exception_code', None) is not None:
+        return EXCEPTION
+    name = type(error).__name__
+    if isinstance(error, TimeoutError) or name == 'ModbusIOException' or "No response" in str(error):
+        return TIMEOUT
+    if isinstance(error, OSError) or name in ('ModbusIOError', 'ConnectionException'):
+        return CONNECTION
+    return ERROR
+
+
+class EventBus:
+    """Delivers published events to the handlers subscribed to their type (or a base type)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._handlers = ()   # (handler, event types) pairs, replaced as a whole on change
+        self._routes = {}     # event type -> handlers, filled in on first publish
+
+    def subscribe(self, handler, *event_types):
+        """Call handler(event) for every event of the given types (all events if none); returns handler."""
+        with self._lock:
+            self._handlers = self._handlers + ((handler, event_types or (Event,)),)
+            self._routes = {}
+        return handler
+
+    def unsubscribe(self, handler):
+        with self._lock:
+            self._handlers = tuple(item for item in self._handlers if item[0] != handler)
+            self._routes = {}
+
+    def handlers(self, event_type):
+        """The handlers that receive events of event_type."""
+        routes = self._routes
+        handlers = routes.get(event_type)
+        if handlers is None:
+            handlers = routes[event_type] = tuple(
+                handler for handler, types in self._handlers if issubclass(event_type, types)
+            )
+        return handlers
+
+    def wants(self, event_type):
+        """True if anybody receives events of event_type, so publishers can skip building them."""
+        return bool(self.handlers(event_type))
+
+    def publish(self, event):
+        """Deliver event to its handlers; a failing handler is logged and does not stop the others."""
+        for handler in self.handlers(type(event)):
+            try:
+                handler(event)
+            except Exception:
+                logger.exception("Event handler %r failed on %r", handler, event)
+
+
+EVENTS = EventBus()
+
+
+class ErrorWindow:
+    """Failures of the last `window` seconds, counted by kind, and the most recent message."""
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.window = window
+        self.entries = deque()
+        self.last_message = None
+        self.last_time = None
+
+    def add(self, kind, count=1, message=None, now=None):
+        now = time.monotonic() if now is None else now
+        self.entries.append((now, kind, count))
+        if message is not None:
+            self.last_message = message
+            self.last_time = now
+
+    def add_event(self, event, now=None):
+        """Count a RequestFailed or OperationFailed event; other events are ignored."""
+        if isinstance(event, RequestFailed):
+            self.add(event.kind, event.count, now=now)
+        elif isinstance(event, OperationFailed):
+            self.add(event.kind, 1, f"{event.source}: {event.message}", now)
+
+    def counts(self, now=None):
+        """{kind: failures} within the window."""
+        now = time.monotonic() if now is None else now
+        while self.entries and self.entries[0][0] < now - self.window:
+            self.entries.popleft()
+        counts = {}
+        for _, kind, count in self.entries:
+            counts[kind] = counts.get(kind, 0) + count
+        return counts
+
+    def summary(self, now=None):
+        """E.g. "37 timeouts, 2 exception responses in last 10 s", or "" when there were none."""
+        counts = self.counts(now)
+        if not counts:
+            return ""
+        parts = [
+            f"{count} {KIND_NAMES[kind][count != 1]}"
+            for kind, count in sorted(counts.items(), key=lambda item: -item[1])
+        ]
+        return f"{', '.join(parts)} in last {self.window:g} s"
+
+
+class RateLimitedReporter:
+    """
+    Report failures through emit(text) without flooding: the first one at once, then summaries.
+
+    After a failure has been reported, further ones are only counted; once
+    interval seconds have passed, the next failure (or flush()) emits the
+    ErrorWindow summary instead. Can be subscribed to an EventBus directly.
+    """
+
+    def __init__(self, emit, window=DEFAULT_WINDOW, interval=None):
+        self.emit = emit
+        self.errors = ErrorWindow(window)
+        self.interval = window if interval is None else interval
+        self.reported_at = None
+        self.pending = 0
+        self._lock = threading.Lock()
+
+    def report(self, kind, message, count=1, now=None):
+        """Count a failure, emitting message or a summary if it is time to."""
+        with self._lock:
+            now = time.monotonic() if now is None else now
+            self.errors.add(kind, count, message, now)
+            if self.reported_at is None or now - self.reported_at >= self.interval:
+                text = message if not self.pending else f"{message} ({self.errors.summary(now)})"
+                self.reported_at = now
+                self.pending = 0
+            else:
+                self.pending += count
+                return
+        self.emit(text)
+
+    def flush(self, now=None):
+        """Emit the summary of failures not reported yet, if any."""
+        with self._lock:
+            if not self.pending:
+                return
+            now = time.monotonic() if now is None else now
+            text = f"{self.errors.last_message} ({self.errors.summary(now)})"
+            self.pending = 0
+            self.reported_at = now
+        self.emit(text)
+
+    def __call__(self, event):
+        if isinstance(event, RequestFailed):
+            name = KIND_NAMES[event.kind][event.count != 1]
+            code = f" {event.exception_code}" if event.exception_code is not None else ""
+            self.report(event.kind, f"{event.device}: {event.count} {name}{code}", event.count)
+        elif isinstance(event, OperationFailed):
+            self.report(event.kind, f"{event.source}: {event.message}")
+        elif isinstance(event, ConnectionLost):
+            self.emit(f"Connection to {event.connection} lost, reconnecting")
+        elif isinstance(event, Reconnected):
+            self.emit(f"Reconnected to {event.connection} after {event.attempts} attempt(s)")
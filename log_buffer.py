@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Bounded log storage for the Modbus TCP Master GUI.
+
+Log entries live in a fixed-capacity ring buffer limited by both line count
+and character count; the oldest entries are evicted first. Any thread may
+append. The GUI drains what is new once per frame and mirrors the buffer in
+its text widget, so the widget never holds more than the buffer does.
+Filtering runs against the buffer, not the widget.
+"""
+
+import threading
+from collections import deque
+
+DEFAULT_MAX_LINES = 5000
+DEFAULT_MAX_CHARS = 1_000_000
+
+
+class LogEntry:
+    """One formatted log message."""
+
+    __slots__ = ('sequence', 'level', 'text', 'lines')
+
+    def __init__(self, sequence, level, text):
+        self.sequence = sequence
+        self.level = level
+        self.text = text
+        self.lines = text.count("\n")
+
+
+class LogBuffer:
+    """Thread-safe ring buffer of log entries with an optional display filter."""
+
+    def __init__(self, max_lines=DEFAULT_MAX_LINES, max_chars=DEFAULT_MAX_CHARS):
+        self.max_lines = max(1, max_lines)
+        self.max_chars = max(1, max_chars)
+        self.filter_text = ""
+        self._entries = deque()
+        self._lines = 0
+        self._chars = 0
+        self._sequence = 0
+        self._displayed_upto = 0
+        self._evicted_displayed_lines = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def matches(self, entry):
+        """Return True if entry passes the current filter."""
+        return not self.filter_text or self.filter_text in entry.text.lower()
+
+    def append(self, text, level="info"):
+        """Add a formatted entry (ending in a newline) and evict old ones if over budget."""
+        with self._lock:
+            self._sequence += 1
+            entry = LogEntry(self._sequence, level, text)
+            self._entries.append(entry)
+            self._lines += entry.lines
+            self._chars += len(text)
+
+            # Always keep the newest entry, even if it alone exceeds the budget
+            while len(self._entries) > 1 and (self._lines > self.max_lines or self._chars > self.max_chars):
+                old = self._entries.popleft()
+                self._lines -= old.lines
+                self._chars -= len(old.text)
+                if old.sequence <= self._displayed_upto and self.matches(old):
+                    self._evicted_displayed_lines += old.lines
+            return entry
+
+    def drain(self):
+        """
+        Return (new_entries, evicted_lines) since the previous drain.
+
+        new_entries are the entries that pass the filter and have not been
+        shown yet; evicted_lines is how many lines of already-shown entries
+        have been evicted and must be removed from the top of the display.
+        """
+        with self._lock:
+            new_entries = []
+            for entry in reversed(self._entries):
+                if entry.sequence <= self._displayed_upto:
+                    break
+                if self.matches(entry):
+                    new_entries.append(entry)
+            new_entries.reverse()
+            evicted_lines = self._evicted_displayed_lines
+            self._evicted_displayed_lines = 0
+            self._displayed_upto = self._sequence
+            return new_entries, evicted_lines
+
+    def set_filter(self, text):
+        """Change the filter and return every buffered entry that matches it."""
+        with self._lock:
+            self.filter_text = text.strip().lower()
+            self._displayed_upto = self._sequence
+            self._evicted_displayed_lines = 0
+            return [entry for entry in self._entries if self.matches(entry)]
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._lines = 0
+            self._chars = 0
+            self._displayed_upto = self._sequence
+            self._evicted_displayed_lines = 0
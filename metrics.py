@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+Request instrumentation for the Modbus TCP Master.
+
+Every request that goes through the I/O paths (ChunkedReader/ChunkedWriter,
+the GUI's ModbusEngine and the scan connection pool) is recorded here:
+send-to-response latency, bytes on the wire, busy retries, timeouts,
+connection errors and exception codes, aggregated per device and function
+code. Time spent waiting for the connection (behind other operations on
+the engine, or for a free slot on a gateway) is kept separately as queue
+wait per connection. Latencies go into fixed-bucket histograms, so recording
+a request is a lock, a dict lookup and a bisect, and nothing grows with the
+number of requests.
+
+The collected numbers can be read as a snapshot (the GUI's Stats tab), as
+Prometheus text exposition or as JSON, served on localhost by MetricsServer
+or written to a file. Together they show whether time goes to the device
+(latency), the network (timeouts, connection errors) or the tool itself
+(queue wait).
+
+Each recorded request is also published as an event (events.RequestStarted,
+RequestCompleted, RequestFailed) on the collection's EventBus, for whoever
+subscribed to them.
+"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from events import EVENTS, CONNECTION, EXCEPTION, TIMEOUT, RequestCompleted, RequestFailed, RequestStarted
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+
+DEFAULT_METRICS_PORT = 9108
+
+FUNCTION_NAMES = {
+    0x01: "read_coils",
+    0x02: "read_discrete_inputs",
+    0x03: "read_holding_registers",
+    0x04: "read_input_registers",
+    0x06: "write_single_register",
+    0x0F: "write_multiple_coils",
+    0x10: "write_multiple_registers",
+    0x16: "mask_write_register",
+    0x17: "read_write_multiple_registers",
+}
+
+
+class Histogram:
+    """Counts of observations per bucket, plus their sum and maximum."""
+
+    __slots__ = ('bounds', 'counts', 'count', 'sum', 'max')
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q):
+        """Estimate the q-quantile by interpolating inside its bucket; 0.0 when empty."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.bounds[index - 1] if index else 0.0
+                upper = self.bounds[index] if index < len(self.bounds) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / count)
+            seen += count
+        return self.max
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'max': self.max,
+            'buckets': dict(zip([*self.bounds, 'inf'], self.counts)),
+        }
+
+
+class RequestStats:
+    """Counters and latency histogram of one (device, function code)."""
+
+    __slots__ = ('requests', 'responses', 'retries', 'timeouts', 'io_errors', 'exceptions',
+                 'bytes_sent', 'bytes_received', 'latency')
+
+    def __init__(self):
+        self.requests = 0
+        self.responses = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.io_errors = 0
+        self.exceptions = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency = Histogram()
+
+    @property
+    def errors(self):
+        """Requests that ended in an exception response (other than retried ones), timeout or I/O error."""
+        return sum(self.exceptions.values()) + self.timeouts + self.io_errors
+
+
+class Metrics:
+    """
+    Thread-safe collection of request statistics.
+
+    Devices are labels such as "192.168.1.10:502/1" (host:port/unit),
+    connections labels such as "192.168.1.10:502". Requests are published
+    on events (an events.EventBus) unless it is None.
+    """
+
+    def __init__(self, events=None):
+        self.events = events
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._queue_waits = {}
+        self.started = time.time()
+
+    def _entry(self, device, function_code):
+        entry = self._requests.get((device, function_code))
+        if entry is None:
+            entry = self._requests[(device, function_code)] = RequestStats()
+        return entry
+
+    def sent(self, device, function_code, size):
+        """Record a request of size bytes put on the wire."""
+        with self._lock:
+            entry = self._entry(device, function_code)
+            entry.requests += 1
+            entry.bytes_sent += size
+        if self.events is not None and self.events.wants(RequestStarted):
+            self.events.publish(RequestStarted(device, function_code, size))
+
+    def received(self, device, function_code, latency, size, exception_code=None, retried=False):
+        """
+        Record a response of size bytes that arrived latency seconds after its request.
+
+        exception_code is set for exception responses; retried means the
+        request is being sent again (busy/acknowledge), which is not an error.
+        """
+        with self._lock:
+            entry = self._entry(device, function_code)
+            entry.responses += 1
+            entry.bytes_received += size
+            entry.latency.observe(latency)
+            if retried:
+                entry.retries += 1
+            elif exception_code is not None:
+                entry.exceptions[exception_code] = entry.exceptions.get(exception_code, 0) + 1
+        if self.events is not None:
+            if self.events.wants(RequestCompleted):
+                self.events.publish(RequestCompleted(device, function_code, latency, size, exception_code, retried))
+            if exception_code is not None and not retried and self.events.wants(RequestFailed):
+                self.events.publish(RequestFailed(device, function_code, EXCEPTION, 1, exception_code))
+
+    def timed_out(self, device, function_code, count=1):
+        """Record count requests that got no response in time."""
+        with self._lock:
+            self._entry(device, function_code).timeouts += count
+        if self.events is not None and self.events.wants(RequestFailed):
+            self.events.publish(RequestFailed(device, function_code, TIMEOUT, count))
+
+    def failed(self, device, function_code, count=1):
+        """Record count requests lost to a connection error."""
+        with self._lock:
+            self._entry(device, function_code).io_errors += count
+        if self.events is not None and self.events.wants(RequestFailed):
+            self.events.publish(RequestFailed(device, function_code, CONNECTION, count))
+
+    def queued(self, connection, wait):
+        """Record an operation that waited wait seconds for the connection."""
+        with self._lock:
+            histogram = self._queue_waits.get(connection)
+            if histogram is None:
+                histogram = self._queue_waits[connection] = Histogram()
+            histogram.observe(wait)
+
+    def reset(self):
+        """Forget everything recorded so far."""
+        with self._lock:
+            self._requests = {}
+            self._queue_waits = {}
+            self.started = time.time()
+
+    def snapshot(self):
+        """
+        Return the current statistics as plain data.
+
+        {"started", "requests": [{device, function_code, function, counters...,
+        latency: histogram dict, p50/p95/p99/max/mean in seconds}], "queue_wait":
+        [{connection, histogram dict, p50/p95/max}]}, sorted by label.
+        """
+        with self._lock:
+            requests = []
+            for (device, function_code), entry in sorted(self._requests.items(), key=lambda item: item[0]):
+                latency = entry.latency
+                requests.append({
+                    'device': device,
+                    'function_code': function_code,
+                    'function': FUNCTION_NAMES.get(function_code, f"fc{function_code}"),
+                    'requests': entry.requests,
+                    'responses': entry.responses,
+                    'errors': entry.errors,
+                    'retries': entry.retries,
+                    'timeouts': entry.timeouts,
+                    'io_errors': entry.io_errors,
+                    'exceptions': dict(entry.exceptions),
+                    'bytes_sent': entry.bytes_sent,
+                    'bytes_received': entry.bytes_received,
+                    'latency': latency.as_dict(),
+                    'mean': latency.mean,
+                    'p50': latency.quantile(0.5),
+                    'p95': latency.quantile(0.95),
+                    'p99': latency.quantile(0.99),
+                    'max': latency.max,
+                })
+            queue_wait = [
+                {
+                    'connection': connection,
+                    'wait': histogram.as_dict(),
+                    'mean': histogram.mean,
+                    'p50': histogram.quantile(0.5),
+                    'p95': histogram.quantile(0.95),
+                    'max': histogram.max,
+                }
+                for connection, histogram in sorted(self._queue_waits.items())
+            ]
+        return {'started': self.started, 'requests': requests, 'queue_wait': queue_wait}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=1)
+
+    def write_json(self, path):
+        """Write the snapshot to path as JSON, replacing the file atomically."""
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as f:
+            f.write(self.to_json())
+        os.replace(temporary, path)
+
+    def to_prometheus(self):
+        """Return the statistics in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+
+        def family(name, kind, text):
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def labels(item, **extra):
+            pairs = {'device': item['device'], 'function': item['function'], **extra}
+            return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs.items()) + "}"
+
+        counters = (
+            ('requests', "modbus_requests_total", "Requests sent, including retries."),
+            ('responses', "modbus_responses_total", "Responses received, including exception responses."),
+            ('retries', "modbus_retries_total", "Requests sent again after a busy or acknowledge response."),
+            ('timeouts', "modbus_timeouts_total", "Requests that got no response in time."),
+            ('io_errors', "modbus_connection_errors_total", "Requests lost to a connection error."),
+            ('bytes_sent', "modbus_sent_bytes_total", "Bytes sent, including framing."),
+            ('bytes_received', "modbus_received_bytes_total", "Bytes received, including framing."),
+        )
+        for key, name, text in counters:
+            family(name, "counter", text)
+            lines.extend(f"{name}{labels(item)} {item[key]}" for item in snapshot['requests'])
+
+        family("modbus_exceptions_total", "counter", "Exception responses by exception code.")
+        for item in snapshot['requests']:
+            lines.extend(
+                f"modbus_exceptions_total{labels(item, code=code)} {count}"
+                for code, count in sorted(item['exceptions'].items())
+            )
+
+        family("modbus_request_duration_seconds", "histogram", "Time from sending a request to its response.")
+        for item in snapshot['requests']:
+            lines.extend(_histogram_lines("modbus_request_duration_seconds", item['latency'],
+                                          lambda **extra: labels(item, **extra)))
+
+        family("modbus_queue_wait_seconds", "histogram", "Time operations waited for the connection.")
+        for item in snapshot['queue_wait']:
+            lines.extend(_histogram_lines(
+                "modbus_queue_wait_seconds", item['wait'],
+                lambda **extra: "{" + ",".join(
+                    f'{key}="{_escape(value)}"' for key, value in {'connection': item['connection'], **extra}.items()
+                ) + "}"
+            ))
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _histogram_lines(name, histogram, labels):
+    """Cumulative _bucket lines plus _sum and _count for one histogram dict."""
+    cumulative = 0
+    for bound, count in histogram['buckets'].items():
+        cumulative += count
+        le = "+Inf" if bound == 'inf' else repr(bound)
+        yield f"{name}_bucket{labels(le=le)} {cumulative}"
+    yield f"{name}_sum{labels()} {histogram['sum']}"
+    yield f"{name}_count{labels()} {histogram['count']}"
+
+
+# Shared by every reader, writer, engine and pool that is not given its own
+METRICS = Metrics(EVENTS)
+
+
+def device_label(host, port, unit):
+    return f"{host}:{port}/{unit}"
+
+
+def client_device(client, unit):
+    """Device label for a pymodbus client and unit ID."""
+    params = getattr(client, 'comm_params', None)
+    host = getattr(params, 'host', None) or "?"
+    port = getattr(params, 'port', None)
+    return device_label(host, port, unit) if port else f"{host}/{unit}"
+
+
+class MetricsServer:
+    """
+    Serve a Metrics collection over HTTP: /metrics (Prometheus text) and /metrics.json.
+
+    Binds to localhost by default; it has no authentication and is meant for
+    a local Prometheus agent or a quick look with a browser.
+    """
+
+    def __init__(self, metrics=METRICS, port=DEFAULT_METRICS_PORT, host="127.0.0.1"):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/metrics"
+
+    def start(self):
+        """Start serving; raises OSError if the port cannot be bound."""
+        if self._server is not None:
+            return
+        # Imported here: only the server needs http.server, and importing metrics stays cheap
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path in ("/", "/metrics"):
+                    body, content_type = metrics.to_prometheus(), "text/plain; version=0.0.4; charset=utf-8"
+                elif path == "/metrics.json":
+                    body, content_type = metrics.to_json(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-server", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join(5)
+        self._server = None
+        self._thread = None
@@ -0,0 +1,924 @@
+#!/usr/bin/env python3
+"""
+Command-line interface for the Modbus TCP Master.
+
+Runs the same read, write, verify and chunking code as the GUI without a
+display, for scripts, cron jobs and headless machines:
+
+    python modbus_gui.py --cli read 0 100 --host 192.168.1.10
+    python modbus_gui.py --cli write 10 1 2 3 --host 192.168.1.10
+    python modbus_gui.py --cli write 10 1 2 3 --fc23 --host 192.168.1.10
+    python modbus_gui.py --cli mask 20 --set 0 3 --clear 7 --host 192.168.1.10
+    python modbus_gui.py --cli sequence recipe.seq --host 192.168.1.10
+    python modbus_gui.py --cli proxy --listen 0.0.0.0:5502 --ttl 0.2 --host 192.168.1.10
+    python modbus_gui.py --cli poll 0 10 --period 100 --cycles 50 --format csv
+    python modbus_gui.py --cli read 0 2000 --table coils
+    python modbus_gui.py --cli dump --start 0 --count 10000 > image.jsonl
+    python modbus_gui.py --cli write-image recipe.csv --host 192.168.1.10
+    python modbus_gui.py --cli snapshot known-good.mbsnap --host 192.168.1.10
+    python modbus_gui.py --cli compare known-good.mbsnap --targets drives.txt --write-back
+    python modbus_gui.py --cli poll 0 100 --period 10 --record capture.mblog
+    python modbus_gui.py --cli export capture.mblog capture.0001.mblog > capture.csv
+    python modbus_gui.py --cli tags tags.csv --period 500 --format csv
+    python modbus_gui.py --cli poll 0 100 --period 100 --metrics-port 9108 --stats
+    python modbus_gui.py --cli read 0 500 --transport serial --serial-port /dev/ttyUSB0 --line "19200 8E1"
+    python modbus_gui.py --cli read 0 500 --transport rtu-tcp --host 192.168.1.20 --port 4001 --line 9600
+
+Output is JSON lines (one object per line) or CSV on stdout; progress and
+errors go to stderr. pymodbus is only imported once a connection is needed,
+so "--help" and argument errors return immediately.
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+
+from modbus_core import (
+    AdaptivePacer, ChunkedReader, ModbusIOError, ModbusResponseError, RetryPolicy, bit_masks, iter_chunks, mask_write_register,
+    parse_register_values, table_by_key, write_and_verify, write_registers, MAX_READ_WRITE_REGISTERS,
+    MAX_WRITE_REGISTERS, TABLES,
+)
+from events import EVENTS, RateLimitedReporter, error_kind
+from read_planner import max_gap_for_line
+from transports import SerialLine, make_transport, TRANSPORT_KINDS
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+
+class RecordWriter:
+    """Write records to a stream as JSON lines or CSV."""
+
+    def __init__(self, stream, output_format, fields):
+        self.stream = stream
+        self.output_format = output_format
+        self.fields = fields
+        self._csv = None
+        if output_format == 'csv':
+            self._csv = csv.writer(stream, lineterminator="\n")
+            self._csv.writerow(fields)
+
+    def write(self, record):
+        """Write one record (a dict keyed by field name)."""
+        if self._csv is not None:
+            self._csv.writerow(
+                " ".join(str(v) for v in value) if isinstance(value, (list, tuple)) else value
+                for value in (record.get(field, "") for field in self.fields)
+            )
+        else:
+            self.stream.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def write_registers(self, address, values):
+        """Write one address/value record per register."""
+        if self._csv is not None:
+            self._csv.writerows((address + i, value) for i, value in enumerate(values))
+        else:
+            self.stream.writelines(
+                f'{{"address":{address + i},"value":{value}}}\n' for i, value in enumerate(values)
+            )
+
+    def flush(self):
+        self.stream.flush()
+
+
+def transport_from_args(args):
+    """Return the transports.Transport selected by the command-line arguments."""
+    line = SerialLine.parse(args.line) if args.line else None
+    return make_transport(args.transport, args.host, args.port, args.serial_port, line)
+
+
+def connect(args):
+    """Open a synchronous client on the transport selected by the command-line arguments."""
+    return transport_from_args(args).open(args.timeout)
+
+
+def make_reader(client, args):
+    """Return a ChunkedReader configured from the command-line arguments."""
+    return ChunkedReader(client, args.unit, pacer=AdaptivePacer(max_in_flight=args.in_flight),
+                         table=table_by_key(args.table), policy=make_policy(args))
+
+
+def make_policy(args):
+    """Return the RetryPolicy for reads configured from the command-line arguments."""
+    return RetryPolicy(retries=args.retries)
+
+
+def error_reporter():
+    """Print poll errors to stderr without flooding it: the first at once, then one summary per 10 s."""
+    return RateLimitedReporter(lambda text: print(f"Poll error: {text}", file=sys.stderr))
+
+
+def print_event(event):
+    """Write one event as a JSON line to stderr (--events)."""
+    sys.stderr.write(json.dumps(event.as_dict(), separators=(",", ":")) + "\n")
+
+
+def check_range(address, count, maximum=65536):
+    """Raise ValueError if address/count do not describe a valid register range."""
+    if address < 0 or address > 65535:
+        raise ValueError("Address must be between 0 and 65535")
+    if count <= 0 or address + count > maximum:
+        raise ValueError(f"Count must be between 1 and {maximum - address}")
+
+
+def cmd_read(args, out):
+    """Read a range of a data table once."""
+    check_range(args.address, args.count)
+    client = connect(args)
+    try:
+        values = make_reader(client, args).read(args.address, args.count)
+    finally:
+        client.close()
+    writer = RecordWriter(out, args.format, ("address", "value"))
+    writer.write_registers(args.address, values)
+    return EXIT_OK
+
+
+def cmd_write(args, out):
+    """Write values and verify them by reading back."""
+    values = parse_register_values(" ".join(args.values))
+    limit = MAX_READ_WRITE_REGISTERS if args.fc23 and not args.no_verify else MAX_WRITE_REGISTERS
+    if len(values) > limit:
+        raise ValueError(f"At most {limit} values can be written at once")
+    check_range(args.address, len(values))
+
+    client = connect(args)
+    try:
+        if args.no_verify:
+            write_registers(client, args.address, values, args.unit)
+            mismatches = None
+        else:
+            mismatches = write_and_verify(
+                client, args.address, values, args.unit, verify_delay=args.verify_delay,
+                pacer=AdaptivePacer(max_in_flight=args.in_flight), single_transaction=args.fc23
+            )
+    finally:
+        client.close()
+
+    writer = RecordWriter(out, args.format, ("address", "written", "verified", "mismatches"))
+    writer.write({
+        "address": args.address,
+        "written": values,
+        "verified": None if mismatches is None else not mismatches,
+        "mismatches": [
+            {"address": addr, "expected": expected, "observed": observed}
+            for addr, expected, observed in (mismatches or [])
+        ] if args.format == 'jsonl' else [addr for addr, _, _ in (mismatches or [])],
+    })
+    return EXIT_FAILED if mismatches else EXIT_OK
+
+
+def cmd_mask(args, out):
+    """Change bits of one holding register with a mask write (FC22)."""
+    check_range(args.address, 1)
+    if args.set or args.clear:
+        if args.and_mask is not None or args.or_mask is not None:
+            raise ValueError("Use either --set/--clear or --and/--or")
+        and_mask, or_mask = bit_masks(args.set or (), args.clear or ())
+    elif args.and_mask is not None or args.or_mask is not None:
+        and_mask = 0xFFFF if args.and_mask is None else args.and_mask
+        or_mask = 0 if args.or_mask is None else args.or_mask
+        if not (0 <= and_mask <= 0xFFFF and 0 <= or_mask <= 0xFFFF):
+            raise ValueError("Masks must be between 0 and 0xFFFF")
+    else:
+        raise ValueError("Nothing to change: give --set/--clear bits or --and/--or masks")
+
+    client = connect(args)
+    try:
+        mask_write_register(client, args.address, and_mask, or_mask, args.unit)
+    finally:
+        client.close()
+    writer = RecordWriter(out, args.format, ("address", "and_mask", "or_mask"))
+    writer.write({"address": args.address, "and_mask": and_mask, "or_mask": or_mask})
+    return EXIT_OK
+
+
+def cmd_sequence(args, out):
+    """Run a write sequence file step by step and report each step's latency and result."""
+    from write_sequence import parse_sequence, run_sequence, summarize
+
+    text = sys.stdin.read() if args.file == "-" else open(args.file).read()
+    steps = parse_sequence(text)
+    writer = RecordWriter(out, args.format, ("step", "command", "latency_ms", "ok", "values", "error"))
+
+    def report(result):
+        writer.write({
+            "step": steps.index(result.step) + 1,
+            "command": str(result.step),
+            "latency_ms": round(result.latency * 1000, 3),
+            "ok": result.ok,
+            "values": result.values,
+            "error": result.describe() if not result.ok else None,
+        })
+        writer.flush()
+
+    client = connect(args)
+    try:
+        results = run_sequence(client, steps, args.unit, keep_going=args.keep_going, on_result=report)
+    finally:
+        client.close()
+    print(summarize(results, steps), file=sys.stderr)
+    return EXIT_OK if len(results) == len(steps) and all(result.ok for result in results) else EXIT_FAILED
+
+
+def cmd_proxy(args, out):
+    """Serve Modbus TCP clients through one upstream connection, from a TTL cache."""
+    from async_engine import ModbusEngine
+    from events import ConnectionLost, Reconnected, RequestFailed
+    from modbus_proxy import ModbusProxy, RegisterCache, parse_ttl_rule
+
+    host, _, port = args.listen.rpartition(":")
+    try:
+        port = int(port)
+    except ValueError:
+        raise ValueError(f"--listen: '{args.listen}' is not HOST:PORT") from None
+    if args.ttl < 0:
+        raise ValueError("--ttl cannot be negative")
+    cache = RegisterCache(args.ttl, [parse_ttl_rule(rule) for rule in args.ttl_range or ()])
+
+    engine = ModbusEngine(args.host, args.port, timeout=args.timeout, policy=make_policy(args),
+                          transport=transport_from_args(args))
+    upstream = RateLimitedReporter(lambda text: print(f"Upstream: {text}", file=sys.stderr))
+    EVENTS.subscribe(upstream, RequestFailed, ConnectionLost, Reconnected)
+    engine.start()
+    try:
+        if not engine.call(engine.connect):
+            raise ModbusIOError(f"Could not connect to {engine.name}")
+        proxy = ModbusProxy(engine, host or "0.0.0.0", port, cache, max_clients=args.max_clients)
+        engine.call(proxy.start)
+        rules = ", ".join(str(rule) for rule in cache.rules)
+        print(f"Proxying {proxy.address} to {engine.name}, TTL {args.ttl:g} s"
+              f"{f' ({rules})' if rules else ''}; Ctrl+C to stop", file=sys.stderr)
+        try:
+            while True:
+                time.sleep(args.report or 3600)
+                if args.report:
+                    print(f"{time.strftime('%H:%M:%S')} {proxy.stats}", file=sys.stderr)
+        except KeyboardInterrupt:
+            pass
+        engine.call(proxy.stop)
+        upstream.flush()
+        print(proxy.stats, file=sys.stderr)
+    finally:
+        EVENTS.unsubscribe(upstream)
+        engine.stop()
+    return EXIT_OK
+
+
+def cmd_write_image(args, out):
+    """Write a register image file and report differences per address range."""
+    from bulk_write import write_image, load_register_image
+
+    segments = load_register_image(args.file, args.image_format, args.base)
+    transport = transport_from_args(args)
+    client = transport.open(args.timeout)
+    try:
+        result = write_image(
+            client, segments, args.unit, verify=not args.no_verify, verify_delay=args.verify_delay,
+            pacer=AdaptivePacer(max_in_flight=args.in_flight), max_gap=max_gap_for_line(transport.line)
+        )
+    finally:
+        client.close()
+
+    writer = RecordWriter(out, args.format, ("first", "last", "expected", "observed"))
+    for first, last, items in result.ranges:
+        writer.write({
+            "first": first,
+            "last": last,
+            "expected": [item[1] for item in items],
+            "observed": [item[2] for item in items],
+        })
+    verified = {None: "not verified", True: "verified", False: f"{len(result.mismatches)} differ"}[result.verified]
+    print(
+        f"Wrote {result.registers} register(s) in {result.write_requests} request(s), "
+        f"{result.verify_requests} verify read(s), {verified}, in {result.elapsed:.2f} s",
+        file=sys.stderr
+    )
+    return EXIT_FAILED if result.mismatches else EXIT_OK
+
+
+def cmd_poll(args, out):
+    """Read a register range periodically and emit one record per cycle."""
+    from poller import Poller, MIN_POLL_PERIOD
+
+    check_range(args.address, args.count)
+    if args.period / 1000 < MIN_POLL_PERIOD:
+        raise ValueError(f"Period must be at least {int(MIN_POLL_PERIOD * 1000)} ms")
+
+    client = connect(args)
+    reader = make_reader(client, args)
+    addresses = [str(args.address + i) for i in range(args.count)]
+    snapshot = None
+    if args.changes:
+        from change_detection import RegisterSnapshot
+
+        snapshot = RegisterSnapshot()
+        writer = RecordWriter(out, args.format, ("timestamp", "address", "value"))
+    elif args.format == 'csv':
+        writer = RecordWriter(out, 'csv', ["timestamp", *addresses])
+    else:
+        writer = RecordWriter(out, 'jsonl', None)
+    failures = []
+    errors = error_reporter()
+    recorder = None
+    if args.record:
+        from data_logger import DataRecorder
+
+        recorder = DataRecorder(
+            args.record, args.address, args.count,
+            metadata={"host": args.host, "port": args.port, "unit": args.unit, "table": args.table,
+                      "period": args.period / 1000},
+            max_bytes=int(args.rotate_mb * 1024 * 1024),
+        )
+        recorder.start()
+
+    def on_result(result):
+        if result.error is not None:
+            failures.append(result.error)
+            errors.report(error_kind(result.error), str(result.error))
+            return
+        if recorder is not None:
+            recorder.record(result)
+            return
+        if snapshot is not None:
+            changed = snapshot.update(args.address, result.values)
+            if not changed:
+                return
+            timestamp = round(result.timestamp, 6)
+            for address in changed:
+                writer.write({"timestamp": timestamp, "address": address,
+                              "value": result.values[address - args.address]})
+        elif args.format == 'csv':
+            writer.write({"timestamp": f"{result.timestamp:.6f}", **dict(zip(addresses, result.values))})
+        else:
+            writer.write({"timestamp": round(result.timestamp, 6), "address": args.address,
+                          "values": list(result.values)})
+        writer.flush()
+
+    poller = Poller(lambda: reader.read(args.address, args.count), args.period / 1000,
+                    on_result=on_result, max_cycles=args.cycles)
+    poller.start()
+    try:
+        while not poller.wait(0.5):
+            if recorder is not None and recorder.error is not None:
+                poller.stop(timeout=5)
+                break
+    except KeyboardInterrupt:
+        poller.stop(timeout=5)
+    finally:
+        client.close()
+        if recorder is not None:
+            recorder.close()
+    errors.flush()
+    print(
+        f"{poller.cycles} cycle(s), {poller.errors} error(s), {poller.skipped} skipped",
+        file=sys.stderr
+    )
+    if recorder is not None:
+        print(
+            f"Recorded {recorder.frames_written} sample(s) to {len(recorder.files)} file(s), "
+            f"{recorder.frames_dropped} dropped",
+            file=sys.stderr
+        )
+        if recorder.error is not None:
+            raise recorder.error
+    return EXIT_FAILED if failures and len(failures) == poller.cycles else EXIT_OK
+
+
+def cmd_tags(args, out):
+    """Read the tags of a device profile and emit the decoded values, once or periodically."""
+    from device_profile import load_profile, read_groups
+
+    profile = load_profile(args.file)
+    tags = profile.tags
+    names = [tag.name for tag in tags]
+    transport = transport_from_args(args)
+    profile.plan_for_link(max_gap_for_line(transport.line))
+    client = transport.open(args.timeout)
+    pacer = AdaptivePacer(max_in_flight=args.in_flight)
+    readers = {group.table: ChunkedReader(client, args.unit, pacer=pacer, table=group.table, policy=make_policy(args))
+               for group in profile.groups}
+
+    def read_tables(requests):
+        return [readers[table].read_blocks(blocks) for blocks, table in requests]
+
+    measured = []
+
+    def follow_link():
+        # Re-plan once for the measured round trip, between reads so no plan changes under a decode
+        if not measured and pacer.srtt is not None:
+            measured.append(pacer.srtt)
+            profile.plan_for_link(max_gap_for_line(transport.line, pacer.srtt))
+
+    if args.groups:
+        try:
+            return _poll_groups(args, out, profile, read_tables, follow_link)
+        finally:
+            client.close()
+
+    def read_tags():
+        values = [value for values in read_groups(profile.groups, read_tables) for value in values]
+        follow_link()
+        return values
+
+    deadbands = None
+    if args.changes:
+        from change_detection import DeadbandFilter
+
+        deadbands = DeadbandFilter(tags)
+        writer = RecordWriter(out, args.format, ("timestamp", "name", "value"))
+    else:
+        writer = RecordWriter(out, args.format, ["timestamp", *names])
+
+    if not args.period:
+        try:
+            values = read_tags()
+        finally:
+            client.close()
+        writer.write({"timestamp": round(time.time(), 6), **dict(zip(names, values))})
+        return EXIT_OK
+
+    from poller import Poller, MIN_POLL_PERIOD
+
+    if args.period / 1000 < MIN_POLL_PERIOD:
+        raise ValueError(f"Period must be at least {int(MIN_POLL_PERIOD * 1000)} ms")
+    failures = []
+    errors = error_reporter()
+
+    def on_result(result):
+        if result.error is not None:
+            failures.append(result.error)
+            errors.report(error_kind(result.error), str(result.error))
+            return
+        if deadbands is not None:
+            timestamp = round(result.timestamp, 6)
+            for index, value in deadbands.update(result.values):
+                writer.write({"timestamp": timestamp, "name": names[index], "value": value})
+        else:
+            writer.write({"timestamp": round(result.timestamp, 6), **dict(zip(names, result.values))})
+        writer.flush()
+
+    poller = Poller(read_tags, args.period / 1000, on_result=on_result, max_cycles=args.cycles)
+    poller.start()
+    try:
+        while not poller.wait(0.5):
+            pass
+    except KeyboardInterrupt:
+        poller.stop(timeout=5)
+    finally:
+        client.close()
+    errors.flush()
+    print(
+        f"{poller.cycles} cycle(s), {poller.errors} error(s), {poller.skipped} skipped, "
+        f"{profile.request_count} request(s) per cycle",
+        file=sys.stderr
+    )
+    return EXIT_FAILED if failures and len(failures) == poller.cycles else EXIT_OK
+
+
+def _poll_groups(args, out, profile, read_tables, follow_link):
+    """Poll each group of a profile at its own period and priority; one record per tag value."""
+    from change_detection import DeadbandFilter
+    from device_profile import read_groups
+    from poller import GroupPoller, ScheduledGroup
+
+    groups = {id(group): group for group in profile.groups}
+    filters = {id(group): DeadbandFilter(group.tags) for group in profile.groups} if args.changes else {}
+    writer = RecordWriter(out, args.format, ("timestamp", "group", "name", "value"))
+    failures = []
+    errors = error_reporter()
+
+    def on_result(key, result):
+        group = groups[key]
+        if result.error is not None:
+            failures.append(result.error)
+            errors.report(error_kind(result.error), f"{group.name}: {result.error}")
+            return
+        timestamp = round(result.timestamp, 6)
+        changes = filters[key].update(result.values) if filters else enumerate(result.values)
+        for index, value in changes:
+            writer.write({"timestamp": timestamp, "group": group.name, "name": group.tags[index].name, "value": value})
+        writer.flush()
+
+    def read_keys(keys):
+        values = read_groups([groups[key] for key in keys], read_tables)
+        follow_link()
+        return values
+
+    poller = GroupPoller(
+        [ScheduledGroup(key, group.period, group.priority, len(group.plan.blocks)) for key, group in groups.items()],
+        lambda keys: read_groups([groups[key] for key in keys], read_tables),
+        on_result=on_result, max_cycles=args.cycles,
+    )
+    poller.start()
+    try:
+        while not poller.wait(0.5):
+            pass
+    except KeyboardInterrupt:
+        poller.stop(timeout=5)
+    errors.flush()
+    for key, stats in poller.stats().items():
+        group = groups[key]
+        print(
+            f"{group.name} ({group.table.name.lower()}): {stats['cycles']} cycle(s) at "
+            f"{stats['achieved_rate']}/s (target {stats['target_rate']}/s), {stats['errors']} error(s), "
+            f"{stats['skipped']} skipped, lateness mean {stats['mean_lateness_ms']} ms, "
+            f"max {stats['max_lateness_ms']} ms",
+            file=sys.stderr
+        )
+    return EXIT_FAILED if failures and len(failures) == sum(group.cycles for group in poller.groups) else EXIT_OK
+
+
+def cmd_dump(args, out):
+    """Read a large range chunk by chunk, skipping ranges the device rejects."""
+    if args.count is None:
+        args.count = 65536 - args.start
+    check_range(args.start, args.count)
+    client = connect(args)
+    reader = make_reader(client, args)
+    writer = RecordWriter(out, args.format, ("address", "value"))
+    read = skipped = 0
+    started = time.perf_counter()
+    try:
+        # Read in batches of several chunks so the reader can pipeline them,
+        # falling back to single chunks when a batch hits a rejected address.
+        batch = reader.chunk_size * 8
+        for batch_address, batch_count in iter_chunks(args.start, args.count, batch):
+            try:
+                writer.write_registers(batch_address, reader.read(batch_address, batch_count))
+                read += batch_count
+                continue
+            except ModbusResponseError:
+                pass
+            for chunk_address, chunk_count in iter_chunks(batch_address, batch_count, reader.chunk_size):
+                try:
+                    writer.write_registers(chunk_address, reader.read(chunk_address, chunk_count))
+                    read += chunk_count
+                except ModbusResponseError as e:
+                    skipped += chunk_count
+                    print(f"Skipped {chunk_address}-{chunk_address + chunk_count - 1}: {e}", file=sys.stderr)
+    finally:
+        client.close()
+    elapsed = time.perf_counter() - started
+    print(f"Read {read} {reader.table.item}(s), skipped {skipped}, in {elapsed:.2f} s", file=sys.stderr)
+    return EXIT_OK if read else EXIT_FAILED
+
+
+def cmd_snapshot(args, out):
+    """Capture every readable address of the device (or of --range ranges) into a snapshot file."""
+    from snapshot import capture_snapshot, client_reader, full_ranges, parse_range
+
+    ranges = [parse_range(text) for text in args.range] if args.range else full_ranges()
+    if args.resolution < 1:
+        raise ValueError("--resolution must be 1 or more")
+    transport = transport_from_args(args)
+    client = transport.open(args.timeout)
+    started = time.perf_counter()
+    try:
+        snapshot = capture_snapshot(
+            client_reader(client, args.unit, AdaptivePacer(max_in_flight=args.in_flight), make_policy(args)),
+            ranges, args.resolution, {"device": transport.device(args.unit), "unit": args.unit}
+        )
+    finally:
+        client.close()
+    for table, first, last, reason in snapshot.skipped:
+        print(f"Skipped {table} {first}-{last}: {reason}", file=sys.stderr)
+    size = snapshot.save(args.file)
+    print(f"Captured {snapshot.describe()} in {time.perf_counter() - started:.2f} s, "
+          f"{size} bytes written to {args.file}", file=sys.stderr)
+    return EXIT_OK if len(snapshot) else EXIT_FAILED
+
+
+def cmd_compare(args, out):
+    """Compare a snapshot with the live device, several devices or another snapshot; print the differences."""
+    from snapshot import Snapshot, compare_device, count_differences, coverage_gaps, diff_snapshots
+
+    reference = Snapshot.load(args.reference)
+    writer = RecordWriter(out, args.format, ("device", "table", "first", "last", "expected", "observed"))
+
+    def report(device, differences, result=None):
+        for difference in differences:
+            writer.write({
+                "device": device,
+                "table": difference.table.key,
+                "first": difference.first,
+                "last": difference.last,
+                "expected": difference.expected,
+                "observed": difference.observed,
+            })
+        writer.flush()
+        text = f"{count_differences(differences)} address(es) differ in {len(differences)} range(s)" \
+            if differences else "identical"
+        if result is not None:
+            restored = "restored" if result.verified else f"{len(result.mismatches)} still differ after writing back"
+            text += f"; wrote back {result.registers} register(s) in {result.write_requests} request(s), {restored}"
+        print(f"{device}: {text}", file=sys.stderr)
+        if result is not None and result.verified:
+            # Only holding registers are written back
+            differences = [difference for difference in differences if difference.table.key != 'holding']
+        return bool(differences)
+
+    if args.other:
+        if args.targets or args.write_back:
+            raise ValueError("--targets and --write-back compare with live devices, not with a second snapshot")
+        other = Snapshot.load(args.other)
+        for gap in coverage_gaps(reference, other):
+            print(f"Coverage: {gap.table.key} {gap.first}-{gap.last} only in "
+                  f"{args.reference if gap.only_in == 'reference' else args.other}", file=sys.stderr)
+        return EXIT_FAILED if report(args.other, diff_snapshots(reference, other)) else EXIT_OK
+
+    pacer = AdaptivePacer(max_in_flight=args.in_flight)
+    if not args.targets:
+        transport = transport_from_args(args)
+        client = transport.open(args.timeout)
+        try:
+            _, differences, result = compare_device(
+                client, args.unit, reference, args.resolution, pacer, make_policy(args), args.write_back,
+                args.verify_delay
+            )
+        finally:
+            client.close()
+        return EXIT_FAILED if report(transport.device(args.unit), differences, result) else EXIT_OK
+
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from connection_pool import ConnectionPool, parse_targets
+
+    with open(args.targets) as f:
+        targets = parse_targets(f.read(), args.port, args.unit)
+    if not targets:
+        raise ValueError(f"{args.targets} lists no devices")
+    pool = ConnectionPool(timeout=args.timeout)
+
+    def compare_target(target):
+        with pool.connection(target.host, target.port) as client:
+            return compare_device(client, target.unit, reference, args.resolution, pool.pacer(target),
+                                  make_policy(args), args.write_back, args.verify_delay)
+
+    failed = 0
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+            futures = {executor.submit(compare_target, target): target for target in targets}
+            for future in as_completed(futures):
+                try:
+                    _, differences, result = future.result()
+                except Exception as e:
+                    print(f"{futures[future]}: {e}", file=sys.stderr)
+                    failed += 1
+                    continue
+                failed += report(str(futures[future]), differences, result)
+    finally:
+        pool.close_all()
+    print(f"{len(targets) - failed} of {len(targets)} device(s) match {args.reference}", file=sys.stderr)
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+def cmd_export(args, out):
+    """Convert recordings made with poll --record to CSV or Parquet."""
+    from data_logger import export_csv, export_parquet, sort_recordings
+
+    files = sort_recordings(args.files)
+    decoder = None
+    if args.tags:
+        from tag_decoder import TagDecoder, load_tags
+
+        decoder = TagDecoder(load_tags(args.tags))
+    if args.to == 'parquet':
+        if not args.output:
+            raise ValueError("Parquet export needs --output")
+        rows = export_parquet(files, args.output, decoder=decoder)
+    elif args.output:
+        with open(args.output, "w", newline="") as f:
+            rows = export_csv(files, f, decoder=decoder)
+    else:
+        rows = export_csv(files, out, decoder=decoder)
+    print(f"Exported {rows} sample(s)", file=sys.stderr)
+    return EXIT_OK
+
+
+def build_parser():
+    """Return the argument parser for the command-line interface."""
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--host", default="127.0.0.1", help="device IP address or host name (default: 127.0.0.1)")
+    common.add_argument("--port", type=int, default=502, help="TCP port (default: 502)")
+    common.add_argument("--unit", type=int, default=1, help="unit/slave ID (default: 1)")
+    common.add_argument("--transport", choices=TRANSPORT_KINDS, default="tcp",
+                        help="tcp (Modbus TCP), rtu-tcp (RTU frames through a TCP serial converter at --host/--port) "
+                             "or serial (RTU on --serial-port) (default: tcp)")
+    common.add_argument("--serial-port", metavar="DEVICE", help="serial port for --transport serial, e.g. /dev/ttyUSB0")
+    common.add_argument("--line", metavar="FORMAT",
+                        help='serial line of the RTU transports, e.g. "19200 8E1" (default for serial: 19200 8N1); '
+                             "frame timing and request sizes follow from it")
+    common.add_argument("--timeout", type=float, default=3,
+                        help="longest response timeout in seconds; once round trips have been measured reads "
+                             "time out after a few round-trip times instead (default: 3)")
+    common.add_argument("--retries", type=int, default=2,
+                        help="times a read is retried after a timeout or lost connection, resending only the "
+                             "missing chunks (default: 2, 0 disables)")
+    common.add_argument("--in-flight", type=int, default=4,
+                        help="maximum pipelined requests on the socket (default: 4, 1 disables pipelining; "
+                             "RTU transports send one request at a time)")
+    common.add_argument("--format", choices=("jsonl", "csv"), default="jsonl", help="output format (default: jsonl)")
+    common.add_argument("--stats", action="store_true",
+                        help="print request statistics per device and function code to stderr at the end")
+    common.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="serve request metrics on http://127.0.0.1:PORT/metrics (Prometheus text) "
+                             "and /metrics.json while the command runs")
+    common.add_argument("--metrics-file", metavar="FILE", help="write request metrics as JSON to FILE at the end")
+    common.add_argument("--events", action="store_true",
+                        help="print every request and connection event as a JSON line to stderr")
+
+    tables = argparse.ArgumentParser(add_help=False)
+    tables.add_argument("--table", choices=[table.key for table in TABLES], default="holding",
+                        help="data table to read: holding/input registers, coils or discrete inputs "
+                             "(default: holding)")
+
+    parser = argparse.ArgumentParser(
+        prog="modbus_gui.py --cli", description="Headless Modbus TCP master."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    read = commands.add_parser("read", parents=[common, tables], help="read registers or bits once")
+    read.add_argument("address", type=int)
+    read.add_argument("count", type=int)
+    read.set_defaults(handler=cmd_read)
+
+    write = commands.add_parser("write", parents=[common], help="write holding registers and verify")
+    write.add_argument("address", type=int)
+    write.add_argument("values", nargs="+", help="uint16 values, decimal or 0x-prefixed hex")
+    write.add_argument("--no-verify", action="store_true", help="do not read the values back")
+    write.add_argument("--verify-delay", type=float, default=0.2,
+                       help="seconds to wait before reading back (default: 0.2)")
+    write.add_argument("--fc23", action="store_true",
+                       help="write and read back in one read/write multiple registers (FC23) request, "
+                            "without a verify delay (up to 121 values)")
+    write.set_defaults(handler=cmd_write)
+
+    mask = commands.add_parser("mask", parents=[common],
+                               help="change bits of one holding register with a mask write (FC22)")
+    mask.add_argument("address", type=int)
+    mask.add_argument("--set", type=int, nargs="+", metavar="BIT", help="bits (0-15) to set")
+    mask.add_argument("--clear", type=int, nargs="+", metavar="BIT", help="bits (0-15) to clear")
+    mask.add_argument("--and", dest="and_mask", type=lambda text: int(text, 0), metavar="MASK",
+                      help="raw AND mask (default: 0xFFFF)")
+    mask.add_argument("--or", dest="or_mask", type=lambda text: int(text, 0), metavar="MASK",
+                      help="raw OR mask (default: 0)")
+    mask.set_defaults(handler=cmd_mask)
+
+    sequence = commands.add_parser("sequence", parents=[common],
+                                   help="run a write sequence back-to-back and report per-step latency")
+    sequence.add_argument("file", help="sequence file ('-' for stdin), one step per line: "
+                                       "write/rw/mask/setbits/clearbits/read/delay (see write_sequence.py)")
+    sequence.add_argument("--keep-going", action="store_true", help="run the remaining steps after a failure")
+    sequence.set_defaults(handler=cmd_sequence)
+
+    proxy = commands.add_parser("proxy", parents=[common],
+                                help="serve Modbus TCP clients through one connection to the device, from a cache")
+    proxy.add_argument("--listen", default="127.0.0.1:5502", metavar="HOST:PORT",
+                       help="address to accept clients on (default: 127.0.0.1:5502; 0.0.0.0 for all interfaces)")
+    proxy.add_argument("--ttl", type=float, default=0.5,
+                       help="seconds a value read is served from the cache (default: 0.5; 0 disables caching)")
+    proxy.add_argument("--ttl-range", action="append", metavar="[TABLE:]FIRST[-LAST]=SECONDS",
+                       help="TTL for an address range, e.g. holding:0-99=0.1 or input:1000-1999=5 (repeatable)")
+    proxy.add_argument("--max-clients", type=int, default=64, help="most clients served at once (default: 64)")
+    proxy.add_argument("--report", type=float, default=0, metavar="SECONDS",
+                       help="print proxy statistics every SECONDS (default: only when stopping)")
+    proxy.set_defaults(handler=cmd_proxy)
+
+    image = commands.add_parser("write-image", parents=[common],
+                                help="write a register image file in chunks and verify it")
+    image.add_argument("file", help="CSV (address,value), JSON/JSON lines or raw big-endian binary image")
+    image.add_argument("--image-format", choices=("csv", "json", "bin"),
+                       help="image format (default: from the file extension, otherwise binary)")
+    image.add_argument("--base", type=int, default=0, help="start address of a binary image (default: 0)")
+    image.add_argument("--no-verify", action="store_true", help="do not read the image back")
+    image.add_argument("--verify-delay", type=float, default=0.2,
+                       help="seconds to wait after the last write before reading back (default: 0.2)")
+    image.set_defaults(handler=cmd_write_image)
+
+    poll = commands.add_parser("poll", parents=[common, tables], help="read a range periodically")
+    poll.add_argument("address", type=int)
+    poll.add_argument("count", type=int)
+    poll.add_argument("--period", type=float, default=1000, help="poll period in ms (default: 1000)")
+    poll.add_argument("--cycles", type=int, default=0, help="stop after this many cycles (default: run until Ctrl+C)")
+    poll.add_argument("--changes", action="store_true",
+                      help="emit one timestamp/address/value record per changed register instead of full cycles")
+    poll.add_argument("--record", metavar="FILE",
+                      help="write samples to a binary .mblog recording instead of stdout")
+    poll.add_argument("--rotate-mb", type=float, default=64,
+                      help="start a new recording file after this many MB (default: 64)")
+    poll.set_defaults(handler=cmd_poll)
+
+    dump = commands.add_parser("dump", parents=[common, tables], help="read a large range, skipping rejected blocks")
+    dump.add_argument("--start", type=int, default=0, help="first address (default: 0)")
+    dump.add_argument("--count", type=int, help="number of registers (default: up to address 65535)")
+    dump.set_defaults(handler=cmd_dump)
+
+    snapshot = commands.add_parser("snapshot", parents=[common],
+                                   help="capture the registers and bits of all tables into a snapshot file")
+    snapshot.add_argument("file", help="snapshot file to write (.mbsnap)")
+    snapshot.add_argument("--range", action="append", metavar="[TABLE:]FIRST[-LAST]",
+                          help="capture only this range, e.g. holding:0-999 or coils:0-1999 (repeatable; "
+                               "default: the whole address space of all four tables)")
+    snapshot.add_argument("--resolution", type=int, default=16,
+                          help="rejected blocks are split down to this many addresses before they are skipped "
+                               "(default: 16; larger is faster on sparse devices)")
+    snapshot.set_defaults(handler=cmd_snapshot)
+
+    compare = commands.add_parser("compare", parents=[common],
+                                  help="print the address ranges where a device or snapshot differs from a snapshot")
+    compare.add_argument("reference", help="reference snapshot (.mbsnap)")
+    compare.add_argument("other", nargs="?", help="second snapshot to compare with (default: the live device)")
+    compare.add_argument("--targets", metavar="FILE",
+                         help="compare every device of FILE in parallel, one 'host[:port] [units]' per line")
+    compare.add_argument("--workers", type=int, default=16, help="devices compared at once with --targets (default: 16)")
+    compare.add_argument("--write-back", action="store_true",
+                         help="write the reference values of differing holding registers back and verify them")
+    compare.add_argument("--verify-delay", type=float, default=0.2,
+                         help="seconds to wait after writing back before reading back (default: 0.2)")
+    compare.add_argument("--resolution", type=int, default=16,
+                         help="rejected blocks are split down to this many addresses (default: 16)")
+    compare.set_defaults(handler=cmd_compare)
+
+    export = commands.add_parser("export", help="convert .mblog recordings to CSV or Parquet")
+    export.add_argument("files", nargs="+", help="recording files (sorted into capture order)")
+    export.add_argument("--to", choices=("csv", "parquet"), default="csv", help="output format (default: csv)")
+    export.add_argument("--output", "-o", help="output file (default: CSV on stdout)")
+    export.add_argument("--tags", metavar="FILE",
+                        help="export the typed values of these tags instead of raw registers")
+    export.set_defaults(handler=cmd_export)
+
+    tags = commands.add_parser("tags", parents=[common],
+                               help="read and decode the typed tags (int32, float32, strings, ...) of a profile")
+    tags.add_argument("file", help="device profile or tag file (.json, or .csv with a header row)")
+    tags.add_argument("--period", type=float, default=0,
+                      help="poll period in ms (default: read once)")
+    tags.add_argument("--cycles", type=int, default=0, help="stop after this many cycles (default: run until Ctrl+C)")
+    tags.add_argument("--groups", action="store_true",
+                      help="poll every group of the profile at its own period and priority "
+                           "(one timestamp/group/name/value record per tag; --cycles counts the fastest group)")
+    tags.add_argument("--changes", action="store_true",
+                      help="with --period or --groups, only emit tags that moved more than their deadband "
+                           "(one record per tag)")
+    tags.set_defaults(handler=cmd_tags)
+
+    return parser
+
+
+def main(argv=None, out=None):
+    """Run the command-line interface and return the process exit code."""
+    args = build_parser().parse_args(argv)
+    out = out or sys.stdout
+    server = None
+    if getattr(args, 'events', False):
+        EVENTS.subscribe(print_event)
+    try:
+        if getattr(args, 'metrics_port', None) is not None:
+            from metrics import MetricsServer
+
+            server = MetricsServer(port=args.metrics_port)
+            server.start()
+            print(f"Serving metrics on {server.url}", file=sys.stderr)
+        return args.handler(args, out)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return EXIT_USAGE
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return EXIT_FAILED
+    finally:
+        if server is not None:
+            server.stop()
+        EVENTS.unsubscribe(print_event)
+        _report_metrics(args)
+
+
+def _report_metrics(args):
+    """Print and/or save the request metrics as asked for by --stats and --metrics-file."""
+    from metrics import METRICS
+
+    if getattr(args, 'stats', False):
+        for item in METRICS.snapshot()['requests']:
+            exceptions = ", ".join(f"code {code}: {count}" for code, count in sorted(item['exceptions'].items()))
+            print(
+                f"{item['device']} {item['function']}: {item['requests']} request(s), "
+                f"{item['retries']} retried, {item['timeouts']} timeout(s), {item['io_errors']} connection error(s)"
+                f"{f', exceptions {exceptions}' if exceptions else ''}; latency p50 {item['p50'] * 1000:.2f} ms, "
+                f"p95 {item['p95'] * 1000:.2f} ms, max {item['max'] * 1000:.2f} ms; "
+                f"{item['bytes_sent']} B sent, {item['bytes_received']} B received",
+                file=sys.stderr
+            )
+        for item in METRICS.snapshot()['queue_wait']:
+            print(f"{item['connection']} queue wait: p50 {item['p50'] * 1000:.2f} ms, "
+                  f"p95 {item['p95'] * 1000:.2f} ms, max {item['max'] * 1000:.2f} ms", file=sys.stderr)
+    if getattr(args, 'metrics_file', None):
+        try:
+            METRICS.write_json(args.metrics_file)
+        except OSError as e:
+            print(f"Could not write {args.metrics_file}: {e}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,847 @@
+#!/usr/bin/env python3
+"""
+Modbus helpers shared by the GUI.
+
+This module has no tkinter dependency and does not import pymodbus itself, so
+it is cheap to import from worker threads, the command-line interface and
+scripts. It provides a chunked reader for all four data tables and a register
+writer that keeps several requests in flight on one Modbus TCP socket and
+paces itself from measured round-trip times, plus the value parsing, write
+and verification logic used by the GUI.
+Every request is recorded in a metrics.Metrics collection (latency, bytes,
+retries, timeouts and exception codes per device and function code).
+Reads recover from timeouts and dropped connections as a RetryPolicy says:
+only the chunks that failed are sent again, after a jittered backoff and a
+reconnect if the socket was lost. Clients of the RTU transports
+(transports.RtuClient) are used one request at a time, in chunks sized for
+their line.
+"""
+
+import itertools
+import random
+import socket
+import struct
+import time
+from collections import deque, namedtuple
+
+from metrics import METRICS, client_device
+
+# Protocol limits (Modbus Application Protocol Specification V1.1b3)
+MAX_READ_REGISTERS = 125
+MAX_WRITE_REGISTERS = 123
+MAX_READ_BITS = 2000
+MAX_READ_WRITE_REGISTERS = 121  # registers written by one read/write multiple (FC23) request
+
+# Function codes
+FC_READ_COILS = 0x01
+FC_READ_DISCRETE_INPUTS = 0x02
+FC_READ_HOLDING_REGISTERS = 0x03
+FC_READ_INPUT_REGISTERS = 0x04
+FC_WRITE_MULTIPLE_REGISTERS = 0x10
+FC_MASK_WRITE_REGISTER = 0x16
+FC_READ_WRITE_MULTIPLE_REGISTERS = 0x17
+
+# Exception codes that mean "try again later" rather than "this will never work"
+EXC_ACKNOWLEDGE = 0x05
+EXC_SLAVE_BUSY = 0x06
+RETRYABLE_EXCEPTIONS = (EXC_ACKNOWLEDGE, EXC_SLAVE_BUSY)
+
+EXCEPTION_NAMES = {
+    0x01: "Illegal function",
+    0x02: "Illegal data address",
+    0x03: "Illegal data value",
+    0x04: "Slave device failure",
+    0x05: "Acknowledge",
+    0x06: "Slave device busy",
+    0x08: "Memory parity error",
+    0x0A: "Gateway path unavailable",
+    0x0B: "Gateway target device failed to respond",
+}
+
+MBAP_HEADER = struct.Struct(">HHHB")
+READ_REQUEST = struct.Struct(">BHH")
+WRITE_REQUEST = struct.Struct(">BHHB")
+MASK_WRITE_REQUEST = struct.Struct(">BHHH")
+READ_WRITE_REQUEST = struct.Struct(">BHHHHB")
+
+
+class DataTable(namedtuple('DataTable', 'key name item function_code max_read bits')):
+    """One of the four Modbus data tables and how it is read."""
+
+    __slots__ = ()
+
+    def __str__(self):
+        return self.name
+
+
+HOLDING_REGISTERS = DataTable('holding', "Holding Registers", "register", FC_READ_HOLDING_REGISTERS,
+                              MAX_READ_REGISTERS, False)
+INPUT_REGISTERS = DataTable('input', "Input Registers", "input register", FC_READ_INPUT_REGISTERS,
+                            MAX_READ_REGISTERS, False)
+COILS = DataTable('coils', "Coils", "coil", FC_READ_COILS, MAX_READ_BITS, True)
+DISCRETE_INPUTS = DataTable('discrete', "Discrete Inputs", "discrete input", FC_READ_DISCRETE_INPUTS,
+                            MAX_READ_BITS, True)
+TABLES = (HOLDING_REGISTERS, INPUT_REGISTERS, COILS, DISCRETE_INPUTS)
+
+
+def table_by_key(key):
+    """Return the DataTable whose key or name is key; raises ValueError otherwise."""
+    for table in TABLES:
+        if key in (table.key, table.name):
+            return table
+    raise ValueError(f"Unknown data table '{key}'")
+
+
+class PackedBits:
+    """
+    A sequence of bits stored eight to a byte, least significant bit first.
+
+    This is how coils and discrete inputs travel in Modbus responses, so
+    response payloads are kept as they arrive instead of as one Python
+    object per bit. Indexing and iteration yield 0 or 1.
+    """
+
+    __slots__ = ('data', 'length')
+
+    def __init__(self, data=b"", length=None):
+        if length is None:
+            length = len(data) * 8
+        self.data = bytearray(data[:(length + 7) // 8])
+        self.data.extend(bytes((length + 7) // 8 - len(self.data)))
+        self.length = length
+        if length % 8 and self.data:
+            self.data[-1] &= (1 << (length % 8)) - 1
+
+    @classmethod
+    def from_bits(cls, bits):
+        """Pack an iterable of truthy/falsy values."""
+        data = bytearray()
+        length = 0
+        for length, bit in enumerate(bits, 1):
+            if length % 8 == 1:
+                data.append(0)
+            if bit:
+                data[-1] |= 1 << ((length - 1) % 8)
+        return cls(data, length)
+
+    def extend(self, other):
+        """Append the bits of another PackedBits."""
+        if self.length % 8 == 0:
+            self.data += other.data
+            self.length += other.length
+        else:
+            for bit in other:
+                self.append(bit)
+
+    def append(self, bit):
+        """Append one bit."""
+        if self.length % 8 == 0:
+            self.data.append(0)
+        if bit:
+            self.data[-1] |= 1 << (self.length % 8)
+        self.length += 1
+
+    def tolist(self):
+        """Return the bits as a list of 0/1 ints."""
+        return list(self)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.length)
+            if step == 1 and start % 8 == 0:
+                return PackedBits(self.data[start // 8:(stop + 7) // 8], max(0, stop - start))
+            return PackedBits.from_bits(self[i] for i in range(start, stop, step))
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("bit index out of range")
+        return (self.data[index >> 3] >> (index & 7)) & 1
+
+    def __iter__(self):
+        data = self.data
+        for index in range(self.length):
+            yield (data[index >> 3] >> (index & 7)) & 1
+
+    def __eq__(self, other):
+        if isinstance(other, PackedBits):
+            return self.length == other.length and self.data == other.data
+        try:
+            return len(other) == self.length and all(bool(a) == bool(b) for a, b in zip(self, other))
+        except TypeError:
+            return NotImplemented
+
+    def __repr__(self):
+        return f"PackedBits('{''.join(str(bit) for bit in self)}')"
+
+
+def join_values(table, parts):
+    """Concatenate per-chunk values: a PackedBits for bit tables, a list of ints for registers."""
+    if table.bits:
+        joined = PackedBits()
+        for part in parts:
+            joined.extend(part)
+        return joined
+    joined = []
+    for part in parts:
+        joined.extend(part)
+    return joined
+
+
+class ModbusError(Exception):
+    """Base class for errors raised by this module."""
+
+
+class ModbusResponseError(ModbusError):
+    """The device answered with a Modbus exception response."""
+
+    def __init__(self, function_code, exception_code, address=None):
+        self.function_code = function_code
+        self.exception_code = exception_code
+        self.address = address
+        name = EXCEPTION_NAMES.get(exception_code, "Unknown exception")
+        where = f" at address {address}" if address is not None else ""
+        super().__init__(
+            f"Exception response {exception_code} ({name}) to function code "
+            f"{function_code}{where}"
+        )
+
+
+class ModbusIOError(ModbusError):
+    """The request could not be completed on the wire (timeout, closed socket, bad frame)."""
+
+
+def response_error(response, function_code, address=None):
+    """Turn a pymodbus error response into a ModbusError."""
+    code = getattr(response, 'exception_code', None)
+    if code is None:
+        return ModbusIOError(str(response))
+    return ModbusResponseError(function_code, code, address)
+
+
+def parse_register_values(text):
+    """
+    Parse comma or whitespace separated uint16 values; 0x-prefixed hex is allowed.
+
+    Raises ValueError with a message suitable for the user.
+    """
+    tokens = [token for token in text.replace(",", " ").split() if token]
+    if not tokens:
+        raise ValueError("Please enter a valid value")
+    try:
+        values = [int(token, 0) for token in tokens]
+    except ValueError:
+        raise ValueError("Values must be integers (decimal or 0x-prefixed hex)") from None
+    for value in values:
+        if value < 0 or value > 65535:
+            raise ValueError("Values must be between 0 and 65535 (uint16)")
+    return values
+
+
+def bit_masks(set_bits=(), clear_bits=()):
+    """
+    Return (and_mask, or_mask) for a mask write that sets and clears bits and keeps the others.
+
+    Bits are numbered 0 (least significant) to 15. Raises ValueError.
+    """
+    and_mask, or_mask = 0xFFFF, 0
+    for bit in (*set_bits, *clear_bits):
+        if not 0 <= bit <= 15:
+            raise ValueError("Bit numbers must be between 0 and 15")
+    for bit in set_bits:
+        and_mask &= ~(1 << bit)
+        or_mask |= 1 << bit
+    for bit in clear_bits:
+        if or_mask & (1 << bit):
+            raise ValueError(f"Bit {bit} cannot be both set and cleared")
+        and_mask &= ~(1 << bit)
+    return and_mask & 0xFFFF, or_mask
+
+
+def apply_mask(value, and_mask, or_mask):
+    """The register value a mask write (FC22) leaves behind: (value AND and_mask) OR (or_mask AND NOT and_mask)."""
+    return (value & and_mask) | (or_mask & ~and_mask & 0xFFFF)
+
+
+def compare_registers(address, expected, observed):
+    """
+    Return (address, expected, observed) for every register that differs.
+
+    Missing read-back values are reported with observed set to None.
+    """
+    mismatches = []
+    for index, value in enumerate(expected):
+        actual = observed[index] if index < len(observed) else None
+        if actual != value:
+            mismatches.append((address + index, value, actual))
+    return mismatches
+
+
+def iter_chunks(address, count, chunk_size=MAX_READ_REGISTERS):
+    """Yield (address, count) pairs covering a range in protocol-legal pieces."""
+    for offset in range(0, count, chunk_size):
+        yield address + offset, min(chunk_size, count - offset)
+
+
+class AdaptivePacer:
+    """
+    Decide how hard to push a device from how it has been responding.
+
+    Round-trip times are smoothed the same way TCP smooths its RTT estimate.
+    After every clean response the number of requests allowed in flight grows
+    by one and any inter-request delay is halved; a busy/acknowledge exception
+    halves the window and introduces a delay of at least one round trip.
+    Fast devices therefore run flat out while slow ones throttle the reader
+    down to the rate they can sustain.
+    """
+
+    def __init__(self, max_in_flight=4, max_delay=1.0):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_delay = max_delay
+        self.window = 1
+        self.delay = 0.0
+        self.srtt = None
+        self.rttvar = None
+
+    def on_success(self, rtt):
+        """Record a successful round trip."""
+        if self.srtt is None:
+            self.srtt, self.rttvar = rtt, rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+        self.window = min(self.max_in_flight, self.window + 1)
+        self.delay = self.delay / 2 if self.delay > 0.001 else 0.0
+
+    def on_busy(self):
+        """Record that the device asked us to slow down."""
+        self.window = max(1, self.window // 2)
+        base = self.srtt if self.srtt is not None else 0.01
+        self.delay = min(self.max_delay, max(self.delay * 2, base))
+
+    def wait(self):
+        """Sleep for the current inter-request delay, if any."""
+        if self.delay > 0:
+            time.sleep(self.delay)
+
+
+class RetryPolicy:
+    """
+    How reads recover from timeouts and lost connections.
+
+    A request times out after srtt + rtt_factor * rttvar of the pacer (the TCP
+    retransmission timeout), doubled on every retry, never less than
+    min_timeout and never more than the configured timeout, which is also used
+    until the first round trip has been measured. A read whose chunks time
+    out or whose connection drops is retried up to retries times, sending
+    only the chunks that are still missing, after a backoff that doubles from
+    backoff_initial to backoff_max with random jitter so that many clients
+    do not hammer a recovering gateway in step. Exception responses are
+    answers, not failures, and are not retried (busy/acknowledge excepted,
+    see _Pipeline). Writes are never retried.
+
+    reconnect enables reconnecting in the background after the connection
+    is lost (ModbusEngine), with the same backoff capped at reconnect_max.
+    """
+
+    def __init__(self, retries=2, backoff_initial=0.1, backoff_max=2.0, min_timeout=0.2, rtt_factor=4,
+                 reconnect=True, reconnect_max=30.0):
+        self.retries = max(0, retries)
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.min_timeout = min_timeout
+        self.rtt_factor = rtt_factor
+        self.reconnect = reconnect
+        self.reconnect_max = reconnect_max
+
+    def request_timeout(self, pacer, timeout, attempt=0):
+        """Response timeout for attempt (0 = first try) given the pacer's RTT estimate and the configured timeout."""
+        if pacer.srtt is None:
+            return timeout
+        estimate = max(self.min_timeout, pacer.srtt + self.rtt_factor * pacer.rttvar) * 2 ** attempt
+        return min(timeout, estimate)
+
+    def backoff(self, attempt, maximum=None):
+        """Seconds to wait before retry number attempt (1 = first retry): half fixed, half random."""
+        base = min(maximum or self.backoff_max, self.backoff_initial * 2 ** (attempt - 1))
+        return base / 2 + random.uniform(0, base / 2)
+
+
+DEFAULT_POLICY = RetryPolicy()
+
+
+def is_transient(error):
+    """True if error means the request may succeed when sent again: a timeout or a connection problem."""
+    if isinstance(error, ModbusResponseError):
+        return False
+    # pymodbus' own timeout and connection errors, checked by name so pymodbus is not imported here
+    return isinstance(error, (ModbusIOError, OSError, TimeoutError)) or type(error).__name__ in (
+        'ModbusIOException', 'ConnectionException', 'TimeoutError',
+    )
+
+
+def _socket_of(client):
+    """Return the raw TCP socket of a connected pymodbus client using MBAP framing."""
+    sock = getattr(client, 'socket', None)
+    framer = getattr(client, 'framer', None)
+    if not isinstance(sock, socket.socket):
+        return None
+    if framer is None or type(framer).__name__ != 'ModbusSocketFramer':
+        return None
+    return sock
+
+
+def _client_timeout(client, default=3.0):
+    """Return the response timeout configured on a pymodbus client."""
+    params = getattr(client, 'comm_params', None)
+    return getattr(params, 'timeout_connect', None) or default
+
+
+def _frame_overhead(client):
+    """Bytes a pymodbus client's framing adds to each PDU: MBAP header, or RTU address and CRC."""
+    overhead = getattr(client, 'frame_overhead', None)
+    if overhead is not None:
+        return overhead
+    framer = getattr(client, 'framer', None)
+    return MBAP_HEADER.size if framer is None or type(framer).__name__ == 'ModbusSocketFramer' else 3
+
+
+def _chunk_size(client, table, timeout, write=False):
+    """Default entries per request: sized by the client's transport (see transports), else the protocol maximum."""
+    transport = getattr(client, 'transport', None)
+    if transport is not None:
+        return transport.chunk_size(table, timeout, write)
+    return MAX_WRITE_REGISTERS if write else table.max_read
+
+
+def _timed_call(metrics, device, overhead, function_code, request_size, send, retrying=False):
+    """
+    Call send() (one request through a pymodbus client) and record it in metrics.
+
+    request_size is the PDU size of the request. retrying(response) tells
+    whether an exception response is going to be retried. Returns the
+    response and its round-trip time.
+    """
+    metrics.sent(device, function_code, overhead + request_size)
+    started = time.perf_counter()
+    try:
+        response = send()
+    except Exception as e:
+        # pymodbus raises ModbusIOException when no response arrives in time, RTU clients TimeoutError
+        if type(e).__name__ == 'ModbusIOException' or isinstance(e, TimeoutError):
+            metrics.timed_out(device, function_code)
+        else:
+            metrics.failed(device, function_code)
+        raise
+    rtt = time.perf_counter() - started
+    error = response.isError()
+    if error and getattr(response, 'exception_code', None) is None:
+        # Without retries pymodbus returns its ModbusIOException instead of raising it
+        metrics.timed_out(device, function_code)
+        return response, rtt
+    try:
+        size = overhead + 1 + len(response.encode())
+    except Exception:
+        size = overhead + 2
+    metrics.received(
+        device, function_code, rtt, size,
+        exception_code=getattr(response, 'exception_code', None) if error else None,
+        retried=bool(error and retrying and retrying(response)),
+    )
+    return response, rtt
+
+
+class _Pipeline:
+    """
+    Send a batch of request PDUs over one Modbus TCP socket, several at a time.
+
+    Requests are matched to responses by MBAP transaction ID. The
+    AdaptivePacer decides how many may be outstanding and whether to wait
+    between them; busy/acknowledge exceptions are retried.
+    """
+
+    max_busy_retries = 8
+
+    def __init__(self, client, unit_id, pacer=None, metrics=None, policy=None):
+        self.client = client
+        self.unit_id = unit_id
+        self.pacer = pacer or AdaptivePacer()
+        self.metrics = metrics if metrics is not None else METRICS
+        self.policy = policy or DEFAULT_POLICY
+        self.timeout = _client_timeout(client)
+        self.device = client_device(client, unit_id)
+        self._tids = itertools.cycle(range(1, 0x10000))
+
+    def _socket(self):
+        """Return the socket to pipeline on, or None to fall back to one request at a time."""
+        if self.pacer.max_in_flight <= 1:
+            return None
+        return _socket_of(self.client)
+
+    def _retrying(self, attempt_fn):
+        """
+        Call attempt_fn(attempt) until it succeeds, retrying transient errors as self.policy allows.
+
+        attempt_fn must keep what it has already read, so that each retry
+        only asks for what is still missing. Between attempts the client is
+        reconnected if it lost its connection.
+        """
+        attempt = 0
+        while True:
+            try:
+                return attempt_fn(attempt)
+            except Exception as e:
+                if not is_transient(e) or attempt >= self.policy.retries:
+                    raise
+            attempt += 1
+            time.sleep(self.policy.backoff(attempt))
+            if not self.client.is_socket_open():
+                self.client.connect()
+
+    def _transact(self, sock, requests, results=None, timeout=None):
+        """
+        Send (key, address, pdu) requests and return {key: response PDU}.
+
+        Responses are stored in results as they arrive, so a caller can see
+        which requests completed when this raises. timeout defaults to the
+        client's full timeout. Exception responses other than
+        busy/acknowledge raise ModbusResponseError.
+        """
+        pending = deque((request, 0) for request in requests)
+        in_flight = {}
+        results = {} if results is None else results
+        buffer = bytearray()
+        timeout = timeout or self.timeout
+        metrics, device = self.metrics, self.device
+
+        try:
+            sock.setblocking(True)
+            sock.settimeout(timeout)
+            while pending or in_flight:
+                while pending and len(in_flight) < self.pacer.window:
+                    if in_flight and self.pacer.delay > 0:
+                        break
+                    request, busy_retries = pending.popleft()
+                    tid = next(self._tids)
+                    pdu = request[2]
+                    sock.sendall(MBAP_HEADER.pack(tid, 0, len(pdu) + 1, self.unit_id) + pdu)
+                    metrics.sent(device, pdu[0], MBAP_HEADER.size + len(pdu))
+                    in_flight[tid] = (request, busy_retries, time.perf_counter())
+
+                data = sock.recv(4096)
+                if not data:
+                    raise ModbusIOError("Connection closed by the device")
+                buffer += data
+
+                for tid, response in self._take_frames(buffer):
+                    entry = in_flight.pop(tid, None)
+                    if entry is None:
+                        continue  # Stale answer to a request we no longer track
+                    request, busy_retries, sent_at = entry
+                    rtt = time.perf_counter() - sent_at
+                    function_code = request[2][0]
+
+                    if response[0] & 0x80:
+                        code = response[1] if len(response) > 1 else 0
+                        retry = code in RETRYABLE_EXCEPTIONS and busy_retries < self.max_busy_retries
+                        metrics.received(device, function_code, rtt, MBAP_HEADER.size + len(response),
+                                         exception_code=code, retried=retry)
+                        if retry:
+                            self.pacer.on_busy()
+                            pending.appendleft((request, busy_retries + 1))
+                            continue
+                        raise ModbusResponseError(response[0] & 0x7F, code, request[1])
+
+                    metrics.received(device, function_code, rtt, MBAP_HEADER.size + len(response))
+                    results[request[0]] = response
+                    self.pacer.on_success(rtt)
+
+                if not in_flight:
+                    self.pacer.wait()
+        except socket.timeout:
+            self._record_lost(in_flight, metrics.timed_out)
+            self.client.close()
+            raise ModbusIOError(f"No response received within {timeout} s") from None
+        except OSError as e:
+            self._record_lost(in_flight, metrics.failed)
+            self.client.close()
+            raise ModbusIOError(f"Socket error: {e}") from e
+        except ModbusError as e:
+            if isinstance(e, ModbusIOError):
+                self._record_lost(in_flight, metrics.failed)
+            # Responses to the remaining requests would desynchronise the next
+            # transaction, so drop the connection and let pymodbus reconnect.
+            if in_flight:
+                self.client.close()
+            raise
+        return results
+
+    def _record_lost(self, in_flight, record):
+        """Record the requests still in flight with metrics.timed_out or metrics.failed."""
+        counts = {}
+        for request, _, _ in in_flight.values():
+            counts[request[2][0]] = counts.get(request[2][0], 0) + 1
+        for function_code, count in counts.items():
+            record(self.device, function_code, count)
+
+    def _retry_busy(self, address, function_code, request_size, send):
+        """Call send() until the device stops answering busy; return the response."""
+        busy_retries = 0
+        overhead = _frame_overhead(self.client)
+
+        def retrying(response):
+            return (getattr(response, 'exception_code', None) in RETRYABLE_EXCEPTIONS
+                    and busy_retries < self.max_busy_retries)
+
+        while True:
+            response, rtt = _timed_call(self.metrics, self.device, overhead, function_code, request_size, send,
+                                        retrying)
+            if not response.isError():
+                self.pacer.on_success(rtt)
+                return response
+            if retrying(response):
+                busy_retries += 1
+                self.pacer.on_busy()
+                self.pacer.wait()
+                continue
+            raise response_error(response, function_code, address)
+
+    @staticmethod
+    def _take_frames(buffer):
+        """Remove complete MBAP frames from buffer and yield (transaction id, PDU)."""
+        while len(buffer) >= MBAP_HEADER.size:
+            tid, protocol, length, _unit = MBAP_HEADER.unpack_from(buffer)
+            if protocol != 0 or length < 2:
+                raise ModbusIOError("Malformed MBAP header received")
+            end = 6 + length
+            if len(buffer) < end:
+                return
+            pdu = bytes(buffer[MBAP_HEADER.size:end])
+            del buffer[:end]
+            yield tid, pdu
+
+
+class ChunkedReader(_Pipeline):
+    """
+    Read ranges of any size from one data table as a series of chunks.
+
+    Ranges are split into requests of up to 125 registers or 2000 bits, or
+    whatever the client's transport sizes for its line (transports). When
+    the client is a Modbus TCP client several chunks are sent back-to-back on
+    its socket and the responses are matched by transaction ID; otherwise
+    chunks are read one at a time through the client. In both cases the
+    AdaptivePacer decides how many requests may be outstanding and whether to
+    wait between them, and chunks lost to a timeout or a dropped connection
+    are read again on their own as the RetryPolicy allows. Register tables
+    return lists of ints, bit tables PackedBits.
+    """
+
+    client_methods = {
+        FC_READ_COILS: 'read_coils',
+        FC_READ_DISCRETE_INPUTS: 'read_discrete_inputs',
+        FC_READ_HOLDING_REGISTERS: 'read_holding_registers',
+        FC_READ_INPUT_REGISTERS: 'read_input_registers',
+    }
+
+    def __init__(self, client, unit_id, chunk_size=None, pacer=None, table=HOLDING_REGISTERS, metrics=None,
+                 policy=None):
+        super().__init__(client, unit_id, pacer, metrics, policy)
+        self.table = table
+        self.chunk_size = max(1, min(chunk_size or _chunk_size(client, table, self.timeout), table.max_read))
+
+    def read(self, address, count):
+        """Read count entries starting at address."""
+        if count <= 0:
+            return join_values(self.table, [])
+        chunks = list(iter_chunks(address, count, self.chunk_size))
+        results = self._read_chunks(chunks)
+        return join_values(self.table, (results[chunk] for chunk in chunks))
+
+    def read_blocks(self, blocks):
+        """
+        Read several (address, count) blocks as one pipelined batch.
+
+        Returns the values of each block, in the order given.
+        """
+        chunks = []
+        for address, count in blocks:
+            chunks.extend(iter_chunks(address, count, self.chunk_size))
+        results = self._read_chunks(chunks)
+        return [
+            join_values(self.table, (results[chunk] for chunk in iter_chunks(address, count, self.chunk_size)))
+            for address, count in blocks
+        ]
+
+    def _read_chunks(self, chunks):
+        """Read (address, count) chunks and return {chunk: values}, retrying failed chunks on their own."""
+        function_code = self.table.function_code
+        values = {}
+        responses = {}
+
+        def attempt(number):
+            sock = self._socket()
+            if sock is None:
+                for chunk in chunks:
+                    if chunk not in values:
+                        values[chunk] = self._read_one(*chunk, attempt=number)
+                return
+            self._transact(sock, [
+                (chunk, chunk[0], READ_REQUEST.pack(function_code, *chunk))
+                for chunk in chunks if chunk not in responses and chunk not in values
+            ], responses, self.policy.request_timeout(self.pacer, self.timeout, number))
+
+        self._retrying(attempt)
+        results = values
+        for chunk_address, chunk_count in chunks:
+            if (chunk_address, chunk_count) in values:
+                continue
+            pdu = responses[(chunk_address, chunk_count)]
+            byte_count = pdu[1] if len(pdu) > 1 else 0
+            needed = (chunk_count + 7) // 8 if self.table.bits else chunk_count * 2
+            if byte_count < needed or len(pdu) < 2 + byte_count:
+                raise ModbusIOError(
+                    f"Short response at address {chunk_address}: expected {needed} bytes, "
+                    f"got {max(0, min(byte_count, len(pdu) - 2))}"
+                )
+            if self.table.bits:
+                results[(chunk_address, chunk_count)] = PackedBits(pdu[2:2 + needed], chunk_count)
+            else:
+                results[(chunk_address, chunk_count)] = struct.unpack_from(f">{chunk_count}H", pdu, 2)
+        return results
+
+    def _read_one(self, chunk_address, chunk_count, attempt=0):
+        """Read one chunk through the pymodbus client."""
+        method = getattr(self.client, self.client_methods[self.table.function_code])
+        # pymodbus reads its response timeout from comm_params on every receive
+        params = getattr(self.client, 'comm_params', None)
+        if params is not None:
+            params.timeout_connect = self.policy.request_timeout(self.pacer, self.timeout, attempt)
+        try:
+            response = self._retry_busy(
+                chunk_address, self.table.function_code, READ_REQUEST.size,
+                lambda: method(address=chunk_address, count=chunk_count, slave=self.unit_id)
+            )
+        finally:
+            if params is not None:
+                params.timeout_connect = self.timeout
+        values = response.bits if self.table.bits else response.registers
+        if len(values) < chunk_count:
+            raise ModbusIOError(
+                f"Short response at address {chunk_address}: "
+                f"expected {chunk_count} values, got {len(values)}"
+            )
+        self.pacer.wait()
+        if self.table.bits:
+            # The packed payload (after its byte count), not one Python bool per bit
+            return PackedBits(response.encode()[1:], chunk_count)
+        return values[:chunk_count]
+
+
+class ChunkedWriter(_Pipeline):
+    """
+    Write register blocks of any size as a series of protocol-legal requests.
+
+    Blocks are split into write-multiple requests of up to 123 registers,
+    pipelined on the socket like ChunkedReader's reads.
+    """
+
+    def __init__(self, client, unit_id, chunk_size=None, pacer=None, metrics=None, policy=None):
+        super().__init__(client, unit_id, pacer, metrics, policy)
+        chunk_size = chunk_size or _chunk_size(client, HOLDING_REGISTERS, self.timeout, write=True)
+        self.chunk_size = max(1, min(chunk_size, MAX_WRITE_REGISTERS))
+
+    def write_blocks(self, blocks):
+        """Write (address, values) blocks; returns the number of requests sent."""
+        chunks = []
+        for address, values in blocks:
+            for offset in range(0, len(values), self.chunk_size):
+                chunks.append((address + offset, tuple(values[offset:offset + self.chunk_size])))
+
+        sock = self._socket()
+        if sock is None:
+            for chunk_address, chunk_values in chunks:
+                self._retry_busy(
+                    chunk_address, FC_WRITE_MULTIPLE_REGISTERS, WRITE_REQUEST.size + 2 * len(chunk_values),
+                    lambda: self.client.write_registers(address=chunk_address, values=list(chunk_values),
+                                                        slave=self.unit_id)
+                )
+                self.pacer.wait()
+            return len(chunks)
+
+        self._transact(sock, [
+            (index, chunk_address, WRITE_REQUEST.pack(
+                FC_WRITE_MULTIPLE_REGISTERS, chunk_address, len(chunk_values), 2 * len(chunk_values)
+            ) + struct.pack(f">{len(chunk_values)}H", *chunk_values))
+            for index, (chunk_address, chunk_values) in enumerate(chunks)
+        ])
+        return len(chunks)
+
+
+def write_registers(client, address, values, unit_id):
+    """Write up to 123 values to consecutive holding registers with a synchronous client."""
+    if not values or len(values) > MAX_WRITE_REGISTERS:
+        raise ValueError(f"Between 1 and {MAX_WRITE_REGISTERS} values can be written at once")
+    response, _ = _timed_call(
+        METRICS, client_device(client, unit_id), _frame_overhead(client), FC_WRITE_MULTIPLE_REGISTERS,
+        WRITE_REQUEST.size + 2 * len(values),
+        lambda: client.write_registers(address=address, values=list(values), slave=unit_id)
+    )
+    if response.isError():
+        raise response_error(response, FC_WRITE_MULTIPLE_REGISTERS, address)
+
+
+def read_write_registers(client, write_address, values, unit_id, read_address=None, read_count=None):
+    """
+    Write values and read registers back in one read/write multiple registers (FC23) transaction.
+
+    The device performs the write before the read, so by default (the
+    written range) this is a write and its verification in one round trip.
+    Returns the values read.
+    """
+    if not values or len(values) > MAX_READ_WRITE_REGISTERS:
+        raise ValueError(f"Between 1 and {MAX_READ_WRITE_REGISTERS} values can be written at once with FC23")
+    read_address = write_address if read_address is None else read_address
+    read_count = len(values) if read_count is None else read_count
+    if not 1 <= read_count <= MAX_READ_REGISTERS:
+        raise ValueError(f"Between 1 and {MAX_READ_REGISTERS} registers can be read at once")
+    response, _ = _timed_call(
+        METRICS, client_device(client, unit_id), _frame_overhead(client), FC_READ_WRITE_MULTIPLE_REGISTERS,
+        READ_WRITE_REQUEST.size + 2 * len(values),
+        lambda: client.readwrite_registers(read_address=read_address, read_count=read_count,
+                                           write_address=write_address, values=list(values), slave=unit_id)
+    )
+    if response.isError():
+        raise response_error(response, FC_READ_WRITE_MULTIPLE_REGISTERS, write_address)
+    if len(response.registers) < read_count:
+        raise ModbusIOError(f"Short response: expected {read_count} registers, got {len(response.registers)}")
+    return list(response.registers[:read_count])
+
+
+def mask_write_register(client, address, and_mask, or_mask, unit_id):
+    """Change bits of one holding register in place with a mask write (FC22); see bit_masks()."""
+    response, _ = _timed_call(
+        METRICS, client_device(client, unit_id), _frame_overhead(client), FC_MASK_WRITE_REGISTER,
+        MASK_WRITE_REQUEST.size,
+        lambda: client.mask_write_register(address=address, and_mask=and_mask, or_mask=or_mask, slave=unit_id)
+    )
+    if response.isError():
+        raise response_error(response, FC_MASK_WRITE_REGISTER, address)
+
+
+def write_and_verify(client, address, values, unit_id, verify_delay=0.2, pacer=None, single_transaction=False):
+    """
+    Write values, wait verify_delay seconds, read them back and compare.
+
+    With single_transaction the write and the read-back are one FC23
+    request instead (no delay, one round trip), for devices that support it.
+    Returns the list of mismatches from compare_registers (empty on success).
+    """
+    if single_transaction:
+        return compare_registers(address, values, read_write_registers(client, address, values, unit_id))
+    write_registers(client, address, values, unit_id)
+    if verify_delay > 0:
+        time.sleep(verify_delay)
+    read_back = ChunkedReader(client, unit_id, pacer=pacer).read(address, len(values))
+    return compare_registers(address, values, read_back)
@@ -4,15 +4,112 @@ Cross-platform Modbus TCP Master GUI
 A graphical tool to read and write Modbus TCP holding registers.
 """
 
+import sys
+
+if __name__ == '__main__' and sys.argv[1:2] == ['--cli']:
+    # Headless mode: hand over before tkinter and pymodbus are imported
+    from modbus_cli import main as cli_main
+    sys.exit(cli_main(sys.argv[2:]))
+
 import tkinter as tk
-from tkinter import ttk, scrolledtext, messagebox
+from tkinter import ttk, scrolledtext, messagebox, filedialog
 import threading
+import queue
 import time
 import json
 import os
+import datetime
 from pathlib import Path
-from pymodbus.client import ModbusTcpClient
 from pymodbus.exceptions import ModbusException
+from modbus_core import (
+    ModbusError, ModbusResponseError, RetryPolicy, HOLDING_REGISTERS, MAX_READ_REGISTERS, MAX_READ_WRITE_REGISTERS,
+    MAX_WRITE_REGISTERS, TABLES, compare_registers, is_transient, parse_register_values, table_by_key,
+)
+from async_engine import CONNECTED, RECONNECTING, ModbusEngine
+from poller import GroupPoller, Poller, ScheduledGroup, MIN_POLL_PERIOD
+from log_buffer import LogBuffer, DEFAULT_MAX_LINES, DEFAULT_MAX_CHARS
+from connection_pool import ConnectionPool, parse_targets, scan
+from read_planner import parse_address_list, plan_reads
+from bulk_write import compare_image, diff_ranges, load_register_image, verify_plan
+from data_logger import (
+    DataRecorder, EXTENSION as RECORDING_EXTENSION, export_csv, export_parquet, sort_recordings,
+)
+from tag_decoder import format_value
+from device_profile import load_profile, read_groups
+from change_detection import DeadbandFilter, RegisterSnapshot
+from metrics import METRICS, DEFAULT_METRICS_PORT, MetricsServer
+from register_pages import ADDRESS_SPACE, PageCache, PendingWrites
+from write_sequence import parse_sequence, summarize
+from snapshot import (
+    EXTENSION as SNAPSHOT_EXTENSION, Snapshot, capture_snapshot, count_differences, diff_snapshots, full_ranges,
+    restore_segments,
+)
+from events import EVENTS, ConnectionLost, ErrorWindow, OperationFailed, Reconnected, RequestFailed
+from modbus_proxy import DEFAULT_LISTEN_PORT, DEFAULT_TTL, ModbusProxy, RegisterCache
+from rtu_framing import DEFAULT_BAUDRATE
+from transports import SerialLine, make_transport, TRANSPORT_KINDS, TRANSPORT_NAMES
+
+# Interval at which results from background workers are pushed to the widgets
+UI_REFRESH_MS = 16
+
+# Time given to the device to apply a write before it is read back
+VERIFY_DELAY_MS = 200
+
+# Largest read shown in the Registers tab; bit tables are shown BITS_PER_ROW to a row
+MAX_DISPLAY_ROWS = 1000
+BITS_PER_ROW = 16
+
+# Interval at which the Stats tab is refreshed while it is visible
+STATS_REFRESH_MS = 1000
+
+# Interval at which the status bar is redrawn, and the window its error counts cover (seconds)
+STATUS_REFRESH_MS = 500
+STATUS_WINDOW = 10.0
+
+# Register browser: addresses per row, how often it checks the connection and fetches missing pages,
+# and how long it waits after a failed read
+BROWSER_COLUMNS = 8
+BROWSER_TICK_MS = 200
+BROWSER_RETRY_S = 1.0
+BROWSER_FORMATS = ("Decimal", "Hex", "Signed")
+
+# Defaults of the connection resilience settings (config file keys in brackets)
+DEFAULT_TIMEOUT = 3.0          # longest response timeout, seconds (timeout_s)
+DEFAULT_READ_RETRIES = 2       # retries of a read after a timeout or lost connection (read_retries)
+DEFAULT_RECONNECT_MAX = 30.0   # longest wait between reconnect attempts, seconds (reconnect_max_s)
+
+
+def read_limit(table):
+    """Return the largest count that can be read and displayed from table at once."""
+    return MAX_DISPLAY_ROWS * (BITS_PER_ROW if table.bits else 1)
+
+
+def register_cells(address, value):
+    """Registers tab cells for one register value."""
+    return value, f"0x{value:04X}"
+
+
+def bit_cells(address, value):
+    """Registers tab cells for one bit value."""
+    return value, "ON" if value else "OFF"
+
+
+def bit_row_cells(row):
+    """Registers tab cells for a (word, width) row of bits, first address leftmost."""
+    word, width = row
+    bits = "".join("1" if word >> i & 1 else "0" for i in range(width))
+    return " ".join(bits[i:i + 4] for i in range(0, width, 4)), f"0x{word:04X}"
+
+
+def bit_rows(bits):
+    """Split PackedBits into (word, width) rows of BITS_PER_ROW bits."""
+    data = bits.data
+    rows = []
+    for offset in range(0, len(bits), BITS_PER_ROW):
+        index = offset // 8
+        word = data[index] | (data[index + 1] << 8 if index + 1 < len(data) else 0)
+        rows.append((word, min(BITS_PER_ROW, len(bits) - offset)))
+    return rows
 
 
 class ModbusGUI:
@@ -22,14 +119,39 @@ class ModbusGUI:
         """Initialize the GUI application."""
         self.root = root
         self.root.title("Modbus TCP Master")
-        self.root.geometry("800x600")
+        self.root.geometry("800x700")
         self.root.minsize(700, 500)
         
-        self.client = None
+        self.engine = None
         self.connected = False
+        self.poller = None
+        self.recorder = None
+        self.displayed_snapshot = None
+        self.displayed_key = None
+        self.profile = None
+        self.profile_file = None
+        self.tag_filters = []
+        self.group_poller = None
+        self.metrics_server = None
+        self.proxy = None
+        self.proxy_listen = f"127.0.0.1:{DEFAULT_LISTEN_PORT}"
+        self.proxy_ttl_s = DEFAULT_TTL
+        self.stats_refreshed = 0.0
+        self.link_state = None
+        self.timeout_s = DEFAULT_TIMEOUT
+        self.read_retries = DEFAULT_READ_RETRIES
+        self.auto_reconnect = True
+        self.reconnect_max_s = DEFAULT_RECONNECT_MAX
+        self.log_buffer = LogBuffer()
+        # Failures and connection changes from any thread, drained by _ui_pump into the status bar
+        self.events = queue.Queue()
+        self.error_window = ErrorWindow(STATUS_WINDOW)
+        self.status_refreshed = 0.0
+        EVENTS.subscribe(self.events.put, RequestFailed, OperationFailed, ConnectionLost, Reconnected)
         
         self.setup_ui()
         self.load_config()
+        self.root.after(UI_REFRESH_MS, self._ui_pump)
         
     @staticmethod
     def get_config_dir():
@@ -60,8 +182,28 @@ class ModbusGUI:
             'ip_address': self.ip_var.get(),
             'port': self.port_var.get(),
             'unit_id': self.unit_var.get(),
+            'transport': self.transport_kind(),
+            'serial_port': self.serial_port_var.get(),
+            'serial_line': self.serial_line_var.get(),
             'read_start_address': self.read_start_var.get(),
             'read_count': self.read_count_var.get(),
+            'read_table': self.table_var.get(),
+            'write_fc23': self.write_fc23_var.get(),
+            'poll_period_ms': self.poll_period_var.get(),
+            'watch_addresses': self.watch_addresses_var.get(),
+            'watch_unreadable': self.watch_unreadable_var.get(),
+            'watch_max_gap': self.watch_max_gap_var.get(),
+            'profile_file': self.profile_file,
+            'metrics_port': self.metrics_port_var.get(),
+            'metrics_serve': self.metrics_serve_var.get(),
+            'timeout_s': self.timeout_s,
+            'read_retries': self.read_retries,
+            'auto_reconnect': self.auto_reconnect,
+            'reconnect_max_s': self.reconnect_max_s,
+            'proxy_listen': self.proxy_listen,
+            'proxy_ttl_s': self.proxy_ttl_s,
+            'log_max_lines': self.log_buffer.max_lines,
+            'log_max_chars': self.log_buffer.max_chars,
         }
         
         try:
@@ -87,10 +229,43 @@ class ModbusGUI:
                     self.port_var.set(config['port'])
                 if 'unit_id' in config:
                     self.unit_var.set(config['unit_id'])
+                if config.get('transport') in TRANSPORT_KINDS:
+                    self.transport_var.set(TRANSPORT_NAMES[config['transport']])
+                if 'serial_port' in config:
+                    self.serial_port_var.set(config['serial_port'])
+                if 'serial_line' in config:
+                    self.serial_line_var.set(config['serial_line'])
                 if 'read_start_address' in config:
                     self.read_start_var.set(config['read_start_address'])
                 if 'read_count' in config:
                     self.read_count_var.set(config['read_count'])
+                if config.get('read_table') in [table.name for table in TABLES]:
+                    self.table_var.set(config['read_table'])
+                if 'write_fc23' in config:
+                    self.write_fc23_var.set(bool(config['write_fc23']))
+                if 'poll_period_ms' in config:
+                    self.poll_period_var.set(config['poll_period_ms'])
+                if 'watch_addresses' in config:
+                    self.watch_addresses_var.set(config['watch_addresses'])
+                if 'watch_unreadable' in config:
+                    self.watch_unreadable_var.set(config['watch_unreadable'])
+                if 'watch_max_gap' in config:
+                    self.watch_max_gap_var.set(config['watch_max_gap'])
+                if config.get('profile_file'):
+                    self.load_profile_file(config['profile_file'], apply_settings=False)
+                if 'metrics_port' in config:
+                    self.metrics_port_var.set(config['metrics_port'])
+                if config.get('metrics_serve'):
+                    self.metrics_serve_var.set(True)
+                    self.toggle_metrics_server()
+                self.timeout_s = max(0.1, float(config.get('timeout_s', DEFAULT_TIMEOUT)))
+                self.read_retries = max(0, int(config.get('read_retries', DEFAULT_READ_RETRIES)))
+                self.auto_reconnect = bool(config.get('auto_reconnect', True))
+                self.reconnect_max_s = max(0.1, float(config.get('reconnect_max_s', DEFAULT_RECONNECT_MAX)))
+                self.proxy_listen = str(config.get('proxy_listen', self.proxy_listen))
+                self.proxy_ttl_s = max(0.0, float(config.get('proxy_ttl_s', DEFAULT_TTL)))
+                self.log_buffer.max_lines = max(1, int(config.get('log_max_lines', DEFAULT_MAX_LINES)))
+                self.log_buffer.max_chars = max(1, int(config.get('log_max_chars', DEFAULT_MAX_CHARS)))
                 
                 self.log_message("Configuration loaded", "info")
         except Exception as e:
@@ -103,6 +278,24 @@ class ModbusGUI:
         menubar = tk.Menu(self.root)
         self.root.config(menu=menubar)
         
+        # Tools menu
+        tools_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Tools", menu=tools_menu)
+        tools_menu.add_command(label="Scan Devices...", command=lambda: ScanDialog(self))
+        tools_menu.add_command(label="Register Browser...", command=lambda: RegisterBrowser(self))
+        tools_menu.add_command(label="Write Sequence...", command=lambda: WriteSequenceDialog(self))
+        tools_menu.add_command(label="Export Recording...", command=self.export_recording)
+        tools_menu.add_command(label="Capture Snapshot...", command=self.capture_snapshot)
+        tools_menu.add_command(label="Compare with Snapshot...", command=self.compare_snapshot)
+        self.proxy_var = tk.BooleanVar(value=False)
+        tools_menu.add_checkbutton(label="Serve as Modbus TCP Proxy", variable=self.proxy_var,
+                                   command=self.toggle_proxy)
+        tools_menu.add_separator()
+        tools_menu.add_command(label="Open Profile...", command=self.choose_profile_file)
+        tools_menu.add_command(label="Read Tags", command=self.read_tags)
+        tools_menu.add_command(label="Start Group Polling", command=self.start_group_polling)
+        tools_menu.add_command(label="Stop Group Polling", command=self.stop_group_polling)
+        
         # Help menu
         help_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Help", menu=help_menu)
@@ -117,6 +310,12 @@ class ModbusGUI:
         self.root.rowconfigure(0, weight=1)
         main_frame.columnconfigure(1, weight=1)
         
+        # Status bar: failures are summarised here instead of in dialogs
+        self.status_bar_var = tk.StringVar(value="")
+        self.status_bar = ttk.Label(self.root, textvariable=self.status_bar_var, relief=tk.SUNKEN, anchor=tk.W,
+                                    padding=(5, 1))
+        self.status_bar.grid(row=1, column=0, sticky=(tk.W, tk.E))
+        
         # Connection Frame
         conn_frame = ttk.LabelFrame(main_frame, text="Connection Settings", padding="10")
         conn_frame.grid(row=0, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
@@ -152,6 +351,25 @@ class ModbusGUI:
         self.status_var = tk.StringVar(value="Disconnected")
         status_label = ttk.Label(conn_frame, textvariable=self.status_var, foreground="red")
         status_label.grid(row=0, column=7, sticky=tk.W)
+
+        # Transport: Modbus TCP, RTU frames through a TCP serial converter, or RTU on a serial port
+        ttk.Label(conn_frame, text="Transport:").grid(row=1, column=0, sticky=tk.W, padx=(0, 5), pady=(5, 0))
+        self.transport_var = tk.StringVar(value=TRANSPORT_NAMES['tcp'])
+        ttk.Combobox(
+            conn_frame, textvariable=self.transport_var, state="readonly", width=18,
+            values=[TRANSPORT_NAMES[kind] for kind in TRANSPORT_KINDS]
+        ).grid(row=1, column=1, sticky=tk.W, padx=(0, 10), pady=(5, 0))
+
+        ttk.Label(conn_frame, text="Serial Port:").grid(row=1, column=2, sticky=tk.W, padx=(0, 5), pady=(5, 0))
+        self.serial_port_var = tk.StringVar(value="")
+        ttk.Entry(conn_frame, textvariable=self.serial_port_var, width=14).grid(
+            row=1, column=3, sticky=tk.W, padx=(0, 10), pady=(5, 0))
+
+        # Baud rate and character format of the RTU line, e.g. "19200 8E1"
+        ttk.Label(conn_frame, text="Line:").grid(row=1, column=4, sticky=tk.W, padx=(0, 5), pady=(5, 0))
+        self.serial_line_var = tk.StringVar(value=f"{DEFAULT_BAUDRATE} 8N1")
+        ttk.Entry(conn_frame, textvariable=self.serial_line_var, width=10).grid(
+            row=1, column=5, sticky=tk.W, padx=(0, 10), pady=(5, 0))
         
         # Read Registers Frame
         read_frame = ttk.LabelFrame(main_frame, text="Read Registers", padding="10")
@@ -177,6 +395,32 @@ class ModbusGUI:
         self.read_btn = ttk.Button(read_frame, text="Read Registers", command=self.read_registers, state=tk.DISABLED)
         self.read_btn.grid(row=0, column=4, padx=(0, 0))
         
+        # Poll Period
+        ttk.Label(read_frame, text="Poll Period (ms):").grid(row=1, column=0, sticky=tk.W, padx=(0, 5), pady=(5, 0))
+        self.poll_period_var = tk.StringVar(value="500")
+        poll_period_entry = ttk.Entry(read_frame, textvariable=self.poll_period_var, width=15)
+        poll_period_entry.grid(row=1, column=1, sticky=(tk.W, tk.E), padx=(0, 10), pady=(5, 0))
+        
+        # Poll Status
+        self.poll_status_var = tk.StringVar(value="")
+        ttk.Label(read_frame, textvariable=self.poll_status_var).grid(row=1, column=2, columnspan=2, sticky=tk.W, pady=(5, 0))
+        
+        # Poll Button
+        self.poll_btn = ttk.Button(read_frame, text="Start Polling", command=self.toggle_polling, state=tk.DISABLED)
+        self.poll_btn.grid(row=1, column=4, padx=(0, 0), pady=(5, 0))
+        
+        # Record Button (only while polling)
+        self.record_btn = ttk.Button(read_frame, text="Record...", command=self.toggle_recording, state=tk.DISABLED)
+        self.record_btn.grid(row=1, column=5, padx=(5, 0), pady=(5, 0))
+        
+        # Data table used by reads, polling and the watch list
+        ttk.Label(read_frame, text="Table:").grid(row=2, column=0, sticky=tk.W, padx=(0, 5), pady=(5, 0))
+        self.table_var = tk.StringVar(value=HOLDING_REGISTERS.name)
+        ttk.Combobox(
+            read_frame, textvariable=self.table_var, values=[table.name for table in TABLES],
+            state="readonly", width=18
+        ).grid(row=2, column=1, sticky=tk.W, pady=(5, 0))
+        
         # Write Register Frame
         write_frame = ttk.LabelFrame(main_frame, text="Write Register", padding="10")
         write_frame.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
@@ -201,27 +445,168 @@ class ModbusGUI:
         self.write_btn = ttk.Button(write_frame, text="Write Register", command=self.write_register, state=tk.DISABLED)
         self.write_btn.grid(row=0, column=4, padx=(0, 0))
         
+        # Write Image Button (register image from a file; Address is the base for binary images)
+        self.image_btn = ttk.Button(write_frame, text="Write Image...", command=self.write_image, state=tk.DISABLED)
+        self.image_btn.grid(row=0, column=5, padx=(5, 0))
+        
+        # Write and read back in a single read/write multiple registers (FC23) request
+        self.write_fc23_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            write_frame, text="Verify in one transaction (FC23)", variable=self.write_fc23_var
+        ).grid(row=1, column=0, columnspan=4, sticky=tk.W, pady=(5, 0))
+        
+        # Watch List Frame
+        watch_frame = ttk.LabelFrame(main_frame, text="Watch List", padding="10")
+        watch_frame.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 10))
+        watch_frame.columnconfigure(1, weight=1)
+        watch_frame.columnconfigure(3, weight=1)
+        
+        # Addresses
+        ttk.Label(watch_frame, text="Addresses:").grid(row=0, column=0, sticky=tk.W, padx=(0, 5))
+        self.watch_addresses_var = tk.StringVar(value="0-9")
+        watch_entry = ttk.Entry(watch_frame, textvariable=self.watch_addresses_var, width=30)
+        watch_entry.grid(row=0, column=1, sticky=(tk.W, tk.E), padx=(0, 10))
+        watch_entry.bind('<Return>', lambda e: self.read_watch_list() if self.connected else None)
+        
+        # Unreadable addresses, never included in a read
+        ttk.Label(watch_frame, text="Unreadable:").grid(row=0, column=2, sticky=tk.W, padx=(0, 5))
+        self.watch_unreadable_var = tk.StringVar(value="")
+        ttk.Entry(watch_frame, textvariable=self.watch_unreadable_var, width=15).grid(
+            row=0, column=3, sticky=(tk.W, tk.E), padx=(0, 10)
+        )
+        
+        # Max Gap
+        ttk.Label(watch_frame, text="Max Gap:").grid(row=0, column=4, sticky=tk.W, padx=(0, 5))
+        self.watch_max_gap_var = tk.StringVar(value="auto")
+        ttk.Entry(watch_frame, textvariable=self.watch_max_gap_var, width=5).grid(
+            row=0, column=5, sticky=tk.W, padx=(0, 10)
+        )
+        
+        # Read Watch List Button
+        self.watch_btn = ttk.Button(watch_frame, text="Read Watch List", command=self.read_watch_list, state=tk.DISABLED)
+        self.watch_btn.grid(row=0, column=6, padx=(0, 0))
+        
         # Output Frame
         output_frame = ttk.LabelFrame(main_frame, text="Output", padding="10")
-        output_frame.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
+        output_frame.grid(row=4, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(0, 10))
         output_frame.columnconfigure(0, weight=1)
         output_frame.rowconfigure(0, weight=1)
-        main_frame.rowconfigure(3, weight=1)
+        main_frame.rowconfigure(4, weight=1)
+        
+        output_notebook = ttk.Notebook(output_frame)
+        output_notebook.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         
         # Output Text Area with scrollbar
-        self.output_text = scrolledtext.ScrolledText(output_frame, height=15, state=tk.DISABLED, wrap=tk.WORD)
+        log_tab = ttk.Frame(output_notebook)
+        log_tab.columnconfigure(0, weight=1)
+        log_tab.rowconfigure(0, weight=1)
+        output_notebook.add(log_tab, text="Log")
+        self.output_text = scrolledtext.ScrolledText(log_tab, height=15, state=tk.DISABLED, wrap=tk.WORD)
         self.output_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
         
-        # Clear Button
-        clear_btn = ttk.Button(output_frame, text="Clear Output", command=self.clear_output)
-        clear_btn.grid(row=1, column=0, sticky=tk.E, pady=(5, 0))
+        # Register table, one row per address, updated in place
+        registers_tab = ttk.Frame(output_notebook)
+        registers_tab.columnconfigure(0, weight=1)
+        registers_tab.rowconfigure(0, weight=1)
+        output_notebook.add(registers_tab, text="Registers")
+        self.register_tree = ttk.Treeview(
+            registers_tab, columns=("dec", "hex"), height=15, selectmode="browse"
+        )
+        self.register_tree.heading("#0", text="Address")
+        self.register_tree.heading("dec", text="Value (dec)")
+        self.register_tree.heading("hex", text="Value (hex)")
+        self.register_tree.column("#0", width=120, stretch=False)
+        self.register_tree.column("dec", width=150, anchor=tk.E)
+        self.register_tree.column("hex", width=150, anchor=tk.E)
+        self.register_tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        tree_scroll = ttk.Scrollbar(registers_tab, orient=tk.VERTICAL, command=self.register_tree.yview)
+        tree_scroll.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.register_tree.configure(yscrollcommand=tree_scroll.set)
+        
+        # Typed tags of the device profile (Tools > Open Profile...), decoded from every read that contains them
+        tags_tab = ttk.Frame(output_notebook)
+        tags_tab.columnconfigure(0, weight=1)
+        tags_tab.rowconfigure(0, weight=1)
+        output_notebook.add(tags_tab, text="Tags")
+        self.tag_tree = ttk.Treeview(
+            tags_tab, columns=("group", "address", "type", "value"), height=15, selectmode="browse"
+        )
+        self.tag_tree.heading("#0", text="Name")
+        self.tag_tree.heading("group", text="Group")
+        self.tag_tree.heading("address", text="Address")
+        self.tag_tree.heading("type", text="Type")
+        self.tag_tree.heading("value", text="Value")
+        self.tag_tree.column("#0", width=200, stretch=False)
+        self.tag_tree.column("group", width=80, stretch=False)
+        self.tag_tree.column("address", width=80, anchor=tk.E, stretch=False)
+        self.tag_tree.column("type", width=80, stretch=False)
+        self.tag_tree.column("value", width=200, anchor=tk.E)
+        self.tag_tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        tag_scroll = ttk.Scrollbar(tags_tab, orient=tk.VERTICAL, command=self.tag_tree.yview)
+        tag_scroll.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.tag_tree.configure(yscrollcommand=tag_scroll.set)
+        self.group_stats_var = tk.StringVar(value="")
+        ttk.Label(tags_tab, textvariable=self.group_stats_var, justify=tk.LEFT).grid(
+            row=1, column=0, columnspan=2, sticky=tk.W, pady=(5, 0)
+        )
         
-    def log_message(self, message, level="info"):
-        """Add a message to the output text area."""
-        self.output_text.config(state=tk.NORMAL)
+        # Request statistics per device and function code (see metrics.py)
+        stats_tab = ttk.Frame(output_notebook)
+        stats_tab.columnconfigure(0, weight=1)
+        stats_tab.rowconfigure(0, weight=1)
+        output_notebook.add(stats_tab, text="Stats")
+        stats_columns = {
+            "function": ("Function", 170, tk.W), "requests": ("Requests", 70, tk.E), "errors": ("Errors", 60, tk.E),
+            "retries": ("Retries", 60, tk.E), "timeouts": ("Timeouts", 65, tk.E), "p50": ("p50 ms", 65, tk.E),
+            "p95": ("p95 ms", 65, tk.E), "max": ("Max ms", 65, tk.E), "bytes": ("Bytes out/in", 110, tk.E),
+        }
+        self.stats_tree = ttk.Treeview(stats_tab, columns=tuple(stats_columns), height=15, selectmode="browse")
+        self.stats_tree.heading("#0", text="Device")
+        self.stats_tree.column("#0", width=150, stretch=False)
+        for column, (heading, width, anchor) in stats_columns.items():
+            self.stats_tree.heading(column, text=heading)
+            self.stats_tree.column(column, width=width, anchor=anchor, stretch=column == "function")
+        self.stats_tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        stats_scroll = ttk.Scrollbar(stats_tab, orient=tk.VERTICAL, command=self.stats_tree.yview)
+        stats_scroll.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.stats_tree.configure(yscrollcommand=stats_scroll.set)
+        self.queue_stats_var = tk.StringVar(value="")
+        ttk.Label(stats_tab, textvariable=self.queue_stats_var, justify=tk.LEFT).grid(
+            row=1, column=0, columnspan=2, sticky=tk.W, pady=(5, 0)
+        )
+        stats_controls = ttk.Frame(stats_tab)
+        stats_controls.grid(row=2, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(5, 0))
+        ttk.Button(stats_controls, text="Reset", command=self.reset_stats).grid(row=0, column=0, padx=(0, 5))
+        ttk.Button(stats_controls, text="Save JSON...", command=self.save_stats).grid(row=0, column=1, padx=(0, 15))
+        self.metrics_serve_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            stats_controls, text="Serve Prometheus metrics on 127.0.0.1 port", variable=self.metrics_serve_var,
+            command=self.toggle_metrics_server
+        ).grid(row=0, column=2)
+        self.metrics_port_var = tk.StringVar(value=str(DEFAULT_METRICS_PORT))
+        ttk.Entry(stats_controls, textvariable=self.metrics_port_var, width=7).grid(row=0, column=3, padx=(5, 0))
+        
+        self.output_notebook = output_notebook
+        self.registers_tab = registers_tab
+        self.tags_tab = tags_tab
+        self.stats_tab = stats_tab
         
+        # Log filter and Clear Button
+        log_controls = ttk.Frame(output_frame)
+        log_controls.grid(row=1, column=0, sticky=(tk.W, tk.E), pady=(5, 0))
+        log_controls.columnconfigure(1, weight=1)
+        ttk.Label(log_controls, text="Filter Log:").grid(row=0, column=0, sticky=tk.W, padx=(0, 5))
+        self.log_filter_var = tk.StringVar(value="")
+        log_filter_entry = ttk.Entry(log_controls, textvariable=self.log_filter_var, width=30)
+        log_filter_entry.grid(row=0, column=1, sticky=tk.W)
+        log_filter_entry.bind('<KeyRelease>', lambda e: self.apply_log_filter())
+        
+        clear_btn = ttk.Button(log_controls, text="Clear Output", command=self.clear_output)
+        clear_btn.grid(row=0, column=2, sticky=tk.E)
+        
+    def log_message(self, message, level="info"):
+        """Queue a message for the output text area (safe to call from any thread)."""
         # Add timestamp and format message
-        import datetime
         timestamp = datetime.datetime.now().strftime("%H:%M:%S")
         
         if level == "success":
@@ -234,12 +619,82 @@ class ModbusGUI:
             prefix = ""
         
         formatted_message = f"[{timestamp}] {prefix} {message}\n"
-        self.output_text.insert(tk.END, formatted_message)
+        self.log_buffer.append(formatted_message, level)
+    
+    def _ui_pump(self):
+        """Deliver background results to the widgets; runs once per UI frame."""
+        if self.engine:
+            self.engine.pump()
+        if self.poller is not None:
+            self._apply_poll_result()
+        if self.group_poller is not None:
+            self._apply_group_results()
+        self._apply_events()
+        now = time.monotonic()
+        if now - self.status_refreshed >= STATUS_REFRESH_MS / 1000:
+            self.status_refreshed = now
+            self.refresh_status_bar()
+        if now - self.stats_refreshed >= STATS_REFRESH_MS / 1000:
+            self.stats_refreshed = now
+            if self.output_notebook.select() == str(self.stats_tab):
+                self.refresh_stats()
+        self._flush_log()
+        self.root.after(UI_REFRESH_MS, self._ui_pump)
+    
+    def _apply_events(self):
+        """Count queued failure events and follow connection changes of the current engine."""
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                return
+            if isinstance(event, (ConnectionLost, Reconnected)):
+                engine = self.engine
+                if self.connected and engine is not None and event.connection == engine.name \
+                        and engine.state != self.link_state:
+                    self._apply_link_state()
+                    self.refresh_status_bar()
+            else:
+                self.error_window.add_event(event)
+    
+    def refresh_status_bar(self):
+        """Show the failures of the last STATUS_WINDOW seconds, or the connection state if there were none."""
+        summary = self.error_window.summary()
+        if summary:
+            last = self.error_window.last_message
+            recent = last is not None and time.monotonic() - self.error_window.last_time < STATUS_WINDOW
+            self.status_bar_var.set(f"{summary}" + (f" | last: {last}" if recent else ""))
+            self.status_bar.configure(foreground="red")
+        elif self.link_state == RECONNECTING and self.engine is not None:
+            self.status_bar_var.set(f"Connection to {self.engine.name} lost, reconnecting...")
+            self.status_bar.configure(foreground="orange")
+        else:
+            self.status_bar_var.set("")
+    
+    def _flush_log(self):
+        """Mirror new log entries into the output widget."""
+        new_entries, evicted_lines = self.log_buffer.drain()
+        if new_entries or evicted_lines:
+            self.output_text.config(state=tk.NORMAL)
+            if new_entries:
+                self.output_text.insert(tk.END, "".join(entry.text for entry in new_entries))
+            if evicted_lines:
+                self.output_text.delete("1.0", f"{evicted_lines + 1}.0")
+            self.output_text.see(tk.END)
+            self.output_text.config(state=tk.DISABLED)
+    
+    def apply_log_filter(self):
+        """Redisplay only the buffered log entries containing the filter text."""
+        entries = self.log_buffer.set_filter(self.log_filter_var.get())
+        self.output_text.config(state=tk.NORMAL)
+        self.output_text.delete(1.0, tk.END)
+        self.output_text.insert(tk.END, "".join(entry.text for entry in entries))
         self.output_text.see(tk.END)
         self.output_text.config(state=tk.DISABLED)
         
     def clear_output(self):
         """Clear the output text area."""
+        self.log_buffer.clear()
         self.output_text.config(state=tk.NORMAL)
         self.output_text.delete(1.0, tk.END)
         self.output_text.config(state=tk.DISABLED)
@@ -251,185 +706,248 @@ class ModbusGUI:
         else:
             self.connect()
             
+    def transport_kind(self):
+        """Key (see transports.TRANSPORT_KINDS) of the transport selected in the connection settings."""
+        for kind, name in TRANSPORT_NAMES.items():
+            if name == self.transport_var.get():
+                return kind
+        return 'tcp'
+
     def connect(self):
         """Connect to Modbus server."""
         try:
             ip = self.ip_var.get().strip()
-            port = int(self.port_var.get().strip())
-            
-            if not ip:
+            kind = self.transport_kind()
+            try:
+                port = int(self.port_var.get().strip()) if kind != 'serial' else None
+            except ValueError:
+                messagebox.showerror("Error", "Invalid port number")
+                return
+
+            if not ip and kind != 'serial':
                 messagebox.showerror("Error", "Please enter an IP address")
                 return
-            
-            self.log_message(f"Connecting to {ip}:{port}...")
-            
-            self.client = ModbusTcpClient(host=ip, port=port, timeout=3)
-            
-            if self.client.connect():
+            try:
+                line_text = self.serial_line_var.get().strip()
+                line = SerialLine.parse(line_text) if line_text else None
+                transport = make_transport(kind, ip, port, self.serial_port_var.get().strip(), line)
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
+                return
+            name = transport.name
+
+            self.log_message(f"Connecting to {transport.describe()}...")
+
+            engine = ModbusEngine(ip, port, timeout=self.timeout_s, policy=RetryPolicy(
+                retries=self.read_retries, reconnect=self.auto_reconnect, reconnect_max=self.reconnect_max_s
+            ), transport=transport)
+            engine.start()
+            self.engine = engine
+            self.connect_btn.config(state=tk.DISABLED)
+
+            def on_connected(ok, error):
+                self.connect_btn.config(state=tk.NORMAL)
+                if error is not None or not ok:
+                    engine.stop()
+                    self.engine = None
+                    if error is not None:
+                        self.log_message(f"Connection error: {error}", "error")
+                        EVENTS.publish(OperationFailed("Connect", error))
+                    else:
+                        self.log_message(f"Failed to connect to {name}", "error")
+                        EVENTS.publish(OperationFailed("Connect", ModbusError(f"Could not connect to {name}")))
+                    return
+
                 self.connected = True
-                self.status_var.set("Connected")
-                self.root.nametowidget(str(self.connect_btn)).configure(style="")
-                
-                # Update UI
-                for widget in self.root.nametowidget(str(self.connect_btn)).master.winfo_children():
-                    if isinstance(widget, ttk.Label) and widget.cget("textvariable") == str(self.status_var):
-                        widget.configure(foreground="green")
-                
+                self.link_state = CONNECTED
+                self.set_status("Connected", "green")
+
                 self.connect_btn.config(text="Disconnect")
                 self.read_btn.config(state=tk.NORMAL)
                 self.write_btn.config(state=tk.NORMAL)
-                
-                self.log_message(f"Connected to {ip}:{port}", "success")
-            else:
-                self.log_message(f"Failed to connect to {ip}:{port}", "error")
-                messagebox.showerror("Connection Error", f"Could not connect to {ip}:{port}")
-                
-        except ValueError:
-            messagebox.showerror("Error", "Invalid port number")
+                self.image_btn.config(state=tk.NORMAL)
+                self.poll_btn.config(state=tk.NORMAL)
+                self.watch_btn.config(state=tk.NORMAL)
+
+                self.log_message(f"Connected to {name}", "success")
+
+            engine.submit(engine.connect, callback=on_connected)
+
         except Exception as e:
             self.log_message(f"Connection error: {e}", "error")
             messagebox.showerror("Error", f"Connection error: {e}")
-            
+
     def disconnect(self):
         """Disconnect from Modbus server."""
-        if self.client:
-            self.client.close()
-            self.client = None
-            
+        self.stop_polling()
+        self.stop_group_polling()
+        self.stop_proxy()
+
+        if self.engine:
+            self.engine.stop()
+            self.engine = None
+
         self.connected = False
-        self.status_var.set("Disconnected")
-        
-        # Update UI
-        for widget in self.root.nametowidget(str(self.connect_btn)).master.winfo_children():
-            if isinstance(widget, ttk.Label) and widget.cget("textvariable") == str(self.status_var):
-                widget.configure(foreground="red")
-        
+        self.link_state = None
+        self.set_status("Disconnected", "red")
+
         self.connect_btn.config(text="Connect")
         self.read_btn.config(state=tk.DISABLED)
         self.write_btn.config(state=tk.DISABLED)
-        
+        self.image_btn.config(state=tk.DISABLED)
+        self.poll_btn.config(state=tk.DISABLED)
+        self.watch_btn.config(state=tk.DISABLED)
+
         self.log_message("Disconnected", "info")
-        
+
+    def set_status(self, text, color):
+        """Show the connection status next to the Connect button."""
+        self.status_var.set(text)
+        for widget in self.root.nametowidget(str(self.connect_btn)).master.winfo_children():
+            if isinstance(widget, ttk.Label) and widget.cget("textvariable") == str(self.status_var):
+                widget.configure(foreground=color)
+    
+    def _apply_link_state(self):
+        """Follow the engine through losing and regaining the connection; polling keeps running meanwhile."""
+        state = self.engine.state
+        previous, self.link_state = self.link_state, state
+        if state == RECONNECTING:
+            self.set_status("Reconnecting...", "orange")
+            self.log_message(
+                f"Connection to {self.engine.name} lost, reconnecting in the background", "error"
+            )
+        elif state == CONNECTED and previous == RECONNECTING:
+            self.set_status("Connected", "green")
+            running = self.poller is not None or self.group_poller is not None
+            self.log_message(
+                f"Reconnected to {self.engine.name}" + (", polling resumed" if running else ""),
+                "success"
+            )
+    
+    def report_error(self, error, title, context):
+        """
+        Log an error from a completed request and show it in the status bar.
+
+        Never opens a dialog: background failures can come in bursts (a
+        poller against a flaky device), and the status bar sums them up
+        instead of stacking dialogs on top of each other.
+        """
+        if is_transient(error) and self.engine is not None and self.engine.state == RECONNECTING:
+            # The status shows the outage and the engine is already reconnecting
+            self.log_message(f"{context}: {error}", "error")
+            return
+        if isinstance(error, ModbusResponseError):
+            self.log_message(f"{context}: {error}", "error")
+        elif isinstance(error, (ModbusException, ModbusError)):
+            self.log_message(f"Modbus error: {error}", "error")
+        else:
+            self.log_message(f"Error: {error}", "error")
+        EVENTS.publish(OperationFailed(title, error))
+
+    def selected_table(self):
+        """Return the data table chosen in the Read section."""
+        return table_by_key(self.table_var.get())
+
     def read_registers(self):
-        """Read holding registers from Modbus server."""
-        if not self.connected or not self.client:
+        """Read a range of the selected data table from Modbus server."""
+        if not self.connected or not self.engine:
             messagebox.showerror("Error", "Not connected to server")
             return
-        
+
         try:
             start_address = int(self.read_start_var.get().strip())
             count = int(self.read_count_var.get().strip())
             unit_id = int(self.unit_var.get().strip())
-            
-            if count <= 0 or count > 1000:
-                messagebox.showerror("Error", "Count must be between 1 and 1000")
+            table = self.selected_table()
+            limit = read_limit(table)
+
+            if count <= 0 or count > limit:
+                messagebox.showerror("Error", f"Count must be between 1 and {limit}")
                 return
-            
-            if start_address < 0 or start_address > 65535:
+
+            if start_address < 0 or start_address + count > 65536:
                 messagebox.showerror("Error", "Address must be between 0 and 65535")
                 return
-            
-            self.log_message(f"Reading {count} register(s) starting at address {start_address}...")
-            
-            # Run in thread to avoid blocking UI
-            def read_thread():
-                try:
-                    # Modbus protocol limits reads to ~125 registers at once
-                    # Split large reads into chunks of 100 registers with pauses
-                    chunk_size = 100
-                    all_registers = []
-                    
-                    # Inform user if chunked reading will be used
-                    if count > chunk_size:
-                        num_chunks = (count + chunk_size - 1) // chunk_size
-                        self.root.after(0, lambda: self.log_message(
-                            f"Reading in {num_chunks} chunks of up to {chunk_size} registers...", "info"
-                        ))
-                    
-                    for offset in range(0, count, chunk_size):
-                        current_address = start_address + offset
-                        current_count = min(chunk_size, count - offset)
-                        
-                        response = self.client.read_holding_registers(
-                            address=current_address,
-                            count=current_count,
-                            slave=unit_id
-                        )
-                        
-                        if response.isError():
-                            self.root.after(0, lambda r=response: self.log_message(f"Error reading registers: {r}", "error"))
-                            self.root.after(0, lambda r=response: messagebox.showerror("Read Error", str(r)))
-                            return
-                        
-                        all_registers.extend(response.registers)
-                        
-                        # Pause between chunks if there are more to read
-                        if offset + chunk_size < count:
-                            time.sleep(0.2)  # 200ms pause
-                    
-                    # Format output
-                    output = "\n" + "="*60 + "\n"
+
+            self.log_message(f"Reading {count} {table.item}(s) starting at address {start_address}...")
+
+            # Inform user if chunked reading will be used
+            if count > table.max_read:
+                num_chunks = (count + table.max_read - 1) // table.max_read
+                self.log_message(
+                    f"Reading in {num_chunks} chunks of up to {table.max_read} {table.item}s...", "info"
+                )
+
+            started = time.perf_counter()
+
+            def on_read(all_registers, error):
+                if error is not None:
+                    self.report_error(error, "Read Error", f"Error reading {table.name.lower()}")
+                    return
+
+                elapsed_ms = (time.perf_counter() - started) * 1000
+
+                # Format output
+                output = "\n" + "="*60 + "\n"
+                if table.bits:
+                    output += f"{'Address':<12} Bits (first address leftmost)\n"
+                    output += "="*60 + "\n"
+                    for row_index, row in enumerate(bit_rows(all_registers)):
+                        addr = start_address + row_index * BITS_PER_ROW
+                        output += f"{addr:<12} {bit_row_cells(row)[0]}\n"
+                else:
                     output += f"{'Address':<12} {'Value (dec)':<15} {'Value (hex)'}\n"
                     output += "="*60 + "\n"
-                    
                     for i, value in enumerate(all_registers):
                         addr = start_address + i
                         output += f"{addr:<12} {value:<15} 0x{value:04X}\n"
-                    
-                    output += "="*60
-                    
-                    self.root.after(0, lambda: self.log_message(output, "success"))
-                        
-                except ModbusException as e:
-                    self.root.after(0, lambda: self.log_message(f"Modbus error: {e}", "error"))
-                    self.root.after(0, lambda: messagebox.showerror("Modbus Error", str(e)))
-                except Exception as e:
-                    self.root.after(0, lambda: self.log_message(f"Error: {e}", "error"))
-                    self.root.after(0, lambda: messagebox.showerror("Error", str(e)))
-            
-            thread = threading.Thread(target=read_thread, daemon=True)
-            thread.start()
-            
+
+                output += "="*60
+
+                self.log_message(output, "success")
+                self.log_message(f"Read {count} {table.item}(s) in {elapsed_ms:.1f} ms", "info")
+                self.show_registers(start_address, all_registers, table)
+
+            self.engine.submit(self.engine.read_registers, start_address, count, unit_id, table, callback=on_read)
+
         except ValueError:
             messagebox.showerror("Error", "Invalid input values. Please enter valid numbers.")
-            
+
     def write_register(self):
         """Write a value to a holding register."""
-        if not self.connected or not self.client:
+        if not self.connected or not self.engine:
             messagebox.showerror("Error", "Not connected to server")
             return
-        
+
         try:
             address = int(self.write_addr_var.get().strip())
             raw_value = self.write_value_var.get().strip()
             unit_id = int(self.unit_var.get().strip())
-            
+
             if address < 0 or address > 65535:
                 messagebox.showerror("Error", "Address must be between 0 and 65535")
                 return
-            
+
             if not raw_value:
                 messagebox.showerror("Error", "Please enter a value to write")
                 return
 
             # Support comma or whitespace separated lists; allow 0x-prefixed numbers.
-            tokens = [token for token in raw_value.replace(",", " ").split() if token]
-            if not tokens:
-                messagebox.showerror("Error", "Please enter a valid value")
-                return
-
             try:
-                values = [int(token, 0) for token in tokens]
-            except ValueError:
-                messagebox.showerror("Error", "Values must be integers (decimal or 0x-prefixed hex)")
+                values = tuple(parse_register_values(raw_value))
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
                 return
 
-            for val in values:
-                if val < 0 or val > 65535:
-                    messagebox.showerror("Error", "Values must be between 0 and 65535 (uint16)")
-                    return
+            single_transaction = self.write_fc23_var.get()
+            limit = MAX_READ_WRITE_REGISTERS if single_transaction else MAX_WRITE_REGISTERS
+            if len(values) > limit:
+                messagebox.showerror("Error", f"At most {limit} values can be written at once")
+                return
+            if address + len(values) > 65536:
+                messagebox.showerror("Error", f"{len(values)} registers do not fit at address {address}")
+                return
 
-            values = tuple(values)
             multiple_values = len(values) > 1
 
             if multiple_values:
@@ -440,104 +958,1545 @@ class ModbusGUI:
             else:
                 value = values[0]
                 self.log_message(f"Writing value {value} (0x{value:04X}) to register {address}...")
-            
-            # Run in thread to avoid blocking UI
-            def write_thread():
-                try:
-                    response = self.client.write_registers(
-                        address=address,
-                        values=list(values),
-                        slave=unit_id
-                    )
-                    
-                    if response.isError():
-                        self.root.after(0, lambda: self.log_message(f"Error writing register: {response}", "error"))
-                        self.root.after(0, lambda: messagebox.showerror("Write Error", str(response)))
-                    else:
-                        if multiple_values:
-                            self.root.after(
-                                0,
-                                lambda: self.log_message(
-                                    f"Successfully wrote {len(values)} value(s) starting at register {address}",
-                                    "success"
-                                )
-                            )
-                        else:
-                            value = values[0]
-                            self.root.after(
-                                0,
-                                lambda: self.log_message(
-                                    f"Successfully wrote {value} to register {address}",
-                                    "success"
-                                )
-                            )
-                        
-                        # Verify write (allow device time to update)
-                        time.sleep(0.2)
-                        self.root.after(0, lambda: self.log_message("Verifying write...", "info"))
-                        verify_response = self.client.read_holding_registers(
-                            address=address,
-                            count=len(values),
-                            slave=unit_id
+
+            engine = self.engine
+
+            def on_verified(read_back, error):
+                if error is not None:
+                    self.log_message(f"Verify read failed: {error}", "error")
+                    return
+
+                read_back = read_back[: len(values)]
+                if len(read_back) < len(values):
+                    self.log_message("Verification returned insufficient data", "error")
+                    return
+
+                if not compare_registers(address, values, read_back):
+                    if multiple_values:
+                        formatted = ", ".join(
+                            f"{address + idx}={val} (0x{val:04X})"
+                            for idx, val in enumerate(read_back)
                         )
-                        
-                        if verify_response.isError():
-                            self.root.after(0, lambda: self.log_message(f"Verify read failed: {verify_response}", "error"))
-                            return
-
-                        read_back = verify_response.registers[: len(values)]
-                        if len(read_back) < len(values):
-                            self.root.after(0, lambda: self.log_message("Verification returned insufficient data", "error"))
-                            return
-
-                        if list(read_back) == list(values):
-                            if multiple_values:
-                                formatted = ", ".join(
-                                    f"{address + idx}={val} (0x{val:04X})"
-                                    for idx, val in enumerate(read_back)
-                                )
-                                self.root.after(0, lambda: self.log_message(f"Verification successful: {formatted}", "success"))
-                            else:
-                                self.root.after(0, lambda: self.log_message(f"Verification successful: register {address} = {read_back[0]}", "success"))
-                        else:
-                            if multiple_values:
-                                expected = ", ".join(str(v) for v in values)
-                                observed = ", ".join(str(v) for v in read_back)
-                                self.root.after(0, lambda: self.log_message(f"Warning: read back values [{observed}] differ from written values [{expected}]", "error"))
-                            else:
-                                value = values[0]
-                                self.root.after(0, lambda: self.log_message(f"Warning: read back value {read_back[0]} differs from written value {value}", "error"))
-                        
-                except ModbusException as e:
-                    self.root.after(0, lambda: self.log_message(f"Modbus error: {e}", "error"))
-                    self.root.after(0, lambda: messagebox.showerror("Modbus Error", str(e)))
-                except Exception as e:
-                    self.root.after(0, lambda: self.log_message(f"Error: {e}", "error"))
-                    self.root.after(0, lambda: messagebox.showerror("Error", str(e)))
-            
-            thread = threading.Thread(target=write_thread, daemon=True)
-            thread.start()
-            
+                        self.log_message(f"Verification successful: {formatted}", "success")
+                    else:
+                        self.log_message(f"Verification successful: register {address} = {read_back[0]}", "success")
+                else:
+                    if multiple_values:
+                        expected = ", ".join(str(v) for v in values)
+                        observed = ", ".join(str(v) for v in read_back)
+                        self.log_message(f"Warning: read back values [{observed}] differ from written values [{expected}]", "error")
+                    else:
+                        value = values[0]
+                        self.log_message(f"Warning: read back value {read_back[0]} differs from written value {value}", "error")
+
+            def verify():
+                if self.engine is not engine:
+                    return  # Disconnected in the meantime
+                self.log_message("Verifying write...", "info")
+                engine.submit(engine.read_registers, address, len(values), unit_id, callback=on_verified)
+
+            def on_written(read_back, error):
+                if error is not None:
+                    if single_transaction and getattr(error, 'exception_code', None) == 1:
+                        self.log_message("The device does not support FC23; untick "
+                                         "'Verify in one transaction' to write and verify separately", "error")
+                    self.report_error(error, "Write Error", "Error writing register")
+                    return
+
+                if multiple_values:
+                    self.log_message(
+                        f"Successfully wrote {len(values)} value(s) starting at register {address}",
+                        "success"
+                    )
+                else:
+                    self.log_message(f"Successfully wrote {values[0]} to register {address}", "success")
+
+                if single_transaction:
+                    # The FC23 response already holds the registers as they were after the write
+                    on_verified(read_back, None)
+                    return
+
+                # Verify write (allow device time to update) without blocking anything meanwhile
+                self.root.after(VERIFY_DELAY_MS, verify)
+
+            if single_transaction:
+                engine.submit(engine.read_write_registers, address, values, unit_id, callback=on_written)
+            else:
+                engine.submit(engine.write_registers, address, values, unit_id, callback=on_written)
+
         except ValueError:
             messagebox.showerror("Error", "Invalid input values. Please enter valid numbers.")
+
+    def write_image(self):
+        """Write a register image file, then verify all of it in one batched read."""
+        if not self.connected or not self.engine:
+            messagebox.showerror("Error", "Not connected to server")
+            return
+        
+        path = filedialog.askopenfilename(
+            title="Select Register Image",
+            filetypes=[("Register images", "*.csv *.json *.jsonl *.bin"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        
+        try:
+            unit_id = int(self.unit_var.get().strip())
+            base_address = int(self.write_addr_var.get().strip())
+            segments = load_register_image(path, base_address=base_address)
+        except (ValueError, OSError) as e:
+            messagebox.showerror("Image Error", f"Could not load register image:\n{e}")
+            return
+        
+        self.write_segments(segments, unit_id, f"image {Path(path).name}")
+    
+    def write_segments(self, segments, unit_id, what):
+        """Write (address, values) segments in batched requests, then verify all of them in one batched read."""
+        registers = sum(len(values) for _, values in segments)
+        self.log_message(
+            f"Writing {what}: {registers} register(s) in {len(segments)} range(s)...", "info"
+        )
+        engine = self.engine
+        started = time.perf_counter()
+        plan = verify_plan(segments, engine.max_gap())
+        
+        def on_verified(block_values, error):
+            if error is not None:
+                self.log_message(f"Verify read failed: {error}", "error")
+                return
+            mismatches = compare_image(segments, plan, block_values)
+            elapsed = time.perf_counter() - started
+            if not mismatches:
+                self.log_message(
+                    f"Verified {what}: {registers} register(s) in {len(plan.blocks)} read request(s), "
+                    f"{elapsed:.2f} s total", "success"
+                )
+                return
+            self.log_message(f"Warning: {len(mismatches)} register(s) differ from the {what}:", "error")
+            for first, last, items in diff_ranges(mismatches):
+                expected = ", ".join(str(item[1]) for item in items)
+                observed = ", ".join(str(item[2]) for item in items)
+                self.log_message(f"  {first}-{last}: expected [{expected}], read [{observed}]", "error")
+        
+        def verify():
+            if self.engine is not engine:
+                return  # Disconnected in the meantime
+            engine.submit(engine.read_blocks, plan.blocks, unit_id, callback=on_verified)
+        
+        def on_written(requests, error):
+            if error is not None:
+                self.report_error(error, "Write Error", f"Error writing {what}")
+                return
+            self.log_message(
+                f"Wrote {registers} register(s) in {requests} request(s), verifying...", "info"
+            )
+            self.root.after(VERIFY_DELAY_MS, verify)
+        
+        engine.submit(engine.write_blocks, segments, unit_id, callback=on_written)
+    
+    def read_watch_list(self):
+        """Read a sparse list of registers with as few requests as possible."""
+        if not self.connected or not self.engine:
+            messagebox.showerror("Error", "Not connected to server")
+            return
+        
+        try:
+            addresses = parse_address_list(self.watch_addresses_var.get())
+            unreadable = parse_address_list(self.watch_unreadable_var.get())
+            max_gap_text = self.watch_max_gap_var.get().strip().lower()
+            max_gap = self.engine.max_gap() if max_gap_text in ("", "auto") else int(max_gap_text)
+            unit_id = int(self.unit_var.get().strip())
+            table = self.selected_table()
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid input values: {e}")
+            return
+        
+        if max_gap < 0:
+            messagebox.showerror("Error", "Max gap must be 0 or more")
+            return
+        
+        plan = plan_reads(addresses, max_gap=max_gap, max_count=table.max_read, unreadable=unreadable)
+        if plan.skipped:
+            self.log_message(
+                f"Skipping unreadable address(es): {', '.join(str(a) for a in plan.skipped)}", "info"
+            )
+        if not plan.addresses:
+            messagebox.showerror("Error", "Please enter at least one readable address")
+            return
+        
+        self.log_message(
+            f"Reading {len(plan.addresses)} watched {table.item}(s) in {len(plan.blocks)} request(s) "
+            f"({plan.register_count} {table.item}s transferred)..."
+        )
+        started = time.perf_counter()
+        
+        def on_read(block_values, error):
+            if error is not None:
+                self.report_error(error, "Read Error", "Error reading registers")
+                return
             
-    def show_about(self):
-        """Show about dialog with author, GitHub link, and license information."""
-        about_text = (
-            "Modbus TCP Master GUI\n\n"
-            "Author: Adrian Shajkofci\n\n"
-            "GitHub: https://github.com/ashajkofci/GUIModbusClientMaster\n\n"
-            "License: BSD 3-Clause License\n\n"
-            "A cross-platform graphical tool for testing Modbus TCP communication."
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            values = plan.extract(block_values)
+            
+            # Format output
+            output = "\n" + "="*60 + "\n"
+            output += f"{'Address':<12} {'Value (dec)':<15} {'Value (hex)'}\n"
+            output += "="*60 + "\n"
+            for addr, value in zip(plan.addresses, values):
+                output += f"{addr:<12} {value:<15} {'0x%04X' % value if not table.bits else bit_cells(addr, value)[1]}\n"
+            output += "="*60
+            
+            self.log_message(output, "success")
+            self.log_message(f"Read {len(values)} watched {table.item}(s) in {elapsed_ms:.1f} ms", "info")
+            self.show_register_values(tuple(plan.addresses), values, table)
+        
+        self.engine.submit(self.engine.read_blocks, plan.blocks, unit_id, table, callback=on_read)
+    
+    def show_registers(self, start_address, registers, table=HOLDING_REGISTERS):
+        """Show a contiguous block of values in the Registers tab; bits are shown 16 to a row."""
+        if table.bits:
+            end = start_address + len(registers)
+            words = [word for word, _ in bit_rows(registers)]
+            addresses = range(start_address, start_address + len(words) * BITS_PER_ROW, BITS_PER_ROW)
+            
+            def row_cells(address, word):
+                return bit_row_cells((word, min(BITS_PER_ROW, end - address)))
+            
+            self._show_rows((table, addresses, len(registers)), addresses, words, row_cells,
+                            ("Bits (first address leftmost)", "Value (hex)"))
+        else:
+            self.show_register_values(range(start_address, start_address + len(registers)), registers, table)
+            if self.profile is not None:
+                for index, group in enumerate(self.profile.groups):
+                    decoder = group.decoder
+                    if decoder.table == table and decoder.covers(start_address, len(registers)):
+                        self.show_tags(index, decoder.decode(registers, start_address))
+    
+    def show_register_values(self, addresses, registers, table=HOLDING_REGISTERS):
+        """Show values for the given addresses, one row per address."""
+        if table.bits:
+            self._show_rows((table, addresses), addresses, registers, bit_cells, ("Value", "State"))
+        else:
+            self._show_rows((table, addresses), addresses, registers, register_cells, ("Value (dec)", "Value (hex)"))
+    
+    def _show_rows(self, key, addresses, values, cells, headings):
+        """
+        Fill the Registers tab, repainting only rows whose value changed since the last call with key.
+
+        values are uint16 numbers, one per row; the snapshot of the shown rows
+        is diffed against them in bulk, so unchanged polls cost no widget work.
+        """
+        tree = self.register_tree
+        
+        if self.displayed_key != key:
+            # Different set of rows: rebuild them once
+            tree.delete(*tree.get_children())
+            tree.heading("dec", text=headings[0])
+            tree.heading("hex", text=headings[1])
+            self.displayed_snapshot = RegisterSnapshot(len(addresses))
+            self.displayed_snapshot.update(0, values)
+            self.displayed_key = key
+            for addr, value in zip(addresses, values):
+                tree.insert("", tk.END, iid=str(addr), text=str(addr), values=cells(addr, value))
+            return
+        
+        for row in self.displayed_snapshot.update(0, values):
+            addr = addresses[row]
+            tree.item(str(addr), values=cells(addr, values[row]))
+    
+    def choose_profile_file(self):
+        """Ask for a device profile and open it."""
+        path = filedialog.askopenfilename(
+            title="Open Device Profile",
+            filetypes=[("Device profiles", "*.json *.csv"), ("All files", "*.*")]
         )
-        messagebox.showinfo("About Modbus TCP Master", about_text)
+        if path:
+            self.load_profile_file(path)
     
-    def on_closing(self):
-        """Handle window close event."""
-        self.save_config()
-        if self.connected:
-            self.disconnect()
-        self.root.destroy()
+    def load_profile_file(self, path, apply_settings=True):
+        """Load a device profile (compiled, or from its cache) and list its tags in the Tags tab."""
+        started = time.perf_counter()
+        try:
+            profile = load_profile(path)
+        except (OSError, ValueError) as e:
+            self.log_message(f"Could not open profile {path}: {e}", "error")
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.stop_group_polling()
+        self.profile = profile
+        self.profile_file = str(path)
+        self.tag_filters = [DeadbandFilter(group.tags) for group in profile.groups]
+        
+        tree = self.tag_tree
+        tree.delete(*tree.get_children())
+        for group_index, group in enumerate(profile.groups):
+            for index, tag in enumerate(group.tags):
+                tree.insert("", tk.END, iid=f"{group_index}:{index}", text=tag.name,
+                            values=(group.name, tag.address, tag.data_type, ""))
+        
+        settings = profile.settings
+        if apply_settings and not self.connected:
+            for key, var in (('host', self.ip_var), ('port', self.port_var), ('unit', self.unit_var)):
+                if key in settings:
+                    var.set(str(settings[key]))
+        self.log_message(
+            f"Opened profile '{profile.name}': {len(profile.tags)} tag(s) in {len(profile.groups)} group(s), "
+            f"{profile.request_count} request(s) per full read "
+            f"({'cached plan' if profile.from_cache else 'compiled'} in {elapsed_ms:.1f} ms)", "info"
+        )
+    
+    def read_tags(self):
+        """Read every register used by the profile's tags and show the decoded values."""
+        if not self.connected or not self.engine:
+            messagebox.showerror("Error", "Not connected to server")
+            return
+        profile = self.profile
+        if profile is None:
+            messagebox.showerror("Error", "Open a device profile first (Tools > Open Profile...)")
+            return
+        try:
+            unit_id = int(self.unit_var.get().strip())
+        except ValueError:
+            messagebox.showerror("Error", "Invalid unit ID")
+            return
+        
+        if self.group_poller is None:
+            profile.plan_for_link(self.engine.max_gap())
+        plans = [group.plan for group in profile.groups]
+        started = time.perf_counter()
+        
+        def on_read(group_values, error):
+            if error is not None:
+                self.report_error(error, "Read Error", "Error reading tags")
+                return
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if profile is self.profile:
+                for index, (group, plan, block_values) in enumerate(zip(profile.groups, plans, group_values)):
+                    self.show_tags(index, group.decoder.decode_blocks(plan.blocks, block_values))
+                self.output_notebook.select(self.tags_tab)
+            self.log_message(
+                f"Read {len(profile.tags)} tag(s) in {profile.request_count} request(s) in {elapsed_ms:.1f} ms",
+                "info"
+            )
+        
+        self.engine.submit(
+            self.engine.read_tables, [(plan.blocks, group.table) for group, plan in zip(profile.groups, plans)], unit_id,
+            callback=on_read
+        )
+    
+    def start_group_polling(self):
+        """Poll every group of the profile at its own period and priority on the shared connection."""
+        if not self.connected or not self.engine:
+            messagebox.showerror("Error", "Not connected to server")
+            return
+        if self.profile is None:
+            messagebox.showerror("Error", "Open a device profile first (Tools > Open Profile...)")
+            return
+        if self.group_poller is not None:
+            return
+        try:
+            unit_id = int(self.unit_var.get().strip())
+        except ValueError:
+            messagebox.showerror("Error", "Invalid unit ID")
+            return
+        
+        engine = self.engine
+        self.profile.plan_for_link(engine.max_gap())
+        groups = self.profile.groups
+        
+        def read_tables(requests):
+            return engine.call(engine.read_tables, requests, unit_id)
+        
+        self.group_poller = GroupPoller(
+            [ScheduledGroup(index, group.period, group.priority, len(group.plan.blocks))
+             for index, group in enumerate(groups)],
+            lambda indexes: read_groups([groups[index] for index in indexes], read_tables),
+        )
+        self.group_poll_last_error = None
+        self.group_poller.start()
+        self.output_notebook.select(self.tags_tab)
+        self.log_message(
+            "Polling groups: " + ", ".join(f"{group.name} every {group.period * 1000:g} ms" for group in groups),
+            "info"
+        )
+    
+    def stop_group_polling(self):
+        """Stop group polling and log each group's statistics."""
+        if self.group_poller is None:
+            return
+        poller = self.group_poller
+        self.group_poller = None
+        poller.stop()
+        for index, stats in poller.stats().items():
+            self.log_message(
+                f"Group {self.profile.groups[index].name}: {stats['cycles']} cycle(s) at "
+                f"{stats['achieved_rate']}/s of {stats['target_rate']}/s, {stats['skipped']} skipped, "
+                f"lateness mean {stats['mean_lateness_ms']} ms, max {stats['max_lateness_ms']} ms", "info"
+            )
+    
+    def _apply_group_results(self):
+        """Show the newest result of every group that has one and refresh the group statistics."""
+        results = self.group_poller.take_latest()
+        if not results:
+            return
+        for index, result in results:
+            if result.error is None:
+                self.show_tags(index, result.values)
+            elif str(result.error) != self.group_poll_last_error:
+                self.group_poll_last_error = str(result.error)
+                self.log_message(f"Group {self.profile.groups[index].name}: {result.error}", "error")
+        lines = []
+        for index, stats in self.group_poller.stats().items():
+            lines.append(
+                f"{self.profile.groups[index].name}: {stats['achieved_rate']:.2f}/s of {stats['target_rate']:g}/s, "
+                f"late {stats['last_lateness_ms']:.1f} ms (max {stats['max_lateness_ms']:.1f}), "
+                f"{stats['skipped']} skipped, {stats['errors']} error(s)"
+            )
+        self.group_stats_var.set("\n".join(lines))
+    
+    def show_tags(self, group_index, values):
+        """Show decoded values of one group, repainting only tags that moved more than their deadband."""
+        tree = self.tag_tree
+        group = self.profile.groups[group_index]
+        for index, value in self.tag_filters[group_index].update(values):
+            tag = group.tags[index]
+            tree.item(f"{group_index}:{index}", values=(group.name, tag.address, tag.data_type, format_value(value)))
+    
+    def toggle_polling(self):
+        """Start or stop continuous polling."""
+        if self.poller is not None:
+            self.stop_polling()
+        else:
+            self.start_polling()
+    
+    def start_polling(self):
+        """Poll the configured register range at the configured period."""
+        if not self.connected or not self.engine:
+            messagebox.showerror("Error", "Not connected to server")
+            return
+        
+        try:
+            start_address = int(self.read_start_var.get().strip())
+            count = int(self.read_count_var.get().strip())
+            unit_id = int(self.unit_var.get().strip())
+            period_ms = int(self.poll_period_var.get().strip())
+            table = self.selected_table()
+        except ValueError:
+            messagebox.showerror("Error", "Invalid input values. Please enter valid numbers.")
+            return
+        
+        limit = read_limit(table)
+        if count <= 0 or count > limit:
+            messagebox.showerror("Error", f"Count must be between 1 and {limit}")
+            return
+        
+        if start_address < 0 or start_address + count > 65536:
+            messagebox.showerror("Error", "Address must be between 0 and 65535")
+            return
+        
+        min_period_ms = int(MIN_POLL_PERIOD * 1000)
+        if period_ms < min_period_ms:
+            messagebox.showerror("Error", f"Poll period must be at least {min_period_ms} ms")
+            return
+        
+        engine = self.engine
+        
+        def read_fn():
+            return engine.call(engine.read_registers, start_address, count, unit_id, table)
+        
+        self.poller = Poller(read_fn, period_ms / 1000)
+        self.poll_start_address = start_address
+        self.poll_count = count
+        self.poll_table = table
+        self.poll_period_ms = period_ms
+        self.poll_last_error = None
+        self.poller.start()
+        
+        self.poll_btn.config(text="Stop Polling")
+        self.record_btn.config(state=tk.NORMAL)
+        self.read_btn.config(state=tk.DISABLED)
+        self.output_notebook.select(self.registers_tab)
+        self.log_message(
+            f"Polling {count} {table.item}(s) starting at address {start_address} every {period_ms} ms", "info"
+        )
+    
+    def stop_polling(self):
+        """Stop continuous polling if it is running."""
+        if self.poller is None:
+            return
+        
+        self.stop_recording()
+        poller = self.poller
+        self.poller = None
+        poller.stop()
+        
+        self.poll_btn.config(text="Start Polling")
+        self.record_btn.config(state=tk.DISABLED)
+        if self.connected:
+            self.read_btn.config(state=tk.NORMAL)
+        self.log_message(
+            f"Polling stopped after {poller.cycles} cycle(s), "
+            f"{poller.errors} error(s), {poller.skipped} skipped", "info"
+        )
+    
+    def _apply_poll_result(self):
+        """Apply the newest poll result to the UI."""
+        poller = self.poller
+        result = poller.take_latest()
+        if result is not None:
+            if result.error is None:
+                self.show_registers(self.poll_start_address, result.values, self.poll_table)
+                self.poll_last_error = None
+            elif str(result.error) != self.poll_last_error:
+                # Only log when the error changes so a dead link does not flood the log
+                self.poll_last_error = str(result.error)
+                self.log_message(f"Polling error: {result.error}", "error")
+            if self.recorder is not None and self.recorder.error is not None:
+                # The disk filled up or went away: stop now rather than silently dropping samples
+                error = self.recorder.error
+                self.stop_recording()
+                EVENTS.publish(OperationFailed("Recording", error))
+            status = f"{poller.cycles} cycles, {result.duration * 1000:.1f} ms, {poller.skipped} skipped"
+            if self.recorder is not None:
+                status += f", {self.recorder.frames_written} recorded"
+            self.poll_status_var.set(status)
+    
+    def toggle_recording(self):
+        """Start or stop recording the running poll to a file."""
+        if self.recorder is not None:
+            self.stop_recording()
+        else:
+            self.start_recording()
+    
+    def start_recording(self):
+        """Ask for a file and record every poll result to it."""
+        if self.poller is None:
+            return
+        path = filedialog.asksaveasfilename(
+            title="Record Polling To",
+            defaultextension=RECORDING_EXTENSION,
+            filetypes=[("Modbus recordings", f"*{RECORDING_EXTENSION}"), ("All files", "*.*")]
+        )
+        if not path or self.poller is None:
+            return
+        
+        recorder = DataRecorder(path, self.poll_start_address, self.poll_count, metadata={
+            'host': self.ip_var.get().strip(),
+            'port': self.port_var.get().strip(),
+            'unit': self.unit_var.get().strip(),
+            'table': self.poll_table.key,
+            'period': self.poll_period_ms / 1000,
+        })
+        try:
+            recorder.start()
+        except OSError as e:
+            messagebox.showerror("Recording Error", f"Could not create recording:\n{e}")
+            return
+        self.recorder = recorder
+        # The poller delivers every result to the recorder, not just the ones the UI shows
+        self.poller.on_result = recorder.record
+        self.record_btn.config(text="Stop Recording")
+        self.log_message(f"Recording to {recorder.path}", "info")
+    
+    def stop_recording(self):
+        """Stop recording and close the recording files."""
+        if self.recorder is None:
+            return
+        
+        recorder = self.recorder
+        self.recorder = None
+        if self.poller is not None:
+            self.poller.on_result = None
+        recorder.close()
+        
+        self.record_btn.config(text="Record...")
+        self.log_message(
+            f"Recording stopped: {recorder.frames_written} sample(s) in {len(recorder.files)} file(s), "
+            f"{recorder.frames_dropped} dropped", "info"
+        )
+        if recorder.error is not None:
+            self.log_message(f"Recording error: {recorder.error}", "error")
+    
+    def export_recording(self):
+        """Convert recording files to CSV or Parquet in the background."""
+        paths = filedialog.askopenfilenames(
+            title="Select Recording Files",
+            filetypes=[("Modbus recordings", f"*{RECORDING_EXTENSION}"), ("All files", "*.*")]
+        )
+        if not paths:
+            return
+        output = filedialog.asksaveasfilename(
+            title="Export Recording As",
+            defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("Parquet", "*.parquet")]
+        )
+        if not output:
+            return
+        
+        def export_thread():
+            try:
+                ordered = sort_recordings(paths)
+                if output.lower().endswith(".parquet"):
+                    rows = export_parquet(ordered, output)
+                else:
+                    with open(output, "w", newline="") as f:
+                        rows = export_csv(ordered, f)
+                self.log_message(f"Exported {rows} sample(s) to {output}", "success")
+            except Exception as e:
+                self.log_message(f"Export failed: {e}", "error")
+        
+        self.log_message(f"Exporting {len(paths)} recording file(s)...", "info")
+        threading.Thread(target=export_thread, daemon=True).start()
+    
+    def snapshot_reader(self, engine, unit_id):
+        """read_blocks(blocks, table) for capture_snapshot, reading through the engine from a worker thread."""
+        return lambda blocks, table: engine.call(engine.read_blocks, blocks, unit_id, table)
+    
+    def capture_snapshot(self):
+        """Capture every readable address of the four tables into a snapshot file, in the background."""
+        if not self.connected or not self.engine:
+            messagebox.showerror("Error", "Not connected to server")
+            return
+        try:
+            unit_id = int(self.unit_var.get().strip())
+        except ValueError:
+            messagebox.showerror("Error", "Invalid unit ID")
+            return
+        path = filedialog.asksaveasfilename(
+            title="Save Snapshot As",
+            defaultextension=SNAPSHOT_EXTENSION,
+            filetypes=[("Register snapshots", f"*{SNAPSHOT_EXTENSION}"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        
+        engine = self.engine
+        reported = [0]
+        
+        def on_progress(done, total):
+            quarter = done * 4 // total
+            if reported[0] < quarter < 4:
+                reported[0] = quarter
+                self.log_message(f"Snapshot {quarter * 25}% done...", "info")
+        
+        def snapshot_thread():
+            started = time.perf_counter()
+            try:
+                snapshot = capture_snapshot(
+                    self.snapshot_reader(engine, unit_id), full_ranges(),
+                    metadata={"device": engine.transport.device(unit_id), "unit": unit_id}, on_progress=on_progress
+                )
+                size = snapshot.save(path)
+            except Exception as e:
+                self.report_error(e, "Snapshot", "Snapshot failed")
+                return
+            for table, first, last, reason in snapshot.skipped:
+                self.log_message(f"  Skipped {table} {first}-{last}: {reason}", "info")
+            self.log_message(
+                f"Snapshot of {snapshot.describe()} saved to {Path(path).name} "
+                f"({size} bytes, {time.perf_counter() - started:.2f} s)", "success"
+            )
+        
+        self.log_message("Capturing a snapshot of all four tables...", "info")
+        threading.Thread(target=snapshot_thread, daemon=True).start()
+    
+    def compare_snapshot(self):
+        """Compare the device with a snapshot file in the background and offer to write differences back."""
+        if not self.connected or not self.engine:
+            messagebox.showerror("Error", "Not connected to server")
+            return
+        try:
+            unit_id = int(self.unit_var.get().strip())
+        except ValueError:
+            messagebox.showerror("Error", "Invalid unit ID")
+            return
+        path = filedialog.askopenfilename(
+            title="Select Snapshot",
+            filetypes=[("Register snapshots", f"*{SNAPSHOT_EXTENSION}"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        try:
+            reference = Snapshot.load(path)
+        except (ValueError, OSError) as e:
+            messagebox.showerror("Snapshot Error", f"Could not load snapshot:\n{e}")
+            return
+        
+        engine = self.engine
+        name = Path(path).name
+        results = queue.Queue()
+        
+        def compare_thread():
+            try:
+                live = capture_snapshot(self.snapshot_reader(engine, unit_id), reference.ranges())
+                results.put(diff_snapshots(reference, live))
+            except Exception as e:
+                self.report_error(e, "Compare", "Snapshot comparison failed")
+                results.put(None)
+        
+        def show_differences():
+            try:
+                differences = results.get_nowait()
+            except queue.Empty:
+                self.root.after(UI_REFRESH_MS, show_differences)
+                return
+            if differences is None:
+                return
+            if not differences:
+                self.log_message(f"Device matches {name}", "success")
+                return
+            self.log_message(
+                f"{count_differences(differences)} address(es) differ from {name} in "
+                f"{len(differences)} range(s):", "error"
+            )
+            for difference in differences:
+                expected = ", ".join("-" if value is None else str(value) for value in difference.expected)
+                observed = ", ".join("-" if value is None else str(value) for value in difference.observed)
+                self.log_message(
+                    f"  {difference.table} {difference.first}-{difference.last}: "
+                    f"snapshot [{expected}], device [{observed}]", "error"
+                )
+            segments = restore_segments(differences)
+            if not segments or self.engine is not engine:
+                return
+            registers = sum(len(values) for _, values in segments)
+            if messagebox.askyesno(
+                "Write Back", f"Write the snapshot values of {registers} differing holding register(s) back?"
+            ):
+                self.write_segments(segments, unit_id, f"differences from {name}")
+        
+        self.log_message(f"Comparing the device with {name} ({reference.describe()})...", "info")
+        threading.Thread(target=compare_thread, daemon=True).start()
+        self.root.after(UI_REFRESH_MS, show_differences)
+    
+    def refresh_stats(self):
+        """Show the current request statistics in the Stats tab, updating rows in place."""
+        snapshot = METRICS.snapshot()
+        tree = self.stats_tree
+        shown = set()
+        for item in snapshot['requests']:
+            iid = f"{item['device']}|{item['function_code']}"
+            shown.add(iid)
+            errors = f"{item['errors']}"
+            if item['exceptions']:
+                errors += " (" + ", ".join(f"{code}: {count}" for code, count in sorted(item['exceptions'].items())) + ")"
+            values = (
+                item['function'], item['requests'], errors, item['retries'], item['timeouts'],
+                f"{item['p50'] * 1000:.2f}", f"{item['p95'] * 1000:.2f}", f"{item['max'] * 1000:.2f}",
+                f"{item['bytes_sent']}/{item['bytes_received']}",
+            )
+            if tree.exists(iid):
+                tree.item(iid, values=values)
+            else:
+                tree.insert("", tk.END, iid=iid, text=item['device'], values=values)
+        for iid in tree.get_children():
+            if iid not in shown:
+                tree.delete(iid)
+        self.queue_stats_var.set("\n".join(
+            f"Queue wait {item['connection']}: p50 {item['p50'] * 1000:.2f} ms, p95 {item['p95'] * 1000:.2f} ms, "
+            f"max {item['max'] * 1000:.2f} ms over {item['wait']['count']} operation(s)"
+            for item in snapshot['queue_wait']
+        ))
+    
+    def reset_stats(self):
+        """Clear the request statistics."""
+        METRICS.reset()
+        self.refresh_stats()
+    
+    def save_stats(self):
+        """Save the request statistics to a JSON file."""
+        path = filedialog.asksaveasfilename(
+            title="Save Request Statistics", defaultextension=".json",
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        try:
+            METRICS.write_json(path)
+            self.log_message(f"Request statistics saved to {path}", "success")
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not save statistics: {e}")
+    
+    def toggle_metrics_server(self):
+        """Start or stop serving metrics over HTTP on localhost, following the checkbox."""
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+            self.log_message("Stopped serving metrics", "info")
+        if not self.metrics_serve_var.get():
+            return
+        try:
+            port = int(self.metrics_port_var.get().strip())
+            if port < 0 or port > 65535:
+                raise ValueError
+        except ValueError:
+            self.metrics_serve_var.set(False)
+            messagebox.showerror("Error", "Invalid metrics port")
+            return
+        server = MetricsServer(METRICS, port)
+        try:
+            server.start()
+        except OSError as e:
+            self.metrics_serve_var.set(False)
+            self.log_message(f"Could not serve metrics on port {port}: {e}", "error")
+            return
+        self.metrics_server = server
+        self.log_message(f"Serving metrics on {server.url} (JSON at /metrics.json)", "success")
+    
+    def toggle_proxy(self):
+        """Start or stop serving other Modbus TCP clients through this connection, following the menu item."""
+        if not self.proxy_var.get():
+            self.stop_proxy()
+            return
+        if not self.connected or not self.engine:
+            self.proxy_var.set(False)
+            messagebox.showerror("Error", "Connect to a device first; the proxy serves it to other clients")
+            return
+        host, _, port = self.proxy_listen.rpartition(":")
+        try:
+            port = int(port)
+        except ValueError:
+            self.proxy_var.set(False)
+            messagebox.showerror("Error", f"Invalid proxy address '{self.proxy_listen}' (proxy_listen in the config)")
+            return
+        engine = self.engine
+        proxy = ModbusProxy(engine, host or "127.0.0.1", port, RegisterCache(self.proxy_ttl_s))
+
+        def on_started(_, error):
+            if error is not None:
+                self.proxy_var.set(False)
+                self.log_message(f"Could not start the proxy on {self.proxy_listen}: {error}", "error")
+                return
+            if self.engine is not engine:
+                engine.submit(proxy.stop)  # Disconnected in the meantime
+                return
+            self.proxy = proxy
+            self.log_message(
+                f"Serving {engine.name} to Modbus TCP clients on {proxy.address} (cache TTL {self.proxy_ttl_s:g} s)",
+                "success"
+            )
+
+        engine.submit(proxy.start, callback=on_started)
+
+    def stop_proxy(self):
+        """Stop the proxy, if it is running, and log what it served."""
+        proxy, self.proxy = self.proxy, None
+        self.proxy_var.set(False)
+        if proxy is None:
+            return
+        try:
+            proxy.engine.call(proxy.stop, timeout=2)
+        except Exception as e:
+            self.log_message(f"Error stopping the proxy: {e}", "error")
+        self.log_message(f"Stopped the proxy: {proxy.stats}", "info")
+
+    def show_about(self):
+        """Show about dialog with author, GitHub link, and license information."""
+        about_text = (
+            "Modbus TCP Master GUI\n\n"
+            "Author: Adrian Shajkofci\n\n"
+            "GitHub: https://github.com/ashajkofci/GUIModbusClientMaster\n\n"
+            "License: BSD 3-Clause License\n\n"
+            "A cross-platform graphical tool for testing Modbus TCP communication."
+        )
+        messagebox.showinfo("About Modbus TCP Master", about_text)
+    
+    def on_closing(self):
+        """Handle window close event."""
+        self.save_config()
+        EVENTS.unsubscribe(self.events.put)
+        if self.connected:
+            self.disconnect()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        self.root.destroy()
+
+
+class ScanDialog:
+    """Window that reads the same register range from many devices in parallel."""
+    
+    def __init__(self, app):
+        """Create the scan window."""
+        self.app = app
+        self.results = queue.Queue()
+        self.cancel = threading.Event()
+        self.thread = None
+        self.rows = {}
+        
+        self.window = tk.Toplevel(app.root)
+        self.window.title("Scan Devices")
+        self.window.geometry("800x500")
+        self.window.columnconfigure(0, weight=1)
+        self.window.rowconfigure(1, weight=1)
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        
+        settings = ttk.Frame(self.window, padding="10")
+        settings.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        settings.columnconfigure(1, weight=1)
+        
+        # Targets, one "host[:port] [units]" per line
+        ttk.Label(settings, text="Targets:").grid(row=0, column=0, sticky=(tk.W, tk.N), padx=(0, 5))
+        self.targets_text = tk.Text(settings, height=5, width=40)
+        self.targets_text.grid(row=0, column=1, columnspan=5, sticky=(tk.W, tk.E), pady=(0, 5))
+        self.targets_text.insert(
+            tk.END,
+            f"# host[:port] [unit IDs, e.g. 1,2,5-8]\n"
+            f"{app.ip_var.get().strip()}:{app.port_var.get().strip()} {app.unit_var.get().strip()}\n"
+        )
+        
+        ttk.Label(settings, text="Start Address:").grid(row=1, column=0, sticky=tk.W, padx=(0, 5))
+        self.start_var = tk.StringVar(value=app.read_start_var.get())
+        ttk.Entry(settings, textvariable=self.start_var, width=10).grid(row=1, column=1, sticky=tk.W)
+        
+        ttk.Label(settings, text="Count:").grid(row=1, column=2, sticky=tk.W, padx=(10, 5))
+        self.count_var = tk.StringVar(value="10")
+        ttk.Entry(settings, textvariable=self.count_var, width=10).grid(row=1, column=3, sticky=tk.W)
+        
+        ttk.Label(settings, text="Parallel:").grid(row=1, column=4, sticky=tk.W, padx=(10, 5))
+        self.workers_var = tk.StringVar(value="16")
+        ttk.Entry(settings, textvariable=self.workers_var, width=6).grid(row=1, column=5, sticky=tk.W)
+        
+        self.scan_btn = ttk.Button(settings, text="Scan", command=self.start_scan)
+        self.scan_btn.grid(row=1, column=6, padx=(10, 0))
+        
+        ttk.Label(settings, text="Table:").grid(row=2, column=0, sticky=tk.W, padx=(0, 5), pady=(5, 0))
+        self.table_var = tk.StringVar(value=app.table_var.get())
+        ttk.Combobox(
+            settings, textvariable=self.table_var, values=[table.name for table in TABLES],
+            state="readonly", width=18
+        ).grid(row=2, column=1, columnspan=3, sticky=tk.W, pady=(5, 0))
+        
+        # Results, one row per target
+        table_frame = ttk.Frame(self.window, padding=(10, 0, 10, 0))
+        table_frame.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        table_frame.columnconfigure(0, weight=1)
+        table_frame.rowconfigure(0, weight=1)
+        self.tree = ttk.Treeview(table_frame, columns=("status", "time"), selectmode="browse")
+        self.tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        y_scroll = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        y_scroll.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        x_scroll = ttk.Scrollbar(table_frame, orient=tk.HORIZONTAL, command=self.tree.xview)
+        x_scroll.grid(row=1, column=0, sticky=(tk.W, tk.E))
+        self.tree.configure(yscrollcommand=y_scroll.set, xscrollcommand=x_scroll.set)
+        
+        self.status_var = tk.StringVar(value="")
+        ttk.Label(self.window, textvariable=self.status_var, padding="10").grid(row=2, column=0, sticky=tk.W)
+    
+    def start_scan(self):
+        """Validate the settings and start the scan in the background."""
+        if self.thread is not None and self.thread.is_alive():
+            return
+        
+        try:
+            targets = parse_targets(self.targets_text.get("1.0", tk.END))
+            start_address = int(self.start_var.get().strip())
+            count = int(self.count_var.get().strip())
+            workers = int(self.workers_var.get().strip())
+            table = table_by_key(self.table_var.get())
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid input values: {e}", parent=self.window)
+            return
+        
+        if not targets:
+            messagebox.showerror("Error", "Please enter at least one target", parent=self.window)
+            return
+        
+        if count <= 0 or count > MAX_READ_REGISTERS:
+            messagebox.showerror("Error", f"Count must be between 1 and {MAX_READ_REGISTERS}", parent=self.window)
+            return
+        
+        if start_address < 0 or start_address + count > 65536:
+            messagebox.showerror("Error", "Address must be between 0 and 65535", parent=self.window)
+            return
+        
+        # One column per register so all targets line up in a single table
+        addresses = [str(start_address + i) for i in range(count)]
+        self.tree.delete(*self.tree.get_children())
+        self.tree.configure(columns=("status", "time", *addresses))
+        self.tree.heading("#0", text="Target")
+        self.tree.column("#0", width=160, stretch=False)
+        self.tree.heading("status", text="Status")
+        self.tree.column("status", width=120, stretch=False)
+        self.tree.heading("time", text="Time (ms)")
+        self.tree.column("time", width=80, stretch=False, anchor=tk.E)
+        for addr in addresses:
+            self.tree.heading(addr, text=addr)
+            self.tree.column(addr, width=60, stretch=False, anchor=tk.E)
+        
+        self.rows = {}
+        for target in targets:
+            if target not in self.rows:
+                self.rows[target] = self.tree.insert("", tk.END, text=str(target), values=("Pending", ""))
+        
+        self.cancel = threading.Event()
+        self.done_count = 0
+        self.total_count = len(targets)
+        self.failed_count = 0
+        self.started = time.perf_counter()
+        self.scan_btn.config(state=tk.DISABLED)
+        self.status_var.set(f"Scanning {len(targets)} target(s)...")
+        self.app.log_message(
+            f"Scanning {len(targets)} target(s), {count} {table.item}(s) at address {start_address}..."
+        )
+        
+        def scan_thread():
+            pool = ConnectionPool(timeout=3)
+            try:
+                scan(pool, targets, start_address, count, workers, on_result=self.results.put, cancel=self.cancel,
+                     table=table)
+            finally:
+                pool.close_all()
+        
+        self.thread = threading.Thread(target=scan_thread, daemon=True)
+        self.thread.start()
+        self.app.root.after(UI_REFRESH_MS, self._pump)
+    
+    def _pump(self):
+        """Move finished results into the table; runs once per UI frame while scanning."""
+        if not self.window.winfo_exists():
+            return
+        
+        while True:
+            try:
+                result = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.done_count += 1
+            elapsed = f"{result.elapsed * 1000:.1f}"
+            if result.ok:
+                values = ("OK", elapsed, *result.values)
+            else:
+                self.failed_count += 1
+                values = (result.error, elapsed)
+            self.tree.item(self.rows[result.target], values=values)
+        
+        if self.thread is not None and self.thread.is_alive():
+            self.status_var.set(f"{self.done_count}/{self.total_count} done, {self.failed_count} failed")
+            self.app.root.after(UI_REFRESH_MS, self._pump)
+            return
+        
+        elapsed = time.perf_counter() - self.started
+        summary = (
+            f"Scanned {self.total_count} target(s) in {elapsed:.2f} s: "
+            f"{self.total_count - self.failed_count} OK, {self.failed_count} failed"
+        )
+        self.status_var.set(summary)
+        self.app.log_message(summary, "success" if not self.failed_count else "error")
+        self.scan_btn.config(state=tk.NORMAL)
+    
+    def close(self):
+        """Cancel any running scan and close the window."""
+        self.cancel.set()
+        self.window.destroy()
+
+
+class RegisterBrowser:
+    """
+    Spreadsheet view of a whole data table, BROWSER_COLUMNS addresses per row.
+
+    The tree only ever holds the rows that fit in the window; scrolling
+    relabels them and asks the page cache which pages to read, so moving
+    through 65536 addresses costs the requests for what is actually looked
+    at (plus read-ahead), never a full dump. Holding register cells can be
+    edited with a double click; edits are queued and written together.
+    """
+
+    def __init__(self, app):
+        """Create the browser window."""
+        self.app = app
+        self.cache = PageCache()
+        self.pending = PendingWrites()
+        self.total_rows = ADDRESS_SPACE // BROWSER_COLUMNS
+        self.top = 0
+        self.rows = []
+        self.direction = 1
+        self.fetching = 0
+        self.generation = 0
+        self.retry_at = 0.0
+        self.writing = False
+        self.source = None
+        self.editor = None
+        self.last_fetch_ms = None
+
+        self.window = tk.Toplevel(app.root)
+        self.window.title("Register Browser")
+        self.window.geometry("760x560")
+        self.window.columnconfigure(0, weight=1)
+        self.window.rowconfigure(1, weight=1)
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        controls = ttk.Frame(self.window, padding="10")
+        controls.grid(row=0, column=0, sticky=(tk.W, tk.E))
+
+        ttk.Label(controls, text="Table:").grid(row=0, column=0, sticky=tk.W, padx=(0, 5))
+        self.table_var = tk.StringVar(value=app.table_var.get())
+        table_box = ttk.Combobox(controls, textvariable=self.table_var, values=[table.name for table in TABLES],
+                                 state="readonly", width=16)
+        table_box.grid(row=0, column=1, sticky=tk.W)
+        table_box.bind("<<ComboboxSelected>>", lambda e: self.reset())
+
+        ttk.Label(controls, text="Go to:").grid(row=0, column=2, sticky=tk.W, padx=(10, 5))
+        self.goto_var = tk.StringVar(value=app.read_start_var.get())
+        goto_entry = ttk.Entry(controls, textvariable=self.goto_var, width=8)
+        goto_entry.grid(row=0, column=3, sticky=tk.W)
+        goto_entry.bind('<Return>', lambda e: self.go_to())
+
+        ttk.Label(controls, text="Format:").grid(row=0, column=4, sticky=tk.W, padx=(10, 5))
+        self.format_var = tk.StringVar(value=BROWSER_FORMATS[0])
+        format_box = ttk.Combobox(controls, textvariable=self.format_var, values=BROWSER_FORMATS,
+                                  state="readonly", width=8)
+        format_box.grid(row=0, column=5, sticky=tk.W)
+        format_box.bind("<<ComboboxSelected>>", lambda e: self.render())
+
+        ttk.Button(controls, text="Refresh", command=self.refresh).grid(row=0, column=6, padx=(10, 0))
+        self.write_btn = ttk.Button(controls, text="Write Pending (0)", command=self.write_pending, state=tk.DISABLED)
+        self.write_btn.grid(row=0, column=7, padx=(10, 0))
+        self.discard_btn = ttk.Button(controls, text="Discard", command=self.discard_pending, state=tk.DISABLED)
+        self.discard_btn.grid(row=0, column=8, padx=(5, 0))
+
+        table_frame = ttk.Frame(self.window, padding=(10, 0, 10, 0))
+        table_frame.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        table_frame.columnconfigure(0, weight=1)
+        table_frame.rowconfigure(0, weight=1)
+        columns = [f"+{offset}" for offset in range(BROWSER_COLUMNS)]
+        self.tree = ttk.Treeview(table_frame, columns=columns, selectmode="none")
+        self.tree.heading("#0", text="Address")
+        self.tree.column("#0", width=90, stretch=False)
+        for column in columns:
+            self.tree.heading(column, text=column)
+            self.tree.column(column, width=70, anchor=tk.E)
+        self.tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        # The scrollbar spans the whole address space, not the few rows in the tree
+        self.scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.on_scrollbar)
+        self.scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<Double-1>", self.begin_edit)
+        self.tree.bind("<MouseWheel>", lambda e: self.scroll_to(self.top - e.delta // 120 * 3))
+        self.tree.bind("<Button-4>", lambda e: self.scroll_to(self.top - 3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll_to(self.top + 3))
+        for key, rows in (("<Up>", -1), ("<Down>", 1)):
+            self.tree.bind(key, lambda e, rows=rows: self.scroll_to(self.top + rows))
+        self.tree.bind("<Prior>", lambda e: self.scroll_to(self.top - len(self.rows)))
+        self.tree.bind("<Next>", lambda e: self.scroll_to(self.top + len(self.rows)))
+        self.tree.bind("<Home>", lambda e: self.scroll_to(0))
+        self.tree.bind("<End>", lambda e: self.scroll_to(self.total_rows))
+
+        self.status_var = tk.StringVar(value="")
+        ttk.Label(self.window, textvariable=self.status_var, padding="10").grid(row=2, column=0, sticky=tk.W)
+
+        self.source = (app.engine, self.unit(), self.table_var.get())
+        self.go_to()
+        self.window.after(BROWSER_TICK_MS, self._tick)
+
+    def table(self):
+        return table_by_key(self.table_var.get())
+
+    def unit(self):
+        try:
+            return int(self.app.unit_var.get().strip())
+        except ValueError:
+            return None
+
+    # ------------------------------------------------------------------ #
+    # Virtual scrolling
+    # ------------------------------------------------------------------ #
+    def on_resize(self, event):
+        """Keep exactly as many tree rows as fit in the window."""
+        row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        wanted = max(1, (event.height - 28) // row_height)
+        if wanted != len(self.rows):
+            while len(self.rows) < wanted:
+                self.rows.append(self.tree.insert("", tk.END, text=""))
+            while len(self.rows) > wanted:
+                self.tree.delete(self.rows.pop())
+            self.scroll_to(self.top)
+
+    def on_scrollbar(self, action, amount, unit=None):
+        """Scrollbar command: 'moveto fraction' or 'scroll n units|pages'."""
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * self.total_rows))
+        elif action == "scroll":
+            step = len(self.rows) if unit == "pages" else 1
+            self.scroll_to(self.top + int(amount) * step)
+
+    def scroll_to(self, row):
+        """Show the rows from row on and fetch whatever is missing."""
+        self.commit_edit()
+        row = max(0, min(row, self.total_rows - len(self.rows)))
+        if row != self.top:
+            self.direction = 1 if row > self.top else -1
+        self.top = row
+        visible = max(1, len(self.rows))
+        self.scrollbar.set(row / self.total_rows, (row + visible) / self.total_rows)
+        self.render()
+        self.fetch()
+        return "break"
+
+    def go_to(self):
+        """Scroll so that the address in the Go to field is on the first row."""
+        try:
+            address = int(self.goto_var.get().strip(), 0)
+        except ValueError:
+            messagebox.showerror("Error", "Invalid address", parent=self.window)
+            return
+        if not 0 <= address < ADDRESS_SPACE:
+            messagebox.showerror("Error", "Address must be between 0 and 65535", parent=self.window)
+            return
+        self.scroll_to(address // BROWSER_COLUMNS)
+
+    def visible_range(self):
+        """(first, last) address on screen."""
+        first = self.top * BROWSER_COLUMNS
+        return first, min(ADDRESS_SPACE, first + len(self.rows) * BROWSER_COLUMNS) - 1
+
+    def format_value(self, value):
+        if self.table().bits:
+            return "1" if value else "0"
+        fmt = self.format_var.get()
+        if fmt == "Hex":
+            return f"0x{value:04X}"
+        if fmt == "Signed":
+            return str(value - 0x10000 if value & 0x8000 else value)
+        return str(value)
+
+    def render(self):
+        """Relabel the tree rows for the current position from the cache and the pending edits."""
+        for index, item in enumerate(self.rows):
+            address = (self.top + index) * BROWSER_COLUMNS
+            cells = []
+            for offset in range(BROWSER_COLUMNS):
+                value, error = self.cache.value(address + offset)
+                if address + offset in self.pending:
+                    cells.append(self.format_value(self.pending.get(address + offset)) + "*")
+                elif error is not None:
+                    cells.append("--")
+                else:
+                    cells.append("" if value is None else self.format_value(value))
+            self.tree.item(item, text=f"{address} (0x{address:04X})", values=cells)
+        self.update_status()
+
+    def update_status(self):
+        first, last = self.visible_range()
+        parts = [f"Addresses {first}-{last}", f"{len(self.cache)}/{self.cache.capacity} pages cached"]
+        if self.fetching:
+            parts.append("reading...")
+        elif self.last_fetch_ms is not None:
+            parts.append(f"last read {self.last_fetch_ms:.1f} ms")
+        if self.pending:
+            parts.append(f"{len(self.pending)} pending write(s)")
+        self.status_var.set(", ".join(parts))
+
+    # ------------------------------------------------------------------ #
+    # Fetching pages
+    # ------------------------------------------------------------------ #
+    def _tick(self):
+        """Follow connection, unit and table changes and retry fetches; runs while the window is open."""
+        if not self.window.winfo_exists():
+            return
+        source = (self.app.engine, self.unit(), self.table_var.get())
+        if source != self.source:
+            # Another device, unit or table: nothing cached or queued applies any more
+            self.source = source
+            self.pending.clear()
+            self.update_write_buttons()
+            self.refresh()
+        else:
+            self.fetch()
+        self.window.after(BROWSER_TICK_MS, self._tick)
+
+    def fetch(self):
+        """Read the visible pages that are missing, then read-ahead pages; one batch at a time."""
+        engine = self.app.engine
+        unit = self.unit()
+        if self.fetching or engine is None or not self.app.connected or unit is None:
+            return
+        if time.monotonic() < self.retry_at:
+            return
+        first, last = self.visible_range()
+        pages = self.cache.wanted(first, last, self.direction)
+        if not pages:
+            return
+        self.read_pages(engine, unit, self.table(), pages)
+
+    def read_pages(self, engine, unit, table, pages):
+        """Read pages as one pipelined batch; if the device rejects the batch, read them one by one."""
+        blocks = [self.cache.page_block(start) for start in pages]
+        generation = self.generation
+        self.fetching += 1
+        started = time.perf_counter()
+
+        def on_read(values, error):
+            if generation != self.generation or not self.window.winfo_exists():
+                return  # Read for a cache that has been cleared since
+            self.fetching -= 1
+            if error is None:
+                self.last_fetch_ms = (time.perf_counter() - started) * 1000
+                for start, block_values in zip(pages, values):
+                    self.cache.put(start, block_values if table.bits else list(block_values))
+            elif isinstance(error, ModbusResponseError) and len(pages) > 1:
+                # Find the rejected pages without giving up on the others
+                for start in pages:
+                    self.read_pages(engine, unit, table, [start])
+                return
+            elif isinstance(error, ModbusResponseError):
+                self.cache.put(pages[0], error=str(error))
+            else:
+                # Timeouts and lost connections: try again on a later tick
+                self.retry_at = time.monotonic() + BROWSER_RETRY_S
+                self.status_var.set(f"Read failed: {error}")
+                return
+            self.render()
+            self.fetch()
+
+        engine.submit(engine.read_blocks, blocks, unit, table, callback=on_read)
+
+    def refresh(self):
+        """Forget every cached page and read the visible ones again."""
+        self.cache.clear()
+        self.generation += 1
+        self.fetching = 0
+        self.render()
+        self.fetch()
+
+    def reset(self):
+        """Start over after the table changed."""
+        self.discard_pending()
+        self.source = (self.app.engine, self.unit(), self.table_var.get())
+        self.refresh()
+
+    # ------------------------------------------------------------------ #
+    # Inline editing and queued writes
+    # ------------------------------------------------------------------ #
+    def begin_edit(self, event):
+        """Put an entry over the double-clicked holding register cell."""
+        if self.table() != HOLDING_REGISTERS:
+            self.status_var.set(f"Only holding registers can be written ({self.table()} are read-only)")
+            return
+        item, column = self.tree.identify_row(event.y), self.tree.identify_column(event.x)
+        if not item or column == "#0":
+            return
+        self.commit_edit()
+        offset = int(column[1:]) - 1
+        address = (self.top + self.rows.index(item)) * BROWSER_COLUMNS + offset
+        x, y, width, height = self.tree.bbox(item, column)
+        value = self.pending.get(address)
+        if value is None:
+            value, _ = self.cache.value(address)
+        entry = ttk.Entry(self.tree, justify=tk.RIGHT)
+        entry.insert(0, "" if value is None else str(value))
+        entry.select_range(0, tk.END)
+        entry.place(x=x, y=y, width=width, height=height)
+        entry.focus_set()
+        entry.bind('<Return>', lambda e: self.commit_edit())
+        entry.bind('<Escape>', lambda e: self.cancel_edit())
+        entry.bind('<FocusOut>', lambda e: self.commit_edit())
+        self.editor = (entry, address)
+
+    def commit_edit(self):
+        """Queue the value typed in the open editor, if any."""
+        if self.editor is None:
+            return
+        entry, address = self.editor
+        text = entry.get().strip()
+        self.cancel_edit()
+        if not text:
+            return
+        try:
+            value = parse_register_values(text)[0]
+        except ValueError as e:
+            messagebox.showerror("Error", str(e), parent=self.window)
+            return
+        current, _ = self.cache.value(address)
+        if value == current and address not in self.pending:
+            return
+        self.pending.set(address, value)
+        self.update_write_buttons()
+        self.render()
+
+    def cancel_edit(self):
+        if self.editor is not None:
+            self.editor[0].destroy()
+            self.editor = None
+
+    def update_write_buttons(self):
+        state = tk.NORMAL if self.pending and not self.writing else tk.DISABLED
+        self.write_btn.config(text=f"Write Pending ({len(self.pending)})", state=state)
+        self.discard_btn.config(state=tk.NORMAL if self.pending else tk.DISABLED)
+
+    def discard_pending(self):
+        self.cancel_edit()
+        self.pending.clear()
+        self.update_write_buttons()
+        self.render()
+
+    def write_pending(self):
+        """Write the queued edits as contiguous blocks in one batch."""
+        self.commit_edit()
+        engine, unit = self.app.engine, self.unit()
+        if engine is None or not self.app.connected or unit is None or not self.pending:
+            messagebox.showerror("Error", "Not connected to server", parent=self.window)
+            return
+        blocks = self.pending.blocks()
+        written = dict(self.pending.values)
+        self.writing = True
+        self.update_write_buttons()
+        started = time.perf_counter()
+        count = len(written)
+
+        def on_written(requests, error):
+            self.writing = False
+            if not self.window.winfo_exists():
+                return
+            if error is not None:
+                self.update_write_buttons()
+                self.app.report_error(error, "Write Error", "Error writing browser edits")
+                return
+            for address, values in blocks:
+                self.cache.update(address, values)
+            for address, value in written.items():
+                if self.pending.get(address) == value:
+                    self.pending.values.pop(address)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.app.log_message(
+                f"Wrote {count} register(s) in {requests} request(s) from the register browser "
+                f"in {elapsed_ms:.1f} ms", "success"
+            )
+            self.update_write_buttons()
+            self.render()
+
+        engine.submit(engine.write_blocks, blocks, unit, callback=on_written)
+
+    def close(self):
+        """Close the window; unwritten edits are dropped."""
+        if self.pending and not messagebox.askyesno(
+                "Register Browser", f"Discard {len(self.pending)} unwritten edit(s)?", parent=self.window):
+            return
+        self.window.destroy()
+
+
+class WriteSequenceDialog:
+    """
+    Window that runs a write sequence (see write_sequence) on the connected device.
+
+    The steps run back-to-back on the engine with nothing else in between;
+    each one's latency and result are shown once the sequence is done.
+    """
+    
+    EXAMPLE = (
+        "# One step per line or separated by ';' (see write_sequence.py)\n"
+        "# write ADDR V...   rw ADDR V... [read ADDR N]   mask ADDR AND OR\n"
+        "# setbits ADDR BIT...   clearbits ADDR BIT...   read ADDR N   delay MS\n"
+    )
+    
+    def __init__(self, app):
+        """Create the sequence window."""
+        self.app = app
+        self.steps = []
+        self.running = False
+        
+        self.window = tk.Toplevel(app.root)
+        self.window.title("Write Sequence")
+        self.window.geometry("760x520")
+        self.window.columnconfigure(0, weight=1)
+        self.window.rowconfigure(1, weight=1)
+        
+        settings = ttk.Frame(self.window, padding="10")
+        settings.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        settings.columnconfigure(0, weight=1)
+        
+        self.text = tk.Text(settings, height=10, width=60)
+        self.text.grid(row=0, column=0, columnspan=4, sticky=(tk.W, tk.E), pady=(0, 5))
+        self.text.insert(tk.END, self.EXAMPLE)
+        
+        self.keep_going_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(settings, text="Continue after a failed step", variable=self.keep_going_var).grid(
+            row=1, column=0, sticky=tk.W
+        )
+        ttk.Button(settings, text="Load...", command=self.load).grid(row=1, column=1, padx=(5, 0))
+        self.run_btn = ttk.Button(settings, text="Run", command=self.run)
+        self.run_btn.grid(row=1, column=2, padx=(5, 0))
+        
+        table_frame = ttk.Frame(self.window, padding=(10, 0, 10, 0))
+        table_frame.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        table_frame.columnconfigure(0, weight=1)
+        table_frame.rowconfigure(0, weight=1)
+        self.tree = ttk.Treeview(table_frame, columns=("step", "latency", "result"), show="headings")
+        self.tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.tree.heading("step", text="Step")
+        self.tree.column("step", width=220, stretch=False)
+        self.tree.heading("latency", text="Latency (ms)")
+        self.tree.column("latency", width=90, stretch=False, anchor=tk.E)
+        self.tree.heading("result", text="Result")
+        self.tree.column("result", width=400)
+        self.tree.tag_configure("failed", foreground="red")
+        y_scroll = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        y_scroll.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.tree.configure(yscrollcommand=y_scroll.set)
+        
+        self.status_var = tk.StringVar(value="")
+        ttk.Label(self.window, textvariable=self.status_var, padding="10").grid(row=2, column=0, sticky=tk.W)
+    
+    def load(self):
+        """Replace the text with a sequence file."""
+        path = filedialog.askopenfilename(
+            title="Open Write Sequence", filetypes=[("Write sequences", "*.seq *.txt"), ("All files", "*.*")],
+            parent=self.window
+        )
+        if not path:
+            return
+        try:
+            text = Path(path).read_text()
+        except OSError as e:
+            messagebox.showerror("Write Sequence", f"Could not read {path}:\n{e}", parent=self.window)
+            return
+        self.text.delete("1.0", tk.END)
+        self.text.insert(tk.END, text)
+    
+    def run(self):
+        """Parse the steps and run them on the connected device."""
+        if self.running:
+            return
+        app = self.app
+        if not app.connected or not app.engine:
+            messagebox.showerror("Error", "Not connected to server", parent=self.window)
+            return
+        try:
+            steps = parse_sequence(self.text.get("1.0", tk.END))
+            unit_id = int(app.unit_var.get().strip())
+        except ValueError as e:
+            messagebox.showerror("Write Sequence", str(e), parent=self.window)
+            return
+        
+        self.steps = steps
+        self.running = True
+        self.run_btn.config(state=tk.DISABLED)
+        self.tree.delete(*self.tree.get_children())
+        for step in steps:
+            self.tree.insert("", tk.END, values=(str(step), "", "Pending"))
+        self.status_var.set(f"Running {len(steps)} step(s)...")
+        app.log_message(f"Running a write sequence of {len(steps)} step(s)...")
+        
+        def on_done(results, error):
+            self.running = False
+            if not self.window.winfo_exists():
+                return
+            self.run_btn.config(state=tk.NORMAL)
+            if error is not None:
+                self.status_var.set(f"Sequence failed: {error}")
+                app.report_error(error, "Write Sequence", "Error running write sequence")
+                return
+            for row, result in zip(self.tree.get_children(), results):
+                self.tree.item(row, values=(str(result.step), f"{result.latency * 1000:.2f}", result.describe()),
+                               tags=() if result.ok else ("failed",))
+            for row in self.tree.get_children()[len(results):]:
+                self.tree.item(row, values=(self.tree.item(row, "values")[0], "", "Not run"))
+            summary = summarize(results, steps)
+            self.status_var.set(summary)
+            ok = len(results) == len(steps) and all(result.ok for result in results)
+            app.log_message(f"Write sequence: {summary}", "success" if ok else "error")
+        
+        app.engine.submit(app.engine.run_sequence, steps, unit_id, self.keep_going_var.get(), callback=on_done)
 
 
 def main():
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Modbus TCP proxy: many downstream clients, one upstream connection.
+
+Small PLCs accept only a few connections and are easily overloaded by
+several tools polling the same registers. ModbusProxy listens for Modbus TCP
+clients and serves them all through a single async_engine.ModbusEngine (over
+any transport, so it also works as a TCP-to-RTU gateway):
+
+- Reads (function codes 1-4) are answered from a RegisterCache when every
+  requested entry is younger than its TTL, with no upstream traffic. The TTL
+  is configurable per table and address range (TtlRule); 0 means never
+  cached.
+- Misses for the same unit and table are queued and read as one pipelined
+  batch as soon as the engine is free. A read identical to one already
+  queued or in flight waits for that one's answer instead of being sent
+  again.
+- Everything else (writes, diagnostics, ...) is passed through as is. The
+  engine's I/O lock is first come, first served, so writes reach the device
+  in the order they arrived. A write invalidates the cached entries it
+  touches, and reads that were in flight across a write are not cached.
+
+Exception responses from the device are passed back unchanged. When the
+device cannot be reached the proxy answers with exception 0x0A (gateway path
+unavailable) or 0x0B (gateway target failed to respond), as a Modbus gateway
+does.
+
+The proxy runs on the engine's event loop: start it with
+engine.call(proxy.start) and stop it with engine.call(proxy.stop).
+"""
+
+import asyncio
+import logging
+import struct
+import time
+from array import array
+from collections import namedtuple
+
+from async_engine import CONNECTED
+from modbus_core import ModbusResponseError, PackedBits, table_by_key, TABLES
+
+DEFAULT_LISTEN_PORT = 5502
+DEFAULT_TTL = 0.5       # seconds a cached value is served for, unless a TtlRule says otherwise
+DEFAULT_MAX_CLIENTS = 64
+MBAP_HEADER = struct.Struct(">HHHB")
+READ_REQUEST = struct.Struct(">HH")
+
+ILLEGAL_FUNCTION = 0x01
+ILLEGAL_DATA_ADDRESS = 0x02
+ILLEGAL_DATA_VALUE = 0x03
+GATEWAY_PATH_UNAVAILABLE = 0x0A
+GATEWAY_TARGET_FAILED = 0x0B
+
+# Function codes that only read; anything else passed through invalidates the cache
+READ_ONLY_FUNCTIONS = frozenset((7, 11, 12, 17, 20, 24, 43))
+# Written table and (address offset, count offset or None for one entry) of the known write requests
+WRITE_LAYOUT = {
+    5: ('coils', 1, None),
+    15: ('coils', 1, 3),
+    6: ('holding', 1, None),
+    16: ('holding', 1, 3),
+    22: ('holding', 1, None),
+    23: ('holding', 5, 7),
+}
+
+_TABLES_BY_FUNCTION = {table.function_code: table for table in TABLES}
+
+logger = logging.getLogger(__name__)
+
+
+class TtlRule(namedtuple('TtlRule', 'table first last ttl')):
+    """Cache values of table (a key such as 'holding', or None for all) at first..last for ttl seconds."""
+
+    __slots__ = ()
+
+    def __str__(self):
+        table = f"{self.table}:" if self.table else ""
+        return f"{table}{self.first}-{self.last}={self.ttl:g}"
+
+
+def parse_ttl_rule(text):
+    """
+    Parse "[TABLE:]FIRST[-LAST]=SECONDS", e.g. "holding:0-99=0.1" or "1000-1999=5".
+
+    Raises ValueError.
+    """
+    where, sep, seconds = text.partition("=")
+    if not sep:
+        raise ValueError(f"TTL rule '{text}': expected [TABLE:]FIRST[-LAST]=SECONDS")
+    table, _, addresses = where.rpartition(":")
+    if table:
+        table = table_by_key(table).key
+    first, _, last = addresses.partition("-")
+    try:
+        first = int(first, 0)
+        last = int(last, 0) if last else first
+        ttl = float(seconds)
+    except ValueError:
+        raise ValueError(f"TTL rule '{text}': addresses must be integers and the TTL a number of seconds") from None
+    if not 0 <= first <= last <= 65535:
+        raise ValueError(f"TTL rule '{text}': addresses must be 0-65535, first <= last")
+    if ttl < 0:
+        raise ValueError(f"TTL rule '{text}': the TTL cannot be negative")
+    return TtlRule(table or None, first, last, ttl)
+
+
+class RegisterCache:
+    """
+    Last values read from each (unit, table), with the time each was read.
+
+    Values and read times are kept in flat arrays over the whole address
+    space, so checking and slicing a 125-register range is a couple of
+    C-level slice operations.
+    """
+
+    def __init__(self, default_ttl=DEFAULT_TTL, rules=()):
+        self.default_ttl = default_ttl
+        self.rules = list(rules)
+        self.tables = {}
+
+    def ttl(self, table, address, count):
+        """TTL of a range: the shortest of the rules overlapping it (and the default unless one rule covers it)."""
+        last = address + count - 1
+        ttls = []
+        covered = False
+        for rule in self.rules:
+            if rule.table not in (None, table.key) or rule.last < address or rule.first > last:
+                continue
+            ttls.append(rule.ttl)
+            covered = covered or (rule.first <= address and last <= rule.last)
+        if not covered:
+            ttls.append(self.default_ttl)
+        return min(ttls)
+
+    def get(self, unit, table, address, count, now=None):
+        """Return the cached values of the range if all are younger than its TTL, else None."""
+        entry = self.tables.get((unit, table.key))
+        if entry is None:
+            return None
+        ttl = self.ttl(table, address, count)
+        if ttl <= 0:
+            return None
+        values, read_at = entry
+        now = time.monotonic() if now is None else now
+        if min(read_at[address:address + count]) < now - ttl:
+            return None
+        return values[address:address + count]
+
+    def put(self, unit, table, address, values, now=None):
+        """Store values read at address."""
+        entry = self.tables.get((unit, table.key))
+        if entry is None:
+            entry = self.tables[(unit, table.key)] = (array('H', bytes(2 * 65536)), array('d', [-1e300]) * 65536)
+        now = time.monotonic() if now is None else now
+        count = len(values)
+        entry[0][address:address + count] = array('H', values)
+        entry[1][address:address + count] = array('d', [now]) * count
+
+    def invalidate(self, unit, table=None, address=0, count=65536):
+        """Forget a range of one table, or every table of the unit when table is None."""
+        for (entry_unit, key), (_, read_at) in self.tables.items():
+            if entry_unit == unit and (table is None or key == table.key):
+                read_at[address:address + count] = array('d', [-1e300]) * count
+
+    def clear(self):
+        self.tables.clear()
+
+
+class ProxyStats:
+    """Counters of a ModbusProxy."""
+
+    __slots__ = ('clients', 'connections', 'rejected', 'requests', 'hits', 'misses', 'coalesced', 'batches',
+                 'upstream_reads', 'forwarded', 'exceptions', 'gateway_errors')
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __str__(self):
+        reads = self.hits + self.misses + self.coalesced
+        hit_rate = f" ({100 * (self.hits + self.coalesced) / reads:.0f}% without a request)" if reads else ""
+        return (
+            f"{self.clients} client(s) connected, {self.requests} request(s): {self.hits} cache hit(s), "
+            f"{self.coalesced} coalesced, {self.misses} miss(es){hit_rate}; {self.upstream_reads} upstream "
+            f"read(s) in {self.batches} batch(es), {self.forwarded} forwarded, {self.exceptions} exception(s), "
+            f"{self.gateway_errors} gateway error(s)"
+        )
+
+
+class _ReadQueue:
+    """Reads waiting for (or in) the next upstream batch of one unit and table, by (address, count)."""
+
+    def __init__(self):
+        self.waiting = {}
+        self.in_flight = {}
+        self.task = None
+
+
+class ModbusProxy:
+    """Modbus TCP server that answers from a RegisterCache and forwards the rest through a ModbusEngine."""
+
+    def __init__(self, engine, host="127.0.0.1", port=DEFAULT_LISTEN_PORT, cache=None,
+                 max_clients=DEFAULT_MAX_CLIENTS):
+        self.engine = engine
+        self.host = host
+        self.port = port
+        self.cache = cache or RegisterCache()
+        self.max_clients = max_clients
+        self.stats = ProxyStats()
+        self.server = None
+        self._queues = {}
+        self._write_epoch = {}
+        self._connections = set()
+        self._decoder = None
+
+    @property
+    def address(self):
+        """host:port the proxy listens on (the actual port once started on port 0)."""
+        if self.server is not None and self.server.sockets:
+            host, port = self.server.sockets[0].getsockname()[:2]
+            return f"{host}:{port}"
+        return f"{self.host}:{self.port}"
+
+    async def start(self):
+        """Start listening (on the engine's loop)."""
+        self.server = await asyncio.start_server(self._serve, self.host, self.port)
+
+    async def stop(self):
+        """Stop listening and disconnect every client."""
+        if self.server is not None:
+            self.server.close()
+            for writer in list(self._connections):
+                writer.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def _serve(self, reader, writer):
+        """Read MBAP frames from one client and answer each as soon as it is done."""
+        peer = writer.get_extra_info('peername')
+        if self.stats.clients >= self.max_clients:
+            self.stats.rejected += 1
+            logger.warning("Proxy: refusing %s, already serving %d clients", peer, self.stats.clients)
+            writer.close()
+            return
+        self.stats.clients += 1
+        self.stats.connections += 1
+        self._connections.add(writer)
+        tasks = set()
+        try:
+            while True:
+                header = await reader.readexactly(MBAP_HEADER.size)
+                tid, protocol, length, unit = MBAP_HEADER.unpack(header)
+                if protocol != 0 or not 2 <= length <= 254:
+                    logger.warning("Proxy: bad MBAP header from %s, closing the connection", peer)
+                    break
+                pdu = await reader.readexactly(length - 1)
+                self.stats.requests += 1
+                task = asyncio.ensure_future(self._answer(writer, tid, unit, pdu))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._connections.discard(writer)
+            self.stats.clients -= 1
+            writer.close()
+
+    async def _answer(self, writer, tid, unit, pdu):
+        response = await self.handle(unit, pdu)
+        if not writer.is_closing():
+            writer.write(MBAP_HEADER.pack(tid, 0, len(response) + 1, unit) + response)
+
+    async def handle(self, unit, pdu):
+        """Return the response PDU to a request PDU for unit."""
+        function_code = pdu[0]
+        table = _TABLES_BY_FUNCTION.get(function_code)
+        if table is None:
+            return await self._forward(unit, pdu)
+        if len(pdu) != 1 + READ_REQUEST.size:
+            return self._exception(function_code, ILLEGAL_DATA_VALUE)
+        address, count = READ_REQUEST.unpack_from(pdu, 1)
+        if not 1 <= count <= table.max_read:
+            return self._exception(function_code, ILLEGAL_DATA_VALUE)
+        if address + count > 65536:
+            return self._exception(function_code, ILLEGAL_DATA_ADDRESS)
+        try:
+            values = await self.read(unit, table, address, count)
+        except Exception as e:
+            return self._error_response(function_code, e)
+        if table.bits:
+            data = PackedBits.from_bits(values).data
+            return bytes((function_code, len(data))) + data
+        return bytes((function_code, 2 * count)) + struct.pack(f">{count}H", *values)
+
+    async def read(self, unit, table, address, count):
+        """Values of a range: from the cache, an identical read already under way, or the next upstream batch."""
+        values = self.cache.get(unit, table, address, count)
+        if values is not None:
+            self.stats.hits += 1
+            return values
+        queue = self._queues.get((unit, table.key))
+        if queue is None:
+            queue = self._queues[(unit, table.key)] = _ReadQueue()
+        block = (address, count)
+        future = queue.waiting.get(block) or queue.in_flight.get(block)
+        if future is not None:
+            self.stats.coalesced += 1
+        else:
+            self.stats.misses += 1
+            future = queue.waiting[block] = asyncio.get_running_loop().create_future()
+            if queue.task is None:
+                queue.task = asyncio.ensure_future(self._flush(unit, table, queue))
+        return await asyncio.shield(future)
+
+    async def _flush(self, unit, table, queue):
+        """Read everything queued for one unit and table, batch after batch, until nothing is waiting."""
+        try:
+            while queue.waiting:
+                queue.in_flight, queue.waiting = queue.waiting, {}
+                blocks = list(queue.in_flight)
+                epoch = self._write_epoch.get(unit, 0)
+                results = await self._read_batch(unit, table, blocks)
+                cacheable = self._write_epoch.get(unit, 0) == epoch
+                now = time.monotonic()
+                for block, values in zip(blocks, results):
+                    future = queue.in_flight[block]
+                    if future.done():
+                        continue
+                    if isinstance(values, Exception):
+                        future.set_exception(values)
+                        continue
+                    values = list(values)
+                    if cacheable:
+                        self.cache.put(unit, table, block[0], values, now)
+                    future.set_result(values)
+                queue.in_flight = {}
+        finally:
+            queue.task = None
+            for future in queue.in_flight.values():
+                if not future.done():
+                    future.cancel()
+            queue.in_flight = {}
+
+    async def _read_batch(self, unit, table, blocks):
+        """Read blocks as one pipelined batch; returns their values, or the exception for blocks that failed."""
+        self.stats.batches += 1
+        self.stats.upstream_reads += len(blocks)
+        try:
+            return await self.engine.read_blocks(blocks, unit, table)
+        except ModbusResponseError as e:
+            if len(blocks) == 1:
+                return [e]
+        except Exception as e:
+            return [e] * len(blocks)
+        # One block is refused: read them one by one so the others still get answers
+        results = []
+        for block in blocks:
+            self.stats.upstream_reads += 1
+            try:
+                results.append((await self.engine.read_blocks([block], unit, table))[0])
+            except Exception as e:
+                results.append(e)
+        return results
+
+    async def _forward(self, unit, pdu):
+        """Pass a request through to the device as is and return its response PDU."""
+        if self._decoder is None:
+            from pymodbus.factory import ServerDecoder
+
+            # Building a decoder registers every request class; do it once, not per forwarded request
+            self._decoder = ServerDecoder()
+        function_code = pdu[0]
+        try:
+            request = self._decoder.decode(pdu)
+        except Exception:
+            request = None
+        if request is None:
+            return self._exception(function_code, ILLEGAL_FUNCTION)
+        self.stats.forwarded += 1
+        writes = function_code not in READ_ONLY_FUNCTIONS
+        if writes:
+            self._write_epoch[unit] = self._write_epoch.get(unit, 0) + 1
+            self._invalidate(unit, pdu)
+        try:
+            response = await self.engine.execute(request, unit)
+        except Exception as e:
+            return self._error_response(function_code, e)
+        finally:
+            if writes:
+                self._write_epoch[unit] += 1
+                self._invalidate(unit, pdu)
+        return bytes((response.function_code,)) + response.encode()
+
+    def _invalidate(self, unit, pdu):
+        """Forget the cached entries a passed-through request may change."""
+        layout = WRITE_LAYOUT.get(pdu[0])
+        if layout is None or len(pdu) < 5:
+            self.cache.invalidate(unit)
+            return
+        key, address_at, count_at = layout
+        address = int.from_bytes(pdu[address_at:address_at + 2], 'big')
+        count = 1
+        if count_at is not None and len(pdu) >= count_at + 2:
+            count = int.from_bytes(pdu[count_at:count_at + 2], 'big')
+        self.cache.invalidate(unit, table_by_key(key), address, max(0, min(count, 65536 - address)))
+
+    def _error_response(self, function_code, error):
+        """Exception response PDU for an upstream failure."""
+        code = getattr(error, 'exception_code', None)
+        if isinstance(error, ModbusResponseError) and code is not None:
+            self.stats.exceptions += 1
+            return self._exception(function_code, code)
+        self.stats.gateway_errors += 1
+        logger.debug("Proxy: upstream request failed: %s", error)
+        if self.engine.state != CONNECTED:
+            return self._exception(function_code, GATEWAY_PATH_UNAVAILABLE)
+        return self._exception(function_code, GATEWAY_TARGET_FAILED)
+
+    @staticmethod
+    def _exception(function_code, code):
+        return bytes((function_code | 0x80, code))
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Periodic register polling for the Modbus TCP Master GUI.
+
+The poller runs one long-lived worker thread. Cycles are scheduled against
+absolute deadlines (start + n * period) so the rate does not drift with the
+time each read takes. A read that overruns its period is followed at once by
+the cycle that is due, and cycles whose whole period passed meanwhile are
+skipped rather than queued. Results are not pushed to the UI; the UI picks
+up the latest one whenever it is ready, so any number of cycles between two
+screen refreshes collapses into a single update. Consumers that need every
+sample, such as the command-line interface, can pass an on_result callback
+instead.
+
+GroupPoller does the same for several poll groups with their own periods
+and priorities on one connection (one worker thread). Groups that are due
+together are merged into one read so their requests can be pipelined, as
+long as the estimated read time fits in the period of the most urgent of
+them; the rest wait for the next turn, in priority order. A group that has
+waited longer than its own period goes first regardless of priority so it
+cannot starve, and cycles missed by an overrun are skipped, not queued.
+Every group reports its lateness and achieved rate.
+"""
+
+import threading
+import time
+
+MIN_POLL_PERIOD = 0.010
+
+# Weight of the newest sample in the running per-request time estimate
+REQUEST_TIME_SMOOTHING = 0.2
+
+
+class PollResult:
+    """Outcome of one poll cycle."""
+
+    __slots__ = ('sequence', 'timestamp', 'values', 'error', 'duration')
+
+    def __init__(self, sequence, timestamp, values=None, error=None, duration=0.0):
+        self.sequence = sequence
+        self.timestamp = timestamp
+        self.values = values
+        self.error = error
+        self.duration = duration
+
+
+class Poller:
+    """
+    Call read_fn every period seconds on a dedicated thread.
+
+    If on_result is given it is called with every PollResult from the worker
+    thread; max_cycles, if non-zero, stops the poller after that many cycles.
+    """
+
+    def __init__(self, read_fn, period, on_result=None, max_cycles=0):
+        self.read_fn = read_fn
+        self.period = max(MIN_POLL_PERIOD, period)
+        self.on_result = on_result
+        self.max_cycles = max_cycles
+        self.cycles = 0
+        self.errors = 0
+        self.skipped = 0
+        self._latest = None
+        self._taken = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        """True while the worker thread is alive."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start polling; does nothing if already running."""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="modbus-poller", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout=None):
+        """Block until the worker thread has finished; returns True if it has."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return not self.running
+
+    def stop(self, timeout=None):
+        """Ask the worker to stop and optionally wait for it."""
+        self._stop.set()
+        if self._thread is not None and timeout is not None:
+            self._thread.join(timeout)
+
+    def take_latest(self):
+        """Return the newest result not yet taken, or None if there is nothing new."""
+        with self._lock:
+            latest = self._latest
+            if latest is None or latest.sequence == self._taken:
+                return None
+            self._taken = latest.sequence
+            return latest
+
+    def _run(self):
+        """Worker loop with drift-free deadlines."""
+        next_due = time.monotonic()
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                values = self.read_fn()
+                error = None
+            except Exception as e:
+                values = None
+                error = e
+            finished = time.monotonic()
+
+            self.cycles += 1
+            if error is not None:
+                self.errors += 1
+            result = PollResult(self.cycles, time.time(), values, error, finished - started)
+            with self._lock:
+                self._latest = result
+            if self.on_result is not None:
+                self.on_result(result)
+            if self.max_cycles and self.cycles >= self.max_cycles:
+                break
+
+            next_due += self.period
+            if finished > next_due:
+                # Overrun: start the cycle that is due now at once, but drop the
+                # ones whose whole period has passed instead of bursting to catch up
+                missed = int((finished - next_due) // self.period)
+                self.skipped += missed
+                next_due += missed * self.period
+            self._stop.wait(max(0.0, next_due - time.monotonic()))
+
+
+class ScheduledGroup:
+    """Schedule and statistics of one group of a GroupPoller."""
+
+    def __init__(self, key, period, priority=0, cost=1):
+        self.key = key
+        self.period = max(MIN_POLL_PERIOD, period)
+        self.priority = priority
+        self.cost = max(1, cost)
+        self.next_due = 0.0
+        self.first_run = None
+        self.last_run = None
+        self.cycles = 0
+        self.errors = 0
+        self.skipped = 0
+        self.overruns = 0
+        self.last_lateness = 0.0
+        self.max_lateness = 0.0
+        self.total_lateness = 0.0
+        self.last_duration = 0.0
+        self.latest = None
+        self.taken = 0
+
+    @property
+    def mean_lateness(self):
+        """Average delay between the due time and the start of the read, in seconds."""
+        return self.total_lateness / self.cycles if self.cycles else 0.0
+
+    @property
+    def achieved_rate(self):
+        """Cycles per second between the first and the latest read."""
+        if self.cycles < 2 or self.last_run <= self.first_run:
+            return 0.0
+        return (self.cycles - 1) / (self.last_run - self.first_run)
+
+    def stats(self):
+        """The group's statistics as a dict."""
+        return {
+            "period_ms": round(self.period * 1000, 3),
+            "priority": self.priority,
+            "cycles": self.cycles,
+            "errors": self.errors,
+            "skipped": self.skipped,
+            "overruns": self.overruns,
+            "target_rate": round(1 / self.period, 3),
+            "achieved_rate": round(self.achieved_rate, 3),
+            "last_lateness_ms": round(self.last_lateness * 1000, 3),
+            "mean_lateness_ms": round(self.mean_lateness * 1000, 3),
+            "max_lateness_ms": round(self.max_lateness * 1000, 3),
+            "last_duration_ms": round(self.last_duration * 1000, 3),
+        }
+
+
+class GroupPoller(Poller):
+    """
+    Poll several groups at their own rates on one worker thread.
+
+    groups is a list of ScheduledGroup; read_fn(keys) reads the groups with
+    those keys in one go and returns their values in the same order. If
+    on_result is given it is called as on_result(key, PollResult) from the
+    worker thread. max_cycles, if non-zero, stops the poller once the
+    fastest group has run that many cycles.
+    """
+
+    def __init__(self, groups, read_fn, on_result=None, max_cycles=0):
+        super().__init__(read_fn, min(group.period for group in groups), on_result, max_cycles)
+        self.groups = list(groups)
+        self.request_time = 0.0
+
+    def take_latest(self):
+        """Return [(key, PollResult), ...] for every group with a result not yet taken."""
+        results = []
+        with self._lock:
+            for group in self.groups:
+                latest = group.latest
+                if latest is not None and latest.sequence != group.taken:
+                    group.taken = latest.sequence
+                    results.append((group.key, latest))
+        return results
+
+    def stats(self):
+        """{key: statistics} for every group."""
+        return {group.key: group.stats() for group in self.groups}
+
+    def _next_batch(self, now):
+        """Return the due groups to read now, most urgent first, or [] if none is due."""
+        due = [group for group in self.groups if group.next_due <= now]
+        if not due:
+            return []
+        # Starving groups first, then by priority, then faster groups, then the longest waiting
+        due.sort(key=lambda g: (now - g.next_due < g.period, g.priority, g.period, g.next_due))
+        batch = [due[0]]
+        budget = due[0].period
+        estimate = due[0].cost * self.request_time
+        for group in due[1:]:
+            estimate += group.cost * self.request_time
+            if estimate > budget:
+                break
+            batch.append(group)
+        return batch
+
+    def _read(self, batch):
+        """
+        Read a batch of groups; returns [(values, error), ...] per group.
+
+        If a merged read fails, the groups are read one by one so a single
+        failing group does not take the others down with it.
+        """
+        started = time.monotonic()
+        try:
+            values = self.read_fn([group.key for group in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                return [(None, e)]
+            return [self._read([group])[0] for group in batch]
+        sample = (time.monotonic() - started) / sum(group.cost for group in batch)
+        if self.request_time:
+            sample = self.request_time + REQUEST_TIME_SMOOTHING * (sample - self.request_time)
+        self.request_time = sample
+        return [(group_values, None) for group_values in values]
+
+    def _run(self):
+        """Worker loop: read whatever is due, merged into one read when the link has room."""
+        fastest = min(self.groups, key=lambda g: (g.period, g.priority))
+        start = time.monotonic()
+        for group in self.groups:
+            group.next_due = start
+        while not self._stop.is_set():
+            now = time.monotonic()
+            batch = self._next_batch(now)
+            if not batch:
+                self._stop.wait(max(0.0, min(group.next_due for group in self.groups) - now))
+                continue
+
+            started = time.monotonic()
+            outcomes = self._read(batch)
+            finished = time.monotonic()
+            duration = finished - started
+
+            self.cycles += 1
+            timestamp = time.time()
+            for group, (group_values, error) in zip(batch, outcomes):
+                lateness = max(0.0, started - group.next_due)
+                if group.first_run is None:
+                    group.first_run = started
+                group.last_run = started
+                group.cycles += 1
+                group.last_lateness = lateness
+                group.total_lateness += lateness
+                group.max_lateness = max(group.max_lateness, lateness)
+                group.last_duration = duration
+                if error is not None:
+                    group.errors += 1
+                    self.errors += 1
+                result = PollResult(group.cycles, timestamp, group_values, error, duration)
+                with self._lock:
+                    group.latest = result
+                if self.on_result is not None:
+                    self.on_result(group.key, result)
+
+                group.next_due += group.period
+                if finished > group.next_due:
+                    # Overrun: the cycle due now runs next, the ones whose whole period has passed are dropped
+                    missed = int((finished - group.next_due) // group.period)
+                    group.skipped += missed
+                    group.overruns += 1
+                    group.next_due += missed * group.period
+            self.skipped = sum(group.skipped for group in self.groups)
+            if self.max_cycles and fastest.cycles >= self.max_cycles:
+                break
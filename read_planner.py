@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Read planning for sparse register lists.
+
+Turns a "watch list" of scattered addresses into as few read requests as
+possible. Neighbouring addresses are merged into one block when the gap
+between them is small enough that reading the unwanted registers is cheaper
+than another round trip, blocks never exceed the protocol limit, and
+addresses marked unreadable are never bridged by a block.
+"""
+
+from bisect import bisect_right
+
+from modbus_core import MAX_READ_BITS, MAX_READ_REGISTERS
+
+# Registers worth bridging rather than spending another request. A read
+# request plus its response carry about 20 bytes of framing and header
+# overhead, i.e. about 10 registers, before counting any link latency.
+DEFAULT_MAX_GAP = 10
+
+# Bytes of an RTU read request (8) and of its response without data (5)
+RTU_READ_FRAMING = 13
+
+
+def parse_address_list(text):
+    """
+    Parse "3, 17-20, 110" into a sorted list of unique addresses.
+
+    Raises ValueError for malformed entries or addresses outside 0-65535.
+    """
+    addresses = set()
+    for token in text.replace(",", " ").split():
+        if "-" in token:
+            first_text, last_text = token.split("-", 1)
+            first, last = int(first_text, 0), int(last_text, 0)
+            if last < first:
+                raise ValueError(f"Invalid range '{token}'")
+            addresses.update(range(first, last + 1))
+        else:
+            addresses.add(int(token, 0))
+    for address in addresses:
+        if address < 0 or address > 65535:
+            raise ValueError(f"Address {address} is outside 0-65535")
+    return sorted(addresses)
+
+
+def max_gap_for_link(round_trip, bytes_per_second):
+    """
+    Return how many unwanted registers cost less to read than one extra round trip.
+
+    round_trip is the measured request/response time in seconds and
+    bytes_per_second the effective link rate; each register is two bytes.
+    """
+    if bytes_per_second <= 0:
+        return DEFAULT_MAX_GAP
+    return max(0, int(round_trip * bytes_per_second / 2))
+
+
+def max_gap_for_line(line, round_trip=None):
+    """
+    The max_gap worth bridging on a link with serial line `line` (rtu_framing.SerialLine).
+
+    round_trip is the measured round trip in seconds, e.g. the engine's
+    smoothed RTT; until there is one, the frame and silence times of one
+    read on the line stand in for it. On Modbus TCP (line None) requests are
+    pipelined, so an extra request costs its framing rather than a round trip
+    and DEFAULT_MAX_GAP applies. The result is never below DEFAULT_MAX_GAP.
+    """
+    if line is None:
+        return DEFAULT_MAX_GAP
+    if round_trip is None:
+        round_trip = line.frame_time(RTU_READ_FRAMING) + 2 * line.silent_interval
+    return max(DEFAULT_MAX_GAP, max_gap_for_link(round_trip, 1 / line.char_time))
+
+
+class ReadPlan:
+    """Blocks to read for a set of wanted addresses, and how to pick values out of them."""
+
+    def __init__(self, addresses, blocks, skipped=()):
+        self.addresses = list(addresses)
+        self.blocks = list(blocks)
+        self.skipped = list(skipped)
+
+    @property
+    def register_count(self):
+        """Total number of registers transferred, including bridged gaps."""
+        return sum(count for _, count in self.blocks)
+
+    def extract(self, block_values):
+        """
+        Map the registers read for each block back to the wanted addresses.
+
+        block_values is a sequence with one register list per block, in the
+        order of self.blocks. Returns a list of values parallel to
+        self.addresses.
+        """
+        values = []
+        block_index = 0
+        for address in self.addresses:
+            start, count = self.blocks[block_index]
+            while address >= start + count:
+                block_index += 1
+                start, count = self.blocks[block_index]
+            values.append(block_values[block_index][address - start])
+        return values
+
+
+def plan_reads(addresses, max_gap=DEFAULT_MAX_GAP, max_count=MAX_READ_REGISTERS, unreadable=()):
+    """
+    Plan the fewest reads covering addresses.
+
+    Addresses are scanned in order and each one joins the current block if
+    the gap to the previous address is at most max_gap, the block stays
+    within max_count entries (125 for registers, 2000 for bits) and no
+    unreadable address lies in between; otherwise it starts a new block.
+    Wanted addresses that are themselves unreadable are dropped and reported
+    in ReadPlan.skipped.
+    """
+    max_count = max(1, min(max_count, MAX_READ_BITS))
+    blocked = sorted(set(unreadable))
+    blocked_set = set(blocked)
+    wanted = sorted(set(addresses))
+    skipped = [address for address in wanted if address in blocked_set]
+    wanted = [address for address in wanted if address not in blocked_set]
+
+    blocks = []
+    start = last = None
+    for address in wanted:
+        if start is not None:
+            gap = address - last - 1
+            crosses_blocked = bisect_right(blocked, last) != bisect_right(blocked, address)
+            if gap <= max_gap and address - start < max_count and not crosses_blocked:
+                last = address
+                continue
+            blocks.append((start, last - start + 1))
+        start = last = address
+    if start is not None:
+        blocks.append((start, last - start + 1))
+
+    return ReadPlan(wanted, blocks, skipped)
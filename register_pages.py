@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Paged access to a whole data table for the register browser.
+
+The browser shows all 65536 addresses of a table but only ever reads the
+pages on screen. PageCache keeps the pages read so far, least recently used
+first out once it holds `capacity` pages, and decides which pages to fetch
+next: the visible ones that are missing or stale, then a few read-ahead pages
+in the direction the user is scrolling, so the next screen is usually there
+before it is needed. A page that the device rejected is cached as an error
+and not asked for again until the cache is refreshed.
+
+PendingWrites collects inline edits until they are written, as contiguous
+blocks ready for ModbusEngine.write_blocks.
+
+No tkinter here, so the logic can be used and tested without a display.
+"""
+
+import time
+from collections import OrderedDict
+
+ADDRESS_SPACE = 65536
+PAGE_SIZE = 120          # addresses per page: 15 rows of 8, one request of up to 125 registers
+DEFAULT_CAPACITY = 256   # pages kept (30720 addresses)
+DEFAULT_READ_AHEAD = 2   # pages fetched beyond the visible ones in the scroll direction
+
+
+class Page:
+    """The values of one page, or the error the device answered with, and when they were read."""
+
+    __slots__ = ('start', 'values', 'error', 'read_at')
+
+    def __init__(self, start, values=None, error=None, read_at=None):
+        self.start = start
+        self.values = values
+        self.error = error
+        self.read_at = time.monotonic() if read_at is None else read_at
+
+    def age(self, now=None):
+        return (time.monotonic() if now is None else now) - self.read_at
+
+
+class PageCache:
+    """LRU cache of fixed-size pages of one data table, with read-ahead planning."""
+
+    def __init__(self, page_size=PAGE_SIZE, capacity=DEFAULT_CAPACITY, read_ahead=DEFAULT_READ_AHEAD,
+                 size=ADDRESS_SPACE):
+        self.page_size = page_size
+        self.capacity = max(1, capacity)
+        self.read_ahead = read_ahead
+        self.size = size
+        self.pages = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def page_start(self, address):
+        """First address of the page holding address."""
+        return address - address % self.page_size
+
+    def page_block(self, start):
+        """The (address, count) request that reads the page starting at start."""
+        return start, min(self.page_size, self.size - start)
+
+    def get(self, start):
+        """Return the Page starting at start, or None; a hit makes it the most recently used."""
+        page = self.pages.get(start)
+        if page is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.pages.move_to_end(start)
+        return page
+
+    def value(self, address):
+        """Return (value, error) at address without touching the LRU order; (None, None) if not read yet."""
+        page = self.pages.get(self.page_start(address))
+        if page is None:
+            return None, None
+        if page.error is not None:
+            return None, page.error
+        return page.values[address - page.start], None
+
+    def put(self, start, values=None, error=None):
+        """Store a page read from the device (or the error it caused), evicting the least recently used."""
+        self.pages[start] = Page(start, values, error)
+        self.pages.move_to_end(start)
+        while len(self.pages) > self.capacity:
+            self.pages.popitem(last=False)
+
+    def update(self, address, values):
+        """Write values through into the cached pages (after a successful write)."""
+        for offset, value in enumerate(values):
+            page = self.pages.get(self.page_start(address + offset))
+            if page is not None and page.values is not None:
+                page.values[address + offset - page.start] = value
+
+    def clear(self):
+        self.pages.clear()
+
+    def wanted(self, first, last, direction=1, max_age=None):
+        """
+        Page starts to fetch so that addresses first..last are shown, best first.
+
+        Visible pages that are missing (or older than max_age seconds) come
+        first, then up to read_ahead missing pages past the visible range in
+        the scroll direction (direction > 0: down, < 0: up) and one the
+        other way.
+        """
+        first = max(0, first)
+        last = min(self.size - 1, last)
+        if last < first:
+            return []
+        now = time.monotonic()
+        visible = range(self.page_start(first), self.page_start(last) + 1, self.page_size)
+        result = []
+        for start in visible:
+            page = self.pages.get(start)
+            if page is None or (max_age is not None and page.error is None and page.age(now) > max_age):
+                result.append(start)
+
+        step = self.page_size if direction >= 0 else -self.page_size
+        ahead = visible[-1] if step > 0 else visible[0]
+        behind = visible[0] if step > 0 else visible[-1]
+        for start in [ahead + step * n for n in range(1, self.read_ahead + 1)] + [behind - step]:
+            if 0 <= start < self.size and start not in self.pages and start not in result:
+                result.append(start)
+        return result
+
+    def __len__(self):
+        return len(self.pages)
+
+
+class PendingWrites:
+    """Edited values waiting to be written, by address."""
+
+    def __init__(self):
+        self.values = {}
+
+    def set(self, address, value):
+        self.values[address] = value
+
+    def get(self, address):
+        return self.values.get(address)
+
+    def clear(self):
+        self.values.clear()
+
+    def blocks(self):
+        """The pending values as (address, [values]) blocks of consecutive addresses, in address order."""
+        blocks = []
+        for address in sorted(self.values):
+            if blocks and blocks[-1][0] + len(blocks[-1][1]) == address:
+                blocks[-1][1].append(self.values[address])
+            else:
+                blocks.append((address, [self.values[address]]))
+        return blocks
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, address):
+        return address in self.values
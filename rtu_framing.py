@@ -0,0 +1,150 @@
+"""
+Modbus RTU framing and serial line timing.
+
+The CRC, frame building and checking, the expected lengths of request and
+response frames, and SerialLine, the character format of a serial line and
+the frame timing that follows from it. transports builds its RTU client on
+these; they depend on nothing else so that the simulator in test_server.py
+can use them without the rest of the tool.
+"""
+
+DEFAULT_BAUDRATE = 19200
+PARITIES = ('N', 'E', 'O')
+RTU_MAX_ADU = 256
+RTU_OVERHEAD = 3  # unit ID and CRC
+FIXED_TIMING_BAUDRATE = 19200
+FIXED_INTER_CHAR = 0.00075
+FIXED_SILENT_INTERVAL = 0.00175
+
+
+def _crc_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+CRC_TABLE = _crc_table()
+
+
+def crc16(data):
+    """Modbus RTU CRC-16 of data."""
+    crc = 0xFFFF
+    for byte in data:
+        crc = (crc >> 8) ^ CRC_TABLE[(crc ^ byte) & 0xFF]
+    return crc
+
+
+def rtu_frame(unit, pdu):
+    """Return the RTU frame (unit ID, PDU, CRC low byte first) for a PDU."""
+    body = bytes((unit,)) + bytes(pdu)
+    return body + crc16(body).to_bytes(2, 'little')
+
+
+def check_frame(frame):
+    """True if the last two bytes of frame are the CRC of the rest."""
+    return len(frame) >= 4 and crc16(frame[:-2]) == int.from_bytes(frame[-2:], 'little')
+
+
+def request_length(head):
+    """
+    Length of the RTU request frame that starts with head, or None if it cannot be known yet.
+
+    Used by the simulator in test_server.py to find the end of a request
+    without waiting for a silent interval.
+    """
+    if len(head) < 2:
+        return None
+    function_code = head[1]
+    if function_code in (1, 2, 3, 4, 5, 6):
+        return 8
+    if function_code in (15, 16):
+        return 9 + head[6] if len(head) > 6 else None
+    if function_code == 22:
+        return 10
+    if function_code == 23:
+        return 13 + head[10] if len(head) > 10 else None
+    if function_code in (7, 11, 12, 17):
+        return 4
+    return None
+
+
+def response_length(pdu):
+    """Length of the RTU frame of a normal response to the request PDU, or None if it is not fixed."""
+    function_code = pdu[0]
+    if function_code in (1, 2) and len(pdu) >= 5:
+        return RTU_OVERHEAD + 2 + (int.from_bytes(pdu[3:5], 'big') + 7) // 8
+    if function_code in (3, 4) and len(pdu) >= 5:
+        return RTU_OVERHEAD + 2 + 2 * int.from_bytes(pdu[3:5], 'big')
+    if function_code in (5, 6, 15, 16):
+        return RTU_OVERHEAD + 5
+    if function_code == 22:
+        return RTU_OVERHEAD + 7
+    if function_code == 23 and len(pdu) >= 5:
+        return RTU_OVERHEAD + 2 + 2 * int.from_bytes(pdu[3:5], 'big')
+    return None
+
+
+class SerialLine:
+    """The character format of a serial line and the frame timing that follows from it."""
+
+    def __init__(self, baudrate=DEFAULT_BAUDRATE, bytesize=8, parity='N', stopbits=1):
+        if baudrate <= 0:
+            raise ValueError("Baud rate must be positive")
+        if bytesize not in (7, 8):
+            raise ValueError("Data bits must be 7 or 8")
+        if parity not in PARITIES:
+            raise ValueError("Parity must be N, E or O")
+        if stopbits not in (1, 2):
+            raise ValueError("Stop bits must be 1 or 2")
+        self.baudrate = baudrate
+        self.bytesize = bytesize
+        self.parity = parity
+        self.stopbits = stopbits
+
+    @classmethod
+    def parse(cls, text):
+        """Parse "19200", "19200 8E1" or "9600,8,N,2"; raises ValueError."""
+        parts = text.replace(",", " ").split()
+        if not parts:
+            raise ValueError("Expected a baud rate, e.g. 19200 8E1")
+        try:
+            baudrate = int(parts[0])
+        except ValueError:
+            raise ValueError(f"Invalid baud rate '{parts[0]}'") from None
+        fmt = "".join(parts[1:]).upper() or "8N1"
+        if len(fmt) != 3 or not fmt[0].isdigit() or not fmt[2].isdigit():
+            raise ValueError(f"Invalid character format '{fmt}', expected e.g. 8N1 or 8E1")
+        return cls(baudrate, int(fmt[0]), fmt[1], int(fmt[2]))
+
+    @property
+    def bits_per_char(self):
+        return 1 + self.bytesize + (self.parity != 'N') + self.stopbits
+
+    @property
+    def char_time(self):
+        """Seconds one character takes on the line."""
+        return self.bits_per_char / self.baudrate
+
+    @property
+    def inter_char(self):
+        """Longest gap allowed between the characters of a frame (1.5 characters)."""
+        return FIXED_INTER_CHAR if self.baudrate > FIXED_TIMING_BAUDRATE else 1.5 * self.char_time
+
+    @property
+    def silent_interval(self):
+        """Silence that separates frames (3.5 characters)."""
+        return FIXED_SILENT_INTERVAL if self.baudrate > FIXED_TIMING_BAUDRATE else 3.5 * self.char_time
+
+    def frame_time(self, size):
+        """Seconds a frame of size bytes takes on the line."""
+        return size * self.char_time
+
+    def __str__(self):
+        return f"{self.baudrate} {self.bytesize}{self.parity}{self.stopbits}"
+
+    def __repr__(self):
+        return f"SerialLine({str(self)!r})"
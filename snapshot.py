@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Snapshots of full-device register images, and diffs between them.
+
+A snapshot holds every readable address of the four data tables (or of the
+ranges asked for), read with the pipelined chunked reader, in a compact
+".mbsnap" file:
+
+    header   "MBSN", version (u8), 3 pad bytes, metadata length (u32 LE),
+             metadata as UTF-8 JSON (device, unit, capture time and the list
+             of captured ranges, plus the ranges the device rejected)
+    data     for each captured range, in order: its registers as big-endian
+             uint16 words or its bits packed LSB first, as on the wire
+
+Ranges are read in pipelined batches. When the device rejects a batch with
+an exception response, its chunks are read one by one and rejected chunks
+are halved until the readable parts are found, down to blocks of
+`resolution` entries, which are then skipped and recorded as such.
+
+In memory each table is a flat array over the whole address space with a
+byte per address saying whether it was captured, so two snapshots are
+compared in slices of DIFF_BLOCK addresses with one memcmp each; only the
+slices that differ are looked at address by address. A snapshot is compared
+with a live device by capturing the same ranges from it first, and the
+reference values of differing holding registers can be written back with
+the bulk writer.
+"""
+
+import json
+import struct
+import sys
+import time
+from array import array
+from collections import namedtuple
+
+from bulk_write import diff_ranges, image_segments, write_image
+from modbus_core import (
+    AdaptivePacer, ChunkedReader, ModbusResponseError, PackedBits, iter_chunks, table_by_key, EXCEPTION_NAMES,
+    HOLDING_REGISTERS, TABLES,
+)
+
+MAGIC = b"MBSN"
+VERSION = 1
+EXTENSION = ".mbsnap"
+FILE_HEADER = struct.Struct("<4sB3xI")
+
+ADDRESS_SPACE = 65536
+BATCH_CHUNKS = 16          # chunks read as one pipelined batch
+DEFAULT_RESOLUTION = 16    # rejected blocks are halved down to this many entries
+DIFF_BLOCK = 256           # addresses compared with one memcmp
+
+
+_INVERT = bytes.maketrans(b"\x00\x01", b"\x01\x00")
+
+
+def _runs(mask):
+    """Runs of 1 bytes in a 0/1 mask as sorted (start, count) pairs."""
+    runs = []
+    start = mask.find(1)
+    while start != -1:
+        end = mask.find(0, start)
+        if end == -1:
+            end = len(mask)
+        runs.append((start, end - start))
+        start = mask.find(1, end)
+    return runs
+
+
+def _both(mask, other):
+    """The bytewise AND of two 0/1 masks of equal length, as one big-integer operation."""
+    return (int.from_bytes(mask, 'little') & int.from_bytes(other, 'little')).to_bytes(len(mask), 'little')
+
+
+class SnapshotTable:
+    """Captured values of one data table over the whole address space, and which addresses were captured."""
+
+    def __init__(self, table):
+        self.table = table
+        self.values = array('H', bytes(2 * ADDRESS_SPACE))
+        self.known = bytearray(ADDRESS_SPACE)
+
+    def put(self, address, values):
+        """Store values (a list of ints or PackedBits) read from address on."""
+        values = array('H', values)
+        end = address + len(values)
+        if address < 0 or end > ADDRESS_SPACE:
+            raise ValueError(f"Addresses {address}-{end - 1} are outside 0-{ADDRESS_SPACE - 1}")
+        self.values[address:end] = values
+        self.known[address:end] = b"\x01" * len(values)
+
+    def get(self, address, count):
+        """Return the stored values of count addresses from address on."""
+        return self.values[address:address + count].tolist()
+
+    def segments(self):
+        """Runs of captured addresses as sorted (address, count) pairs."""
+        return _runs(self.known)
+
+    def __len__(self):
+        return ADDRESS_SPACE - self.known.count(0)
+
+
+class Snapshot:
+    """A register image of a device: captured tables, rejected ranges and metadata."""
+
+    def __init__(self, metadata=None):
+        self.metadata = dict(metadata or {})
+        self.tables = {}    # table key -> SnapshotTable
+        self.skipped = []   # (table key, first, last, reason) of ranges the device rejected
+
+    def table(self, table):
+        """The SnapshotTable of a DataTable, created empty on first use."""
+        if table.key not in self.tables:
+            self.tables[table.key] = SnapshotTable(table)
+        return self.tables[table.key]
+
+    def requested(self, table):
+        """
+        0/1 mask of the addresses of table the capture asked for.
+
+        Every address asked for was either captured or rejected by the
+        device, so this is the captured addresses plus the skipped ranges.
+        """
+        if table.key not in self.tables:
+            return bytes(ADDRESS_SPACE)
+        mask = bytearray(self.tables[table.key].known)
+        for key, first, last, _ in self.skipped:
+            if key == table.key:
+                mask[first:last + 1] = b"\x01" * (last - first + 1)
+        return mask
+
+    def ranges(self):
+        """Every captured range as (table, address, count), tables in the usual order."""
+        return [
+            (table, address, count)
+            for table in TABLES if table.key in self.tables
+            for address, count in self.tables[table.key].segments()
+        ]
+
+    def __len__(self):
+        return sum(len(table) for table in self.tables.values())
+
+    def describe(self):
+        """E.g. "1000 holding registers, 2000 coils in 3 range(s)"."""
+        parts = [
+            f"{len(self.tables[table.key])} {table.name.lower()}"
+            for table in TABLES if table.key in self.tables and len(self.tables[table.key])
+        ]
+        return f"{', '.join(parts) or 'nothing'} in {len(self.ranges())} range(s)"
+
+    def save(self, path):
+        """Write the snapshot to path; returns the number of bytes written."""
+        ranges = self.ranges()
+        metadata = dict(
+            self.metadata,
+            ranges=[[table.key, address, count] for table, address, count in ranges],
+            skipped=[list(item) for item in self.skipped],
+        )
+        encoded = json.dumps(metadata).encode("utf-8")
+        data = [FILE_HEADER.pack(MAGIC, VERSION, len(encoded)), encoded]
+        for table, address, count in ranges:
+            values = self.tables[table.key].values[address:address + count]
+            if table.bits:
+                data.append(bytes(PackedBits.from_bits(values).data))
+            else:
+                if sys.byteorder == 'little':
+                    values.byteswap()
+                data.append(values.tobytes())
+        with open(path, "wb") as f:
+            for part in data:
+                f.write(part)
+        return sum(len(part) for part in data)
+
+    @classmethod
+    def load(cls, path):
+        """Read a snapshot file written by save(). Raises ValueError if it is not one."""
+        with open(path, "rb") as f:
+            content = f.read()
+        if len(content) < FILE_HEADER.size:
+            raise ValueError(f"{path}: not a snapshot (file too short)")
+        magic, version, length = FILE_HEADER.unpack_from(content)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a snapshot (bad magic)")
+        if version != VERSION:
+            raise ValueError(f"{path}: unsupported snapshot version {version}")
+        try:
+            metadata = json.loads(content[FILE_HEADER.size:FILE_HEADER.size + length].decode("utf-8"))
+            ranges = [(table_by_key(key), address, count) for key, address, count in metadata.pop('ranges')]
+            skipped = [tuple(item) for item in metadata.pop('skipped', [])]
+        except (ValueError, KeyError, TypeError) as e:
+            raise ValueError(f"{path}: invalid snapshot metadata ({e})") from None
+
+        snapshot = cls(metadata)
+        snapshot.skipped = skipped
+        position = FILE_HEADER.size + length
+        for table, address, count in ranges:
+            size = (count + 7) // 8 if table.bits else 2 * count
+            data = content[position:position + size]
+            if len(data) < size:
+                raise ValueError(f"{path}: truncated snapshot (in {table.key} {address}-{address + count - 1})")
+            if table.bits:
+                values = PackedBits(data, count)
+            else:
+                values = array('H')
+                values.frombytes(data)
+                if sys.byteorder == 'little':
+                    values.byteswap()
+            snapshot.table(table).put(address, values)
+            position += size
+        return snapshot
+
+
+def parse_range(text):
+    """
+    Parse "[TABLE:]FIRST[-LAST]", e.g. "coils:0-1999" or "100-199" (holding registers).
+
+    Returns (table, address, count). Raises ValueError.
+    """
+    table, _, addresses = text.rpartition(":")
+    table = table_by_key(table) if table else HOLDING_REGISTERS
+    first, _, last = addresses.partition("-")
+    try:
+        first = int(first, 0)
+        last = int(last, 0) if last else first
+    except ValueError:
+        raise ValueError(f"Range '{text}': addresses must be integers") from None
+    if not 0 <= first <= last < ADDRESS_SPACE:
+        raise ValueError(f"Range '{text}': addresses must be 0-{ADDRESS_SPACE - 1}, first <= last")
+    return table, first, last - first + 1
+
+
+def full_ranges(tables=TABLES):
+    """The whole address space of each table, as (table, address, count)."""
+    return [(table, 0, ADDRESS_SPACE) for table in tables]
+
+
+def client_reader(client, unit_id, pacer=None, policy=None):
+    """Return read_blocks(blocks, table) for capture_snapshot, reading with a synchronous client."""
+    pacer = pacer or AdaptivePacer()
+    readers = {}
+
+    def read_blocks(blocks, table):
+        if table.key not in readers:
+            readers[table.key] = ChunkedReader(client, unit_id, pacer=pacer, table=table, policy=policy)
+        return readers[table.key].read_blocks(blocks)
+
+    return read_blocks
+
+
+def capture_snapshot(read_blocks, ranges, resolution=DEFAULT_RESOLUTION, metadata=None, on_progress=None,
+                     cancel=None):
+    """
+    Read ranges [(table, address, count), ...] into a new Snapshot.
+
+    read_blocks(blocks, table) reads (address, count) blocks as one batch and
+    returns their values (see client_reader; the GUI passes the engine's).
+    Exception responses only cause the rejected addresses to be skipped;
+    any other error ends the capture. on_progress(done, total) is called
+    after each batch with the number of entries handled; cancel is an
+    optional threading.Event.
+    """
+    started = time.time()
+    snapshot = Snapshot(dict(metadata or {}, created=started))
+    total = sum(count for _, _, count in ranges)
+    done = 0
+
+    def read_block(table, address, count):
+        """Read one block, halving it around rejected addresses."""
+        try:
+            (values,) = read_blocks([(address, count)], table)
+            snapshot.table(table).put(address, values)
+        except ModbusResponseError as e:
+            if count <= resolution:
+                reason = f"exception {e.exception_code} ({EXCEPTION_NAMES.get(e.exception_code, 'Unknown exception')})"
+                snapshot.skipped.append((table.key, address, address + count - 1, reason))
+                return
+            half = count // 2
+            read_block(table, address, half)
+            read_block(table, address + half, count - half)
+
+    for table, address, count in ranges:
+        snapshot.table(table)
+        chunks = list(iter_chunks(address, count, table.max_read))
+        for index in range(0, len(chunks), BATCH_CHUNKS):
+            if cancel is not None and cancel.is_set():
+                raise InterruptedError("Snapshot cancelled")
+            batch = chunks[index:index + BATCH_CHUNKS]
+            try:
+                for (chunk_address, _), values in zip(batch, read_blocks(batch, table)):
+                    snapshot.table(table).put(chunk_address, values)
+            except ModbusResponseError:
+                for chunk in batch:
+                    read_block(table, *chunk)
+            done += sum(chunk_count for _, chunk_count in batch)
+            if on_progress is not None:
+                on_progress(done, total)
+    snapshot.metadata['elapsed'] = round(time.time() - started, 3)
+    _merge_skipped(snapshot)
+    return snapshot
+
+
+def _merge_skipped(snapshot):
+    """Join adjacent skipped ranges of the same table that were rejected for the same reason."""
+    merged = []
+    for item in snapshot.skipped:
+        if merged and merged[-1][0] == item[0] and merged[-1][2] + 1 == item[1] and merged[-1][3] == item[3]:
+            merged[-1] = (item[0], merged[-1][1], item[2], item[3])
+        else:
+            merged.append(item)
+    snapshot.skipped = merged
+
+
+class SnapshotDifference(namedtuple('SnapshotDifference', 'table first last expected observed')):
+    """
+    A run of consecutive addresses of one table whose values differ.
+
+    expected holds the reference values and observed the other snapshot's;
+    an entry is None where that side did not capture the address.
+    """
+
+    __slots__ = ()
+
+
+def diff_snapshots(reference, other):
+    """
+    Compare two snapshots; returns SnapshotDifferences ordered by table and address.
+
+    Only addresses that both captures asked for are compared, so snapshots
+    of different ranges can be compared. Among those, an address captured on
+    one side only (the device rejected it on the other) differs. Addresses
+    only one snapshot asked for are listed by coverage_gaps() instead.
+    """
+    differences = []
+    for table in TABLES:
+        ours = reference.tables.get(table.key)
+        theirs = other.tables.get(table.key)
+        if ours is None or theirs is None:
+            continue
+        old_values = memoryview(ours.values).cast('B')
+        new_values = memoryview(theirs.values).cast('B')
+        if ours.known == theirs.known and old_values == new_values:
+            continue
+
+        shared = _both(reference.requested(table), other.requested(table))
+        old, new = ours.values, theirs.values
+        old_known, new_known = memoryview(ours.known), memoryview(theirs.known)
+        mismatches = []
+        for start in range(0, ADDRESS_SPACE, DIFF_BLOCK):
+            stop = start + DIFF_BLOCK
+            if (old_known[start:stop] == new_known[start:stop]
+                    and old_values[2 * start:2 * stop] == new_values[2 * start:2 * stop]):
+                continue
+            for address in range(start, stop):
+                if not shared[address]:
+                    continue
+                expected = old[address] if old_known[address] else None
+                observed = new[address] if new_known[address] else None
+                if expected != observed:
+                    mismatches.append((address, expected, observed))
+        differences.extend(
+            SnapshotDifference(table, first, last, [item[1] for item in items], [item[2] for item in items])
+            for first, last, items in diff_ranges(mismatches)
+        )
+    return differences
+
+
+class CoverageGap(namedtuple('CoverageGap', 'table first last only_in')):
+    """Addresses captured by one snapshot only ('reference' or 'other') because the other did not ask for them."""
+
+    __slots__ = ()
+
+
+def coverage_gaps(reference, other):
+    """The ranges two snapshots cannot be compared on, as CoverageGaps ordered by table and address."""
+    gaps = []
+    for table in TABLES:
+        for side, ours, theirs in (('reference', reference, other), ('other', other, reference)):
+            if table.key not in ours.tables:
+                continue
+            outside = _both(ours.tables[table.key].known, bytes(theirs.requested(table)).translate(_INVERT))
+            gaps.extend(CoverageGap(table, first, first + count - 1, side) for first, count in _runs(outside))
+    return gaps
+
+
+def count_differences(differences):
+    """The number of addresses in a list of SnapshotDifferences."""
+    return sum(difference.last - difference.first + 1 for difference in differences)
+
+
+def restore_segments(differences):
+    """
+    The (address, values) segments that write the reference values of differing holding registers back.
+
+    Input registers and discrete inputs are read-only and the bulk writer
+    only writes registers, so other tables are left out.
+    """
+    image = {}
+    for difference in differences:
+        if difference.table is not HOLDING_REGISTERS:
+            continue
+        for offset, value in enumerate(difference.expected):
+            if value is not None:
+                image[difference.first + offset] = value
+    return image_segments(image)
+
+
+def compare_device(client, unit_id, reference, resolution=DEFAULT_RESOLUTION, pacer=None, policy=None,
+                   write_back=False, verify_delay=0.2):
+    """
+    Compare a live device with a reference snapshot using a synchronous client.
+
+    Captures the reference's ranges from the device and returns (live
+    snapshot, differences, BulkWriteResult or None). With write_back, the
+    differing holding registers are written back to their reference values
+    and verified.
+    """
+    pacer = pacer or AdaptivePacer()
+    live = capture_snapshot(client_reader(client, unit_id, pacer, policy), reference.ranges(), resolution,
+                            {"unit": unit_id})
+    differences = diff_snapshots(reference, live)
+    result = None
+    segments = restore_segments(differences) if write_back else []
+    if segments:
+        result = write_image(client, segments, unit_id, verify_delay=verify_delay, pacer=pacer)
+    return live, differences, result
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Typed decoding of register values.
+
+A tag gives a name to one value stored in one or more registers:
+
+    name, address, type, byte order, word order, scale, offset, deadband
+
+Types are uint16/int16, uint32/int32/float32 (2 registers), uint64/int64/
+float64 (4 registers) and string (length registers, two characters each).
+Byte order is the order of the two bytes inside each register, word order the
+order of the registers inside a multi-register value; "big" for both is the
+usual Modbus layout (ABCD), "little" word order gives CDAB, "little" byte order
+BADC, and both DCBA. Numeric values are converted as raw * scale + offset.
+
+A TagDecoder compiles its tags once into byte index tables grouped by type,
+then converts a whole block of registers at a time: the registers are turned
+into one bytes object, each group is gathered and unpacked by a single
+struct call (or NumPy fancy indexing and view when NumPy is installed), so
+decoding thousands of tags costs a few C-level calls instead of a Python
+loop per register. Tag files are CSV (with a header row) or JSON.
+"""
+
+import csv
+import io
+import json
+import struct
+import sys
+from array import array
+from operator import itemgetter
+from pathlib import Path
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from modbus_core import table_by_key
+from read_planner import DEFAULT_MAX_GAP, plan_reads
+
+# type name: (registers, struct format character)
+TYPES = {
+    'uint16': (1, 'H'),
+    'int16': (1, 'h'),
+    'uint32': (2, 'I'),
+    'int32': (2, 'i'),
+    'float32': (2, 'f'),
+    'uint64': (4, 'Q'),
+    'int64': (4, 'q'),
+    'float64': (4, 'd'),
+    'string': (None, None),
+}
+ORDERS = ('big', 'little')
+TAG_FIELDS = (
+    'name', 'address', 'type', 'byte_order', 'word_order', 'scale', 'offset', 'length', 'table', 'deadband',
+)
+
+# Below this many numeric tags plain struct is faster than going through NumPy
+NUMPY_MIN_TAGS = 64
+
+
+class Tag:
+    """One typed value stored in consecutive registers."""
+
+    def __init__(self, name, address, data_type='uint16', byte_order='big', word_order='big',
+                 scale=1.0, offset=0.0, length=1, table='holding', deadband=0.0):
+        if data_type not in TYPES:
+            raise ValueError(f"Tag '{name}': unknown type '{data_type}' (expected one of {', '.join(TYPES)})")
+        if byte_order not in ORDERS or word_order not in ORDERS:
+            raise ValueError(f"Tag '{name}': byte and word order must be 'big' or 'little'")
+        self.name = str(name)
+        self.address = int(address)
+        self.data_type = data_type
+        self.byte_order = byte_order
+        self.word_order = word_order
+        self.scale = float(scale)
+        self.offset = float(offset)
+        self.length = int(length) if data_type == 'string' else TYPES[data_type][0]
+        self.deadband = abs(float(deadband))
+        self.table = table_by_key(table)
+        if self.table.bits:
+            raise ValueError(f"Tag '{name}': tags must be in a register table, not {self.table.name.lower()}")
+        if self.length < 1 or self.address < 0 or self.address + self.length > 65536:
+            raise ValueError(f"Tag '{name}': registers {self.address}-{self.address + self.length - 1} "
+                             "are outside 0-65535")
+
+    @property
+    def scaled(self):
+        """True if the raw value is scaled or offset."""
+        return self.scale != 1.0 or self.offset != 0.0
+
+    def byte_indexes(self, base):
+        """Positions of this tag's bytes in a big-endian image starting at base, in big-endian value order."""
+        start = 2 * (self.address - base)
+        words = self.length
+        indexes = []
+        for word in range(words):
+            source = word if self.word_order == 'big' else words - 1 - word
+            first, second = start + 2 * source, start + 2 * source + 1
+            indexes.extend((first, second) if self.byte_order == 'big' else (second, first))
+        return indexes
+
+    def __repr__(self):
+        return f"Tag({self.name!r}, {self.address}, {self.data_type!r})"
+
+
+def tag_from_dict(item, where):
+    """Build a Tag from a mapping with TAG_FIELDS keys; empty values take the defaults."""
+    values = {key: value for key, value in item.items() if value not in (None, "")}
+    unknown = set(values) - set(TAG_FIELDS)
+    if unknown:
+        raise ValueError(f"{where}: unknown field(s) {', '.join(sorted(unknown))}")
+    if 'name' not in values or 'address' not in values:
+        raise ValueError(f"{where}: every tag needs a name and an address")
+    try:
+        return Tag(
+            values['name'],
+            int(values['address'], 0) if isinstance(values['address'], str) else values['address'],
+            values.get('type', 'uint16'),
+            values.get('byte_order', 'big'),
+            values.get('word_order', 'big'),
+            float(values.get('scale', 1.0)),
+            float(values.get('offset', 0.0)),
+            int(values.get('length', 1)),
+            values.get('table', 'holding'),
+            float(values.get('deadband', 0.0)),
+        )
+    except ValueError as e:
+        raise ValueError(f"{where}: {e}") from None
+
+
+def parse_tags_csv(text):
+    """Parse a CSV tag list whose header row names the TAG_FIELDS columns used."""
+    rows = csv.DictReader(io.StringIO(text))
+    tags = []
+    for line_number, row in enumerate(rows, 2):
+        if not any((value or "").strip() for value in row.values()) or row.get('name', '').startswith('#'):
+            continue
+        tags.append(tag_from_dict({key.strip(): (value or "").strip() for key, value in row.items() if key},
+                                  f"Line {line_number}"))
+    return tags
+
+
+def parse_tags_json(text):
+    """Parse a JSON list of tag objects, or an object with a "tags" list."""
+    try:
+        document = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON: {e}") from None
+    if isinstance(document, dict):
+        document = document.get('tags')
+    if not isinstance(document, list):
+        raise ValueError("Expected a list of tags")
+    tags = []
+    for index, item in enumerate(document):
+        if not isinstance(item, dict):
+            raise ValueError(f"Tag {index + 1}: expected an object")
+        tags.append(tag_from_dict(item, f"Tag {index + 1}"))
+    return tags
+
+
+def load_tags(path):
+    """Load tags from a .csv or .json file."""
+    path = Path(path)
+    text = path.read_text()
+    tags = parse_tags_csv(text) if path.suffix.lower() == '.csv' else parse_tags_json(text)
+    if not tags:
+        raise ValueError(f"{path.name} contains no tags")
+    return tags
+
+
+def registers_to_bytes(registers):
+    """Pack uint16 register values as big-endian bytes (the wire layout)."""
+    data = array('H', registers)
+    if sys.byteorder == 'little':
+        data.byteswap()
+    return data.tobytes()
+
+
+class TagDecoder:
+    """Decode a fixed set of tags from blocks of register values."""
+
+    def __init__(self, tags, use_numpy=None, schedule=None):
+        self.tags = list(tags)
+        if not self.tags:
+            raise ValueError("No tags to decode")
+        tables = {tag.table for tag in self.tags}
+        if len(tables) > 1:
+            raise ValueError("All tags of a decoder must be in the same table")
+        self.table = tables.pop()
+        self.names = [tag.name for tag in self.tags]
+        self.base = min(tag.address for tag in self.tags)
+        self.span = max(tag.address + tag.length for tag in self.tags) - self.base
+        self.addresses = sorted({tag.address + i for tag in self.tags for i in range(tag.length)})
+
+        # The schedule is plain data so it can be cached (see device_profile) and reused
+        self.schedule = schedule if schedule is not None else self.build_schedule()
+        numeric, strings = self.schedule
+        if use_numpy is None:
+            use_numpy = sum(len(positions) for _, positions, _, _ in numeric) >= NUMPY_MIN_TAGS
+        self.use_numpy = bool(use_numpy) and numpy is not None
+
+        self._groups = []
+        for code, positions, indexes, scaled in numeric:
+            if self.use_numpy:
+                self._groups.append((
+                    positions, numpy.array(indexes, dtype=numpy.intp), numpy.dtype('>' + code),
+                    numpy.array([i for i, _, _ in scaled], dtype=numpy.intp),
+                    numpy.array([scale for _, scale, _ in scaled]), numpy.array([offset for _, _, offset in scaled]),
+                ))
+            else:
+                gather = itemgetter(*indexes) if len(indexes) > 1 else (lambda data, i=indexes[0]: (data[i],))
+                self._groups.append((positions, gather, struct.Struct(f'>{len(positions)}{code}'), scaled))
+        self._strings = strings
+
+    def build_schedule(self):
+        """
+        Compile the tags into (numeric, strings) decode tables.
+
+        numeric has one (struct code, tag positions, byte indexes, scaled)
+        entry per type, so all values of that type come out of one unpack
+        call; strings has one (tag position, byte indexes) entry per string.
+        """
+        groups = {}
+        for position, tag in enumerate(self.tags):
+            if tag.data_type != 'string':
+                groups.setdefault(TYPES[tag.data_type][1], []).append((position, tag))
+        numeric = []
+        for code, members in groups.items():
+            numeric.append((
+                code,
+                [position for position, _ in members],
+                [index for _, tag in members for index in tag.byte_indexes(self.base)],
+                [(i, tag.scale, tag.offset) for i, (_, tag) in enumerate(members) if tag.scaled],
+            ))
+        strings = [
+            (position, tag.byte_indexes(self.base)) for position, tag in enumerate(self.tags)
+            if tag.data_type == 'string'
+        ]
+        return numeric, strings
+
+    def covers(self, address, count):
+        """True if registers address..address+count-1 contain every tag."""
+        return address <= self.base and self.base + self.span <= address + count
+
+    def decode(self, registers, address):
+        """Decode all tags from registers read starting at address; returns values in tag order."""
+        if not self.covers(address, len(registers)):
+            raise ValueError(
+                f"Registers {address}-{address + len(registers) - 1} do not contain all tags "
+                f"({self.base}-{self.base + self.span - 1})"
+            )
+        offset = self.base - address
+        return self.decode_bytes(registers_to_bytes(registers[offset:offset + self.span]))
+
+    def read_plan(self, max_gap=DEFAULT_MAX_GAP, unreadable=()):
+        """Return the ReadPlan that reads every tag register with the fewest requests."""
+        return plan_reads(self.addresses, max_gap=max_gap, max_count=self.table.max_read, unreadable=unreadable)
+
+    def decode_blocks(self, blocks, block_values):
+        """Decode all tags from the results of reading (address, count) blocks, e.g. read_plan().blocks."""
+        image = bytearray(2 * self.span)
+        for (address, count), values in zip(blocks, block_values):
+            first = max(address, self.base)
+            last = min(address + count, self.base + self.span)
+            if first < last:
+                image[2 * (first - self.base):2 * (last - self.base)] = registers_to_bytes(
+                    values[first - address:last - address]
+                )
+        return self.decode_bytes(bytes(image))
+
+    def decode_bytes(self, data):
+        """Decode all tags from a big-endian register image starting at self.base."""
+        results = [None] * len(self.tags)
+        if self.use_numpy:
+            raw = numpy.frombuffer(data, dtype=numpy.uint8)
+            for positions, indexes, dtype, scaled, scales, offsets in self._groups:
+                values = raw[indexes].view(dtype)
+                converted = values.tolist()
+                if len(scaled):
+                    # Only scaled tags become floats; the others keep their integer type
+                    for i, value in zip(scaled.tolist(), (values[scaled] * scales + offsets).tolist()):
+                        converted[i] = value
+                for position, value in zip(positions, converted):
+                    results[position] = value
+        else:
+            for positions, gather, unpacker, scaled in self._groups:
+                values = unpacker.unpack(bytes(gather(data)))
+                if scaled:
+                    values = list(values)
+                    for i, scale, offset in scaled:
+                        values[i] = values[i] * scale + offset
+                for position, value in zip(positions, values):
+                    results[position] = value
+        for position, indexes in self._strings:
+            text = bytes(data[i] for i in indexes)
+            results[position] = text.split(b"\0", 1)[0].decode("latin-1").rstrip()
+        return results
+
+    def as_dict(self, values):
+        """Map decoded values to tag names."""
+        return dict(zip(self.names, values))
+
+
+def format_value(value):
+    """Short text for a decoded value: floats with 7 significant digits."""
+    if isinstance(value, float):
+        return f"{value:.7g}"
+    return str(value)
@@ -1,39 +1,306 @@
 #!/usr/bin/env python3
 """
-Simple Modbus TCP Server for testing the modbus_master.py client.
-This server runs locally and provides a test environment.
+Modbus test server for the GUI, the command-line mode, the benchmark and the
+test suite. It runs locally and needs only pymodbus and rtu_framing.py.
+
+Without options it serves 1000 entries of each table, with a few test values
+in the first holding registers, on 127.0.0.1:5020 and answers any unit ID.
+Options scale it up and make it behave like a slow or unreliable device:
+
+    python test_server.py --size 65536 --units 1-32 --port 5020-5023
+    python test_server.py --latency 20 --jitter 10 --drop-rate 0.01
+    python test_server.py --exception-rate 0.05 --exception-code 6
+    python test_server.py --dynamic 100 --update-ms 50
+    python test_server.py --rtu --line "9600 8E1"
+    python test_server.py --serial-pty /tmp/modbus-pty --line 19200
+
+--rtu serves Modbus RTU frames over TCP, like a serial converter, and
+--serial-pty simulates a device on a serial line: it opens a pseudo-terminal
+(POSIX only), prints the path of its slave side for the master to open and
+optionally links it to a fixed path. With --line the simulated device answers
+only after request and response would have crossed a line of that baud rate,
+so throughput measured against it is what the real line would give.
+
+Every port serves its own set of units, and every unit has its own coils,
+discrete inputs, input registers and holding registers, stored compactly
+(two bytes per register, one byte per bit), so the full address space can
+be simulated for many devices.
 """
 
-from pymodbus.server import StartTcpServer
+import argparse
+import asyncio
+import inspect
+import logging
+import math
+import os
+import random
+import sys
+import time
+from array import array
+
 from pymodbus.datastore import ModbusSequentialDataBlock, ModbusSlaveContext, ModbusServerContext
 from pymodbus.device import ModbusDeviceIdentification
-import logging
+from pymodbus.factory import ServerDecoder
+from pymodbus.pdu import ExceptionResponse, ModbusExceptions
+from pymodbus.server import ModbusTcpServer
+
+from rtu_framing import SerialLine, check_frame, request_length, rtu_frame
 
 # Configure logging
 logging.basicConfig()
 log = logging.getLogger()
 log.setLevel(logging.INFO)
 
-def run_test_server(host='127.0.0.1', port=5020):
+# Function codes whose values come from each table
+FC_READ_COILS = 1
+FC_READ_DISCRETE_INPUTS = 2
+FC_READ_HOLDING_REGISTERS = 3
+FC_READ_INPUT_REGISTERS = 4
+
+INITIAL_VALUES = [0, 1234, 5678, 9999, 42, 65535, 100, 200, 300, 400]
+
+# Registers written by the dynamic value generator, relative to --dynamic
+DYNAMIC_LAYOUT = (
+    "counter (+1 per update)",
+    "32-bit counter, high word",
+    "32-bit counter, low word",
+    "sine",
+    "triangle",
+    "sawtooth",
+    "square",
+    "random",
+)
+
+
+class CompactDataBlock(ModbusSequentialDataBlock):
+    """Sequential data block backed by an array instead of a list of Python ints."""
+
+    def __init__(self, size, bits=False):
+        self.address = 0
+        self.typecode = 'B' if bits else 'H'
+        self.bits = bits
+        self.values = array(self.typecode, bytes(size * (1 if bits else 2)))
+        self.default_value = False if bits else 0
+
+    def reset(self):
+        """Set every entry back to zero."""
+        self.values = array(self.typecode, bytes(len(self.values) * self.values.itemsize))
+
+    def getValues(self, address, count=1):
+        """Return count values from address as a list."""
+        start = address - self.address
+        values = self.values[start:start + count].tolist()
+        return [bool(v) for v in values] if self.bits else values
+
+    def setValues(self, address, values):
+        """Store values from address on."""
+        if not isinstance(values, (list, tuple)):
+            values = [values]
+        start = address - self.address
+        self.values[start:start + len(values)] = array(self.typecode, (int(v) for v in values))
+
+
+class FaultInjector:
+    """Delays, drops and exception responses applied to every request on a server."""
+
+    def __init__(self, latency=0.0, jitter=0.0, drop_rate=0.0, exception_rate=0.0, exception_code=6, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.exception_rate = exception_rate
+        self.exception_code = exception_code
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.dropped = 0
+        self.exceptions = 0
+
+    async def delay(self):
+        """Wait latency +/- jitter seconds without blocking other connections."""
+        delay = self.latency + (self.random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def manipulate(self, response):
+        """pymodbus response_manipulator: drop the response or turn it into an exception."""
+        self.requests += 1
+        roll = self.random.random()
+        if roll < self.drop_rate:
+            self.dropped += 1
+            response.should_respond = False
+        elif roll < self.drop_rate + self.exception_rate and not response.isError():
+            # The request itself has been executed; only the answer is replaced
+            self.exceptions += 1
+            exception = ExceptionResponse(response.function_code, self.exception_code)
+            exception.transaction_id = response.transaction_id
+            exception.slave_id = response.slave_id
+            response = exception
+        return response, False
+
+
+class SimulatedDevice(ModbusSlaveContext):
+    """One unit: four compact tables of size entries, addressed from 0, with injected latency."""
+
+    def __init__(self, size, faults=None):
+        super().__init__(
+            di=CompactDataBlock(size, bits=True),
+            co=CompactDataBlock(size, bits=True),
+            ir=CompactDataBlock(size),
+            hr=CompactDataBlock(size),
+            zero_mode=True,
+        )
+        self.faults = faults
+
+    async def async_getValues(self, fc_as_hex, address, count=1):
+        """Read values after the injected delay."""
+        if self.faults is not None:
+            await self.faults.delay()
+        return self.getValues(fc_as_hex, address, count)
+
+    async def async_setValues(self, fc_as_hex, address, values):
+        """Write values after the injected delay."""
+        if self.faults is not None:
+            await self.faults.delay()
+        self.setValues(fc_as_hex, address, values)
+
+
+class RtuResponder:
     """
-    Start a Modbus TCP test server.
-    
-    Args:
-        host: IP address to bind to
-        port: TCP port to listen on
+    Answer Modbus RTU request frames from a server context, as a device on a serial line would.
+
+    Frames with a bad CRC or for units that are not served are ignored, and
+    broadcasts (unit 0) are executed without an answer. With a SerialLine the
+    answer is delayed by the time request and response take on that line
+    plus a silent interval.
     """
-    # Initialize data store with some test values
-    # Create 1000 holding registers to test large reads
-    store = ModbusSlaveContext(
-        hr=ModbusSequentialDataBlock(0, [0]*1000)
-    )
-    
-    # Set some initial test values
-    store.setValues(3, 0, [0, 1234, 5678, 9999, 42, 65535, 100, 200, 300, 400])
-    
-    context = ModbusServerContext(slaves=store, single=True)
-    
-    # Server identity
+
+    def __init__(self, context, faults=None, line=None):
+        self.context = context
+        self.faults = faults
+        self.line = line
+        self.decoder = ServerDecoder()
+        self.frames = 0
+        self.crc_errors = 0
+
+    def take_frames(self, buffer):
+        """Remove complete request frames from buffer and yield them."""
+        while len(buffer) >= 2:
+            length = request_length(buffer)
+            if length is None:
+                if buffer[1] in (15, 16, 23):
+                    return  # Byte count not received yet
+                length = len(buffer)  # Unknown function: the rest is one frame
+            if len(buffer) < length:
+                return
+            frame = bytes(buffer[:length])
+            del buffer[:length]
+            yield frame
+
+    async def answer(self, frame):
+        """Return the response frame to a request frame, or None if the device stays silent."""
+        if not check_frame(frame):
+            self.crc_errors += 1
+            return None
+        unit, pdu = frame[0], frame[1:-2]
+        if unit != 0 and unit not in self.context:
+            return None
+        self.frames += 1
+        request = self.decoder.decode(pdu)
+        if request is None:
+            response = ExceptionResponse(pdu[0], ModbusExceptions.IllegalFunction)
+        else:
+            response = request.execute(self.context[unit])
+            if inspect.isawaitable(response):
+                response = await response
+        if unit == 0:
+            return None
+        if self.faults is not None:
+            response, _ = self.faults.manipulate(response)
+            if not getattr(response, 'should_respond', True):
+                return None
+        reply = rtu_frame(unit, bytes((response.function_code,)) + response.encode())
+        if self.line is not None:
+            await asyncio.sleep(self.line.frame_time(len(frame) + len(reply)) + self.line.silent_interval)
+        return reply
+
+    async def handle_connection(self, reader, writer):
+        """Serve RTU frames on one TCP connection (RTU over TCP)."""
+        buffer = bytearray()
+        try:
+            while True:
+                data = await reader.read(4096)
+                if not data:
+                    break
+                buffer += data
+                for frame in self.take_frames(buffer):
+                    reply = await self.answer(frame)
+                    if reply is not None:
+                        writer.write(reply)
+                        await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve_pty(self, link=None):
+        """Serve RTU frames on a new pseudo-terminal until cancelled; prints the path of its slave side."""
+        import tty
+
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        path = os.ttyname(slave)
+        if link:
+            if os.path.islink(link):
+                os.unlink(link)
+            os.symlink(path, link)
+        print(f"Serial RTU simulator on {link or path}" + (f" -> {path}" if link else ""), flush=True)
+
+        loop = asyncio.get_running_loop()
+        received = asyncio.Queue()
+        loop.add_reader(master, lambda: received.put_nowait(os.read(master, 4096)))
+        buffer = bytearray()
+        try:
+            while True:
+                buffer += await received.get()
+                for frame in self.take_frames(buffer):
+                    reply = await self.answer(frame)
+                    if reply is not None:
+                        os.write(master, reply)
+        finally:
+            loop.remove_reader(master)
+            os.close(master)
+            # The slave side stays open until now so the pty survives masters closing it
+            os.close(slave)
+            if link and os.path.islink(link):
+                os.unlink(link)
+
+
+async def update_dynamic_values(devices, address, period, wave_period):
+    """Rewrite the DYNAMIC_LAYOUT registers (holding and input) and one discrete input forever."""
+    rng = random.Random()
+    counter = 0
+    started = time.monotonic()
+    while True:
+        phase = ((time.monotonic() - started) % wave_period) / wave_period
+        values = [
+            counter & 0xFFFF,
+            (counter >> 16) & 0xFFFF,
+            counter & 0xFFFF,
+            int(32767.5 + 32767.5 * math.sin(2 * math.pi * phase)),
+            int(65535 * (1 - abs(2 * phase - 1))),
+            int(65535 * phase),
+            65535 if phase < 0.5 else 0,
+            rng.randrange(65536),
+        ]
+        for device in devices:
+            device.setValues(FC_READ_HOLDING_REGISTERS, address, values)
+            device.setValues(FC_READ_INPUT_REGISTERS, address, values)
+            device.setValues(FC_READ_DISCRETE_INPUTS, address, [phase < 0.5])
+        counter = (counter + 1) & 0xFFFFFFFF
+        await asyncio.sleep(period)
+
+
+def create_identity():
+    """Return the device identification served by the test server."""
     identity = ModbusDeviceIdentification()
     identity.VendorName = 'Test Modbus Server'
     identity.ProductCode = 'TEST'
@@ -41,27 +308,198 @@ def run_test_server(host='127.0.0.1', port=5020):
     identity.ProductName = 'Test Modbus TCP Server'
     identity.ModelName = 'Test Server v1.0'
     identity.MajorMinorRevision = '1.0.0'
-    
-    print(f"Starting Modbus TCP test server on {host}:{port}")
+    return identity
+
+
+def create_context(size, units, faults):
+    """Return (server context, devices) for one port; units=None answers any unit ID."""
+    if units is None:
+        device = SimulatedDevice(size, faults)
+        devices = [device]
+        context = ModbusServerContext(slaves=device, single=True)
+    else:
+        devices = [SimulatedDevice(size, faults) for _ in units]
+        context = ModbusServerContext(slaves=dict(zip(units, devices)), single=False)
+    for device in devices:
+        device.setValues(FC_READ_HOLDING_REGISTERS, 0, INITIAL_VALUES[:size])
+    return context, devices
+
+
+async def serve(host='127.0.0.1', ports=(5020,), size=1000, units=None, faults=None,
+                dynamic_address=None, update_period=0.1, wave_period=10.0, rtu=False, serial_pty=None, line=None):
+    """
+    Run one server per port until cancelled.
+
+    rtu serves RTU frames over TCP instead of Modbus TCP; serial_pty (a
+    path to link the pty to, or "" for none) adds a simulated device on a
+    pseudo-terminal. line is the simulated serial line of both.
+    """
+    identity = create_identity()
+    servers = []
+    rtu_servers = []
+    all_devices = []
+    try:
+        for port in ports:
+            context, devices = create_context(size, units, faults)
+            all_devices.extend(devices)
+            if rtu:
+                responder = RtuResponder(context, faults, line)
+                rtu_servers.append(await asyncio.start_server(responder.handle_connection, host, port))
+                continue
+            server = ModbusTcpServer(
+                context, identity=identity, address=(host, port),
+                response_manipulator=faults.manipulate if faults is not None else None,
+            )
+            servers.append(server)
+            # listen() only logs a failed bind, so check it here rather than in serve_forever()
+            if not await server.listen():
+                raise OSError(f"Could not listen on {host}:{port} (address in use?)")
+
+        tasks = [server.serving for server in servers]
+        tasks += [asyncio.create_task(server.serve_forever()) for server in rtu_servers]
+        if serial_pty is not None:
+            context, devices = create_context(size, units, faults)
+            all_devices.extend(devices)
+            tasks.append(asyncio.create_task(RtuResponder(context, faults, line).serve_pty(serial_pty)))
+        if dynamic_address is not None:
+            tasks.append(asyncio.create_task(
+                update_dynamic_values(all_devices, dynamic_address, update_period, wave_period)
+            ))
+        await asyncio.gather(*tasks)
+    finally:
+        for server in servers:
+            await server.shutdown()
+        for server in rtu_servers:
+            server.close()
+
+
+def run_test_server(host='127.0.0.1', port=5020, size=1000, **options):
+    """
+    Start a Modbus TCP test server.
+
+    Args:
+        host: IP address to bind to
+        port: TCP port to listen on (or a list of ports)
+        size: number of entries in each of the four tables
+        options: units, faults, dynamic_address, update_period, wave_period, rtu, serial_pty, line (see serve())
+
+    Returns:
+        0 when stopped with Ctrl+C, 1 if a port could not be bound
+    """
+    ports = list(port) if isinstance(port, (list, tuple)) else [port]
+    units = options.get('units')
+
+    if ports:
+        framing = "Modbus RTU over TCP" if options.get('rtu') else "Modbus TCP"
+        print(f"Starting {framing} test server on {host}:{', '.join(str(p) for p in ports)}")
+    if options.get('line') is not None:
+        print(f"  Simulating a {options['line']} serial line")
+    print(f"  {size} coils, discrete inputs, input registers and holding registers per unit")
+    print(f"  Unit IDs: {'any' if units is None else f'{len(units)} ({units[0]}-{units[-1]})'}")
     print("Press Ctrl+C to stop")
     print("\nInitial register values (0-9):")
-    print("  Address 0: 0")
-    print("  Address 1: 1234")
-    print("  Address 2: 5678")
-    print("  Address 3: 9999")
-    print("  Address 4: 42")
-    print("  Address 5: 65535")
-    print("  Address 6: 100")
-    print("  Address 7: 200")
-    print("  Address 8: 300")
-    print("  Address 9: 400")
-    
+    for address, value in enumerate(INITIAL_VALUES[:size]):
+        print(f"  Address {address}: {value}")
+    if options.get('dynamic_address') is not None:
+        print(f"\nDynamic registers (holding and input) from address {options['dynamic_address']}:")
+        for offset, description in enumerate(DYNAMIC_LAYOUT):
+            print(f"  Address {options['dynamic_address'] + offset}: {description}")
+
     # Start server
-    StartTcpServer(
-        context=context,
-        identity=identity,
-        address=(host, port)
+    try:
+        asyncio.run(serve(host, ports, size, **options))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def parse_numbers(text, lowest, highest, name):
+    """Parse a list such as "1,2,5-8" into sorted unique numbers from lowest to highest; raises ValueError."""
+    numbers = set()
+    for token in text.replace(",", " ").split():
+        first_text, _, last_text = token.partition("-")
+        first = int(first_text)
+        last = int(last_text) if last_text else first
+        if last < first:
+            raise ValueError(f"Invalid range '{token}'")
+        for number in (first, last):
+            if not lowest <= number <= highest:
+                raise ValueError(f"{name} {number} is outside {lowest}-{highest}")
+        numbers.update(range(first, last + 1))
+    return sorted(numbers)
+
+
+def build_parser():
+    """Return the argument parser for the test server."""
+    parser = argparse.ArgumentParser(description="Modbus TCP test server with configurable size and faults.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to bind to (default: 127.0.0.1)")
+    parser.add_argument("--port", default="5020", help="port(s), e.g. 5020 or 5020-5027 (default: 5020)")
+    parser.add_argument("--size", type=int, default=1000,
+                        help="entries per table, up to 65536 (default: 1000)")
+    parser.add_argument("--units", help="unit IDs to serve, e.g. 1-32 (default: answer any unit ID)")
+    parser.add_argument("--latency", type=float, default=0, help="delay per request in ms (default: 0)")
+    parser.add_argument("--jitter", type=float, default=0, help="random +/- variation of the delay in ms")
+    parser.add_argument("--drop-rate", type=float, default=0, help="fraction of responses never sent (0-1)")
+    parser.add_argument("--exception-rate", type=float, default=0,
+                        help="fraction of responses replaced by an exception (0-1)")
+    parser.add_argument("--exception-code", type=int, default=6,
+                        help="exception code to inject (default: 6, slave device busy)")
+    parser.add_argument("--seed", type=int, help="random seed for reproducible faults")
+    parser.add_argument("--dynamic", type=int, metavar="ADDRESS",
+                        help=f"generate counters and waveforms in {len(DYNAMIC_LAYOUT)} registers from ADDRESS")
+    parser.add_argument("--update-ms", type=float, default=100, help="dynamic value update period (default: 100)")
+    parser.add_argument("--wave-period", type=float, default=10, help="waveform period in seconds (default: 10)")
+    parser.add_argument("--rtu", action="store_true", help="serve Modbus RTU frames over TCP (a serial converter)")
+    parser.add_argument("--serial-pty", nargs="?", const="", metavar="LINK",
+                        help="also simulate a serial RTU device on a pseudo-terminal, optionally linked to LINK")
+    parser.add_argument("--no-tcp", action="store_true", help="with --serial-pty, do not listen on TCP ports")
+    parser.add_argument("--line", help='simulate the timing of a serial line, e.g. "9600 8E1" (RTU only)')
+    return parser
+
+
+def main(argv=None):
+    """Parse the command line and run the server."""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        ports = parse_numbers(args.port, 1, 65535, "Port")
+        units = parse_numbers(args.units, 0, 255, "Unit ID") if args.units else None
+    except ValueError as e:
+        parser.error(str(e))
+    if not ports:
+        parser.error("Ports must be between 1 and 65535")
+    if not 1 <= args.size <= 65536:
+        parser.error("--size must be between 1 and 65536")
+    if args.dynamic is not None and not 0 <= args.dynamic <= args.size - len(DYNAMIC_LAYOUT):
+        parser.error(f"--dynamic must be between 0 and {args.size - len(DYNAMIC_LAYOUT)}")
+    if args.drop_rate + args.exception_rate > 1 or min(args.drop_rate, args.exception_rate) < 0:
+        parser.error("--drop-rate and --exception-rate must be between 0 and 1 together")
+    if args.no_tcp and args.serial_pty is None:
+        parser.error("--no-tcp needs --serial-pty")
+    if args.line and not args.rtu and args.serial_pty is None:
+        parser.error("--line needs --rtu or --serial-pty")
+    line = None
+    if args.line:
+        try:
+            line = SerialLine.parse(args.line)
+        except ValueError as e:
+            parser.error(str(e))
+
+    faults = None
+    if args.latency or args.jitter or args.drop_rate or args.exception_rate:
+        faults = FaultInjector(
+            args.latency / 1000, args.jitter / 1000, args.drop_rate, args.exception_rate,
+            args.exception_code, args.seed
+        )
+    return run_test_server(
+        args.host, [] if args.no_tcp else ports, args.size, units=units, faults=faults,
+        dynamic_address=args.dynamic, update_period=max(0.001, args.update_ms / 1000), wave_period=args.wave_period,
+        rtu=args.rtu, serial_pty=args.serial_pty, line=line,
     )
 
+
 if __name__ == '__main__':
-    run_test_server()
+    sys.exit(main())
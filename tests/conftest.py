@@ -0,0 +1,54 @@
+"""Shared fixtures: the repository modules on sys.path and test_server.py instances on free ports."""
+
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+SERVER_START_TIMEOUT = 10.0
+
+
+def free_port():
+    """A TCP port nobody listens on right now."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def test_server():
+    """
+    start(*options) runs test_server.py with options on a free port and returns the port.
+
+    Every server started is terminated when the test ends.
+    """
+    processes = []
+
+    def start(*options):
+        port = free_port()
+        process = subprocess.Popen(
+            [sys.executable, str(ROOT / "test_server.py"), "--port", str(port), *options],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        processes.append(process)
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"test_server.py exited with status {process.returncode}")
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+                return port
+            except OSError:
+                time.sleep(0.05)
+        raise RuntimeError(f"test_server.py did not listen on port {port}")
+
+    yield start
+    for process in processes:
+        process.terminate()
+        process.wait(5)
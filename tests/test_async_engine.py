@@ -0,0 +1,90 @@
+import time
+
+import pytest
+from pymodbus.bit_write_message import WriteMultipleCoilsRequest
+
+from async_engine import CONNECTED, ModbusEngine
+from events import EventBus, Reconnected
+from metrics import Metrics
+from modbus_core import COILS, ModbusIOError, PackedBits, RetryPolicy
+from test_server import INITIAL_VALUES
+
+
+@pytest.fixture
+def connect(test_server):
+    """connect(*server_options, **engine_options) starts a server and returns an engine connected to it."""
+    engines = []
+
+    def connect(*options, **engine_options):
+        engine = ModbusEngine("127.0.0.1", test_server(*options), metrics=Metrics(), **engine_options)
+        engine.start()
+        engines.append(engine)
+        assert engine.call(engine.connect)
+        # A measured 10 ms round trip, so timeouts follow the estimate from the first request
+        engine.pacer.on_success(0.01)
+        return engine
+
+    yield connect
+    for engine in engines:
+        engine.stop()
+
+
+def stats(engine):
+    (entry,) = engine.metrics.snapshot()['requests']
+    return entry
+
+
+def test_bits(connect):
+    engine = connect()
+    pattern = [i % 3 == 0 for i in range(21)]
+    assert not engine.call(engine.execute, WriteMultipleCoilsRequest(3, pattern), 1).isError()
+    coils = engine.call(engine.read_registers, 0, 1000, 1, table=COILS)
+    assert isinstance(coils, PackedBits) and len(coils) == 1000
+    assert coils[3:24] == pattern and coils[:3] == [0, 0, 0]
+    (block,) = engine.call(engine.read_blocks, [(5, 11)], 1, table=COILS)
+    assert block == pattern[2:13]
+
+
+class TestRetries:
+    def test_only_lost_chunks_are_read_again(self, connect):
+        # With seed 2 the third and fourth of the eight responses are dropped
+        engine = connect("--drop-rate", "0.25", "--seed", "2", timeout=5,
+                         policy=RetryPolicy(min_timeout=0.1, backoff_initial=0.01))
+        started = time.perf_counter()
+        values = engine.call(engine.read_registers, 0, 1000, 1)
+        assert values[:len(INITIAL_VALUES)] == INITIAL_VALUES and len(values) == 1000
+        # The retry waited for the estimated round trip, not the configured 5 s
+        assert time.perf_counter() - started < 2
+        entry = stats(engine)
+        assert entry['responses'] == 8 and entry['timeouts'] >= 2
+        assert entry['requests'] == entry['responses'] + entry['timeouts']
+        assert engine.state == CONNECTED
+
+    def test_gives_up_after_the_retries(self, connect):
+        engine = connect("--drop-rate", "1", timeout=5,
+                         policy=RetryPolicy(retries=1, min_timeout=0.05, backoff_initial=0.01))
+        started = time.perf_counter()
+        with pytest.raises(ModbusIOError):
+            engine.call(engine.read_registers, 0, 100, 1)
+        assert time.perf_counter() - started < 1
+        assert stats(engine)['requests'] == 2
+
+    def test_busy_responses_are_retried(self, connect):
+        engine = connect("--exception-rate", "0.3", "--exception-code", "6", "--seed", "1")
+        engine.pacer.max_delay = 0.01
+        values = engine.call(engine.read_registers, 0, 1000, 1)
+        assert values[:len(INITIAL_VALUES)] == INITIAL_VALUES
+        entry = stats(engine)
+        assert entry['retries'] > 0 and entry['errors'] == 0
+        assert entry['responses'] == 8 + entry['retries']
+
+    def test_lost_connection_is_reopened_before_the_retry(self, connect):
+        events = EventBus()
+        reconnected = []
+        events.subscribe(reconnected.append, Reconnected)
+        engine = connect(policy=RetryPolicy(reconnect=False, backoff_initial=0.01), events=events)
+        engine.loop.call_soon_threadsafe(engine.client.close)
+        assert engine.call(engine.read_registers, 0, 10, 1) == INITIAL_VALUES
+        assert engine.reconnects == 1
+        assert engine.state == CONNECTED
+        assert len(reconnected) == 1
@@ -0,0 +1,113 @@
+import json
+
+import pytest
+
+from bulk_write import (
+    compare_image, diff_ranges, image_segments, load_register_image, parse_image_binary, parse_image_csv,
+    parse_image_json, verify_plan, write_image,
+)
+from modbus_core import ChunkedReader, ModbusResponseError
+from transports import TcpTransport
+
+
+class TestParse:
+    def test_csv(self):
+        text = "address,value\n10,1\n# comment\n0x0B,0xFFFF\n\n12, 3\n"
+        assert parse_image_csv(text) == {10: 1, 11: 65535, 12: 3}
+
+    @pytest.mark.parametrize("text, message", [
+        ("10,1\n11\n", "Line 2"),
+        ("10,1\n11,x\n", "Line 2"),
+        ("10,65536\n", "uint16"),
+        ("65536,1\n", "outside 0-65535"),
+    ])
+    def test_malformed_csv(self, text, message):
+        with pytest.raises(ValueError, match=message):
+            parse_image_csv(text)
+
+    def test_json_forms(self):
+        lines = '{"address": 10, "value": 1}\n{"address": 11, "value": 2}\n'
+        assert parse_image_json(lines) == {10: 1, 11: 2}
+        blocks = json.dumps([{"address": 10, "values": [1, 2]}, {"address": 20, "values": [3]}])
+        assert parse_image_json(blocks) == {10: 1, 11: 2, 20: 3}
+        assert parse_image_json('{"0x10": 5, "17": 6}') == {16: 5, 17: 6}
+
+    @pytest.mark.parametrize("text", [
+        '{"address": 10, "value": 1',
+        '{"address": 10, "value": "1"}',
+        '{"address": 65535, "values": [1, 2]}',
+        '{"ten": 1}',
+        '{"10": 1.5}',
+        '[1, 2]',
+        '"registers"',
+    ])
+    def test_malformed_json(self, text):
+        with pytest.raises(ValueError):
+            parse_image_json(text)
+
+    def test_binary(self):
+        assert parse_image_binary(b"\x12\x34\xff\x00", base_address=100) == {100: 0x1234, 101: 0xFF00}
+        with pytest.raises(ValueError, match="odd"):
+            parse_image_binary(b"\x12\x34\xff")
+        with pytest.raises(ValueError, match="does not fit"):
+            parse_image_binary(b"\x00\x01\x00\x02", base_address=65535)
+
+    def test_load_by_extension(self, tmp_path):
+        (tmp_path / "image.csv").write_text("5,1\n6,2\n9,3\n")
+        (tmp_path / "image.jsonl").write_text('{"address": 5, "value": 1}\n')
+        (tmp_path / "image.img").write_bytes(b"\x00\x07")
+        (tmp_path / "empty.csv").write_text("address,value\n")
+        assert load_register_image(tmp_path / "image.csv") == [(5, [1, 2]), (9, [3])]
+        assert load_register_image(tmp_path / "image.jsonl") == [(5, [1])]
+        assert load_register_image(tmp_path / "image.img", base_address=40) == [(40, [7])]
+        with pytest.raises(ValueError, match="no registers"):
+            load_register_image(tmp_path / "empty.csv")
+        with pytest.raises(ValueError, match="Unknown image format"):
+            load_register_image(tmp_path / "image.csv", image_format='xml')
+
+
+def test_segments_and_verify_plan():
+    segments = image_segments({7: 1, 3: 9, 4: 8, 40: 2})
+    assert segments == [(3, [9, 8]), (7, [1]), (40, [2])]
+    assert verify_plan(segments, max_gap=10).blocks == [(3, 5), (40, 1)]
+    assert verify_plan(segments, max_gap=0).blocks == [(3, 2), (7, 1), (40, 1)]
+
+
+def test_compare_and_diff_ranges():
+    segments = [(10, [1, 2, 3, 4]), (20, [5])]
+    plan = verify_plan(segments, max_gap=10)
+    assert plan.blocks == [(10, 11)]
+    read_back = [[1, 0, 0, 4, 9, 9, 9, 9, 9, 9, 6]]
+    mismatches = compare_image(segments, plan, read_back)
+    assert mismatches == [(11, 2, 0), (12, 3, 0), (20, 5, 6)]
+    assert diff_ranges(mismatches) == [(11, 12, mismatches[:2]), (20, 20, mismatches[2:])]
+    assert compare_image(segments, plan, [[1, 2, 3, 4, 0, 0, 0, 0, 0, 0, 5]]) == []
+
+
+class TestLoopback:
+    @pytest.fixture
+    def client(self, test_server):
+        client = TcpTransport("127.0.0.1", test_server()).open(2.0)
+        yield client
+        client.close()
+
+    def test_write_and_verify(self, client):
+        segments = image_segments({**{100 + i: (7 * i) % 65536 for i in range(300)}, 500: 1, 505: 2})
+        result = write_image(client, segments, 1, verify_delay=0)
+        assert (result.registers, result.write_requests) == (302, 5)
+        assert result.verified and result.ranges == []
+        assert result.verify_requests == len(verify_plan(segments).blocks)
+        plan = verify_plan(segments)
+        assert compare_image(segments, plan, ChunkedReader(client, 1).read_blocks(plan.blocks)) == []
+
+    def test_changed_registers_are_found(self, client):
+        segments = [(200, [1, 2, 3, 4])]
+        assert write_image(client, segments, 1, verify=False).verified is None
+        client.write_registers(201, [20, 30], slave=1)
+        plan = verify_plan(segments)
+        mismatches = compare_image(segments, plan, ChunkedReader(client, 1).read_blocks(plan.blocks))
+        assert diff_ranges(mismatches) == [(201, 202, [(201, 2, 20), (202, 3, 30)])]
+
+    def test_rejected_write(self, client):
+        with pytest.raises(ModbusResponseError):
+            write_image(client, [(995, [1] * 10)], 1)
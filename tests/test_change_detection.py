@@ -0,0 +1,68 @@
+import pytest
+
+from change_detection import BLOCK_SIZE, DeadbandFilter, RegisterSnapshot
+from tag_decoder import Tag
+
+
+class TestRegisterSnapshot:
+    def test_first_update_reports_everything(self):
+        snapshot = RegisterSnapshot(100)
+        assert snapshot.update(10, [0, 0, 5]) == [10, 11, 12]
+        assert snapshot.update(10, [0, 0, 5]) == []
+
+    def test_reports_changed_addresses_across_blocks(self):
+        snapshot = RegisterSnapshot(1000)
+        values = list(range(300))
+        snapshot.update(0, values)
+        values[3] = 999
+        values[BLOCK_SIZE * 4 + 1] = 999
+        values[299] = 0
+        assert snapshot.update(0, values) == [3, BLOCK_SIZE * 4 + 1, 299]
+        assert snapshot.get(3, 2) == [999, 4]
+
+    def test_partial_overlap_with_unknown_addresses(self):
+        snapshot = RegisterSnapshot(100)
+        snapshot.update(0, [1, 2])
+        assert snapshot.update(1, [2, 0]) == [2]
+
+    def test_sparse(self):
+        snapshot = RegisterSnapshot()
+        assert snapshot.update_sparse([5, 900], [1, 2]) == [5, 900]
+        assert snapshot.update_sparse([5, 900], [1, 3]) == [900]
+
+    def test_clear(self):
+        snapshot = RegisterSnapshot(10)
+        snapshot.update(0, [1])
+        snapshot.clear()
+        assert snapshot.update(0, [1]) == [0]
+
+    def test_out_of_range(self):
+        with pytest.raises(ValueError):
+            RegisterSnapshot(10).update(8, [1, 2, 3])
+
+
+class TestDeadbandFilter:
+    def test_deadband(self):
+        deadband = DeadbandFilter([Tag('level', 0, deadband=0.5), Tag('count', 1)])
+        assert deadband.update([10.0, 1]) == [(0, 10.0), (1, 1)]
+        assert deadband.update([10.4, 1]) == []
+        assert deadband.update([10.6, 2]) == [(0, 10.6), (1, 2)]
+        # Measured from the last reported value, not the last update
+        assert deadband.update([10.2, 2]) == []
+        assert deadband.update([10.0, 2]) == [(0, 10.0)]
+
+    def test_default_deadband_and_strings(self):
+        deadband = DeadbandFilter([Tag('speed', 0), Tag('name', 1, 'string', length=2)], default_deadband=1.0)
+        deadband.update([5.0, "a"])
+        assert deadband.update([5.5, "b"]) == [(1, "b")]
+
+    def test_nan_is_reported_once(self):
+        deadband = DeadbandFilter([Tag('x', 0, 'float32')])
+        assert len(deadband.update([float('nan')])) == 1
+        assert deadband.update([float('nan')]) == []
+
+    def test_reset(self):
+        deadband = DeadbandFilter([Tag('x', 0)])
+        deadband.update([1])
+        deadband.reset()
+        assert deadband.update([1]) == [(0, 1)]
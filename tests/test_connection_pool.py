@@ -0,0 +1,95 @@
+import threading
+
+import pytest
+
+from conftest import free_port
+from connection_pool import ConnectionPool, Target, parse_targets, parse_units, scan
+from metrics import Metrics
+from modbus_core import ModbusIOError
+from test_server import INITIAL_VALUES
+
+
+def test_parse_units():
+    assert parse_units("1,2 5-7") == [1, 2, 5, 6, 7]
+    with pytest.raises(ValueError):
+        parse_units("250-256")
+
+
+def test_parse_targets():
+    text = "# plant A\n192.168.1.10:5020 1-2\n\n192.168.1.11  # default port and unit\n"
+    assert parse_targets(text) == [
+        Target("192.168.1.10", 5020, 1), Target("192.168.1.10", 5020, 2), Target("192.168.1.11", 502, 1),
+    ]
+    with pytest.raises(ValueError, match="Line 1"):
+        parse_targets("host:99999")
+
+
+class TestPool:
+    @pytest.fixture
+    def pool(self):
+        pool = ConnectionPool(timeout=0.2, backoff_initial=0.5, metrics=Metrics())
+        yield pool
+        pool.close_all()
+
+    def test_clients_are_reused_without_pymodbus_retries(self, pool, test_server):
+        port = test_server()
+        with pool.connection("127.0.0.1", port) as client:
+            assert client.params.retries == 0
+        with pool.connection("127.0.0.1", port) as again:
+            assert again is client
+        assert pool.read(Target("127.0.0.1", port, 1), 0, 10) == INITIAL_VALUES
+
+    def test_one_request_per_host_at_a_time(self, pool, test_server):
+        # Both ports are on 127.0.0.1, so they share its single slot
+        first, second = test_server(), test_server()
+        entered = threading.Event()
+
+        def borrow():
+            with pool.connection("127.0.0.1", second):
+                entered.set()
+
+        with pool.connection("127.0.0.1", first):
+            thread = threading.Thread(target=borrow)
+            thread.start()
+            assert not entered.wait(0.2)
+        assert entered.wait(5)
+        thread.join(5)
+        waits = {item['connection']: item for item in pool.metrics.snapshot()['queue_wait']}
+        assert waits[f"127.0.0.1:{second}"]['max'] >= 0.2
+
+    def test_refused_connection_backs_off(self, pool):
+        target = Target("127.0.0.1", free_port(), 1)
+        with pytest.raises(ModbusIOError, match="Could not connect"):
+            pool.read(target, 0, 1)
+        with pytest.raises(ModbusIOError, match="unreachable, next attempt"):
+            pool.read(target, 0, 1)
+
+    def test_timeout_of_one_unit_does_not_back_off(self, pool, test_server):
+        port = test_server("--units", "2")
+        with pytest.raises(ModbusIOError, match="No response"):
+            pool.read(Target("127.0.0.1", port, 1), 0, 1)
+        # The gateway itself is fine: the next unit connects at once
+        assert pool.read(Target("127.0.0.1", port, 2), 0, 10) == INITIAL_VALUES
+
+
+def test_scan(test_server):
+    pool = ConnectionPool(timeout=0.5, max_per_host=2, metrics=Metrics())
+    port = test_server("--units", "1-3")
+    targets = [Target("127.0.0.1", port, unit) for unit in (1, 2, 3)] + [Target("127.0.0.1", free_port(), 1)]
+    finished = []
+    try:
+        results = scan(pool, targets, 0, 10, max_workers=4, on_result=finished.append)
+    finally:
+        pool.close_all()
+    assert [result.target for result in results] == targets
+    assert [result.ok for result in results] == [True, True, True, False]
+    assert all(result.values == INITIAL_VALUES for result in results[:3])
+    assert "Could not connect" in results[3].error
+    assert len(finished) == 4
+
+
+def test_cancelled_scan():
+    cancel = threading.Event()
+    cancel.set()
+    (result,) = scan(ConnectionPool(metrics=Metrics()), [Target("127.0.0.1", free_port(), 1)], 0, 1, cancel=cancel)
+    assert result.error == "Cancelled"
@@ -0,0 +1,87 @@
+import errno
+import io
+
+import pytest
+
+from data_logger import DataRecorder, export_csv, iter_frames, read_header, sort_recordings
+from tag_decoder import Tag, TagDecoder
+
+
+def record(path, frames, **options):
+    recorder = DataRecorder(path, 100, 3, metadata={'device': "test"}, **options)
+    recorder.start()
+    for timestamp, values in frames:
+        assert recorder.submit(timestamp, values)
+    recorder.close()
+    assert recorder.error is None
+    return recorder
+
+
+def test_round_trip(tmp_path):
+    frames = [(1000.0 + i, [i, 65535 - i, 7]) for i in range(50)]
+    recorder = record(tmp_path / "capture", frames)
+    assert recorder.files == [tmp_path / "capture.mblog"]
+    metadata, _ = read_header(recorder.files[0])
+    assert (metadata['address'], metadata['count'], metadata['device']) == (100, 3, "test")
+    assert [(timestamp, list(values)) for timestamp, values in iter_frames(recorder.files[0])] == frames
+
+
+def test_rotation(tmp_path):
+    frames = [(float(i), [i, i, i]) for i in range(100)]
+    recorder = record(tmp_path / "capture.mblog", frames, max_bytes=1)
+    assert len(recorder.files) > 1
+    paths = sort_recordings(reversed(recorder.files))
+    assert paths == recorder.files
+    assert [timestamp for path in paths for timestamp, _ in iter_frames(path)] == [timestamp for timestamp, _ in frames]
+
+
+def test_truncated_frame_is_ignored(tmp_path):
+    recorder = record(tmp_path / "capture", [(1.0, [1, 2, 3]), (2.0, [4, 5, 6])])
+    with open(recorder.files[0], "ab") as f:
+        f.write(b"\0" * 5)
+    assert len(list(iter_frames(recorder.files[0]))) == 2
+
+
+def test_export_csv(tmp_path):
+    recorder = record(tmp_path / "capture", [(1.5, [1, 0, 2]), (2.5, [3, 0, 4])])
+    out = io.StringIO()
+    assert export_csv(recorder.files, out) == 2
+    assert out.getvalue() == "timestamp,100,101,102\n1.500000,1,0,2\n2.500000,3,0,4\n"
+
+    out = io.StringIO()
+    export_csv(recorder.files, out, TagDecoder([Tag('total', 101, 'uint32'), Tag('first', 100)]))
+    assert out.getvalue().splitlines() == ["timestamp,total,first", "1.500000,2,1", "2.500000,4,3"]
+
+
+def test_export_needs_the_tag_registers(tmp_path):
+    recorder = record(tmp_path / "capture", [(1.0, [1, 2, 3])])
+    with pytest.raises(ValueError):
+        export_csv(recorder.files, io.StringIO(), TagDecoder([Tag('outside', 103)]))
+
+
+def test_not_a_recording(tmp_path):
+    path = tmp_path / "other.mblog"
+    path.write_bytes(b"something else entirely")
+    with pytest.raises(ValueError):
+        read_header(path)
+
+
+class FullDisk(io.RawIOBase):
+    def write(self, data):
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    def fileno(self):
+        raise OSError(errno.EBADF, "no file")
+
+
+def test_writer_failure_stops_recording(tmp_path):
+    recorder = DataRecorder(tmp_path / "capture", 0, 1, queue_size=8)
+    recorder.start()
+    file, recorder._file = recorder._file, FullDisk()
+    file.close()
+    recorder.submit(1.0, [1])
+    recorder._thread.join(5)
+    assert isinstance(recorder.error, OSError)
+    assert not recorder.submit(2.0, [2])
+    recorder.close(timeout=1)
+    assert recorder.frames_dropped >= 1
@@ -0,0 +1,103 @@
+import json
+import os
+
+import pytest
+
+from device_profile import CACHE_VERSION, cache_path, load_profile, read_groups
+
+PROFILE = {
+    "name": "Pump skid",
+    "groups": {"fast": {"period_ms": 100}, "slow": {"period_ms": 5000, "priority": 1}},
+    "tags": [
+        {"name": "flow", "address": 100, "type": "float32", "group": "fast"},
+        {"name": "pressure", "address": 104, "type": "uint16", "group": "fast"},
+        {"name": "serial", "address": 900, "type": "string", "length": 4, "group": "slow"},
+    ],
+}
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / "pump.json"
+    path.write_text(json.dumps(PROFILE))
+    return path
+
+
+def summary(profile):
+    return [(group.name, group.period, group.priority, [tag.name for tag in group.tags], group.plan.blocks)
+            for group in profile.groups]
+
+
+def test_compile(path):
+    profile = load_profile(path, use_cache=False)
+    assert profile.name == "Pump skid" and not profile.from_cache
+    assert summary(profile) == [
+        ('fast', 0.1, 0, ['flow', 'pressure'], [(100, 5)]),
+        ('slow', 5.0, 1, ['serial'], [(900, 4)]),
+    ]
+    assert not cache_path(path).exists()
+
+
+def test_compiled_form_is_reused(path):
+    compiled = load_profile(path)
+    assert cache_path(path).exists()
+    cached = load_profile(path)
+    assert cached.from_cache and cached.source == path
+    assert summary(cached) == summary(compiled)
+    registers = {(100, 5): [0x3F80, 0, 0, 0, 7], (900, 4): [0x4142, 0x4344, 0, 0]}
+
+    def read(requests):
+        return [[registers[block] for block in blocks] for blocks, _ in requests]
+
+    assert read_groups(cached.groups, read) == read_groups(compiled.groups, read)
+    assert read_groups(cached.groups, read)[1] == ["ABCD"]
+
+
+def test_changed_source_is_compiled_again(path):
+    load_profile(path)
+    path.write_text(json.dumps(dict(PROFILE, tags=PROFILE['tags'][:2])))
+    profile = load_profile(path)
+    assert not profile.from_cache and len(profile.tags) == 2
+    assert load_profile(path).from_cache
+
+
+def test_same_size_but_newer_source_is_compiled_again(path):
+    load_profile(path)
+    path.write_text(path.read_text().replace("flow", "flux"))
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    profile = load_profile(path)
+    assert not profile.from_cache and profile.tags[0].name == "flux"
+
+
+@pytest.mark.parametrize("damage", [
+    lambda document: "{not json",
+    lambda document: json.dumps(dict(document, version=CACHE_VERSION - 1)),
+    lambda document: json.dumps(dict(document, source=[0, 0])),
+    lambda document: json.dumps(dict(document, groups=[{"name": "fast"}])),
+    lambda document: json.dumps(dict(document, groups=[dict(document['groups'][0], tags=[["x"]])])),
+])
+def test_stale_or_corrupt_cache_is_ignored(path, damage):
+    load_profile(path)
+    plan = cache_path(path)
+    plan.write_text(damage(json.loads(plan.read_text())))
+    profile = load_profile(path)
+    assert not profile.from_cache
+    assert summary(profile) == summary(load_profile(path, use_cache=False))
+    # ... and replaced by a good one
+    assert load_profile(path).from_cache
+
+
+def test_csv(tmp_path):
+    path = tmp_path / "tags.csv"
+    path.write_text("name,address,type,group,period_ms\nflow,100,float32,fast,250\n# note,,,,\nlevel,10,,slow,\n")
+    profile = load_profile(path, use_cache=False)
+    assert profile.name == "tags"
+    assert [(group.name, group.period) for group in profile.groups] == [('fast', 0.25), ('slow', 1.0)]
+
+
+def test_duplicate_tags(tmp_path):
+    path = tmp_path / "twice.json"
+    path.write_text(json.dumps([{"name": "a", "address": 1}, {"name": "a", "address": 2}]))
+    with pytest.raises(ValueError, match="Duplicate"):
+        load_profile(path)
@@ -0,0 +1,107 @@
+import pytest
+
+from events import (
+    CONNECTION, ERROR, EXCEPTION, TIMEOUT, ConnectionLost, ErrorWindow, Event, EventBus, OperationFailed,
+    RateLimitedReporter, Reconnected, RequestCompleted, RequestFailed,
+)
+
+
+class TestErrorWindow:
+    def test_failures_expire_with_the_window(self):
+        window = ErrorWindow(10)
+        window.add(TIMEOUT, 3, now=100.0)
+        window.add(EXCEPTION, now=105.0)
+        window.add(TIMEOUT, now=109.0)
+        assert window.counts(now=109.0) == {TIMEOUT: 4, EXCEPTION: 1}
+        assert window.counts(now=112.0) == {TIMEOUT: 1, EXCEPTION: 1}
+        assert window.counts(now=119.5) == {}
+
+    def test_summary(self):
+        window = ErrorWindow(10)
+        assert window.summary(now=0.0) == ""
+        window.add(EXCEPTION, now=0.0)
+        window.add(TIMEOUT, 37, "unit 1: timeout", now=1.0)
+        assert window.summary(now=2.0) == "37 timeouts, 1 exception response in last 10 s"
+        assert window.last_message == "unit 1: timeout"
+
+    def test_events(self):
+        window = ErrorWindow()
+        window.add_event(RequestFailed("dev", 3, CONNECTION, 2), now=0.0)
+        window.add_event(OperationFailed("Read", TimeoutError("no answer")), now=0.0)
+        window.add_event(Reconnected("dev", 1), now=0.0)
+        assert window.counts(now=0.0) == {CONNECTION: 2, TIMEOUT: 1}
+        assert window.last_message == "Read: no answer"
+
+
+class TestRateLimitedReporter:
+    @pytest.fixture
+    def emitted(self):
+        return []
+
+    def test_first_failure_at_once_then_summaries(self, emitted):
+        reporter = RateLimitedReporter(emitted.append, window=10, interval=5)
+        reporter.report(TIMEOUT, "first", now=100.0)
+        for second in range(1, 5):
+            reporter.report(TIMEOUT, f"timeout {second}", now=100.0 + second)
+        assert emitted == ["first"]
+        assert reporter.pending == 4
+        reporter.report(EXCEPTION, "busy", now=105.0)
+        assert emitted[1] == "busy (5 timeouts, 1 exception response in last 10 s)"
+        assert reporter.pending == 0
+
+    def test_quiet_period_reports_the_next_failure_alone(self, emitted):
+        reporter = RateLimitedReporter(emitted.append, window=10, interval=5)
+        reporter.report(TIMEOUT, "first", now=100.0)
+        reporter.report(TIMEOUT, "second", now=200.0)
+        assert emitted == ["first", "second"]
+
+    def test_flush(self, emitted):
+        reporter = RateLimitedReporter(emitted.append, window=10, interval=5)
+        reporter.flush(now=100.0)
+        reporter.report(ERROR, "first", now=100.0)
+        reporter.report(ERROR, "second", count=2, now=101.0)
+        reporter.flush(now=102.0)
+        assert emitted == ["first", "second (3 errors in last 10 s)"]
+        reporter.flush(now=103.0)
+        assert len(emitted) == 2
+
+    def test_subscribed_to_a_bus(self, emitted):
+        bus = EventBus()
+        bus.subscribe(RateLimitedReporter(emitted.append))
+        bus.publish(RequestCompleted("dev", 3, 0.01, 20))
+        bus.publish(RequestFailed("10.0.0.5:502/1", 3, EXCEPTION, 1, exception_code=2))
+        bus.publish(RequestFailed("10.0.0.5:502/1", 3, TIMEOUT, 4))
+        bus.publish(ConnectionLost("10.0.0.5:502"))
+        bus.publish(Reconnected("10.0.0.5:502", 3))
+        assert emitted == [
+            "10.0.0.5:502/1: 1 exception response 2",
+            "Connection to 10.0.0.5:502 lost, reconnecting",
+            "Reconnected to 10.0.0.5:502 after 3 attempt(s)",
+        ]
+
+
+class TestEventBus:
+    def test_handlers_receive_their_types_and_subtypes(self):
+        bus = EventBus()
+        failures, everything = [], []
+        bus.subscribe(failures.append, RequestFailed)
+        bus.subscribe(everything.append)
+        assert bus.wants(RequestCompleted)
+        bus.publish(RequestFailed("dev", 3, TIMEOUT))
+        bus.publish(ConnectionLost("dev"))
+        assert len(failures) == 1 and len(everything) == 2
+        bus.unsubscribe(everything.append)
+        assert not bus.wants(ConnectionLost)
+
+    def test_failing_handler_does_not_stop_the_others(self):
+        bus = EventBus()
+        seen = []
+        bus.subscribe(lambda event: 1 / 0)
+        bus.subscribe(seen.append)
+        bus.publish(Event())
+        assert len(seen) == 1
+
+    def test_as_dict(self):
+        record = RequestFailed("dev", 3, TIMEOUT, 2).as_dict()
+        assert record['event'] == "RequestFailed"
+        assert (record['device'], record['kind'], record['count']) == ("dev", TIMEOUT, 2)
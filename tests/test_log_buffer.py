@@ -0,0 +1,55 @@
+from log_buffer import LogBuffer
+
+
+def texts(entries):
+    return [entry.text for entry in entries]
+
+
+def test_evicts_by_lines():
+    buffer = LogBuffer(max_lines=3)
+    for i in range(5):
+        buffer.append(f"message {i}\n")
+    assert len(buffer) == 3
+    new, evicted = buffer.drain()
+    assert texts(new) == ["message 2\n", "message 3\n", "message 4\n"]
+    assert evicted == 0
+
+
+def test_evicts_by_characters_but_keeps_the_newest():
+    buffer = LogBuffer(max_chars=10)
+    buffer.append("short\n")
+    buffer.append("a much longer message\n")
+    assert len(buffer) == 1
+    assert texts(buffer.drain()[0]) == ["a much longer message\n"]
+
+
+def test_evicted_lines_that_were_displayed():
+    buffer = LogBuffer(max_lines=4)
+    buffer.append("one\n")
+    buffer.append("two\nlines\n")
+    buffer.drain()
+    buffer.append("three\n")
+    buffer.append("four\n")
+    new, evicted = buffer.drain()
+    assert texts(new) == ["three\n", "four\n"]
+    assert evicted == 1
+
+
+def test_filter():
+    buffer = LogBuffer()
+    buffer.append("Read 10 registers\n")
+    buffer.append("Write failed\n", "error")
+    assert texts(buffer.set_filter(" WRITE ")) == ["Write failed\n"]
+    buffer.append("Write done\n")
+    buffer.append("Read again\n")
+    assert texts(buffer.drain()[0]) == ["Write done\n"]
+    assert buffer.drain() == ([], 0)
+
+
+def test_clear():
+    buffer = LogBuffer()
+    buffer.append("gone\n")
+    buffer.clear()
+    buffer.append("kept\n")
+    assert len(buffer) == 1
+    assert texts(buffer.drain()[0]) == ["kept\n"]
@@ -0,0 +1,116 @@
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from events import EventBus, RequestCompleted, RequestFailed, TIMEOUT
+from metrics import Histogram, Metrics, MetricsServer, device_label
+
+DEVICE = device_label("10.0.0.5", 502, 1)
+
+
+class TestHistogram:
+    def test_buckets_are_upper_bounds(self):
+        histogram = Histogram((0.001, 0.01, 0.1))
+        for value in (0.0005, 0.001, 0.002, 0.01, 0.05, 3.0):
+            histogram.observe(value)
+        assert histogram.counts == [2, 2, 1, 1]
+        assert histogram.as_dict()['buckets'] == {0.001: 2, 0.01: 2, 0.1: 1, 'inf': 1}
+        assert (histogram.count, histogram.max) == (6, 3.0)
+        assert histogram.sum == pytest.approx(3.0635)
+
+    def test_quantiles(self):
+        histogram = Histogram((0.01, 0.02))
+        assert histogram.quantile(0.5) == 0.0
+        for value in (0.005, 0.005, 0.015, 0.015):
+            histogram.observe(value)
+        assert histogram.quantile(0.5) == pytest.approx(0.01)
+        assert histogram.quantile(0.75) == pytest.approx(0.015)
+        assert histogram.quantile(1.0) == 0.015
+        assert histogram.mean == pytest.approx(0.01)
+
+
+def recorded():
+    metrics = Metrics()
+    for latency in (0.003, 0.004):
+        metrics.sent(DEVICE, 3, 12)
+        metrics.received(DEVICE, 3, latency, 29)
+    metrics.sent(DEVICE, 3, 12)
+    metrics.received(DEVICE, 3, 0.001, 9, exception_code=6, retried=True)
+    metrics.sent(DEVICE, 3, 12)
+    metrics.received(DEVICE, 3, 0.001, 9, exception_code=2)
+    metrics.timed_out(DEVICE, 3, 2)
+    metrics.failed(DEVICE, 16)
+    metrics.queued('10.0.0.5:502', 0.0002)
+    return metrics
+
+
+def test_snapshot():
+    metrics = recorded()
+    holding, writes = metrics.snapshot()['requests']
+    assert (holding['function'], holding['requests'], holding['responses']) == ("read_holding_registers", 4, 4)
+    assert (holding['retries'], holding['timeouts'], holding['exceptions']) == (1, 2, {2: 1})
+    assert holding['errors'] == 3
+    assert (holding['bytes_sent'], holding['bytes_received']) == (48, 76)
+    assert (writes['function'], writes['io_errors'], writes['errors']) == ("write_multiple_registers", 1, 1)
+    metrics.reset()
+    assert metrics.snapshot()['requests'] == []
+
+
+def test_events():
+    events = EventBus()
+    seen = []
+    events.subscribe(seen.append, RequestCompleted, RequestFailed)
+    metrics = Metrics(events)
+    metrics.received(DEVICE, 3, 0.002, 29)
+    metrics.timed_out(DEVICE, 3, 2)
+    completed, failed = seen
+    assert (completed.device, completed.latency) == (DEVICE, 0.002)
+    assert (failed.kind, failed.count) == (TIMEOUT, 2)
+
+
+def test_prometheus():
+    lines = recorded().to_prometheus().splitlines()
+    labels = '{device="10.0.0.5:502/1",function="read_holding_registers"'
+    assert "# TYPE modbus_requests_total counter" in lines
+    assert f"modbus_requests_total{labels}}} 4" in lines
+    assert f"modbus_timeouts_total{labels}}} 2" in lines
+    assert f'modbus_exceptions_total{labels},code="2"}} 1' in lines
+    assert '# TYPE modbus_request_duration_seconds histogram' in lines
+    # Buckets are cumulative and +Inf is the count
+    assert f'modbus_request_duration_seconds_bucket{labels},le="0.001"}} 2' in lines
+    assert f'modbus_request_duration_seconds_bucket{labels},le="0.005"}} 4' in lines
+    assert f'modbus_request_duration_seconds_bucket{labels},le="+Inf"}} 4' in lines
+    assert f"modbus_request_duration_seconds_count{labels}}} 4" in lines
+    assert 'modbus_queue_wait_seconds_bucket{connection="10.0.0.5:502",le="0.0005"} 1' in lines
+
+
+def test_label_escaping():
+    metrics = Metrics()
+    metrics.sent('odd "name"\\x', 3, 12)
+    assert 'modbus_requests_total{device="odd \\"name\\"\\\\x",function="read_holding_registers"} 1' in (
+        metrics.to_prometheus().splitlines()
+    )
+
+
+def test_write_json(tmp_path):
+    path = tmp_path / "metrics.json"
+    recorded().write_json(path)
+    assert json.loads(path.read_text())['requests'][0]['requests'] == 4
+
+
+def test_server():
+    server = MetricsServer(recorded(), port=0)
+    server.start()
+    try:
+        assert server.port != 0
+        with urllib.request.urlopen(server.url, timeout=5) as response:
+            assert response.headers['Content-Type'].startswith("text/plain")
+            assert "modbus_requests_total" in response.read().decode()
+        with urllib.request.urlopen(server.url + ".json", timeout=5) as response:
+            assert json.load(response)['requests'][0]['device'] == DEVICE
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(server.url.replace("/metrics", "/other"), timeout=5)
+    finally:
+        server.stop()
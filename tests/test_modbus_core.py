@@ -0,0 +1,278 @@
+import time
+
+import pytest
+from pymodbus.client import ModbusTcpClient
+
+from modbus_core import (
+    AdaptivePacer, ChunkedReader, ChunkedWriter, ModbusIOError, ModbusResponseError, PackedBits, RetryPolicy,
+    apply_mask, bit_masks, iter_chunks, join_values, COILS, DISCRETE_INPUTS, HOLDING_REGISTERS, INPUT_REGISTERS,
+)
+from metrics import Metrics
+from test_server import INITIAL_VALUES
+
+
+class TestPackedBits:
+    def test_from_bits_packs_lsb_first(self):
+        bits = PackedBits.from_bits([1, 0, 0, 0, 0, 0, 0, 0, 1, 1])
+        assert bytes(bits.data) == b"\x01\x03"
+        assert len(bits) == 10
+        assert bits.tolist() == [1, 0, 0, 0, 0, 0, 0, 0, 1, 1]
+
+    def test_padding_bits_are_cleared(self):
+        bits = PackedBits(b"\xff\xff", 10)
+        assert bytes(bits.data) == b"\xff\x03"
+        assert bits == [1] * 10
+
+    def test_indexing(self):
+        bits = PackedBits.from_bits([0, 1, 1])
+        assert bits[1] == 1 and bits[-3] == 0
+        with pytest.raises(IndexError):
+            bits[3]
+
+    @pytest.mark.parametrize("start, stop", [(0, 16), (8, 13), (3, 17), (5, 5)])
+    def test_slices_match_lists(self, start, stop):
+        pattern = [(i * 7) % 3 == 0 for i in range(20)]
+        bits = PackedBits.from_bits(pattern)
+        assert bits[start:stop] == pattern[start:stop]
+
+    @pytest.mark.parametrize("first", [0, 3, 8, 13])
+    def test_extend(self, first):
+        head = [i % 2 for i in range(first)]
+        tail = [1, 1, 0, 1, 0, 0, 1, 1, 1]
+        bits = PackedBits.from_bits(head)
+        bits.extend(PackedBits.from_bits(tail))
+        assert bits == PackedBits.from_bits(head + tail)
+
+
+class TestAdaptivePacer:
+    def test_window_grows_to_the_maximum(self):
+        pacer = AdaptivePacer(max_in_flight=3)
+        for _ in range(5):
+            pacer.on_success(0.01)
+        assert pacer.window == 3
+
+    def test_rtt_is_smoothed(self):
+        pacer = AdaptivePacer()
+        pacer.on_success(0.1)
+        assert (pacer.srtt, pacer.rttvar) == (0.1, 0.05)
+        pacer.on_success(0.02)
+        assert pacer.srtt == pytest.approx(0.09)
+        assert pacer.rttvar == pytest.approx(0.0575)
+
+    def test_busy_halves_the_window_and_delays(self):
+        pacer = AdaptivePacer(max_in_flight=8)
+        for _ in range(8):
+            pacer.on_success(0.02)
+        pacer.on_busy()
+        assert pacer.window == 4
+        assert pacer.delay >= pacer.srtt
+        delay = pacer.delay
+        pacer.on_success(0.02)
+        assert pacer.delay == delay / 2
+
+    def test_delay_is_capped(self):
+        pacer = AdaptivePacer(max_delay=0.05)
+        pacer.on_success(0.04)
+        for _ in range(4):
+            pacer.on_busy()
+        assert pacer.delay == 0.05
+        assert pacer.window == 1
+
+
+class TestRetryPolicy:
+    def test_configured_timeout_until_measured(self):
+        assert RetryPolicy().request_timeout(AdaptivePacer(), 3.0) == 3.0
+
+    def test_timeout_from_rtt(self):
+        policy = RetryPolicy(min_timeout=0.01, rtt_factor=4)
+        pacer = AdaptivePacer()
+        pacer.on_success(0.1)
+        assert policy.request_timeout(pacer, 3.0) == pytest.approx(0.3)
+        assert policy.request_timeout(pacer, 3.0, attempt=2) == pytest.approx(1.2)
+        assert policy.request_timeout(pacer, 1.0, attempt=3) == 1.0
+
+    def test_minimum_timeout(self):
+        pacer = AdaptivePacer()
+        pacer.on_success(0.001)
+        assert RetryPolicy(min_timeout=0.2).request_timeout(pacer, 3.0) == 0.2
+
+    def test_backoff_doubles_with_jitter(self):
+        policy = RetryPolicy(backoff_initial=0.1, backoff_max=0.3)
+        for attempt, base in ((1, 0.1), (2, 0.2), (3, 0.3), (6, 0.3)):
+            for _ in range(20):
+                assert base / 2 <= policy.backoff(attempt) <= base
+
+
+class TestMasks:
+    def test_set_and_clear(self):
+        and_mask, or_mask = bit_masks(set_bits=[0, 4], clear_bits=[15])
+        assert (and_mask, or_mask) == (0x7FEE, 0x0011)
+        assert apply_mask(0x8002, and_mask, or_mask) == 0x0013
+        assert apply_mask(0x0000, and_mask, or_mask) == 0x0011
+
+    def test_no_bits_keep_the_value(self):
+        assert apply_mask(0x1234, *bit_masks()) == 0x1234
+
+    @pytest.mark.parametrize("set_bits, clear_bits", [([16], []), ([], [-1]), ([3], [3])])
+    def test_invalid(self, set_bits, clear_bits):
+        with pytest.raises(ValueError):
+            bit_masks(set_bits, clear_bits)
+
+
+def test_join_values():
+    assert join_values(HOLDING_REGISTERS, [[1, 2], [3]]) == [1, 2, 3]
+    joined = join_values(COILS, [PackedBits.from_bits([1, 0, 1]), PackedBits.from_bits([1])])
+    assert isinstance(joined, PackedBits) and joined == [1, 0, 1, 1]
+
+
+def test_iter_chunks():
+    assert list(iter_chunks(10, 300)) == [(10, 125), (135, 125), (260, 50)]
+    assert list(iter_chunks(0, 0)) == []
+
+
+class TestLoopback:
+    """The pipelined reader against test_server.py."""
+
+    @pytest.fixture
+    def client(self, test_server):
+        client = ModbusTcpClient("127.0.0.1", port=test_server(), timeout=2.0, retries=0)
+        assert client.connect()
+        yield client
+        client.close()
+
+    def test_pipelined_read(self, client):
+        pacer = AdaptivePacer(max_in_flight=4)
+        values = ChunkedReader(client, 1, pacer=pacer).read(0, 1000)
+        assert len(values) == 1000
+        assert list(values[:len(INITIAL_VALUES)]) == INITIAL_VALUES
+        assert pacer.window == 4
+
+    def test_sequential_read(self, client):
+        pacer = AdaptivePacer(max_in_flight=1)
+        values = ChunkedReader(client, 1, chunk_size=7, pacer=pacer).read(0, 20)
+        assert list(values[:len(INITIAL_VALUES)]) == INITIAL_VALUES
+
+    def test_written_values_are_read_back(self, client):
+        image = [(100 + 3 * i) % 65536 for i in range(400)]
+        for offset in range(0, 400, 100):
+            assert not client.write_registers(100 + offset, image[offset:offset + 100], slave=1).isError()
+        assert list(ChunkedReader(client, 1, pacer=AdaptivePacer(max_in_flight=4)).read(100, 400)) == image
+
+    def test_write_then_read_blocks(self, client):
+        pacer = AdaptivePacer(max_in_flight=4)
+        image = [(100 + 3 * i) % 65536 for i in range(400)]
+        assert ChunkedWriter(client, 1, pacer=pacer).write_blocks([(100, image), (900, [7, 8, 9])]) == 5
+        first, second = ChunkedReader(client, 1, pacer=pacer).read_blocks([(100, 400), (899, 5)])
+        assert list(first) == image
+        assert list(second) == [0, 7, 8, 9, 0]
+
+    def test_bits(self, client):
+        client.write_coils(10, [True, False, True], slave=1)
+        coils = ChunkedReader(client, 1, table=COILS).read(0, 1000)
+        assert isinstance(coils, PackedBits)
+        assert coils[8:14] == [0, 0, 1, 0, 1, 0]
+        assert len(ChunkedReader(client, 1, table=DISCRETE_INPUTS).read(0, 1000)) == 1000
+        sequential = ChunkedReader(client, 1, chunk_size=6, pacer=AdaptivePacer(max_in_flight=1), table=COILS)
+        assert sequential.read(7, 13) == coils[7:20]
+
+    def test_input_registers_and_blocks(self, client):
+        first, second = ChunkedReader(client, 1, table=INPUT_REGISTERS).read_blocks([(0, 300), (998, 2)])
+        assert (len(first), len(second)) == (300, 2)
+
+    def test_units(self, test_server):
+        client = ModbusTcpClient("127.0.0.1", port=test_server("--size", "65536", "--units", "2"), timeout=0.5,
+                                 retries=0)
+        assert client.connect()
+        try:
+            assert len(ChunkedReader(client, 2).read(65000, 536)) == 536
+            # Units that are not served are not answered
+            with pytest.raises(ModbusIOError):
+                ChunkedReader(client, 1, policy=RetryPolicy(retries=0)).read(0, 1)
+        finally:
+            client.close()
+
+    def test_exception_response(self, client):
+        with pytest.raises(ModbusResponseError) as raised:
+            ChunkedReader(client, 1).read(990, 20)
+        assert raised.value.exception_code == 2
+
+
+class TestFaults:
+    """Retries against test_server.py injecting seeded drops and busy exceptions."""
+
+    def connect(self, port, timeout=5.0):
+        client = ModbusTcpClient("127.0.0.1", port=port, timeout=timeout, retries=0)
+        assert client.connect()
+        self.clients.append(client)
+        return client
+
+    @pytest.fixture(autouse=True)
+    def clients(self):
+        self.clients = []
+        yield
+        for client in self.clients:
+            client.close()
+
+    @staticmethod
+    def warm_pacer(max_in_flight):
+        """A pacer that has measured a 10 ms round trip, so timeouts follow the estimate from the start."""
+        pacer = AdaptivePacer(max_in_flight=max_in_flight)
+        pacer.on_success(0.01)
+        return pacer
+
+    @staticmethod
+    def stats(metrics):
+        (entry,) = metrics.snapshot()['requests']
+        return entry
+
+    def test_only_lost_chunks_are_read_again(self, test_server):
+        # With seed 2 the third and fourth of the eight responses are dropped
+        client = self.connect(test_server("--drop-rate", "0.25", "--seed", "2"))
+        metrics = Metrics()
+        connects = []
+        connect = client.connect
+        client.connect = lambda: connects.append(None) or connect()
+        reader = ChunkedReader(client, 1, pacer=self.warm_pacer(8), metrics=metrics,
+                               policy=RetryPolicy(min_timeout=0.1, backoff_initial=0.01))
+        started = time.perf_counter()
+        values = reader.read(0, 1000)
+        elapsed = time.perf_counter() - started
+        assert list(values[:len(INITIAL_VALUES)]) == INITIAL_VALUES and len(values) == 1000
+        stats = self.stats(metrics)
+        assert stats['responses'] == 8
+        assert stats['timeouts'] == 2
+        assert stats['requests'] == stats['responses'] + stats['timeouts']
+        # The timed-out connection is dropped and reopened before the retry
+        assert connects and client.is_socket_open()
+        # The retry waited for the estimated round trip, not the configured 5 s
+        assert elapsed < 2
+
+    def test_sequential_reads_retry_lost_chunks(self, test_server):
+        client = self.connect(test_server("--drop-rate", "0.25", "--seed", "2"))
+        metrics = Metrics()
+        reader = ChunkedReader(client, 1, chunk_size=100, pacer=self.warm_pacer(1), metrics=metrics,
+                               policy=RetryPolicy(min_timeout=0.1, backoff_initial=0.01))
+        assert list(reader.read(0, 500)[:len(INITIAL_VALUES)]) == INITIAL_VALUES
+        stats = self.stats(metrics)
+        assert (stats['responses'], stats['timeouts']) == (5, 2)
+        assert client.comm_params.timeout_connect == 5.0
+
+    def test_timeout_gives_up_after_the_retries(self, test_server):
+        client = self.connect(test_server("--drop-rate", "1"))
+        reader = ChunkedReader(client, 1, pacer=self.warm_pacer(4), metrics=Metrics(),
+                               policy=RetryPolicy(retries=1, min_timeout=0.05, backoff_initial=0.01))
+        started = time.perf_counter()
+        with pytest.raises(ModbusIOError):
+            reader.read(0, 100)
+        assert time.perf_counter() - started < 1
+
+    @pytest.mark.parametrize("max_in_flight", [1, 4])
+    def test_busy_responses_are_retried(self, test_server, max_in_flight):
+        client = self.connect(test_server("--exception-rate", "0.3", "--exception-code", "6", "--seed", "1"))
+        metrics = Metrics()
+        pacer = AdaptivePacer(max_in_flight=max_in_flight, max_delay=0.01)
+        values = ChunkedReader(client, 1, chunk_size=50, pacer=pacer, metrics=metrics).read(0, 1000)
+        assert list(values[:len(INITIAL_VALUES)]) == INITIAL_VALUES
+        stats = self.stats(metrics)
+        assert stats['retries'] > 0 and stats['errors'] == 0
+        assert stats['responses'] == 20 + stats['retries']
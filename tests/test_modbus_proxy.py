@@ -0,0 +1,118 @@
+import pytest
+
+from async_engine import ModbusEngine
+from modbus_core import COILS, HOLDING_REGISTERS, INPUT_REGISTERS
+from modbus_proxy import ModbusProxy, RegisterCache, TtlRule, parse_ttl_rule
+from test_server import INITIAL_VALUES
+from transports import TcpTransport
+
+
+class TestTtlRules:
+    def test_parse(self):
+        assert parse_ttl_rule("holding:0-99=0.1") == TtlRule('holding', 0, 99, 0.1)
+        assert parse_ttl_rule("1000=5") == TtlRule(None, 1000, 1000, 5.0)
+        assert str(parse_ttl_rule("Coils:0x10-0x1f=2")) == "coils:16-31=2"
+
+    @pytest.mark.parametrize("text", ["0-99", "holding:9-1=1", "0-99=-1", "0-70000=1", "tags:0=1", "a-b=1"])
+    def test_invalid(self, text):
+        with pytest.raises(ValueError):
+            parse_ttl_rule(text)
+
+    def test_covering_rule_replaces_the_default(self):
+        cache = RegisterCache(0.5, [parse_ttl_rule("1000-1999=5")])
+        assert cache.ttl(HOLDING_REGISTERS, 1000, 100) == 5
+        assert cache.ttl(HOLDING_REGISTERS, 0, 100) == 0.5
+
+    def test_partial_overlap_takes_the_shortest(self):
+        cache = RegisterCache(0.5, [parse_ttl_rule("1000-1999=5"), parse_ttl_rule("1050-1059=0.1")])
+        assert cache.ttl(HOLDING_REGISTERS, 990, 20) == 0.5
+        assert cache.ttl(HOLDING_REGISTERS, 1040, 20) == 0.1
+
+    def test_rules_of_other_tables_do_not_apply(self):
+        cache = RegisterCache(0.5, [parse_ttl_rule("input:0-99=0")])
+        assert cache.ttl(INPUT_REGISTERS, 0, 10) == 0
+        assert cache.ttl(HOLDING_REGISTERS, 0, 10) == 0.5
+
+
+class TestRegisterCache:
+    def test_expiry(self):
+        cache = RegisterCache(1.0)
+        cache.put(1, HOLDING_REGISTERS, 10, [1, 2, 3], now=100.0)
+        assert list(cache.get(1, HOLDING_REGISTERS, 10, 3, now=100.5)) == [1, 2, 3]
+        assert cache.get(1, HOLDING_REGISTERS, 10, 3, now=101.5) is None
+        assert cache.get(2, HOLDING_REGISTERS, 10, 3, now=100.5) is None
+
+    def test_every_entry_must_be_fresh(self):
+        cache = RegisterCache(1.0)
+        cache.put(1, HOLDING_REGISTERS, 10, [1, 2], now=100.0)
+        assert cache.get(1, HOLDING_REGISTERS, 10, 3, now=100.5) is None
+
+    def test_zero_ttl_is_never_cached(self):
+        cache = RegisterCache(0.5, [parse_ttl_rule("holding:0-9=0")])
+        cache.put(1, HOLDING_REGISTERS, 0, [1], now=100.0)
+        assert cache.get(1, HOLDING_REGISTERS, 0, 1, now=100.0) is None
+
+    def test_invalidate(self):
+        cache = RegisterCache(1.0)
+        cache.put(1, HOLDING_REGISTERS, 0, [1, 2, 3], now=100.0)
+        cache.put(1, COILS, 0, [1, 0], now=100.0)
+        cache.invalidate(1, HOLDING_REGISTERS, 1, 1)
+        assert list(cache.get(1, HOLDING_REGISTERS, 0, 1, now=100.0)) == [1]
+        assert cache.get(1, HOLDING_REGISTERS, 1, 1, now=100.0) is None
+        cache.invalidate(1)
+        assert cache.get(1, COILS, 0, 2, now=100.0) is None
+
+
+class TestLoopback:
+    """The proxy between a pymodbus client and test_server.py."""
+
+    @pytest.fixture
+    def proxy(self, test_server):
+        port = test_server()
+        engine = ModbusEngine("127.0.0.1", port, timeout=2)
+        engine.start()
+        try:
+            assert engine.call(engine.connect)
+            proxy = ModbusProxy(engine, "127.0.0.1", 0, RegisterCache(60))
+            engine.call(proxy.start)
+            yield proxy
+            engine.call(proxy.stop)
+        finally:
+            engine.stop()
+
+    @pytest.fixture
+    def client(self, proxy):
+        host, _, port = proxy.address.rpartition(":")
+        client = TcpTransport(host, int(port)).open(2.0)
+        yield client
+        client.close()
+
+    def test_reads_are_cached(self, proxy, client):
+        first = client.read_holding_registers(0, 10, slave=1)
+        second = client.read_holding_registers(0, 10, slave=1)
+        assert first.registers == second.registers == INITIAL_VALUES
+        assert (proxy.stats.misses, proxy.stats.hits, proxy.stats.upstream_reads) == (1, 1, 1)
+
+    def test_writes_pass_through_and_invalidate(self, proxy, client):
+        assert client.read_holding_registers(100, 3, slave=1).registers == [0, 0, 0]
+        assert not client.write_registers(101, [7, 8], slave=1).isError()
+        assert client.read_holding_registers(100, 3, slave=1).registers == [0, 7, 8]
+        assert proxy.stats.forwarded == 1
+        assert proxy.stats.misses == 2
+
+    def test_one_decoder_for_all_forwarded_requests(self, proxy, client):
+        client.write_registers(101, [7, 8], slave=1)
+        decoder = proxy._decoder
+        client.write_register(103, 9, slave=1)
+        client.write_coils(3, [True], slave=1)
+        assert proxy.stats.forwarded == 3
+        assert decoder is not None and proxy._decoder is decoder
+
+    def test_coils(self, client):
+        client.write_coils(3, [True, True], slave=1)
+        assert client.read_coils(0, 8, slave=1).bits == [False, False, False, True, True, False, False, False]
+
+    def test_exceptions_are_passed_back(self, proxy, client):
+        response = client.read_holding_registers(995, 10, slave=1)
+        assert response.isError() and response.exception_code == 2
+        assert proxy.stats.exceptions == 1
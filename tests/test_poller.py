@@ -0,0 +1,117 @@
+import threading
+import time
+
+from poller import GroupPoller, Poller, ScheduledGroup
+
+
+def run(read, period, cycles):
+    """Run a Poller until read has been called cycles times; returns the stopped poller."""
+    done = threading.Event()
+    calls = []
+
+    def counted():
+        calls.append(None)
+        if len(calls) >= cycles:
+            done.set()
+        return read(len(calls))
+
+    poller = Poller(counted, period)
+    poller.start()
+    assert done.wait(5)
+    poller.stop(5)
+    return poller
+
+
+class TestPoller:
+    def test_cycles_and_errors(self):
+        def read(number):
+            if number == 2:
+                raise OSError("lost")
+            return [number]
+
+        poller = run(read, 0.01, 4)
+        assert poller.cycles >= 4
+        assert poller.errors == 1
+
+    def test_latest_is_taken_once(self):
+        poller = run(lambda number: [number], 0.01, 3)
+        latest = poller.take_latest()
+        assert latest.sequence == poller.cycles and latest.values == [latest.sequence]
+        assert poller.take_latest() is None
+
+    def test_error_result(self):
+        poller = run(lambda number: 1 / 0, 0.01, 1)
+        result = poller.take_latest()
+        assert result.values is None and isinstance(result.error, ZeroDivisionError)
+
+    def test_overruns_skip_cycles(self):
+        poller = run(lambda number: time.sleep(0.035), 0.01, 3)
+        assert poller.skipped >= 4
+
+    def test_slight_overrun_runs_the_next_cycle_at_once(self):
+        starts = []
+        poller = run(lambda number: starts.append(time.monotonic()) or time.sleep(0.055), 0.05, 3)
+        assert poller.skipped == 0
+        assert max(later - earlier for earlier, later in zip(starts, starts[1:])) < 0.075
+
+    def test_stop(self):
+        poller = Poller(lambda: None, 0.01)
+        poller.start()
+        poller.stop(5)
+        assert not poller.running
+
+
+class TestGroupPoller:
+    def make(self, *groups, request_time=0.0):
+        poller = GroupPoller(groups, lambda keys: [key for key in keys])
+        poller.request_time = request_time
+        return poller
+
+    def test_batch_order(self):
+        slow = ScheduledGroup('slow', 1.0, priority=0)
+        urgent = ScheduledGroup('urgent', 0.5, priority=0)
+        low = ScheduledGroup('low', 0.1, priority=5)
+        poller = self.make(low, slow, urgent)
+        assert [group.key for group in poller._next_batch(0.0)] == ['urgent', 'slow', 'low']
+
+    def test_not_due(self):
+        group = ScheduledGroup('a', 1.0)
+        group.next_due = 5.0
+        assert self.make(group)._next_batch(1.0) == []
+
+    def test_batch_fits_the_most_urgent_period(self):
+        groups = [ScheduledGroup(key, 0.1, cost=2) for key in 'abc']
+        poller = self.make(*groups, request_time=0.02)
+        assert [group.key for group in poller._next_batch(0.0)] == ['a', 'b']
+
+    def test_starving_group_goes_first(self):
+        important = ScheduledGroup('important', 0.1, priority=0)
+        starving = ScheduledGroup('starving', 0.1, priority=9)
+        starving.next_due = -0.5
+        poller = self.make(important, starving, request_time=1.0)
+        assert [group.key for group in poller._next_batch(0.0)] == ['starving']
+
+    def test_failing_group_is_read_on_its_own(self):
+        def read(keys):
+            if 'bad' in keys:
+                raise OSError("rejected")
+            return [key.upper() for key in keys]
+
+        poller = GroupPoller([ScheduledGroup('good', 0.1), ScheduledGroup('bad', 0.1)], read)
+        (good, good_error), (bad, bad_error) = poller._read(poller.groups)
+        assert (good, good_error) == ('GOOD', None)
+        assert bad is None and isinstance(bad_error, OSError)
+
+    def test_rates(self):
+        results = {'fast': [], 'slow': []}
+        poller = GroupPoller(
+            [ScheduledGroup('fast', 0.02), ScheduledGroup('slow', 0.1)],
+            lambda keys: [[key] for key in keys],
+            on_result=lambda key, result: results[key].append(result), max_cycles=15,
+        )
+        poller.start()
+        assert poller.wait(5)
+        assert len(results['fast']) == 15
+        assert 2 <= len(results['slow']) <= 5
+        assert [result.values for result in results['slow']] == [['slow']] * len(results['slow'])
+        assert poller.stats()['fast']['cycles'] == 15
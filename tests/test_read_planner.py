@@ -0,0 +1,53 @@
+import pytest
+
+from read_planner import DEFAULT_MAX_GAP, max_gap_for_line, max_gap_for_link, parse_address_list, plan_reads
+from transports import SerialLine
+
+
+def test_parse_address_list():
+    assert parse_address_list("110, 3 17-20,3") == [3, 17, 18, 19, 20, 110]
+    assert parse_address_list("0x10") == [16]
+    for text in ("5-2", "65536", "a"):
+        with pytest.raises(ValueError):
+            parse_address_list(text)
+
+
+class TestPlanReads:
+    def test_bridges_small_gaps(self):
+        plan = plan_reads([1, 3, 20, 30, 45], max_gap=10)
+        assert plan.blocks == [(1, 3), (20, 11), (45, 1)]
+        assert plan.register_count == 15
+
+    def test_never_exceeds_the_limit(self):
+        plan = plan_reads(range(0, 300, 2), max_gap=10, max_count=125)
+        assert all(count <= 125 for _, count in plan.blocks)
+        assert [start for start, _ in plan.blocks] == [0, 126, 252]
+
+    def test_unreadable_addresses(self):
+        plan = plan_reads([1, 5, 9], max_gap=10, unreadable=[5, 7])
+        assert plan.blocks == [(1, 1), (9, 1)]
+        assert plan.skipped == [5]
+
+    def test_extract(self):
+        plan = plan_reads([2, 4, 30], max_gap=5)
+        assert plan.blocks == [(2, 3), (30, 1)]
+        assert plan.extract([[20, 30, 40], [300]]) == [20, 40, 300]
+
+    def test_empty(self):
+        plan = plan_reads([])
+        assert plan.blocks == [] and plan.register_count == 0
+
+
+class TestMaxGap:
+    def test_for_link(self):
+        assert max_gap_for_link(0.01, 100_000) == 500
+        assert max_gap_for_link(0.01, 0) == DEFAULT_MAX_GAP
+
+    def test_tcp_keeps_the_default(self):
+        assert max_gap_for_line(None, 0.5) == DEFAULT_MAX_GAP
+
+    def test_grows_with_the_round_trip(self):
+        line = SerialLine.parse("9600")
+        assert max_gap_for_line(line) == DEFAULT_MAX_GAP
+        assert max_gap_for_line(line, 0.08) > max_gap_for_line(line, 0.05) > DEFAULT_MAX_GAP
+        assert max_gap_for_line(SerialLine.parse("115200")) > DEFAULT_MAX_GAP
@@ -0,0 +1,70 @@
+from register_pages import PageCache, PendingWrites
+
+
+def filled(cache, *starts):
+    for start in starts:
+        cache.put(start, list(range(start, start + cache.page_size)))
+    return cache
+
+
+class TestPageCache:
+    def test_least_recently_used_page_is_evicted(self):
+        cache = filled(PageCache(page_size=10, capacity=3), 0, 10, 20)
+        assert cache.get(0) is not None
+        cache.put(30, [0] * 10)
+        assert list(cache.pages) == [20, 0, 30]
+        assert (cache.hits, cache.misses) == (1, 0)
+        assert cache.get(10) is None and cache.misses == 1
+
+    def test_value_does_not_touch_the_order(self):
+        cache = filled(PageCache(page_size=10, capacity=2), 0, 10)
+        assert cache.value(5) == (5, None)
+        cache.put(20, [0] * 10)
+        assert cache.value(5) == (None, None)
+
+    def test_visible_pages_then_read_ahead(self):
+        cache = PageCache(page_size=10, read_ahead=2)
+        assert cache.wanted(25, 44) == [20, 30, 40, 50, 60, 10]
+        assert cache.wanted(25, 44, direction=-1) == [20, 30, 40, 10, 0, 50]
+
+    def test_only_missing_pages_are_wanted(self):
+        cache = filled(PageCache(page_size=10, read_ahead=2), 20, 40, 50)
+        assert cache.wanted(25, 44) == [30, 60, 10]
+
+    def test_read_ahead_stays_in_the_table(self):
+        cache = PageCache(page_size=10, size=100, read_ahead=2)
+        assert cache.wanted(85, 99) == [80, 90, 70]
+        assert cache.wanted(0, 5, direction=-1) == [0, 10]
+        assert cache.page_block(90) == (90, 10)
+        assert PageCache(page_size=30, size=100).page_block(90) == (90, 10)
+
+    def test_errors_stay_cached_until_refresh(self):
+        cache = PageCache(page_size=10, read_ahead=0)
+        cache.put(0, error="exception 2")
+        assert cache.value(3) == (None, "exception 2")
+        assert cache.wanted(0, 9, max_age=0) == []
+        cache.clear()
+        assert cache.wanted(0, 9) == [0]
+
+    def test_stale_pages_are_read_again(self):
+        cache = filled(PageCache(page_size=10, read_ahead=0), 0, 10)
+        cache.pages[0].read_at -= 5
+        assert cache.wanted(0, 19) == []
+        assert cache.wanted(0, 19, max_age=1) == [0]
+
+    def test_writes_go_through_to_cached_pages(self):
+        cache = filled(PageCache(page_size=10), 0)
+        cache.update(8, [100, 101, 102])
+        assert cache.pages[0].values[8:] == [100, 101]
+        assert cache.value(10) == (None, None)
+
+
+def test_pending_writes_merge_into_blocks():
+    pending = PendingWrites()
+    for address, value in [(12, 3), (10, 1), (11, 2), (20, 9), (65535, 7)]:
+        pending.set(address, value)
+    pending.set(11, 5)
+    assert pending.blocks() == [(10, [1, 5, 3]), (20, [9]), (65535, [7])]
+    assert len(pending) == 5 and 20 in pending and pending.get(21) is None
+    pending.clear()
+    assert pending.blocks() == []
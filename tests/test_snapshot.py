@@ -0,0 +1,110 @@
+import pytest
+
+from modbus_core import ModbusResponseError, PackedBits, COILS, HOLDING_REGISTERS
+from snapshot import (
+    Snapshot, capture_snapshot, count_differences, coverage_gaps, diff_snapshots, parse_range, restore_segments,
+)
+
+
+def fake_device(size, registers=None, refused=()):
+    """read_blocks for capture_snapshot over a device of size entries per table that refuses some addresses."""
+    registers = registers if registers is not None else {}
+
+    def read_blocks(blocks, table):
+        results = []
+        for address, count in blocks:
+            if address + count > size or any(address <= item < address + count for item in refused):
+                raise ModbusResponseError(table.function_code, 2, address)
+            if table.bits:
+                results.append(PackedBits.from_bits(i % 3 == 0 for i in range(address, address + count)))
+            else:
+                results.append([registers.get(i, i % 7) for i in range(address, address + count)])
+        return results
+
+    return read_blocks
+
+
+def make(ranges, size=1000, resolution=16, **device):
+    return capture_snapshot(fake_device(size, **device), [parse_range(text) for text in ranges], resolution)
+
+
+class TestCapture:
+    def test_rejected_addresses_are_skipped(self):
+        snapshot = make(["holding:0-1999"], size=1000, refused=[500])
+        # The chunk 500-624 is halved until the rejected block is at most 16 entries
+        assert snapshot.tables['holding'].segments() == [(0, 500), (515, 485)]
+        assert snapshot.skipped == [
+            ('holding', 500, 514, "exception 2 (Illegal data address)"),
+            ('holding', 1000, 1999, "exception 2 (Illegal data address)"),
+        ]
+        assert len(snapshot) == 985
+
+    def test_bits(self):
+        snapshot = make(["coils:0-99"])
+        assert snapshot.tables['coils'].get(0, 4) == [1, 0, 0, 1]
+
+    def test_parse_range(self):
+        assert parse_range("coils:0-1999") == (COILS, 0, 2000)
+        assert parse_range("100") == (HOLDING_REGISTERS, 100, 1)
+        for text in ("holding:5-1", "holding:0-65536", "x:1", "1-a"):
+            with pytest.raises(ValueError):
+                parse_range(text)
+
+
+def test_save_and_load(tmp_path):
+    snapshot = make(["holding:0-1999", "coils:3-70", "input:10-19"], refused=[20], registers={0: 65535})
+    snapshot.metadata['device'] = "test"
+    path = tmp_path / "device.mbsnap"
+    assert snapshot.save(path) == path.stat().st_size
+    loaded = Snapshot.load(path)
+    assert loaded.metadata['device'] == "test"
+    assert loaded.ranges() == snapshot.ranges()
+    assert loaded.skipped == snapshot.skipped
+    for key in ('holding', 'coils', 'input'):
+        assert loaded.tables[key].values == snapshot.tables[key].values
+        assert loaded.tables[key].known == snapshot.tables[key].known
+    assert diff_snapshots(snapshot, loaded) == []
+
+
+def test_load_rejects_other_files(tmp_path):
+    path = tmp_path / "other.mbsnap"
+    path.write_bytes(b"MBLG" + bytes(20))
+    with pytest.raises(ValueError):
+        Snapshot.load(path)
+
+
+class TestDiff:
+    def test_value_differences(self):
+        reference = make(["holding:0-999"])
+        other = make(["holding:0-999"], registers={10: 100, 11: 101, 500: 5})
+        differences = diff_snapshots(reference, other)
+        assert [(d.table.key, d.first, d.last, d.expected, d.observed) for d in differences] == [
+            ('holding', 10, 11, [3, 4], [100, 101]),
+            ('holding', 500, 500, [3], [5]),
+        ]
+        assert count_differences(differences) == 3
+        assert restore_segments(differences) == [(10, [3, 4]), (500, [3])]
+
+    def test_refused_addresses_differ(self):
+        reference = make(["holding:0-999"])
+        other = make(["holding:0-999"], refused=[40])
+        (difference,) = diff_snapshots(reference, other)
+        assert (difference.first, difference.last) == (31, 45)
+        assert difference.observed == [None] * 15
+
+    def test_different_ranges_are_coverage_gaps(self):
+        full = make(["holding:0-999", "coils:0-999"])
+        part = make(["holding:0-499", "input:0-9"], registers={7: 70})
+        (difference,) = diff_snapshots(full, part)
+        assert (difference.first, difference.expected, difference.observed) == (7, [0], [70])
+        assert [(gap.table.key, gap.first, gap.last, gap.only_in) for gap in coverage_gaps(full, part)] == [
+            ('holding', 500, 999, 'reference'),
+            ('input', 0, 9, 'other'),
+            ('coils', 0, 999, 'reference'),
+        ]
+        assert [gap.only_in for gap in coverage_gaps(part, full)] == ['other', 'reference', 'other']
+
+    def test_same_coverage_has_no_gaps(self):
+        snapshot = make(["holding:0-1999"], refused=[100])
+        assert coverage_gaps(snapshot, make(["holding:0-1999"])) == []
+        assert diff_snapshots(snapshot, make(["input:0-99"])) == []
@@ -0,0 +1,98 @@
+import struct
+
+import pytest
+
+from tag_decoder import Tag, TagDecoder, parse_tags_csv, parse_tags_json, registers_to_bytes
+
+
+def registers(data):
+    """Big-endian bytes as register values."""
+    return list(struct.unpack(f">{len(data) // 2}H", data))
+
+
+@pytest.mark.parametrize("byte_order, word_order, image", [
+    ('big', 'big', bytes.fromhex("3fc00000")),          # ABCD
+    ('big', 'little', bytes.fromhex("00003fc0")),       # CDAB
+    ('little', 'big', bytes.fromhex("c03f0000")),       # BADC
+    ('little', 'little', bytes.fromhex("0000c03f")),    # DCBA
+])
+def test_float32_orders(byte_order, word_order, image):
+    decoder = TagDecoder([Tag('t', 10, 'float32', byte_order, word_order)])
+    assert decoder.decode(registers(image), 10) == [1.5]
+
+
+@pytest.mark.parametrize("word_order, image", [
+    ('big', struct.pack(">q", -2)),
+    ('little', b"".join(reversed([struct.pack(">q", -2)[i:i + 2] for i in range(0, 8, 2)]))),
+])
+def test_int64_word_order(word_order, image):
+    decoder = TagDecoder([Tag('t', 0, 'int64', word_order=word_order)])
+    assert decoder.decode(registers(image), 0) == [-2]
+
+
+def test_mixed_tags_scaling_and_strings():
+    tags = [
+        Tag('raw', 100),
+        Tag('signed', 101, 'int16'),
+        Tag('temperature', 102, 'int16', scale=0.1, offset=-40),
+        Tag('serial', 103, 'uint32'),
+        Tag('name', 105, 'string', length=3),
+    ]
+    decoder = TagDecoder(tags)
+    image = struct.pack(">HhhI", 7, -3, 650, 123456) + b"PLC\0\0\0"
+    values = decoder.decode([0] + registers(image), 99)
+    assert values[:2] == [7, -3]
+    assert values[2] == pytest.approx(25.0)
+    assert values[3:] == [123456, "PLC"]
+    assert decoder.as_dict(values)['serial'] == 123456
+
+
+def test_decode_blocks_from_a_read_plan():
+    decoder = TagDecoder([Tag('a', 0), Tag('b', 40), Tag('c', 41, 'uint32')])
+    plan = decoder.read_plan(max_gap=10)
+    assert plan.blocks == [(0, 1), (40, 3)]
+    assert decoder.decode_blocks(plan.blocks, [[5], [6, 0, 9]]) == [5, 6, 9]
+
+
+def test_decode_needs_every_tag():
+    decoder = TagDecoder([Tag('a', 5), Tag('b', 8)])
+    with pytest.raises(ValueError):
+        decoder.decode([0, 0, 0], 5)
+
+
+def test_registers_to_bytes():
+    assert registers_to_bytes([0x1234, 0xABCD]) == b"\x12\x34\xab\xcd"
+
+
+class TestTagFiles:
+    def test_csv(self):
+        tags = parse_tags_csv(
+            "name,address,type,word_order,scale\n"
+            "speed,0x10,float32,little,\n"
+            "# comment,1,,,\n"
+            "\n"
+            "level,20,uint16,,0.5\n"
+        )
+        assert [(tag.name, tag.address, tag.data_type) for tag in tags] == [
+            ('speed', 16, 'float32'), ('level', 20, 'uint16')
+        ]
+        assert tags[0].word_order == 'little' and tags[1].scale == 0.5
+
+    def test_json(self):
+        (tag,) = parse_tags_json('{"tags": [{"name": "x", "address": 3, "table": "input"}]}')
+        assert tag.table.key == 'input'
+
+    @pytest.mark.parametrize("text", [
+        "name,address,colour\nx,1,red\n",
+        "name,address,type\nx,1,int24\n",
+        "name,address,table\nx,1,coils\n",
+        "name,address,type\nx,65535,uint32\n",
+        "name\nx\n",
+    ])
+    def test_invalid_csv(self, text):
+        with pytest.raises(ValueError):
+            parse_tags_csv(text)
+
+    def test_one_table_per_decoder(self):
+        with pytest.raises(ValueError):
+            TagDecoder([Tag('a', 0), Tag('b', 0, table='input')])
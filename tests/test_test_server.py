@@ -0,0 +1,28 @@
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+from test_server import parse_numbers
+
+
+def test_parse_numbers():
+    assert parse_numbers("5020-5023", 1, 65535, "Port") == [5020, 5021, 5022, 5023]
+    assert parse_numbers("3, 1 2,2", 0, 255, "Unit ID") == [1, 2, 3]
+
+
+@pytest.mark.parametrize("text", ["0", "1-70000", "9-1", "a"])
+def test_invalid_numbers(text):
+    with pytest.raises(ValueError):
+        parse_numbers(text, 1, 65535, "Port")
+
+
+def test_standalone():
+    """The server only needs pymodbus and rtu_framing, not the tool's own modules."""
+    code = "import sys, test_server; print(' '.join(sorted(sys.modules)))"
+    modules = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True,
+                             check=True).stdout.split()
+    assert 'rtu_framing' in modules
+    for name in ('modbus_core', 'metrics', 'transports', 'connection_pool', 'read_planner'):
+        assert name not in modules
@@ -0,0 +1,132 @@
+import time
+
+import pytest
+
+from modbus_core import ChunkedReader
+from test_server import INITIAL_VALUES
+from rtu_framing import SerialLine, check_frame, crc16, request_length, response_length, rtu_frame
+from transports import RtuOverTcpTransport, SerialTransport
+
+
+class TestFraming:
+    def test_crc(self):
+        assert crc16(b"123456789") == 0x4B37
+        assert crc16(b"") == 0xFFFF
+
+    @pytest.mark.parametrize("unit, pdu, frame", [
+        (0x11, "03006b0003", "1103006b00037687"),
+        (1, "030000000a", "01030000000ac5cd"),
+    ])
+    def test_frame(self, unit, pdu, frame):
+        assert rtu_frame(unit, bytes.fromhex(pdu)) == bytes.fromhex(frame)
+        assert check_frame(bytes.fromhex(frame))
+
+    def test_corrupt_frames(self):
+        frame = bytearray(rtu_frame(1, bytes.fromhex("030000000a")))
+        frame[3] ^= 0x01
+        assert not check_frame(frame)
+        assert not check_frame(b"\x01\x03\xff")
+
+    @pytest.mark.parametrize("function_code", [1, 2, 3, 4, 5, 6])
+    def test_fixed_request_length(self, function_code):
+        assert request_length(bytes((1, function_code))) == 8
+
+    def test_request_length_from_byte_count(self):
+        for function_code in (15, 16):
+            head = bytes((1, function_code, 0, 0, 0, 4, 8))
+            assert request_length(head) == 17
+            assert request_length(head[:6]) is None
+        assert request_length(bytes((1, 22))) == 10
+        head = bytes((1, 23, 0, 0, 0, 2, 0, 10, 0, 3, 6))
+        assert request_length(head) == 19
+        assert request_length(head[:10]) is None
+        assert request_length(b"\x01") is None
+
+    @pytest.mark.parametrize("pdu, length", [
+        ("010000000a", 7),
+        ("0200000010", 7),
+        ("0300000064", 205),
+        ("040000007d", 255),
+        ("050000ff00", 8),
+        ("0600000007", 8),
+        ("0f0000000a0203ff", 8),
+        ("10000000010200ff", 8),
+        ("160000ff000001", 10),
+        ("1700000003000a0001020007", 11),
+    ])
+    def test_response_length(self, pdu, length):
+        assert response_length(bytes.fromhex(pdu)) == length
+
+    def test_unknown_response_length(self):
+        assert response_length(bytes((43, 14, 1, 0))) is None
+
+
+class TestSerialLine:
+    def test_timing(self):
+        line = SerialLine.parse("9600 8E1")
+        assert line.bits_per_char == 11
+        assert line.silent_interval == pytest.approx(3.5 * 11 / 9600)
+        assert SerialLine.parse("115200,8,N,1").silent_interval == 0.00175
+
+    @pytest.mark.parametrize("text", ["", "fast", "9600 8X1", "9600 9N1", "0"])
+    def test_invalid(self, text):
+        with pytest.raises(ValueError):
+            SerialLine.parse(text)
+
+
+def check_read_and_write(client):
+    assert client.read_holding_registers(0, len(INITIAL_VALUES), slave=1).registers == INITIAL_VALUES
+    assert not client.write_registers(200, [7, 8, 9], slave=1).isError()
+    assert client.read_holding_registers(200, 3, slave=1).registers == [7, 8, 9]
+    assert list(ChunkedReader(client, 1).read(0, 1000)[200:203]) == [7, 8, 9]
+    response = client.read_holding_registers(995, 10, slave=1)
+    assert response.isError() and response.exception_code == 2
+
+
+class TestLoopback:
+    """RtuClient against the RTU simulators of test_server.py."""
+
+    def test_rtu_over_tcp(self, test_server):
+        client = RtuOverTcpTransport("127.0.0.1", test_server("--rtu")).open(2.0)
+        try:
+            check_read_and_write(client)
+        finally:
+            client.close()
+
+    @pytest.fixture
+    def serial_port(self, test_server, tmp_path):
+        pytest.importorskip("termios")
+        link = tmp_path / "modbus-pty"
+        test_server("--serial-pty", str(link), "--units", "1", "--line", "9600")
+        deadline = time.monotonic() + 5
+        while not link.exists():
+            assert time.monotonic() < deadline, "the serial simulator did not create its pty"
+            time.sleep(0.02)
+        return str(link)
+
+    def test_serial(self, serial_port):
+        line = SerialLine(9600)
+        client = SerialTransport(serial_port, line).open(2.0)
+        try:
+            check_read_and_write(client)
+            # Units that are not on the line stay silent
+            with pytest.raises(TimeoutError):
+                client.exchange(2, bytes.fromhex("0300000001"), timeout=0.2)
+            assert client.read_holding_registers(0, 1, slave=1).registers == INITIAL_VALUES[:1]
+        finally:
+            client.close()
+
+    def test_silent_interval_between_frames(self, serial_port):
+        line = SerialLine(9600)
+        client = SerialTransport(serial_port, line).open(2.0)
+        sent = []
+        write = client.stream.write
+        client.stream.write = lambda data: (sent.append(time.perf_counter()), write(data))
+        try:
+            for _ in range(5):
+                client.read_holding_registers(0, 1, slave=1)
+                finished = client._last_frame
+                client.read_holding_registers(0, 1, slave=1)
+                assert sent[-1] - finished >= line.silent_interval
+        finally:
+            client.close()
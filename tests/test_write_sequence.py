@@ -0,0 +1,114 @@
+import pytest
+
+from async_engine import ModbusEngine
+from metrics import Metrics
+from transports import TcpTransport
+from write_sequence import parse_sequence, parse_step, run_sequence, summarize
+
+
+class TestParse:
+    def test_steps(self):
+        steps = parse_sequence("write 10 1 0x2  # comment\nrw 20 7; mask 5 0xFF00 0x0001\n\ndelay 0x10")
+        assert [step.kind for step in steps] == ['write', 'rw', 'mask', 'delay']
+        assert (steps[0].address, steps[0].values) == (10, [1, 2])
+        assert (steps[1].read_address, steps[1].read_count, steps[1].verifies) == (20, 1, True)
+        assert (steps[2].and_mask, steps[2].or_mask) == (0xFF00, 0x0001)
+        assert steps[3].delay == 0.016
+
+    def test_rw_with_its_own_read_range(self):
+        step = parse_step("rw 10 1 2 READ 100 3")
+        assert (step.values, step.read_address, step.read_count) == ([1, 2], 100, 3)
+        assert not step.verifies
+
+    def test_bit_steps(self):
+        step = parse_step("setbits 4 0 15")
+        assert (step.and_mask, step.or_mask) == (0x7FFE, 0x8001)
+        step = parse_step("clearbits 4 3")
+        assert (step.and_mask, step.or_mask) == (0xFFF7, 0)
+
+    @pytest.mark.parametrize("text", [
+        "jump 10",
+        "write",
+        "write 65536 1",
+        "write 10 65536",
+        "write 10 x",
+        "write 10",
+        "rw 10 1 2 read 20",
+        "rw 10 1 read 20 5 6",
+        "rw 10 read 20 5",
+        "rw 10 1 read 20 0",
+        "read 10",
+        "read 10 126",
+        "mask 5 0x10000 0",
+        "mask 5 1",
+        "delay",
+        "delay -1",
+        "delay 60001",
+        "setbits 4",
+        "setbits 4 16",
+        "clearbits 4 -1",
+    ])
+    def test_invalid(self, text):
+        with pytest.raises(ValueError):
+            parse_step(text)
+
+    @pytest.mark.parametrize("text", ["write 65535 1 2", "read 65530 10", "rw 0 1 read 65530 10", "rw 65535 1 2"])
+    def test_steps_must_fit_the_address_space(self, text):
+        with pytest.raises(ValueError, match="do not fit"):
+            parse_step(text)
+
+    def test_errors_name_the_line(self):
+        with pytest.raises(ValueError, match="Line 3"):
+            parse_sequence("write 1 1\n# two\nwrite 1 1; read 1")
+        with pytest.raises(ValueError, match="no steps"):
+            parse_sequence("# nothing\n;")
+
+
+def test_read_back_mismatch():
+    step = parse_step("rw 10 1 2 3")
+    result = step.result(0.001, [1, 9, 3])
+    assert not result.ok
+    assert result.describe() == "VERIFY FAILED: 11: wrote 2, read 9"
+    assert step.result(0.001, [1, 2, 3]).describe() == "written and verified"
+
+
+SEQUENCE = "write 30 0x00F0; setbits 30 0; clearbits 30 4; rw 40 1 2; read 995 10; write 50 5; read 30 1"
+
+
+class TestLoopback:
+    """Sequences against test_server.py, whose tables end at address 999."""
+
+    @pytest.fixture
+    def client(self, test_server):
+        client = TcpTransport("127.0.0.1", test_server()).open(2.0)
+        yield client
+        client.close()
+
+    def test_stops_at_the_first_failure(self, client):
+        steps = parse_sequence(SEQUENCE)
+        results = run_sequence(client, steps, 1)
+        assert [result.ok for result in results] == [True, True, True, True, False]
+        assert results[3].describe() == "written and verified"
+        assert "Illegal data address" in results[4].error
+        assert client.read_holding_registers(30, 1, slave=1).registers == [0x00E1]
+        assert client.read_holding_registers(50, 1, slave=1).registers == [0]
+        assert summarize(results, steps).startswith("4 of 7 steps OK, 1 failed, 2 not run")
+
+    def test_keep_going(self, client):
+        results = run_sequence(client, parse_sequence(SEQUENCE), 1, keep_going=True)
+        assert [result.ok for result in results] == [True, True, True, True, False, True, True]
+        assert results[-1].values == [0x00E1]
+        assert client.read_holding_registers(50, 1, slave=1).registers == [5]
+
+    def test_engine(self, test_server):
+        engine = ModbusEngine("127.0.0.1", test_server(), timeout=2, metrics=Metrics())
+        engine.start()
+        try:
+            assert engine.call(engine.connect)
+            results = engine.call(engine.run_sequence, parse_sequence(SEQUENCE), 1)
+            assert [result.ok for result in results] == [True, True, True, True, False]
+            results = engine.call(engine.run_sequence, parse_sequence(SEQUENCE), 1, keep_going=True)
+            assert [result.ok for result in results] == [True, True, True, True, False, True, True]
+            assert results[-1].values == [0x00E1]
+        finally:
+            engine.stop()
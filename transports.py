@@ -0,0 +1,506 @@
+#!/usr/bin/env python3
+"""
+Transports: how Modbus requests reach a device.
+
+    tcp      Modbus TCP. pymodbus' client, pipelined by modbus_core on its socket.
+    rtu-tcp  Modbus RTU frames tunnelled through a TCP serial converter (gateway).
+    serial   Modbus RTU on a local serial port, through pyserial if it is
+             installed and termios otherwise (POSIX only).
+
+RTU transports use RtuClient, which frames requests itself and times them
+from the line's character format (SerialLine): one character is a start bit,
+the data bits, an optional parity bit and the stop bits. A request is only
+sent once the line has been silent for 3.5 characters since the last frame,
+responses are read by their exact expected length (so a frame is complete
+as soon as its last byte arrives instead of after a silence), and the
+response timeout counts from the end of the request's transmission with the
+response's own transmission time added. Above 19200 baud the specification
+fixes the silent interval at 1.75 ms and the inter-character gap at 0.75 ms.
+
+Each transport sizes requests for its link: TCP reads the protocol maximum
+and pipelines, while an RTU line, which carries one request at a time, reads
+as much per request as still fits in half the response timeout on the wire.
+At 9600 baud and above that is the protocol maximum too (one request
+overhead amortised over the most data); slow lines get smaller chunks
+instead of timeouts.
+
+RtuClient offers the read/write methods of a synchronous pymodbus client
+(returning pymodbus response objects), so ChunkedReader, ChunkedWriter and
+the rest of modbus_core use it unchanged, and exchange() for raw PDUs.
+Framing and SerialLine come from rtu_framing.
+"""
+
+import os
+import select
+import socket
+import time
+from types import SimpleNamespace
+
+from modbus_core import MAX_WRITE_REGISTERS, ModbusError, ModbusIOError
+from rtu_framing import RTU_MAX_ADU, RTU_OVERHEAD, SerialLine, check_frame, response_length, rtu_frame
+
+TRANSPORT_KINDS = ('tcp', 'rtu-tcp', 'serial')
+TRANSPORT_NAMES = {'tcp': "Modbus TCP", 'rtu-tcp': "RTU over TCP", 'serial': "Serial RTU"}
+
+WIRE_BUDGET = 0.5  # share of the response timeout a request and its response may spend on the wire
+
+
+class Transport:
+    """How to reach a device; subclasses set kind and implement client()."""
+
+    kind = None
+    pipelining = False
+    overhead = RTU_OVERHEAD
+    line = None
+
+    @property
+    def name(self):
+        """Connection name for messages and metrics."""
+        raise NotImplementedError
+
+    def device(self, unit):
+        """Device label of a unit behind this transport (see metrics.device_label)."""
+        return f"{self.name}/{unit}"
+
+    def wire_time(self, size):
+        """Seconds a frame of size bytes spends on the slowest link, 0 if unknown."""
+        return self.line.frame_time(size) if self.line is not None else 0.0
+
+    def max_in_flight(self, requested):
+        """Requests that may be outstanding: only TCP framing can match several responses to their requests."""
+        return max(1, requested) if self.pipelining else 1
+
+    def chunk_size(self, table, timeout, write=False):
+        """
+        Entries per request for table: the largest count whose request and response fit WIRE_BUDGET of timeout.
+
+        With write=True it is the count of a write-multiple request instead
+        of a read.
+        """
+        maximum = MAX_WRITE_REGISTERS if write else table.max_read
+        if self.line is None:
+            return maximum
+        budget = timeout * WIRE_BUDGET
+        for_count = (lambda n: (n + 7) // 8) if table.bits else (lambda n: 2 * n)
+        low, high = 1, maximum
+        while low < high:
+            middle = (low + high + 1) // 2
+            data = for_count(middle)
+            # write: 7-byte request header + data and an 8-byte echo; read: 8-byte request, 5-byte response header
+            size = (RTU_OVERHEAD + 6 + data) + 8 if write else 8 + RTU_OVERHEAD + 2 + data
+            if self.wire_time(size) <= budget:
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+    def client(self, timeout):
+        """Return an unconnected synchronous client."""
+        raise NotImplementedError
+
+    def open(self, timeout):
+        """Return a connected synchronous client; raises ModbusError if the device cannot be reached."""
+        client = self.client(timeout)
+        if not client.connect():
+            client.close()
+            raise ModbusError(f"Could not connect to {self.name}")
+        return client
+
+    def describe(self):
+        """One line for the log: transport, endpoint, line format and request sizing."""
+        text = f"{TRANSPORT_NAMES[self.kind]} {self.name}"
+        if self.line is not None:
+            text += f", {self.line}, silent interval {self.line.silent_interval * 1000:.2f} ms"
+        return text
+
+
+class TcpTransport(Transport):
+    """Modbus TCP through pymodbus' ModbusTcpClient."""
+
+    kind = 'tcp'
+    pipelining = True
+    overhead = 7
+
+    def __init__(self, host, port=502):
+        self.host = host
+        self.port = port
+
+    @property
+    def name(self):
+        return f"{self.host}:{self.port}"
+
+    def client(self, timeout):
+        from pymodbus.client import ModbusTcpClient
+
+        # Retries are left to the RetryPolicy of the readers, which only resend what is missing
+        return ModbusTcpClient(host=self.host, port=self.port, timeout=timeout, retries=0)
+
+
+class RtuOverTcpTransport(Transport):
+    """
+    RTU frames through a TCP serial converter.
+
+    line is the converter's serial side; without it requests are sized as
+    for TCP and only the TCP round trip is timed.
+    """
+
+    kind = 'rtu-tcp'
+
+    def __init__(self, host, port=502, line=None):
+        self.host = host
+        self.port = port
+        self.line = line
+
+    @property
+    def name(self):
+        return f"{self.host}:{self.port}"
+
+    def client(self, timeout):
+        return RtuClient(_SocketStream(self.host, self.port), self, timeout)
+
+
+class SerialTransport(Transport):
+    """RTU on a local serial port (or pseudo-terminal)."""
+
+    kind = 'serial'
+
+    def __init__(self, port, line=None):
+        self.port = port
+        self.line = line or SerialLine()
+
+    @property
+    def name(self):
+        return self.port
+
+    def client(self, timeout):
+        return RtuClient(_SerialStream(self.port, self.line), self, timeout)
+
+
+def make_transport(kind, host="127.0.0.1", port=502, serial_port=None, line=None):
+    """Return the Transport of a kind from TRANSPORT_KINDS; raises ValueError."""
+    if kind == 'tcp':
+        return TcpTransport(host, port)
+    if kind == 'rtu-tcp':
+        return RtuOverTcpTransport(host, port, line)
+    if kind == 'serial':
+        if not serial_port:
+            raise ValueError("A serial port is needed, e.g. /dev/ttyUSB0 or COM3")
+        return SerialTransport(serial_port, line)
+    raise ValueError(f"Unknown transport '{kind}', expected one of {', '.join(TRANSPORT_KINDS)}")
+
+
+class _SocketStream:
+    """Byte stream over a TCP connection."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.sock = None
+
+    def open(self, timeout):
+        self.sock = socket.create_connection((self.host, self.port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.setblocking(False)
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    @property
+    def is_open(self):
+        return self.sock is not None
+
+    def write(self, data):
+        self.sock.setblocking(True)
+        try:
+            self.sock.sendall(data)
+        finally:
+            self.sock.setblocking(False)
+
+    def read(self, size, timeout):
+        """Return up to size bytes, b"" if none arrive within timeout; raises ModbusIOError when closed."""
+        ready, _, _ = select.select([self.sock], [], [], max(0.0, timeout))
+        if not ready:
+            return b""
+        data = self.sock.recv(size)
+        if not data:
+            self.close()
+            raise ModbusIOError("Connection closed by the device")
+        return data
+
+    def discard_input(self):
+        """Drop bytes that have already arrived (late answers to abandoned requests)."""
+        while True:
+            ready, _, _ = select.select([self.sock], [], [], 0)
+            if not ready or not self.read(4096, 0):
+                return
+
+
+class _SerialStream:
+    """Byte stream over a serial port: pyserial when installed, else a raw termios file descriptor."""
+
+    def __init__(self, port, line):
+        self.port = port
+        self.line = line
+        self.serial = None
+        self.fd = None
+
+    def open(self, timeout):
+        try:
+            import serial
+        except ImportError:
+            serial = None
+        if serial is not None:
+            self.serial = serial.Serial(
+                self.port, baudrate=self.line.baudrate, bytesize=self.line.bytesize, parity=self.line.parity,
+                stopbits=self.line.stopbits, timeout=0, write_timeout=timeout,
+            )
+            return
+        try:
+            import termios
+        except ImportError:
+            raise ModbusError("Serial ports need pyserial on this system (pip install pyserial)") from None
+        self.fd = os.open(self.port, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        try:
+            self._configure(termios)
+        except (termios.error, ValueError):
+            os.close(self.fd)
+            self.fd = None
+            raise
+
+    def _configure(self, termios):
+        """Raw mode in the line's character format."""
+        speed = getattr(termios, f"B{self.line.baudrate}", None)
+        if speed is None:
+            raise ValueError(f"Baud rate {self.line.baudrate} is not supported without pyserial")
+        iflag, oflag, cflag, lflag, _, _, cc = termios.tcgetattr(self.fd)
+        iflag = termios.IGNBRK if self.line.parity == 'N' else termios.IGNBRK | termios.INPCK
+        oflag = lflag = 0
+        cflag = termios.CREAD | termios.CLOCAL | (termios.CS8 if self.line.bytesize == 8 else termios.CS7)
+        if self.line.parity != 'N':
+            cflag |= termios.PARENB | (termios.PARODD if self.line.parity == 'O' else 0)
+        if self.line.stopbits == 2:
+            cflag |= termios.CSTOPB
+        cc[termios.VMIN] = 0
+        cc[termios.VTIME] = 0
+        termios.tcsetattr(self.fd, termios.TCSANOW, [iflag, oflag, cflag, lflag, speed, speed, cc])
+
+    def close(self):
+        if self.serial is not None:
+            self.serial.close()
+            self.serial = None
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    @property
+    def is_open(self):
+        return self.serial is not None or self.fd is not None
+
+    def write(self, data):
+        if self.serial is not None:
+            self.serial.write(data)
+            return
+        view = memoryview(data)
+        while view:
+            select.select([], [self.fd], [], 1.0)
+            try:
+                view = view[os.write(self.fd, view):]
+            except BlockingIOError:
+                continue
+
+    def read(self, size, timeout):
+        """Return up to size bytes, b"" if none arrive within timeout."""
+        if self.serial is not None:
+            self.serial.timeout = max(0.0, timeout)
+            return self.serial.read(size)
+        ready, _, _ = select.select([self.fd], [], [], max(0.0, timeout))
+        if not ready:
+            return b""
+        try:
+            return os.read(self.fd, size)
+        except BlockingIOError:
+            return b""
+        except OSError as e:
+            raise ModbusIOError(f"Serial port error: {e}") from e
+
+    def discard_input(self):
+        if self.serial is not None:
+            self.serial.reset_input_buffer()
+            return
+        while self.read(4096, 0):
+            pass
+
+
+class RtuClient:
+    """
+    Synchronous Modbus RTU master on a byte stream, timed from the transport's SerialLine.
+
+    Mirrors the parts of pymodbus' synchronous client that the rest of the
+    tool uses: connect(), close(), is_socket_open(), comm_params (timeout
+    and endpoint) and the read/write methods, which take slave= and return
+    pymodbus response objects. exchange() sends one raw PDU.
+    """
+
+    def __init__(self, stream, transport, timeout=3.0):
+        self.stream = stream
+        self.transport = transport
+        self.frame_overhead = RTU_OVERHEAD
+        if transport.kind == 'serial':
+            host, port = transport.port, None
+        else:
+            host, port = transport.host, transport.port
+        self.comm_params = SimpleNamespace(host=host, port=port, timeout_connect=timeout)
+        self._last_frame = 0.0
+        self._decoder = None
+
+    def connect(self):
+        """Open the stream; returns False if that fails."""
+        if self.stream.is_open:
+            return True
+        try:
+            self.stream.open(self.comm_params.timeout_connect)
+        except OSError:
+            return False
+        self._last_frame = time.perf_counter()
+        return True
+
+    def close(self):
+        self.stream.close()
+
+    def is_socket_open(self):
+        return self.stream.is_open
+
+    @property
+    def connected(self):
+        return self.stream.is_open
+
+    def _silent_interval(self):
+        line = self.transport.line
+        return line.silent_interval if line is not None else 0.0
+
+    def exchange(self, unit, pdu, timeout=None):
+        """
+        Send a request PDU to unit and return the response PDU (an exception response included).
+
+        timeout is how long the device may take to start answering once the
+        request has been sent (default comm_params.timeout_connect); the
+        transmission times of request and response are added to it. Raises
+        TimeoutError if no answer arrives and ModbusIOError for corrupt or
+        misaddressed frames.
+        """
+        if not self.stream.is_open:
+            raise ModbusIOError("Not connected")
+        timeout = timeout or self.comm_params.timeout_connect
+        wait = self._last_frame + self._silent_interval() - time.perf_counter()
+        if wait > 0:
+            time.sleep(wait)
+        self.stream.discard_input()
+        frame = rtu_frame(unit, pdu)
+        self.stream.write(frame)
+        sent = time.perf_counter() + self.transport.wire_time(len(frame))
+        try:
+            response = self._receive(pdu, sent + timeout, timeout)
+        finally:
+            self._last_frame = time.perf_counter()
+        if not check_frame(response):
+            raise ModbusIOError(f"CRC error in the response from unit {unit}")
+        if response[0] != unit:
+            raise ModbusIOError(f"Response from unit {response[0]} instead of unit {unit}")
+        if response[1] & 0x7F != pdu[0]:
+            raise ModbusIOError(f"Response to function code {response[1] & 0x7F} instead of {pdu[0]}")
+        return bytes(response[1:-2])
+
+    def _receive(self, pdu, deadline, timeout):
+        """Read one response frame: by its expected length when known, else up to a silent interval."""
+        buffer = bytearray()
+        expected = response_length(pdu)
+        while True:
+            now = time.perf_counter()
+            if len(buffer) >= 2:
+                if buffer[1] & 0x80:
+                    expected = RTU_OVERHEAD + 2
+                if expected is not None and len(buffer) >= expected:
+                    return buffer[:expected]
+            if buffer and expected is None:
+                # Unknown length: the frame ends at the first silent interval
+                data = self.stream.read(RTU_MAX_ADU, max(self._silent_interval(), 0.002))
+                if not data:
+                    return buffer
+            else:
+                if now >= deadline:
+                    if buffer:
+                        raise ModbusIOError(f"Incomplete response: {len(buffer)} of {expected} bytes")
+                    raise TimeoutError(f"No response received within {timeout:.3g} s")
+                data = self.stream.read(RTU_MAX_ADU - len(buffer), deadline - now)
+            if data and not buffer:
+                # The rest of the frame takes its transmission time (plus slack) to arrive
+                size = expected if expected is not None else RTU_MAX_ADU
+                deadline = max(deadline, time.perf_counter() + self.transport.wire_time(size) + timeout)
+            buffer += data
+
+    def execute(self, request, timeout=None):
+        """Send a pymodbus request object and return the decoded pymodbus response (see exchange())."""
+        if self._decoder is None:
+            from pymodbus.factory import ClientDecoder
+
+            self._decoder = ClientDecoder()
+        pdu = bytes((request.function_code,)) + request.encode()
+        response = self._decoder.decode(self.exchange(request.slave_id, pdu, timeout))
+        if response is None:
+            raise ModbusIOError(f"Undecodable response to function code {request.function_code}")
+        return response
+
+    def read_coils(self, address, count=1, slave=1):
+        from pymodbus.bit_read_message import ReadCoilsRequest
+
+        return self.execute(ReadCoilsRequest(address, count, slave=slave))
+
+    def read_discrete_inputs(self, address, count=1, slave=1):
+        from pymodbus.bit_read_message import ReadDiscreteInputsRequest
+
+        return self.execute(ReadDiscreteInputsRequest(address, count, slave=slave))
+
+    def read_holding_registers(self, address, count=1, slave=1):
+        from pymodbus.register_read_message import ReadHoldingRegistersRequest
+
+        return self.execute(ReadHoldingRegistersRequest(address, count, slave=slave))
+
+    def read_input_registers(self, address, count=1, slave=1):
+        from pymodbus.register_read_message import ReadInputRegistersRequest
+
+        return self.execute(ReadInputRegistersRequest(address, count, slave=slave))
+
+    def write_register(self, address, value, slave=1):
+        from pymodbus.register_write_message import WriteSingleRegisterRequest
+
+        return self.execute(WriteSingleRegisterRequest(address, value, slave=slave))
+
+    def write_registers(self, address, values, slave=1):
+        from pymodbus.register_write_message import WriteMultipleRegistersRequest
+
+        return self.execute(WriteMultipleRegistersRequest(address, list(values), slave=slave))
+
+    def write_coil(self, address, value, slave=1):
+        from pymodbus.bit_write_message import WriteSingleCoilRequest
+
+        return self.execute(WriteSingleCoilRequest(address, value, slave=slave))
+
+    def write_coils(self, address, values, slave=1):
+        from pymodbus.bit_write_message import WriteMultipleCoilsRequest
+
+        return self.execute(WriteMultipleCoilsRequest(address, list(values), slave=slave))
+
+    def readwrite_registers(self, read_address=0, read_count=0, write_address=0, values=0, slave=1):
+        from pymodbus.register_read_message import ReadWriteMultipleRegistersRequest
+
+        return self.execute(ReadWriteMultipleRegistersRequest(
+            read_address=read_address, read_count=read_count, write_address=write_address,
+            write_registers=values, slave=slave
+        ))
+
+    def mask_write_register(self, address=0, and_mask=0xFFFF, or_mask=0, slave=1):
+        from pymodbus.register_write_message import MaskWriteRegisterRequest
+
+        return self.execute(MaskWriteRegisterRequest(address, and_mask, or_mask, slave=slave))
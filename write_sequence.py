@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Write sequences: ordered register writes sent back-to-back, with per-step results.
+
+A sequence is text with one step per line (or several separated by ";");
+"#" starts a comment. Addresses and values may be decimal or 0x-prefixed hex.
+
+    write ADDR V [V ...]              write multiple registers (FC16)
+    rw ADDR V [V ...] [read ADDR N]   read/write multiple registers (FC23): write,
+                                      then read back in the same transaction;
+                                      reads the written range (and compares it)
+                                      unless another read range is given
+    mask ADDR AND OR                  mask write register (FC22)
+    setbits ADDR BIT [BIT ...]        FC22 setting bits 0-15, others unchanged
+    clearbits ADDR BIT [BIT ...]      FC22 clearing bits 0-15, others unchanged
+    read ADDR N                       read holding registers (FC3)
+    delay MS                          wait before the next step
+
+Steps run strictly one after the other, each as soon as the previous one has
+been answered: a write is never sent before the one ahead of it was
+acknowledged, so the device sees them in order even if it answers one with
+Server Busy. Nothing is pipelined and there is no delay unless a step asks
+for one. The run stops at the first failed step unless told to keep going.
+"""
+
+import time
+
+from modbus_core import (
+    ChunkedReader, ModbusError, bit_masks, compare_registers, mask_write_register, read_write_registers,
+    write_registers, FC_MASK_WRITE_REGISTER, FC_READ_HOLDING_REGISTERS, FC_READ_WRITE_MULTIPLE_REGISTERS,
+    FC_WRITE_MULTIPLE_REGISTERS, MAX_READ_REGISTERS, MAX_READ_WRITE_REGISTERS, MAX_WRITE_REGISTERS,
+)
+
+STEP_KINDS = ('write', 'rw', 'mask', 'setbits', 'clearbits', 'read', 'delay')
+MAX_DELAY_MS = 60000
+
+
+class SequenceStep:
+    """One step of a write sequence."""
+
+    def __init__(self, kind, address=None, values=(), and_mask=0xFFFF, or_mask=0, read_address=None, read_count=None,
+                 delay=0.0, text=""):
+        self.kind = kind
+        self.address = address
+        self.values = list(values)
+        self.and_mask = and_mask
+        self.or_mask = or_mask
+        self.read_address = read_address
+        self.read_count = read_count
+        self.delay = delay
+        self.text = text
+
+    @property
+    def function_code(self):
+        """The Modbus function code of the step's request, None for a delay."""
+        if self.kind == 'write':
+            return FC_WRITE_MULTIPLE_REGISTERS
+        if self.kind == 'rw':
+            return FC_READ_WRITE_MULTIPLE_REGISTERS
+        if self.kind == 'read':
+            return FC_READ_HOLDING_REGISTERS
+        if self.kind == 'delay':
+            return None
+        return FC_MASK_WRITE_REGISTER
+
+    @property
+    def verifies(self):
+        """True for a read/write step that reads back exactly what it wrote."""
+        return self.kind == 'rw' and self.read_address == self.address and self.read_count == len(self.values)
+
+    def request(self, unit):
+        """The pymodbus request for this step (not for a delay)."""
+        if self.kind == 'write':
+            from pymodbus.register_write_message import WriteMultipleRegistersRequest
+
+            return WriteMultipleRegistersRequest(self.address, list(self.values), slave=unit)
+        if self.kind == 'rw':
+            from pymodbus.register_read_message import ReadWriteMultipleRegistersRequest
+
+            return ReadWriteMultipleRegistersRequest(
+                read_address=self.read_address, read_count=self.read_count, write_address=self.address,
+                write_registers=list(self.values), slave=unit
+            )
+        if self.kind == 'read':
+            from pymodbus.register_read_message import ReadHoldingRegistersRequest
+
+            return ReadHoldingRegistersRequest(self.address, self.read_count, slave=unit)
+        from pymodbus.register_write_message import MaskWriteRegisterRequest
+
+        return MaskWriteRegisterRequest(self.address, self.and_mask, self.or_mask, slave=unit)
+
+    def result(self, latency, values=None, error=None):
+        """Build the StepResult for this step from the values it read (or the error it raised)."""
+        mismatches = []
+        if error is None and self.verifies:
+            mismatches = compare_registers(self.address, self.values, values)
+        return StepResult(self, latency, values, error, mismatches)
+
+    def __str__(self):
+        return self.text or self.kind
+
+
+class StepResult:
+    """Outcome of one step: latency in seconds, values read, error message and read-back mismatches."""
+
+    def __init__(self, step, latency, values=None, error=None, mismatches=()):
+        self.step = step
+        self.latency = latency
+        self.values = values
+        self.error = error
+        self.mismatches = list(mismatches)
+
+    @property
+    def ok(self):
+        return self.error is None and not self.mismatches
+
+    def describe(self):
+        """One-line summary of the result for logs and tables."""
+        if self.error is not None:
+            return f"FAILED: {self.error}"
+        if self.mismatches:
+            return "VERIFY FAILED: " + ", ".join(
+                f"{address}: wrote {expected}, read {observed}" for address, expected, observed in self.mismatches
+            )
+        if self.step.kind == 'delay':
+            return "waited"
+        if self.step.verifies:
+            return "written and verified"
+        if self.step.kind in ('mask', 'setbits', 'clearbits'):
+            return f"masked (AND 0x{self.step.and_mask:04X}, OR 0x{self.step.or_mask:04X})"
+        if self.values is not None:
+            return "read " + " ".join(str(value) for value in self.values)
+        return "written"
+
+
+def _number(token, where):
+    try:
+        return int(token, 0)
+    except ValueError:
+        raise ValueError(f"{where}: '{token}' is not a number") from None
+
+
+def _address(token, where):
+    address = _number(token, where)
+    if not 0 <= address <= 65535:
+        raise ValueError(f"{where}: address {address} is outside 0-65535")
+    return address
+
+
+def _uint16(token, where):
+    value = _number(token, where)
+    if not 0 <= value <= 65535:
+        raise ValueError(f"{where}: value {value} is outside 0-65535 (uint16)")
+    return value
+
+
+def _fits(address, count, where):
+    if address + count > 65536:
+        raise ValueError(f"{where}: {count} registers do not fit at address {address}")
+
+
+def parse_step(text, where="Step"):
+    """Parse one step (see the module docstring). Raises ValueError."""
+    tokens = text.replace(",", " ").split()
+    kind = tokens[0].lower()
+    args = tokens[1:]
+    if kind not in STEP_KINDS:
+        raise ValueError(f"{where}: unknown step '{tokens[0]}' (expected one of {', '.join(STEP_KINDS)})")
+
+    if kind == 'delay':
+        if len(args) != 1:
+            raise ValueError(f"{where}: expected 'delay MS'")
+        delay = _number(args[0], where)
+        if not 0 <= delay <= MAX_DELAY_MS:
+            raise ValueError(f"{where}: delay must be between 0 and {MAX_DELAY_MS} ms")
+        return SequenceStep(kind, delay=delay / 1000, text=text)
+
+    if not args:
+        raise ValueError(f"{where}: missing address")
+    address = _address(args[0], where)
+    args = args[1:]
+
+    if kind == 'read':
+        if len(args) != 1:
+            raise ValueError(f"{where}: expected 'read ADDR COUNT'")
+        count = _number(args[0], where)
+        if not 1 <= count <= MAX_READ_REGISTERS:
+            raise ValueError(f"{where}: between 1 and {MAX_READ_REGISTERS} registers can be read at once")
+        _fits(address, count, where)
+        return SequenceStep(kind, address, read_count=count, text=text)
+
+    if kind == 'mask':
+        if len(args) != 2:
+            raise ValueError(f"{where}: expected 'mask ADDR AND OR'")
+        return SequenceStep(kind, address, and_mask=_uint16(args[0], where), or_mask=_uint16(args[1], where),
+                            text=text)
+
+    if kind in ('setbits', 'clearbits'):
+        if not args:
+            raise ValueError(f"{where}: expected '{kind} ADDR BIT [BIT ...]'")
+        bits = [_number(arg, where) for arg in args]
+        try:
+            and_mask, or_mask = bit_masks(bits, ()) if kind == 'setbits' else bit_masks((), bits)
+        except ValueError as e:
+            raise ValueError(f"{where}: {e}") from None
+        return SequenceStep(kind, address, and_mask=and_mask, or_mask=or_mask, text=text)
+
+    read_address = read_count = None
+    if kind == 'rw' and 'read' in [arg.lower() for arg in args]:
+        split = [arg.lower() for arg in args].index('read')
+        if len(args) - split != 3:
+            raise ValueError(f"{where}: expected 'rw ADDR V [V ...] read ADDR COUNT'")
+        read_address = _address(args[split + 1], where)
+        read_count = _number(args[split + 2], where)
+        if not 1 <= read_count <= MAX_READ_REGISTERS:
+            raise ValueError(f"{where}: between 1 and {MAX_READ_REGISTERS} registers can be read at once")
+        _fits(read_address, read_count, where)
+        args = args[:split]
+    limit = MAX_READ_WRITE_REGISTERS if kind == 'rw' else MAX_WRITE_REGISTERS
+    if not 1 <= len(args) <= limit:
+        raise ValueError(f"{where}: between 1 and {limit} values can be written by one '{kind}' step")
+    values = [_uint16(arg, where) for arg in args]
+    _fits(address, len(values), where)
+    if kind == 'rw' and read_address is None:
+        read_address, read_count = address, len(values)
+    return SequenceStep(kind, address, values, read_address=read_address, read_count=read_count, text=text)
+
+
+def parse_sequence(text):
+    """Parse a write sequence into a list of SequenceSteps. Raises ValueError naming the line."""
+    steps = []
+    for line_number, line in enumerate(text.splitlines(), 1):
+        line = line.split("#", 1)[0]
+        for part in line.split(";"):
+            part = part.strip()
+            if part:
+                steps.append(parse_step(part, f"Line {line_number}"))
+    if not steps:
+        raise ValueError("The sequence has no steps")
+    return steps
+
+
+def run_step(client, step, unit_id):
+    """Run one step with a synchronous client; returns the values it read (None for writes)."""
+    if step.kind == 'delay':
+        time.sleep(step.delay)
+        return None
+    if step.kind == 'write':
+        write_registers(client, step.address, step.values, unit_id)
+        return None
+    if step.kind == 'rw':
+        return read_write_registers(client, step.address, step.values, unit_id, step.read_address, step.read_count)
+    if step.kind == 'read':
+        return ChunkedReader(client, unit_id).read(step.address, step.read_count)
+    mask_write_register(client, step.address, step.and_mask, step.or_mask, unit_id)
+    return None
+
+
+def run_sequence(client, steps, unit_id, keep_going=False, on_result=None):
+    """
+    Run steps in order with a synchronous client and return their StepResults.
+
+    Stops after the first failed step (an error or a read-back mismatch)
+    unless keep_going is set; steps not run have no result. on_result(result)
+    is called as each step completes.
+    """
+    results = []
+    for step in steps:
+        started = time.perf_counter()
+        try:
+            values = run_step(client, step, unit_id)
+            result = step.result(time.perf_counter() - started, values)
+        except (ModbusError, OSError, ValueError) as e:
+            result = step.result(time.perf_counter() - started, error=str(e))
+        except Exception as e:
+            # pymodbus' own exceptions (ConnectionException, ModbusIOException)
+            if not type(e).__module__.startswith('pymodbus'):
+                raise
+            result = step.result(time.perf_counter() - started, error=str(e))
+        results.append(result)
+        if on_result is not None:
+            on_result(result)
+        if not result.ok and not keep_going:
+            break
+    return results
+
+
+def summarize(results, steps):
+    """Summary line for a finished run: steps ok of run, failures and total/slowest latency."""
+    run = len(results)
+    failed = sum(1 for result in results if not result.ok)
+    total = sum(result.latency for result in results)
+    requests = [result for result in results if result.step.kind != 'delay']
+    slowest = max(requests, key=lambda result: result.latency, default=None)
+    text = f"{run - failed} of {len(steps)} steps OK"
+    if failed:
+        text += f", {failed} failed"
+    if run < len(steps):
+        text += f", {len(steps) - run} not run"
+    text += f" in {total * 1000:.1f} ms"
+    if slowest is not None:
+        text += f" (slowest: step {results.index(slowest) + 1}, {slowest.latency * 1000:.1f} ms)"
+    return text